@@ -0,0 +1,16 @@
+-- Textos (context_summary) dos usuários cujo hash (modelo + texto) difere do armazenado.
+-- Parâmetros: :model (nome do modelo de embeddings)
+WITH hashed AS (
+    SELECT
+        u.id AS source_id,
+        u.context_summary AS chunk_text,
+        md5(:model || ':' || u.context_summary) AS content_hash
+    FROM raw_data.users u
+    WHERE u.context_summary IS NOT NULL
+        AND u.user_geom IS NOT NULL
+)
+SELECT h.source_id, h.chunk_text, h.content_hash
+FROM hashed h
+LEFT JOIN embeddings.fct_vector_geo_search f ON f.user_id = h.source_id
+WHERE f.content_hash IS DISTINCT FROM h.content_hash
+ORDER BY h.source_id;
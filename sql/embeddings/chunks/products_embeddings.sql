@@ -0,0 +1,23 @@
+-- Textos (chunks) dos produtos cujo hash (modelo + texto) difere do armazenado.
+-- Parâmetros: :model (nome do modelo de embeddings)
+WITH chunks AS (
+    SELECT
+        p.id AS source_id,
+        CONCAT(
+            'Produto: ', p.name,
+            '. Marca: ', p.brand,
+            '. Categoria: ', p.category,
+            '. Departamento: ', p.department,
+            '. Preço: ', p.retail_price, '.'
+        ) AS chunk_text
+    FROM raw_data.products p
+),
+hashed AS (
+    SELECT source_id, chunk_text, md5(:model || ':' || chunk_text) AS content_hash
+    FROM chunks
+)
+SELECT h.source_id, h.chunk_text, h.content_hash
+FROM hashed h
+LEFT JOIN embeddings.products_embeddings e ON e.source_id = h.source_id
+WHERE e.content_hash IS DISTINCT FROM h.content_hash
+ORDER BY h.source_id;
@@ -1,16 +1,39 @@
-CREATE TABLE IF NOT EXISTS embeddings.fct_user_logistics AS
-SELECT
-    u.id AS user_id,
-    dc.id AS dc_id,
-    u.user_geom,
-    dc.distribution_center_geom,
-    round(ST_Distance(u.user_geom, dc.distribution_center_geom)::numeric / 1000, 3) AS distance_km
-FROM raw_data.users u
-JOIN raw_data.orders o ON u.id = o.user_id
-JOIN raw_data.order_items oi ON o.order_id = oi.order_id
-JOIN raw_data.products p ON oi.product_id = p.id
-JOIN raw_data.distribution_centers dc ON p.distribution_center_id = dc.id;
+-- Substitui a versão anterior (CTAS sem order_item_id e sem chave primária), que o
+-- CREATE TABLE IF NOT EXISTS manteria: o próximo refresh reconstrói a tabela por completo
+DO $$
+BEGIN
+    IF to_regclass('embeddings.fct_user_logistics') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'embeddings'
+          AND table_name = 'fct_user_logistics'
+          AND column_name = 'order_item_id'
+    ) THEN
+        DROP TABLE embeddings.fct_user_logistics;
+        DELETE FROM raw_data.refresh_state WHERE consumer = 'fct_user_logistics';
+    END IF;
+END $$;
+
+-- Tabela materializada pelo pipeline metrics (sql/embeddings/refresh/fct_user_logistics.sql)
+CREATE TABLE IF NOT EXISTS embeddings.fct_user_logistics (
+    order_item_id INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    user_id INTEGER NOT NULL,
+    dc_id INTEGER NOT NULL,
+    user_geom GEOGRAPHY(POINT, 4326),
+    distribution_center_geom GEOGRAPHY(POINT, 4326),
+    distance_km NUMERIC(10, 3),
+    PRIMARY KEY (order_item_id, created_at)
+);
+
+-- Cache de distâncias: ST_Distance é calculado uma vez por par (usuário, CD), e não por item
+CREATE TABLE IF NOT EXISTS embeddings.user_dc_distance (
+    user_id INTEGER NOT NULL,
+    dc_id INTEGER NOT NULL,
+    distance_km NUMERIC(10, 3),
+    PRIMARY KEY (user_id, dc_id)
+);
 
 -- Comentários para fct_user_logistics
-COMMENT ON TABLE embeddings.fct_user_logistics IS 'Tabela de fatos logísticos com distâncias pré-calculadas entre usuários e CDs baseadas em pedidos reais.';
+COMMENT ON TABLE embeddings.fct_user_logistics IS 'Tabela de fatos logísticos com distâncias pré-calculadas entre usuários e CDs baseadas em pedidos reais. Uma linha por item de pedido.';
 COMMENT ON COLUMN embeddings.fct_user_logistics.distance_km IS 'Distância exata em quilômetros. Use esta coluna em vez de recalcular com ST_Distance.';
+COMMENT ON TABLE embeddings.user_dc_distance IS 'Tabela técnica: cache da distância (km) entre cada usuário e CD com pedidos. Base da fct_user_logistics.';
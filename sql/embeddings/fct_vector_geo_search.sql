@@ -21,7 +21,14 @@ CREATE TABLE IF NOT EXISTS embeddings.fct_vector_geo_search (
         ON DELETE CASCADE
 );
 
+-- Hash do texto (modelo + chunk_text): textos inalterados não são codificados novamente
+ALTER TABLE embeddings.fct_vector_geo_search ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Um embedding por usuário (chave do UPSERT do pipeline data_embedding)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_vsearch_user_id ON embeddings.fct_vector_geo_search (user_id);
+
 -- Comentários para fct_vector_geo_search
 COMMENT ON TABLE embeddings.fct_vector_geo_search IS 'Busca híbrida de usuários. Une busca semântica (vetores), filtros de negócio (gasto médio) e raio espacial (PostGIS).';
 COMMENT ON COLUMN embeddings.fct_vector_geo_search.avg_spend IS 'Ticket médio de gasto do usuário. Ótimo para pré-filtro.';
 COMMENT ON COLUMN embeddings.fct_vector_geo_search.embedding IS 'Vetor semântico do perfil do usuário para busca por similaridade.';
+COMMENT ON COLUMN embeddings.fct_vector_geo_search.content_hash IS 'Coluna técnica: hash do modelo e do texto que geraram o vetor.';
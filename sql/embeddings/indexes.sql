@@ -16,17 +16,14 @@ ON embeddings.fct_vector_geo_search USING GIST (user_geom);
 CREATE INDEX IF NOT EXISTS idx_vsearch_spend
 ON embeddings.fct_vector_geo_search (avg_spend DESC);
 
--- 3. Índice HNSW para busca vetorial de alta performance
--- Nota: HNSW é mais rápido que IVFFlat para buscas ANN em NLP
-CREATE INDEX IF NOT EXISTS idx_vsearch_vector
-ON embeddings.fct_vector_geo_search
-USING hnsw (embedding vector_cosine_ops)
-WITH (m=24, ef_construction=256);
+-- 3. Índice HNSW (idx_vsearch_vector): criado pelo pipeline data_embedding ao final de cada
+-- carga, com os parâmetros de embedding.hnsw (cargas grandes removem e reconstroem o índice)
 
 -- ------------------------------------------------
--- map_hotspots_h3
+-- map_hotspots_grid
 -- ------------------------------------------------
-CREATE INDEX IF NOT EXISTS idx_hotspots_geom ON embeddings.map_hotspots_h3 USING GIST (grid_geom);
+-- Tiles do mapa: filtro por resolução (chave primária) e pela área visível
+CREATE INDEX IF NOT EXISTS idx_hotspots_geom ON embeddings.map_hotspots_grid USING GIST (grid_geom);
 
 -- ------------------------------------------------
 -- products_embeddings
@@ -36,8 +33,5 @@ CREATE INDEX IF NOT EXISTS idx_hotspots_geom ON embeddings.map_hotspots_h3 USING
 CREATE INDEX IF NOT EXISTS idx_emb_brand ON embeddings.products_embeddings(brand);
 CREATE INDEX IF NOT EXISTS idx_emb_category ON embeddings.products_embeddings(category);
 
--- Índice HNSW para busca rápida (Approximate Nearest Neighbor)
--- Utiliza vector_cosine_ops, pois se trata de NLP
-CREATE INDEX IF NOT EXISTS idx_product_embedding ON embeddings.products_embeddings
-USING hnsw (embedding vector_cosine_ops)
-WITH (m=24, ef_construction=256);
+-- Índice HNSW (idx_product_embedding): criado pelo pipeline data_embedding ao final de cada
+-- carga, com os parâmetros de embedding.hnsw (cargas grandes removem e reconstroem o índice)
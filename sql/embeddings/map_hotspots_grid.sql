@@ -0,0 +1,37 @@
+-- Tabelas mantidas pelo nó refresh_hotspot_grid_node (pipeline metrics)
+
+-- Substituída pela grade hierárquica (o agrupamento em ST_SnapToGrid não era H3 e
+-- exigia reagrupar a tabela users inteira)
+DROP TABLE IF EXISTS embeddings.map_hotspots_h3;
+
+CREATE TABLE IF NOT EXISTS embeddings.map_hotspots_grid (
+    resolution SMALLINT NOT NULL,
+    cell_id BIGINT NOT NULL,
+    center_lat DOUBLE PRECISION NOT NULL,
+    center_lon DOUBLE PRECISION NOT NULL,
+    density INTEGER NOT NULL,
+    age_sum BIGINT NOT NULL,
+    age_count INTEGER NOT NULL,
+    avg_user_age NUMERIC(5, 1) GENERATED ALWAYS AS (
+        ROUND(age_sum::numeric / NULLIF(age_count, 0), 1)
+    ) STORED,
+    grid_geom GEOGRAPHY(POINT, 4326) GENERATED ALWAYS AS (
+        ST_SetSRID(ST_MakePoint(center_lon, center_lat), 4326)::geography
+    ) STORED,
+    PRIMARY KEY (resolution, cell_id)
+);
+
+-- Estado por usuário: célula na resolução mais fina e idade aplicadas na grade
+CREATE TABLE IF NOT EXISTS embeddings.user_grid_cells (
+    user_id INTEGER PRIMARY KEY,
+    cell_id BIGINT NOT NULL,
+    age SMALLINT
+);
+
+-- Comentários para map_hotspots_grid
+COMMENT ON TABLE embeddings.map_hotspots_grid IS 'Mapa de calor de usuários em uma grade hierárquica (quadtree) com várias resoluções. Use para análises de densidade e concentração territorial, filtrando por resolution (maior = células menores).';
+COMMENT ON COLUMN embeddings.map_hotspots_grid.resolution IS 'Resolução da grade: 2^resolution células por eixo (13 ~ 0,044 grau de longitude, ~5 km no equador).';
+COMMENT ON COLUMN embeddings.map_hotspots_grid.cell_id IS 'Id da célula na resolução. O pai na resolução r - k é cell_id >> 2k.';
+COMMENT ON COLUMN embeddings.map_hotspots_grid.grid_geom IS 'Coordenada central da célula.';
+COMMENT ON COLUMN embeddings.map_hotspots_grid.density IS 'Número total de usuários morando nesta célula.';
+COMMENT ON TABLE embeddings.user_grid_cells IS 'Tabela técnica: célula e idade de cada usuário já aplicadas em map_hotspots_grid. Não use para perguntas de negócio.';
@@ -0,0 +1,32 @@
+-- Grava os embeddings codificados (tabela temporária embedding_stage) com os metadados do usuário
+INSERT INTO embeddings.fct_vector_geo_search AS f (
+    user_id,
+    city,
+    country,
+    avg_spend,
+    chunk_text,
+    user_geom,
+    embedding,
+    content_hash
+)
+SELECT
+    s.source_id,
+    u.city,
+    u.country,
+    cs.ltv_sum / NULLIF(cs.order_count, 0) AS avg_spend,
+    s.chunk_text,
+    u.user_geom,
+    s.embedding,
+    s.content_hash
+FROM embedding_stage s
+JOIN raw_data.users u ON u.id = s.source_id
+LEFT JOIN metrics.customer_stats cs ON cs.user_id = u.id
+ON CONFLICT (user_id) DO UPDATE
+SET
+    city = EXCLUDED.city,
+    country = EXCLUDED.country,
+    avg_spend = EXCLUDED.avg_spend,
+    chunk_text = EXCLUDED.chunk_text,
+    user_geom = EXCLUDED.user_geom,
+    embedding = EXCLUDED.embedding,
+    content_hash = EXCLUDED.content_hash;
@@ -0,0 +1,31 @@
+-- Grava os embeddings codificados (tabela temporária embedding_stage) com os metadados do produto
+INSERT INTO embeddings.products_embeddings AS e (
+    source_id,
+    chunk_text,
+    brand,
+    category,
+    department,
+    retail_price,
+    embedding,
+    content_hash
+)
+SELECT
+    s.source_id,
+    s.chunk_text,
+    p.brand,
+    p.category,
+    p.department,
+    p.retail_price,
+    s.embedding,
+    s.content_hash
+FROM embedding_stage s
+JOIN raw_data.products p ON p.id = s.source_id
+ON CONFLICT (source_id) DO UPDATE
+SET
+    chunk_text = EXCLUDED.chunk_text,
+    brand = EXCLUDED.brand,
+    category = EXCLUDED.category,
+    department = EXCLUDED.department,
+    retail_price = EXCLUDED.retail_price,
+    embedding = EXCLUDED.embedding,
+    content_hash = EXCLUDED.content_hash;
@@ -18,7 +18,14 @@ CREATE TABLE IF NOT EXISTS embeddings.products_embeddings (
         ON DELETE CASCADE
 );
 
+-- Hash do texto (modelo + chunk_text): textos inalterados não são codificados novamente
+ALTER TABLE embeddings.products_embeddings ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Um embedding por produto (chave do UPSERT do pipeline data_embedding)
+CREATE UNIQUE INDEX IF NOT EXISTS ux_products_embeddings_source_id ON embeddings.products_embeddings (source_id);
+
 -- Comentários para products_embeddings
 COMMENT ON TABLE embeddings.products_embeddings IS 'Tabela de busca semântica para produtos usando pgvector. Use para encontrar produtos similares por contexto textual.';
 COMMENT ON COLUMN embeddings.products_embeddings.chunk_text IS 'Texto original que gerou o vetor. Retorne esta coluna no SELECT.';
 COMMENT ON COLUMN embeddings.products_embeddings.embedding IS 'Vetor (384 dim). OBRIGATÓRIO usar operador <=> com placeholder para ordenação de similaridade.';
+COMMENT ON COLUMN embeddings.products_embeddings.content_hash IS 'Coluna técnica: hash do modelo e do texto que geraram o vetor.';
@@ -0,0 +1,91 @@
+-- Refresh de embeddings.fct_user_logistics. No incremental, apenas os itens de pedido
+-- tocados no change_log (diretamente, pelo pedido ou pelo usuário) são recalculados, e a
+-- distância de cada par (usuário, CD) vem do cache embeddings.user_dc_distance.
+-- Alterações em products ou distribution_centers forçam a reconstrução.
+-- Parâmetros: :from_seq, :to_seq (janela do change_log) e :full_refresh
+
+-- 1. Itens tocados na janela
+CREATE TEMP TABLE logistics_touched_items ON COMMIT DROP AS
+SELECT oi.id, oi.created_at
+FROM raw_data.change_log c
+JOIN raw_data.order_items oi ON oi.id = c.row_id AND oi.created_at = c.created_at
+WHERE NOT :full_refresh
+    AND c.table_name = 'order_items'
+    AND c.seq > :from_seq
+    AND c.seq <= :to_seq
+UNION
+SELECT oi.id, oi.created_at
+FROM raw_data.change_log c
+JOIN raw_data.order_items oi ON oi.order_id = c.row_id
+WHERE NOT :full_refresh
+    AND c.table_name = 'orders'
+    AND c.seq > :from_seq
+    AND c.seq <= :to_seq
+UNION
+SELECT oi.id, oi.created_at
+FROM raw_data.change_log c
+JOIN raw_data.order_items oi ON oi.user_id = c.row_id
+WHERE NOT :full_refresh
+    AND c.table_name = 'users'
+    AND c.seq > :from_seq
+    AND c.seq <= :to_seq;
+
+-- 2. Invalida o cache dos usuários alterados (o endereço pode ter mudado)
+DELETE FROM embeddings.user_dc_distance d
+WHERE :full_refresh
+    OR d.user_id IN (
+        SELECT CAST(c.row_id AS integer)
+        FROM raw_data.change_log c
+        WHERE c.table_name = 'users'
+            AND c.seq > :from_seq
+            AND c.seq <= :to_seq
+    );
+
+-- 3. Calcula a distância apenas dos pares (usuário, CD) ainda fora do cache
+INSERT INTO embeddings.user_dc_distance (user_id, dc_id, distance_km)
+SELECT
+    u.id AS user_id,
+    dc.id AS dc_id,
+    round(ST_Distance(u.user_geom, dc.distribution_center_geom)::numeric / 1000, 3) AS distance_km
+FROM (
+    SELECT DISTINCT o.user_id, p.distribution_center_id AS dc_id
+    FROM raw_data.order_items oi
+    JOIN raw_data.orders o ON o.order_id = oi.order_id
+    JOIN raw_data.products p ON oi.product_id = p.id
+    WHERE :full_refresh
+        OR (oi.id, oi.created_at) IN (SELECT id, created_at FROM logistics_touched_items)
+) pairs
+JOIN raw_data.users u ON u.id = pairs.user_id
+JOIN raw_data.distribution_centers dc ON dc.id = pairs.dc_id
+ON CONFLICT (user_id, dc_id) DO NOTHING;
+
+-- 4. Substitui as linhas dos itens tocados (ou todas, na reconstrução)
+DELETE FROM embeddings.fct_user_logistics f
+WHERE :full_refresh
+    OR (f.order_item_id, f.created_at) IN (SELECT id, created_at FROM logistics_touched_items);
+
+INSERT INTO embeddings.fct_user_logistics (
+    order_item_id,
+    created_at,
+    user_id,
+    dc_id,
+    user_geom,
+    distribution_center_geom,
+    distance_km
+)
+SELECT
+    oi.id AS order_item_id,
+    oi.created_at,
+    u.id AS user_id,
+    dc.id AS dc_id,
+    u.user_geom,
+    dc.distribution_center_geom,
+    d.distance_km
+FROM raw_data.users u
+JOIN raw_data.orders o ON u.id = o.user_id
+JOIN raw_data.order_items oi ON o.order_id = oi.order_id
+JOIN raw_data.products p ON oi.product_id = p.id
+JOIN raw_data.distribution_centers dc ON p.distribution_center_id = dc.id
+JOIN embeddings.user_dc_distance d ON d.user_id = u.id AND d.dc_id = dc.id
+WHERE :full_refresh
+    OR (oi.id, oi.created_at) IN (SELECT id, created_at FROM logistics_touched_items);
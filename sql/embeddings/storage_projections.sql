@@ -0,0 +1,10 @@
+-- Projeções (PCA) do armazenamento compacto dos embeddings, gravadas pelo pipeline
+-- data_embedding. O banco é a cópia durável: o arquivo .npz em embedding.storage.pca_dir
+-- é restaurado daqui quando o volume é recriado, sem reajustar a PCA
+CREATE TABLE IF NOT EXISTS embeddings.storage_projections (
+    name TEXT PRIMARY KEY,
+    payload BYTEA NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE embeddings.storage_projections IS 'Tabela técnica: projeções PCA (.npz) usadas na redução de dimensão dos embeddings.';
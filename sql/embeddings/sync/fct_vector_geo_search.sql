@@ -0,0 +1,8 @@
+-- O gasto médio não faz parte do texto (o hash não muda quando só o gasto muda): executado
+-- a cada carga, com ou sem textos alterados, após o refresh de metrics.customer_stats.
+-- Atualiza apenas os usuários com valor diferente
+UPDATE embeddings.fct_vector_geo_search f
+SET avg_spend = cs.ltv_sum / NULLIF(cs.order_count, 0)
+FROM metrics.customer_stats cs
+WHERE cs.user_id = f.user_id
+    AND f.avg_spend IS DISTINCT FROM cs.ltv_sum / NULLIF(cs.order_count, 0);
@@ -0,0 +1,22 @@
+-- Tabela materializada pelo nó assign_nearest_dc_node (pipeline metrics)
+CREATE TABLE IF NOT EXISTS embeddings.user_dc_rank (
+    user_id INTEGER NOT NULL,
+    dc_id INTEGER NOT NULL,
+    distance_km DOUBLE PRECISION NOT NULL,
+    dc_rank SMALLINT NOT NULL,
+    PRIMARY KEY (user_id, dc_id)
+);
+
+-- Usuários atendidos por cada CD (CD mais próximo)
+CREATE INDEX IF NOT EXISTS idx_user_dc_rank_nearest ON embeddings.user_dc_rank (dc_id) WHERE dc_rank = 1;
+
+CREATE OR REPLACE VIEW embeddings.user_nearest_dc AS
+SELECT user_id, dc_id AS nearest_dc_id, distance_km
+FROM embeddings.user_dc_rank
+WHERE dc_rank = 1;
+
+-- Comentários para user_dc_rank
+COMMENT ON TABLE embeddings.user_dc_rank IS 'Matriz de distâncias entre cada usuário e todos os CDs, com o ranking de proximidade. Use para perguntas de logística e cobertura por CD.';
+COMMENT ON COLUMN embeddings.user_dc_rank.distance_km IS 'Distância em linha reta (haversine) em quilômetros. Use esta coluna em vez de recalcular com ST_Distance.';
+COMMENT ON COLUMN embeddings.user_dc_rank.dc_rank IS 'Posição do CD na ordem de proximidade do usuário (1 = CD mais próximo).';
+COMMENT ON VIEW embeddings.user_nearest_dc IS 'CD mais próximo de cada usuário e a distância até ele.';
@@ -1,49 +1,42 @@
-WITH ref_date AS (
-	SELECT max(created_at)::date + 1 AS snapshot_date
-	FROM raw_data.order_items
-	WHERE status NOT IN ('Cancelled', 'Returned')
-),
-customer_stats AS (
-	SELECT
-		u.id AS user_id,
-		(SELECT snapshot_date FROM ref_date) - MAX(oi.created_at)::date AS recency_days,
-		COUNT(DISTINCT oi.order_id) AS frequency_count,
-		SUM(oi.sale_price) AS ltv,
-		MIN(oi.created_at)::date AS first_purchase_date
-	FROM raw_data.users u
-	JOIN raw_data.order_items oi ON u.id = oi.user_id
-	WHERE oi.status NOT IN ('Cancelled', 'Returned')
-	GROUP BY 1
-	),
-rfm_scores AS (
-	SELECT
-		*,
-		NTILE(5) OVER (ORDER BY recency_days DESC) AS r_score,
-		NTILE(5) OVER (ORDER BY frequency_count ASC) AS f_score,
-		NTILE(5) OVER (ORDER BY ltv ASC) AS m_score
-	FROM customer_stats
-)
-SELECT
-	user_id,
-	recency_days,
-	frequency_count,
-	ROUND(ltv::numeric, 2) AS ltv_value,
-	CONCAT(r_score, f_score, m_score) AS rfm_score,
-	r_score,
-	f_score,
-	m_score,
-	CASE
-		WHEN r_score >= 5 AND f_score >= 5 THEN 'Champions (VIP)'
-		WHEN r_score >= 4 AND f_score >= 4 THEN 'Loyal Customers'
-		WHEN r_score >= 3 AND f_score >= 3 THEN 'Potential Loyalist'
-		WHEN r_score <= 2 AND f_score >= 4 THEN 'At Risk (High Value)'
-		WHEN r_score <= 2 AND f_score <= 2 THEN 'Hibernating'
-		WHEN r_score >= 4 AND f_score <= 2 THEN 'New Users'
-		ELSE 'General'
-	end AS customer_segment
-FROM rfm_scores
-ORDER BY ltv DESC;
+-- Tabela materializada pelo pipeline metrics (sql/metrics/refresh/customer_rfm_ltv.sql)
+CREATE TABLE IF NOT EXISTS metrics.customer_rfm_ltv (
+	user_id INTEGER PRIMARY KEY,
+	recency_days INTEGER NOT NULL,
+	frequency_count INTEGER NOT NULL,
+	ltv_value NUMERIC(14, 2) NOT NULL,
+	rfm_score TEXT NOT NULL,
+	r_score SMALLINT NOT NULL,
+	f_score SMALLINT NOT NULL,
+	m_score SMALLINT NOT NULL,
+	customer_segment TEXT NOT NULL,
+	refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
 
-COMMENT ON VIEW analytics.customer_rfm IS 'Métricas de RFM (Recency, Frequency, Monetary) e segmentação de clientes. Use para análises de LTV, churn e valor do cliente.';
-COMMENT ON COLUMN analytics.customer_rfm.customer_segment IS 'Segmentação de negócio (ex: Champions, At Risk, Hibernating).';
-COMMENT ON COLUMN analytics.customer_rfm.ltv_value IS 'Lifetime Value (Receita total do cliente).';
+CREATE INDEX IF NOT EXISTS idx_customer_rfm_ltv_segment ON metrics.customer_rfm_ltv (customer_segment);
+
+-- Estatísticas acumuladas por cliente, atualizadas apenas para os clientes com itens alterados
+CREATE TABLE IF NOT EXISTS metrics.customer_stats (
+	user_id INTEGER PRIMARY KEY,
+	ltv_sum NUMERIC(14, 2) NOT NULL,
+	order_count INTEGER NOT NULL,
+	first_purchase_at TIMESTAMP WITH TIME ZONE NOT NULL,
+	last_purchase_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Pontos de corte dos quintis de RFM (linha única), recalculados no máximo uma vez por
+-- metrics.rfm_cutpoints_max_age
+CREATE TABLE IF NOT EXISTS metrics.rfm_cutpoints (
+	singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+	snapshot_date DATE,
+	recency_cuts DOUBLE PRECISION[],
+	frequency_cuts DOUBLE PRECISION[],
+	monetary_cuts DOUBLE PRECISION[],
+	computed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE metrics.customer_rfm_ltv IS 'Métricas de RFM (Recency, Frequency, Monetary) e segmentação de clientes. Use para análises de LTV, churn e valor do cliente.';
+COMMENT ON COLUMN metrics.customer_rfm_ltv.customer_segment IS 'Segmentação de negócio (ex: Champions, At Risk, Hibernating).';
+COMMENT ON COLUMN metrics.customer_rfm_ltv.ltv_value IS 'Lifetime Value (Receita total do cliente).';
+COMMENT ON COLUMN metrics.customer_rfm_ltv.rfm_score IS 'Concatenação dos quintis de recência, frequência e valor (ex: 555 é o melhor cliente).';
+COMMENT ON TABLE metrics.customer_stats IS 'Tabela técnica: receita, pedidos distintos e datas da primeira e última compra válida de cada cliente. Base da customer_rfm_ltv.';
+COMMENT ON TABLE metrics.rfm_cutpoints IS 'Tabela técnica: pontos de corte (20%, 40%, 60%, 80%) da recência, frequência e valor usados nos scores de RFM.';
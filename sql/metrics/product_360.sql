@@ -1,51 +1,39 @@
-WITH sales_metrics AS (
-	SELECT
-		oi.product_id,
+-- Tabela materializada pelo pipeline metrics (sql/metrics/refresh/product_360.sql)
+CREATE TABLE IF NOT EXISTS metrics.product_360 (
+	product_id INTEGER PRIMARY KEY,
+	category TEXT NOT NULL,
+	product_name TEXT NOT NULL,
+	return_rate_pct NUMERIC(5, 2),
+	avg_to_shipping_days NUMERIC(10, 2),
+	avg_margin_pct NUMERIC(10, 2),
+	aov NUMERIC(10, 2),
+	-- Soma dos dias (desde 1970-01-01) de entrada dos itens em estoque: o aging é derivado
+	-- na leitura, sem reconstruir a tabela só porque a data mudou
+	stock_created_day_sum BIGINT NOT NULL DEFAULT 0,
+	stock_qt INTEGER NOT NULL,
+	refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
 
-		-- Taxa de Devolução (Itens devolvidos / Total Itens Entregues ou Completos -> desconsiderado 'Processing' e 'Cancelled')
-		(
-			COUNT(CASE WHEN oi.status = 'Returned' THEN 1 END)::numeric /
-			NULLIF(COUNT(CASE WHEN oi.status IN ('Complete', 'Returned', 'Shipped') THEN 1 END), 0)
-		) AS return_rate,
-
-		-- Tempo de Envio: extrai os segundos e converte para dias (86400s = 24h)
-		AVG(EXTRACT(epoch FROM (oi.shipped_at - oi.created_at))/86400) AS avg_to_shipping_days,
-
-		-- Average Ticket (AOV)
-		AVG(oi.sale_price) AS aov
-	FROM raw_data.order_items oi
-	JOIN raw_data.products p ON oi.product_id = p.id
-	WHERE oi.status NOT IN ('Cancelled')
-	GROUP BY 1
-),
-stock_metrics AS (
-	SELECT
-		ii.product_id,
-
-		-- Aging do Estoque (Média de dias dos itens parados(não vendidos))
-		AVG(current_date - ii.created_at::date) AS avg_aging_days,
-		COUNT(*) AS stock_qt
-	FROM raw_data.inventory_items ii
-	WHERE ii.sold_at IS null -- Não vendido
-	GROUP BY 1
-)
+-- Visão de leitura com o aging calculado na data corrente
+CREATE OR REPLACE VIEW metrics.product_360_current AS
 SELECT
-	p.category,
-	p.name AS product_name,
-	ROUND(sa.return_rate * 100, 2) AS return_rate_pct,
-	ROUND(sa.avg_to_shipping_days::numeric, 2) AS avg_to_shipping_days,
+	product_id,
+	category,
+	product_name,
+	return_rate_pct,
+	avg_to_shipping_days,
+	avg_margin_pct,
+	aov,
 	ROUND(
-		((sa.aov - p.cost) / nullif(sa.aov, 0)) * 100, 2
-	) AS avg_margin_pct,
-	ROUND(sa.aov, 2) AS aov,
-	ROUND(st.avg_aging_days, 2) AS avg_aging_days,
-	COALESCE(stock_qt, 0) AS stock_qt
-FROM raw_data.products p
-LEFT JOIN sales_metrics sa ON p.id = sa.product_id
-LEFT JOIN stock_metrics st ON p.id = st.product_id
-ORDER BY avg_aging_days DESC;
+		(current_date - DATE '1970-01-01') - stock_created_day_sum::numeric / NULLIF(stock_qt, 0), 2
+	) AS avg_aging_days,
+	stock_qt,
+	refreshed_at
+FROM metrics.product_360;
 
-COMMENT ON VIEW analytics.product_performance IS 'Visão consolidada de performance de produtos. Une métricas de vendas (margem, devolução, ticket médio) com saúde de estoque (aging e quantidade).';
-COMMENT ON COLUMN analytics.product_performance.avg_aging_days IS 'Média de dias que o estoque do produto está parado (sem vender).';
-COMMENT ON COLUMN analytics.product_performance.avg_margin_pct IS 'Margem de lucro média em percentual (AOV - Custo / AOV).';
-COMMENT ON COLUMN analytics.product_performance.return_rate_pct IS 'Taxa percentual de devolução do produto.';
+COMMENT ON TABLE metrics.product_360 IS 'Tabela técnica com as métricas de produtos. Para perguntas de negócio use a view metrics.product_360_current.';
+COMMENT ON COLUMN metrics.product_360.stock_created_day_sum IS 'Soma dos dias (desde 1970-01-01) de entrada dos itens não vendidos. Aging médio = dias até hoje - soma / stock_qt.';
+COMMENT ON VIEW metrics.product_360_current IS 'Visão consolidada de performance de produtos. Une métricas de vendas (margem, devolução, ticket médio) com saúde de estoque (aging e quantidade).';
+COMMENT ON COLUMN metrics.product_360_current.avg_aging_days IS 'Média de dias que o estoque do produto está parado (sem vender), na data atual.';
+COMMENT ON COLUMN metrics.product_360_current.avg_margin_pct IS 'Margem de lucro média em percentual (AOV - Custo / AOV).';
+COMMENT ON COLUMN metrics.product_360_current.return_rate_pct IS 'Taxa percentual de devolução do produto.';
@@ -0,0 +1,113 @@
+-- Refresh de metrics.cohort_retention a partir de um estado compacto por usuário
+-- (metrics.user_cohorts e metrics.user_active_months). No incremental, apenas os usuários
+-- com itens ou cadastro alterados no change_log são recalculados, e apenas as safras
+-- (país, mês) afetadas têm a matriz de retenção refeita.
+-- Parâmetros: :from_seq, :to_seq (janela do change_log), :full_refresh e :cohort_limit
+
+-- 1. Usuários tocados na janela (itens de pedido e cadastro)
+CREATE TEMP TABLE cohort_touched_users ON COMMIT DROP AS
+SELECT oi.user_id
+FROM raw_data.change_log c
+JOIN raw_data.order_items oi ON oi.id = c.row_id AND oi.created_at = c.created_at
+WHERE NOT :full_refresh
+	AND c.table_name = 'order_items'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq
+UNION
+SELECT CAST(c.row_id AS integer) AS user_id
+FROM raw_data.change_log c
+WHERE NOT :full_refresh
+	AND c.table_name = 'users'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq;
+
+-- 2. Safras afetadas antes da atualização (o usuário pode mudar de safra ou país)
+CREATE TEMP TABLE cohort_affected ON COMMIT DROP AS
+SELECT DISTINCT uc.country, uc.cohort_month
+FROM metrics.user_cohorts uc
+WHERE NOT :full_refresh
+	AND uc.user_id IN (SELECT user_id FROM cohort_touched_users);
+
+-- 3. Atualiza o estado dos usuários tocados (ou de todos, na reconstrução)
+DELETE FROM metrics.user_active_months
+WHERE :full_refresh
+	OR user_id IN (SELECT user_id FROM cohort_touched_users);
+
+INSERT INTO metrics.user_active_months (user_id, activity_month)
+SELECT DISTINCT
+	oi.user_id,
+	DATE_TRUNC('month', oi.created_at)::date AS activity_month
+FROM raw_data.order_items oi
+WHERE oi.status NOT IN ('Cancelled', 'Returned')
+	AND (:full_refresh OR oi.user_id IN (SELECT user_id FROM cohort_touched_users));
+
+DELETE FROM metrics.user_cohorts
+WHERE :full_refresh
+	OR user_id IN (SELECT user_id FROM cohort_touched_users);
+
+INSERT INTO metrics.user_cohorts (user_id, country, cohort_month)
+SELECT
+	am.user_id,
+	COALESCE(u.country, 'Unknown') AS country,
+	MIN(am.activity_month) AS cohort_month
+FROM metrics.user_active_months am
+JOIN raw_data.users u ON u.id = am.user_id
+WHERE :full_refresh
+	OR am.user_id IN (SELECT user_id FROM cohort_touched_users)
+GROUP BY am.user_id, u.country;
+
+-- 4. Safras afetadas após a atualização
+INSERT INTO cohort_affected (country, cohort_month)
+SELECT DISTINCT uc.country, uc.cohort_month
+FROM metrics.user_cohorts uc
+WHERE NOT :full_refresh
+	AND uc.user_id IN (SELECT user_id FROM cohort_touched_users);
+
+-- 5. Refaz a matriz de retenção apenas das safras afetadas, a partir do estado compacto
+DELETE FROM metrics.cohort_retention r
+WHERE :full_refresh
+	OR (r.country, r.cohort_month) IN (SELECT country, cohort_month FROM cohort_affected);
+
+INSERT INTO metrics.cohort_retention (
+	country,
+	cohort_month,
+	original_users,
+	month_number,
+	active_users,
+	retention_rate
+)
+WITH cohorts AS (
+	SELECT uc.user_id, uc.country, uc.cohort_month
+	FROM metrics.user_cohorts uc
+	WHERE :full_refresh
+		OR (uc.country, uc.cohort_month) IN (SELECT country, cohort_month FROM cohort_affected)
+),
+cohort_size AS (
+	SELECT country, cohort_month, COUNT(*) AS original_users
+	FROM cohorts
+	GROUP BY 1, 2
+),
+cohort_base AS (
+	SELECT
+		c.country,
+		c.cohort_month,
+		(
+			(EXTRACT(year FROM am.activity_month) - EXTRACT(year FROM c.cohort_month)) * 12
+			+ EXTRACT(month FROM am.activity_month) - EXTRACT(month FROM c.cohort_month)
+		)::integer AS month_number,
+		-- (user_id, activity_month) é único no estado: COUNT(*) dispensa o COUNT(DISTINCT)
+		COUNT(*) AS active_users
+	FROM cohorts c
+	JOIN metrics.user_active_months am ON am.user_id = c.user_id
+	GROUP BY 1, 2, 3
+)
+SELECT
+	b.country,
+	b.cohort_month,
+	s.original_users,
+	b.month_number,
+	b.active_users,
+	ROUND((b.active_users::numeric / s.original_users) * 100, 2) AS retention_rate
+FROM cohort_base b
+JOIN cohort_size s ON b.cohort_month = s.cohort_month AND b.country = s.country
+WHERE b.month_number <= :cohort_limit;
@@ -0,0 +1,153 @@
+-- Refresh de metrics.customer_rfm_ltv a partir de estatísticas acumuladas por cliente
+-- (metrics.customer_stats) e de pontos de corte dos quintis (metrics.rfm_cutpoints).
+-- No incremental, apenas os clientes tocados no change_log são recalculados e
+-- pontuados com os pontos de corte vigentes. Os pontos de corte são recalculados na
+-- reconstrução ou quando ficam mais antigos que :rfm_cutpoints_max_age; nesse caso
+-- todos os clientes são pontuados novamente, sem reler order_items.
+-- Parâmetros: :from_seq, :to_seq (janela do change_log), :full_refresh e :rfm_cutpoints_max_age
+
+-- 1. Clientes tocados na janela (itens de pedido e cadastro)
+CREATE TEMP TABLE rfm_touched_users ON COMMIT DROP AS
+SELECT oi.user_id
+FROM raw_data.change_log c
+JOIN raw_data.order_items oi ON oi.id = c.row_id AND oi.created_at = c.created_at
+WHERE NOT :full_refresh
+	AND c.table_name = 'order_items'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq
+UNION
+SELECT CAST(c.row_id AS integer) AS user_id
+FROM raw_data.change_log c
+WHERE NOT :full_refresh
+	AND c.table_name = 'users'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq;
+
+-- 2. Recalcula as estatísticas dos clientes tocados (um status alterado pode remover itens
+-- válidos, então o cliente é recalculado por inteiro pelo índice de user_id)
+DELETE FROM metrics.customer_stats
+WHERE :full_refresh
+	OR user_id IN (SELECT user_id FROM rfm_touched_users);
+
+INSERT INTO metrics.customer_stats (
+	user_id,
+	ltv_sum,
+	order_count,
+	first_purchase_at,
+	last_purchase_at
+)
+SELECT
+	u.id AS user_id,
+	SUM(oi.sale_price) AS ltv_sum,
+	COUNT(DISTINCT oi.order_id) AS order_count,
+	MIN(oi.created_at) AS first_purchase_at,
+	MAX(oi.created_at) AS last_purchase_at
+FROM raw_data.users u
+JOIN raw_data.order_items oi ON u.id = oi.user_id
+WHERE oi.status NOT IN ('Cancelled', 'Returned')
+	AND (:full_refresh OR u.id IN (SELECT user_id FROM rfm_touched_users))
+GROUP BY 1;
+
+-- 3. Pontos de corte dos quintis sobre a tabela compacta de estatísticas (uma ordenação
+-- por dimensão). O filtro constante do SELECT vira um filtro único no plano: enquanto os
+-- pontos persistidos forem mais novos que :rfm_cutpoints_max_age, nada é lido nem ordenado
+INSERT INTO metrics.rfm_cutpoints (
+	singleton,
+	snapshot_date,
+	recency_cuts,
+	frequency_cuts,
+	monetary_cuts,
+	computed_at
+)
+WITH ref_date AS (
+	SELECT MAX(last_purchase_at)::date + 1 AS snapshot_date
+	FROM metrics.customer_stats
+)
+SELECT
+	TRUE,
+	r.snapshot_date,
+	percentile_cont(ARRAY[0.2, 0.4, 0.6, 0.8])
+		WITHIN GROUP (ORDER BY r.snapshot_date - cs.last_purchase_at::date),
+	percentile_cont(ARRAY[0.2, 0.4, 0.6, 0.8]) WITHIN GROUP (ORDER BY cs.order_count),
+	percentile_cont(ARRAY[0.2, 0.4, 0.6, 0.8]) WITHIN GROUP (ORDER BY cs.ltv_sum),
+	now()
+FROM metrics.customer_stats cs
+CROSS JOIN ref_date r
+WHERE :full_refresh
+	OR NOT EXISTS (
+		SELECT 1
+		FROM metrics.rfm_cutpoints
+		WHERE computed_at >= now() - CAST(:rfm_cutpoints_max_age AS interval)
+	)
+GROUP BY r.snapshot_date
+ON CONFLICT (singleton) DO UPDATE
+SET
+	snapshot_date = EXCLUDED.snapshot_date,
+	recency_cuts = EXCLUDED.recency_cuts,
+	frequency_cuts = EXCLUDED.frequency_cuts,
+	monetary_cuts = EXCLUDED.monetary_cuts,
+	computed_at = EXCLUDED.computed_at;
+
+-- 4. Pontua os clientes tocados, ou todos quando os pontos de corte foram recalculados
+-- nesta transação (computed_at = now())
+DELETE FROM metrics.customer_rfm_ltv
+WHERE :full_refresh
+	OR EXISTS (SELECT 1 FROM metrics.rfm_cutpoints WHERE computed_at = now())
+	OR user_id IN (SELECT user_id FROM rfm_touched_users);
+
+INSERT INTO metrics.customer_rfm_ltv (
+	user_id,
+	recency_days,
+	frequency_count,
+	ltv_value,
+	rfm_score,
+	r_score,
+	f_score,
+	m_score,
+	customer_segment
+)
+WITH rfm_scores AS (
+	SELECT
+		cs.user_id,
+		rc.snapshot_date - cs.last_purchase_at::date AS recency_days,
+		cs.order_count AS frequency_count,
+		cs.ltv_sum AS ltv,
+		-- Quintil pela quantidade de pontos de corte ultrapassados. Empates ficam no
+		-- quintil inferior (ex: a maioria dos clientes com um único pedido tem F = 1)
+		1 + (
+			SELECT COUNT(*) FROM unnest(rc.recency_cuts) AS cut
+			WHERE cut > rc.snapshot_date - cs.last_purchase_at::date
+		) AS r_score,
+		1 + (
+			SELECT COUNT(*) FROM unnest(rc.frequency_cuts) AS cut
+			WHERE cut < cs.order_count
+		) AS f_score,
+		1 + (
+			SELECT COUNT(*) FROM unnest(rc.monetary_cuts) AS cut
+			WHERE cut < cs.ltv_sum
+		) AS m_score
+	FROM metrics.customer_stats cs
+	CROSS JOIN metrics.rfm_cutpoints rc
+	WHERE :full_refresh
+		OR rc.computed_at = now()
+		OR cs.user_id IN (SELECT user_id FROM rfm_touched_users)
+)
+SELECT
+	user_id,
+	recency_days,
+	frequency_count,
+	ROUND(ltv::numeric, 2) AS ltv_value,
+	CONCAT(r_score, f_score, m_score) AS rfm_score,
+	r_score,
+	f_score,
+	m_score,
+	CASE
+		WHEN r_score >= 5 AND f_score >= 5 THEN 'Champions (VIP)'
+		WHEN r_score >= 4 AND f_score >= 4 THEN 'Loyal Customers'
+		WHEN r_score >= 3 AND f_score >= 3 THEN 'Potential Loyalist'
+		WHEN r_score <= 2 AND f_score >= 4 THEN 'At Risk (High Value)'
+		WHEN r_score <= 2 AND f_score <= 2 THEN 'Hibernating'
+		WHEN r_score >= 4 AND f_score <= 2 THEN 'New Users'
+		ELSE 'General'
+	END AS customer_segment
+FROM rfm_scores;
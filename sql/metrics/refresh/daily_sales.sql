@@ -0,0 +1,62 @@
+-- Refresh de metrics.daily_sales por dia. Usado tanto na reconstrução completa quanto no
+-- incremental: apenas os dias de created_at com itens alterados no change_log são recalculados.
+-- Parâmetros: :from_seq, :to_seq (janela do change_log), :full_refresh e :returns_cost
+CREATE TEMP TABLE daily_sales_changed_days ON COMMIT DROP AS
+SELECT DISTINCT CAST(DATE_TRUNC('day', c.created_at) AS date) AS day
+FROM raw_data.change_log c
+WHERE NOT :full_refresh
+	AND c.table_name = 'order_items'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq
+	AND c.created_at IS NOT NULL;
+
+-- DELETE (e não TRUNCATE) mantém a tabela legível pelos dashboards durante o refresh
+DELETE FROM metrics.daily_sales d
+WHERE :full_refresh
+	OR d.day IN (SELECT day FROM daily_sales_changed_days);
+
+INSERT INTO metrics.daily_sales (
+	day,
+	country,
+	gmv,
+	net_revenue,
+	gross_profit_optimistic,
+	gross_profit_realistic,
+	logistic_loss,
+	cancellation_rate,
+	returns_rate
+)
+WITH daily AS (
+	SELECT
+		CAST(DATE_TRUNC('day', oi.created_at) AS date) AS day,
+		COALESCE(u.country, 'Unknown') AS country,
+		COALESCE(SUM(oi.sale_price) FILTER (WHERE oi.status != 'Cancelled'), 0) AS gmv,
+		COALESCE(SUM(oi.sale_price) FILTER (WHERE oi.status NOT IN ('Cancelled', 'Returned')), 0) AS net_revenue,
+		COALESCE(SUM(p.cost) FILTER (WHERE oi.status NOT IN ('Cancelled', 'Returned')), 0) AS cogs_net,
+		COALESCE(SUM(p.cost) FILTER (WHERE oi.status = 'Returned'), 0) AS cost_of_returns,
+		CAST(COUNT(DISTINCT oi.order_id) FILTER (WHERE oi.status = 'Cancelled') AS float) AS count_orders_cancelled,
+		CAST(COUNT(DISTINCT oi.order_id) FILTER (WHERE oi.status = 'Returned') AS float) AS count_orders_returned,
+		CAST(COUNT(DISTINCT oi.order_id) AS float) AS count_orders_total
+	FROM raw_data.order_items oi
+	JOIN raw_data.products p ON oi.product_id = p.id
+	JOIN raw_data.users u ON oi.user_id = u.id
+	WHERE :full_refresh
+		OR (
+			-- Intervalo explícito permite o pruning das partições mensais de order_items
+			oi.created_at >= (SELECT MIN(day) FROM daily_sales_changed_days)
+			AND oi.created_at < (SELECT MAX(day) + 1 FROM daily_sales_changed_days)
+			AND CAST(DATE_TRUNC('day', oi.created_at) AS date) IN (SELECT day FROM daily_sales_changed_days)
+		)
+	GROUP BY 1, 2
+)
+SELECT
+	day,
+	country,
+	gmv,
+	net_revenue,
+	net_revenue - cogs_net AS gross_profit_optimistic,
+	net_revenue - cogs_net - (cost_of_returns * :returns_cost) AS gross_profit_realistic,
+	cost_of_returns * :returns_cost AS logistic_loss,
+	COALESCE(count_orders_cancelled / NULLIF(count_orders_total, 0) * 100, 0)::numeric(5, 2) AS cancellation_rate,
+	COALESCE(count_orders_returned / NULLIF(count_orders_total, 0) * 100, 0)::numeric(5, 2) AS returns_rate
+FROM daily;
@@ -0,0 +1,95 @@
+-- Refresh de metrics.product_360. No incremental, apenas os produtos com itens de pedido,
+-- itens de estoque ou cadastro alterados no change_log são recalculados.
+-- Parâmetros: :from_seq, :to_seq (janela do change_log) e :full_refresh
+
+-- 1. Produtos tocados na janela
+CREATE TEMP TABLE product_360_touched ON COMMIT DROP AS
+SELECT oi.product_id
+FROM raw_data.change_log c
+JOIN raw_data.order_items oi ON oi.id = c.row_id AND oi.created_at = c.created_at
+WHERE NOT :full_refresh
+	AND c.table_name = 'order_items'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq
+UNION
+SELECT ii.product_id
+FROM raw_data.change_log c
+JOIN raw_data.inventory_items ii ON ii.id = c.row_id
+WHERE NOT :full_refresh
+	AND c.table_name = 'inventory_items'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq
+UNION
+SELECT CAST(c.row_id AS integer) AS product_id
+FROM raw_data.change_log c
+WHERE NOT :full_refresh
+	AND c.table_name = 'products'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq;
+
+-- 2. Substitui as linhas dos produtos tocados (ou todas, na reconstrução)
+DELETE FROM metrics.product_360
+WHERE :full_refresh
+	OR product_id IN (SELECT product_id FROM product_360_touched);
+
+INSERT INTO metrics.product_360 (
+	product_id,
+	category,
+	product_name,
+	return_rate_pct,
+	avg_to_shipping_days,
+	avg_margin_pct,
+	aov,
+	stock_created_day_sum,
+	stock_qt
+)
+WITH sales_metrics AS (
+	SELECT
+		oi.product_id,
+
+		-- Taxa de Devolução (Itens devolvidos / Total Itens Entregues ou Completos -> desconsiderado 'Processing' e 'Cancelled')
+		(
+			COUNT(CASE WHEN oi.status = 'Returned' THEN 1 END)::numeric /
+			NULLIF(COUNT(CASE WHEN oi.status IN ('Complete', 'Returned', 'Shipped') THEN 1 END), 0)
+		) AS return_rate,
+
+		-- Tempo de Envio: extrai os segundos e converte para dias (86400s = 24h)
+		AVG(EXTRACT(epoch FROM (oi.shipped_at - oi.created_at))/86400) AS avg_to_shipping_days,
+
+		-- Average Ticket (AOV)
+		AVG(oi.sale_price) AS aov
+	FROM raw_data.order_items oi
+	WHERE oi.status NOT IN ('Cancelled')
+		AND (:full_refresh OR oi.product_id IN (SELECT product_id FROM product_360_touched))
+	GROUP BY 1
+),
+stock_metrics AS (
+	SELECT
+		ii.product_id,
+
+		-- Aging do Estoque independente da data: soma dos dias de entrada e quantidade
+		-- dos itens parados (não vendidos)
+		SUM(ii.created_at::date - DATE '1970-01-01') AS stock_created_day_sum,
+		COUNT(*) AS stock_qt
+	FROM raw_data.inventory_items ii
+	WHERE ii.sold_at IS null -- Não vendido
+		AND (:full_refresh OR ii.product_id IN (SELECT product_id FROM product_360_touched))
+	GROUP BY 1
+)
+SELECT
+	p.id AS product_id,
+	p.category,
+	p.name AS product_name,
+	ROUND(sa.return_rate * 100, 2) AS return_rate_pct,
+	ROUND(sa.avg_to_shipping_days::numeric, 2) AS avg_to_shipping_days,
+	ROUND(
+		((sa.aov - p.cost) / nullif(sa.aov, 0)) * 100, 2
+	) AS avg_margin_pct,
+	ROUND(sa.aov, 2) AS aov,
+	COALESCE(st.stock_created_day_sum, 0) AS stock_created_day_sum,
+	COALESCE(stock_qt, 0) AS stock_qt
+FROM raw_data.products p
+LEFT JOIN sales_metrics sa ON p.id = sa.product_id
+LEFT JOIN stock_metrics st ON p.id = st.product_id
+WHERE :full_refresh
+	OR p.id IN (SELECT product_id FROM product_360_touched);
@@ -0,0 +1,37 @@
+-- Reconstrução completa de metrics.sales_funnel
+-- Lê a tabela fato metrics.sessions (mantida incrementalmente) em vez de agrupar raw_data.events
+DELETE FROM metrics.sales_funnel;
+
+INSERT INTO metrics.sales_funnel (
+	year,
+	total_sessions,
+	added_cart,
+	purchased,
+	abandon_cart,
+	drop_off
+)
+WITH funil AS (
+	SELECT
+		EXTRACT(YEAR FROM first_event_at)::integer AS year,
+		has_cart,
+		has_purchase,
+		has_product_view
+	FROM metrics.sessions
+)
+SELECT
+	year,
+	COUNT(*) AS total_sessions,
+	ROUND(AVG(has_cart) * 100, 2) AS added_cart,
+	ROUND(AVG(has_purchase) * 100, 2) AS purchased,
+	ROUND(
+		COUNT(*) FILTER (WHERE has_cart = 1 AND has_purchase = 0)::numeric /
+		NULLIF(COUNT(*) FILTER (WHERE has_cart = 1), 0) * 100,
+		2
+	) AS abandon_cart,
+	ROUND(
+		COUNT(*) FILTER (WHERE has_product_view = 1 AND has_cart = 0)::numeric /
+		NULLIF(COUNT(*) FILTER (WHERE has_product_view = 1), 0) * 100,
+		2
+	) AS drop_off
+FROM funil
+GROUP BY 1;
@@ -0,0 +1,77 @@
+-- Re-agrega apenas as sessões tocadas pelos eventos registrados no change_log e
+-- propaga o agregado para as colunas de sessão de raw_data.events. Uma sessão pode
+-- atravessar lotes de ingestão; o valor calculado no lote cobre apenas os eventos
+-- dele e é corrigido aqui a partir de todos os eventos gravados.
+-- Parâmetros: :from_seq, :to_seq (janela do change_log) e :full_refresh (reconstrução completa)
+
+-- 1. Sessões tocadas na janela (todas na reconstrução)
+CREATE TEMP TABLE touched_sessions ON COMMIT DROP AS
+SELECT DISTINCT e.session_id
+FROM raw_data.events e
+WHERE :full_refresh
+UNION
+SELECT DISTINCT e.session_id
+FROM raw_data.change_log c
+JOIN raw_data.events e ON e.id = c.row_id AND e.created_at = c.created_at
+WHERE NOT :full_refresh
+	AND c.table_name = 'events'
+	AND c.seq > :from_seq
+	AND c.seq <= :to_seq;
+
+-- 2. Agregado das sessões tocadas sobre todos os eventos gravados
+INSERT INTO metrics.sessions (
+	session_id,
+	user_id,
+	traffic_source,
+	first_event_at,
+	last_event_at,
+	duration_min,
+	event_count,
+	has_product_view,
+	has_cart,
+	has_purchase,
+	refreshed_at
+)
+SELECT
+	e.session_id,
+	MAX(e.user_id) AS user_id,
+	MIN(e.traffic_source) AS traffic_source,
+	MIN(e.created_at) AS first_event_at,
+	MAX(e.created_at) AS last_event_at,
+	EXTRACT(epoch FROM (MAX(e.created_at) - MIN(e.created_at))) / 60 AS duration_min,
+	COUNT(*) AS event_count,
+	MAX(CASE WHEN e.extracted_product_id IS NOT NULL THEN 1 ELSE 0 END) AS has_product_view,
+	MAX(CASE WHEN e.event_type = 'cart' THEN 1 ELSE 0 END) AS has_cart,
+	MAX(CASE WHEN e.event_type = 'purchase' THEN 1 ELSE 0 END) AS has_purchase,
+	now() AS refreshed_at
+FROM raw_data.events e
+JOIN touched_sessions t ON e.session_id = t.session_id
+-- Eventos sem sessão (session_id 'Unknown') não formam uma sessão
+WHERE e.session_id <> 'Unknown'
+GROUP BY e.session_id
+ON CONFLICT (session_id) DO UPDATE SET
+	user_id = EXCLUDED.user_id,
+	traffic_source = EXCLUDED.traffic_source,
+	first_event_at = EXCLUDED.first_event_at,
+	last_event_at = EXCLUDED.last_event_at,
+	duration_min = EXCLUDED.duration_min,
+	event_count = EXCLUDED.event_count,
+	has_product_view = EXCLUDED.has_product_view,
+	has_cart = EXCLUDED.has_cart,
+	has_purchase = EXCLUDED.has_purchase,
+	refreshed_at = EXCLUDED.refreshed_at;
+
+-- 3. Colunas de sessão dos eventos a partir do agregado (sem reescrever linhas iguais)
+UPDATE raw_data.events e
+SET
+	session_first_event_at = s.first_event_at,
+	session_last_event_at = s.last_event_at,
+	session_event_count = s.event_count
+FROM metrics.sessions s
+JOIN touched_sessions t ON s.session_id = t.session_id
+WHERE e.session_id = s.session_id
+	AND (
+		e.session_first_event_at IS DISTINCT FROM s.first_event_at
+		OR e.session_last_event_at IS DISTINCT FROM s.last_event_at
+		OR e.session_event_count IS DISTINCT FROM s.event_count
+	);
@@ -0,0 +1,30 @@
+-- Reconstrução completa de metrics.time_to_purchase
+-- Lê a tabela fato metrics.sessions (mantida incrementalmente) em vez de agrupar raw_data.events
+DELETE FROM metrics.time_to_purchase;
+
+INSERT INTO metrics.time_to_purchase (
+	session_duration_bucket,
+	bucket_order,
+	total_sessions,
+	total_sales,
+	conversion_rate
+)
+WITH buckets AS (
+	SELECT
+		CASE
+			WHEN duration_min < 1 THEN 1
+			WHEN duration_min < 5 THEN 2
+			WHEN duration_min < 10 THEN 3
+			ELSE 4
+		END AS bucket_order,
+		has_purchase
+	FROM metrics.sessions
+)
+SELECT
+	(ARRAY['0-1 min', '1-5 min', '5-10 min', '10+ min'])[bucket_order] AS session_duration_bucket,
+	bucket_order,
+	COUNT(*) AS total_sessions,
+	SUM(has_purchase) AS total_sales,
+	ROUND(AVG(has_purchase) * 100, 2) AS conversion_rate
+FROM buckets
+GROUP BY bucket_order;
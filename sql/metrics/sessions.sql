@@ -0,0 +1,25 @@
+-- Tabela fato de sessões, mantida incrementalmente pelo pipeline (sql/metrics/refresh/sessions.sql)
+CREATE TABLE IF NOT EXISTS metrics.sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id INTEGER,
+    traffic_source TEXT,
+    first_event_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_event_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    duration_min DOUBLE PRECISION NOT NULL,
+    event_count INTEGER NOT NULL,
+    has_product_view SMALLINT NOT NULL,
+    has_cart SMALLINT NOT NULL,
+    has_purchase SMALLINT NOT NULL,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_first_event_at ON metrics.sessions (first_event_at);
+
+-- Agregado dos eventos sem sessão gravado por versões anteriores do refresh
+DELETE FROM metrics.sessions WHERE session_id = 'Unknown';
+
+COMMENT ON TABLE metrics.sessions IS 'Uma linha por sessão de navegação (clickstream agregado). Use em vez de GROUP BY session_id sobre raw_data.events para funil, duração e conversão.';
+COMMENT ON COLUMN metrics.sessions.duration_min IS 'Duração da sessão em minutos (último evento - primeiro evento).';
+COMMENT ON COLUMN metrics.sessions.has_product_view IS '1 se a sessão visualizou algum produto, 0 caso contrário.';
+COMMENT ON COLUMN metrics.sessions.has_cart IS '1 se a sessão adicionou algum item ao carrinho, 0 caso contrário.';
+COMMENT ON COLUMN metrics.sessions.has_purchase IS '1 se a sessão terminou em compra, 0 caso contrário.';
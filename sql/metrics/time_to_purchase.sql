@@ -1,25 +1,14 @@
-WITH metrics AS (
-	SELECT
-		session_id,
-		EXTRACT(epoch FROM (MAX(created_at) - MIN(created_at))) / 60 AS duration_min,
-		MAX(CASE WHEN event_type = 'purchase' THEN 1 ELSE 0 END) AS has_purchase
-	FROM raw_data.events
-	GROUP BY 1
-)
-SELECT
-	CASE
-		WHEN duration_min < 1 THEN '0-1 min'
-		WHEN duration_min < 5 THEN '1-5 min'
-		WHEN duration_min < 10 THEN '5-10 min'
-		ELSE '10+ min'
-	END AS session_duration_bucket,
-	COUNT(*) AS total_sessions,
-	SUM(has_purchase) AS total_sales,
-	ROUND(AVG(has_purchase) * 100, 2) AS conversion_rate
-FROM metrics
-GROUP BY 1
-ORDER BY MIN(duration_min);
+-- Tabela materializada pelo pipeline metrics (sql/metrics/refresh/time_to_purchase.sql)
+CREATE TABLE IF NOT EXISTS metrics.time_to_purchase (
+	session_duration_bucket TEXT PRIMARY KEY,
+	bucket_order SMALLINT NOT NULL,
+	total_sessions INTEGER NOT NULL,
+	total_sales INTEGER NOT NULL,
+	conversion_rate NUMERIC(5, 2),
+	refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
 
-COMMENT ON VIEW analytics.session_conversion IS 'Métricas de conversão de vendas agrupadas por tempo de duração da sessão do usuário.';
-COMMENT ON COLUMN analytics.session_conversion.session_duration_bucket IS 'Faixa de tempo da sessão (0-1 min, 1-5 min, 5-10 min, 10+ min).';
-COMMENT ON COLUMN analytics.session_conversion.conversion_rate IS 'Taxa de conversão em % de sessões que resultaram em compra.';
+COMMENT ON TABLE metrics.time_to_purchase IS 'Métricas de conversão de vendas agrupadas por tempo de duração da sessão do usuário.';
+COMMENT ON COLUMN metrics.time_to_purchase.session_duration_bucket IS 'Faixa de tempo da sessão (0-1 min, 1-5 min, 5-10 min, 10+ min).';
+COMMENT ON COLUMN metrics.time_to_purchase.bucket_order IS 'Ordem das faixas de duração (use em ORDER BY).';
+COMMENT ON COLUMN metrics.time_to_purchase.conversion_rate IS 'Taxa de conversão em % de sessões que resultaram em compra.';
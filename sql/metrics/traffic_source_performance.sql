@@ -1,15 +1,13 @@
-SELECT
-	u.traffic_source,
-	COUNT(DISTINCT u.id) AS acquired_users,
-	COUNT(DISTINCT o.order_id) AS total_orders,
-	ROUND(COUNT(DISTINCT o.user_id)::numeric / COUNT(DISTINCT u.id) * 100, 2) AS user_conversion_rate,
-	ROUND(AVG(oi.sale_price)::numeric, 2) AS avg_ticket
-FROM raw_data.users u
-LEFT JOIN raw_data.orders o ON u.id = o.user_id
-LEFT JOIN raw_data.order_items oi ON o.order_id = oi.order_id
-GROUP BY 1
-ORDER BY 5 DESC;
+-- Tabela materializada pelo pipeline metrics (sql/metrics/refresh/traffic_source_performance.sql)
+CREATE TABLE IF NOT EXISTS metrics.traffic_source_performance (
+	traffic_source TEXT PRIMARY KEY,
+	acquired_users INTEGER NOT NULL,
+	total_orders INTEGER NOT NULL,
+	user_conversion_rate NUMERIC(5, 2),
+	avg_ticket NUMERIC(10, 2),
+	refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
 
-COMMENT ON VIEW analytics.traffic_source_performance IS 'Métricas de aquisição e conversão de marketing agrupadas por origem de tráfego.';
-COMMENT ON COLUMN analytics.traffic_source_performance.user_conversion_rate IS 'Percentual de usuários cadastrados no canal que realizaram pelo menos uma compra.';
-COMMENT ON COLUMN analytics.traffic_source_performance.avg_ticket IS 'Ticket médio por item comprado pelos usuários deste canal.';
+COMMENT ON TABLE metrics.traffic_source_performance IS 'Métricas de aquisição e conversão de marketing agrupadas por origem de tráfego.';
+COMMENT ON COLUMN metrics.traffic_source_performance.user_conversion_rate IS 'Percentual de usuários cadastrados no canal que realizaram pelo menos uma compra.';
+COMMENT ON COLUMN metrics.traffic_source_performance.avg_ticket IS 'Ticket médio por item comprado pelos usuários deste canal.';
@@ -0,0 +1,21 @@
+-- Registro de alterações (Change Data Capture) gravado pelo IbisUpsertDataset (save_args.track_changes)
+-- Cada linha inserida ou efetivamente atualizada pelo UPSERT gera um registro com a sua chave.
+CREATE TABLE IF NOT EXISTS raw_data.change_log (
+    seq BIGSERIAL PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    row_id BIGINT NOT NULL, -- Primeiro elemento da chave (index_elements)
+    created_at TIMESTAMP WITH TIME ZONE, -- Preenchido quando a tabela possui created_at
+    changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_log_table_seq ON raw_data.change_log (table_name, seq);
+
+-- Watermark de cada consumidor (tabelas derivadas atualizadas incrementalmente)
+CREATE TABLE IF NOT EXISTS raw_data.refresh_state (
+    consumer TEXT PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+COMMENT ON TABLE raw_data.change_log IS 'Tabela técnica de controle de cargas incrementais. Não use para perguntas de negócio.';
+COMMENT ON TABLE raw_data.refresh_state IS 'Tabela técnica com o último seq do change_log processado por cada tabela derivada. Não use para perguntas de negócio.';
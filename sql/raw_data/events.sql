@@ -13,12 +13,65 @@ CREATE TABLE IF NOT EXISTS raw_data.events (
     uri TEXT,
     event_type TEXT CHECK (event_type IN ('product', 'department', 'cart', 'purchase', 'cancel', 'home')),
     visitor_type TEXT NOT NULL, -- Coluna criada via pipeline
-    extracted_product_id INTEGER NOT NULL, -- Coluna criada via pipeline
+    extracted_product_id INTEGER, -- Coluna criada via pipeline (NULL fora das páginas de produto)
     extracted_page_type TEXT NOT NULL, -- Coluna criada via pipeline
+    -- Colunas criadas via pipeline; NULL nos eventos sem sessão (session_id 'Unknown')
+    session_first_event_at TIMESTAMP WITH TIME ZONE,
+    session_last_event_at TIMESTAMP WITH TIME ZONE,
+    session_event_count INTEGER CHECK (session_event_count > 0),
     PRIMARY KEY (id, created_at) -- PK Composta para Hypertables
 );
 
+-- Transformação em Hypertable antes da primeira carga: o IbisUpsertDataset grava os lotes
+-- ordenados por created_at (save_args.hypertable) para ocupar o menor número de chunks.
+-- Particionando por 'created_at' usando intervalo de 1 mês por chunk.
+SELECT create_hypertable(
+    'raw_data.events',
+    'created_at',
+    chunk_time_interval => INTERVAL '1 month',
+    if_not_exists => TRUE,
+    migrate_data => TRUE
+);
+
+-- Configurar Compressão. Os chunks antigos são comprimidos após cada carga (compress_after).
+-- segmentby de baixa cardinalidade (event_type) gera segmentos grandes e bem comprimidos;
+-- orderby por session_id agrupa os eventos de cada sessão (min/max por segmento).
+-- Só é aplicada uma vez: a configuração não pode mudar com chunks já comprimidos.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM timescaledb_information.hypertables
+        WHERE hypertable_schema = 'raw_data'
+          AND hypertable_name = 'events'
+          AND compression_enabled
+    ) THEN
+        ALTER TABLE raw_data.events SET (
+            timescaledb.compress,
+            timescaledb.compress_segmentby = 'event_type',
+            timescaledb.compress_orderby = 'session_id, created_at'
+        );
+    END IF;
+END $$;
+
+-- Tabelas criadas com as colunas de sessão NOT NULL (antes dos eventos sem sessão)
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = to_regclass('raw_data.events')
+          AND attname = 'session_event_count'
+          AND attnotnull
+    ) THEN
+        ALTER TABLE raw_data.events
+            ALTER COLUMN session_first_event_at DROP NOT NULL,
+            ALTER COLUMN session_last_event_at DROP NOT NULL,
+            ALTER COLUMN session_event_count DROP NOT NULL;
+    END IF;
+END $$;
+
 COMMENT ON TABLE raw_data.events IS 'Dados de navegação web (clickstream) dos usuários. Use para análise de funil, tráfego, sessões e comportamento em tela.';
-COMMENT ON COLUMN raw_data.events.session_id IS 'Identificador único da sessão. Agrupa uma sequência de eventos de um mesmo acesso.';
+COMMENT ON COLUMN raw_data.events.session_id IS 'Identificador único da sessão. Agrupa uma sequência de eventos de um mesmo acesso. Unknown: evento sem sessão (colunas de sessão nulas).';
 COMMENT ON COLUMN raw_data.events.event_type IS 'Ação mapeada do usuário. Valores estritos: product, department, cart, purchase, cancel, home.';
-COMMENT ON COLUMN raw_data.events.extracted_product_id IS 'ID do produto acessado, derivado do evento. Útil para cruzar visualizações com a tabela products.';
+COMMENT ON COLUMN raw_data.events.extracted_product_id IS 'ID do produto acessado, derivado do uri (/product/<id>). NULL quando o evento não é uma página de produto. Útil para cruzar visualizações com a tabela products.';
+COMMENT ON COLUMN raw_data.events.extracted_page_type IS 'Tipo de página derivado do primeiro segmento do uri (ex: product, department, cart, home).';
+COMMENT ON COLUMN raw_data.events.session_event_count IS 'Quantidade de eventos da sessão. Junto com session_first_event_at e session_last_event_at evita GROUP BY session_id para duração da sessão.';
@@ -1,5 +1,19 @@
+-- Particionada por mês (created_at), assim como raw_data.orders (partições order_items_pYYYY_MM).
+-- CREATE TABLE IF NOT EXISTS não converte uma tabela comum (anterior ao particionamento):
+-- falha aqui, com a instrução de migração, em vez de na criação das partições.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE oid = to_regclass('raw_data.order_items') AND relkind <> 'p'
+    ) THEN
+        RAISE EXCEPTION 'raw_data.order_items existe sem particionamento (criada antes das partições mensais).'
+            USING HINT = 'Recrie a tabela com DROP TABLE raw_data.order_items CASCADE e recarregue todo o histórico (kedro run --pipeline data_processing --params order_lookback_days=36500).';
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS raw_data.order_items (
-    id INTEGER PRIMARY KEY,
+    id INTEGER NOT NULL,
     order_id INTEGER NOT NULL,
     user_id INTEGER NOT NULL,
     product_id INTEGER NOT NULL,
@@ -15,11 +29,14 @@ CREATE TABLE IF NOT EXISTS raw_data.order_items (
     CONSTRAINT check_delivered_after_shipped CHECK (delivered_at >= shipped_at),
     CONSTRAINT check_returned_after_delivered CHECK (returned_at >= delivered_at),
 
-    CONSTRAINT fk_order_items_orders FOREIGN KEY (order_id) REFERENCES raw_data.orders (order_id),
+    PRIMARY KEY (id, created_at),
+
+    -- Sem FK para raw_data.orders: order_id não é único sozinho na tabela particionada.
+    -- A integridade é garantida no pipeline (semi-join com os pedidos carregados).
     CONSTRAINT fk_order_items_users FOREIGN KEY (user_id) REFERENCES raw_data.users (id),
     CONSTRAINT fk_order_items_products FOREIGN KEY (product_id) REFERENCES raw_data.products (id),
     CONSTRAINT fk_order_items_inventory_items FOREIGN KEY (inventory_item_id) REFERENCES raw_data.inventory_items (id)
-);
+) PARTITION BY RANGE (created_at);
 
 COMMENT ON TABLE raw_data.order_items IS 'Tabela de granularidade mínima de vendas (nível de item). Liga o pedido genérico ao item físico exato do inventário e ao preço real de venda.';
 COMMENT ON COLUMN raw_data.order_items.sale_price IS 'Preço real pelo qual o item foi vendido (Receita). Pode diferir do retail_price da tabela products devido a descontos.';
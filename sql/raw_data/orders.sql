@@ -1,5 +1,20 @@
+-- Particionada por mês (created_at). As partições (orders_pYYYY_MM) são criadas pelo
+-- IbisUpsertDataset (save_args.partitioning) antes de cada carga, com meses de antecedência.
+-- CREATE TABLE IF NOT EXISTS não converte uma tabela comum (anterior ao particionamento):
+-- falha aqui, com a instrução de migração, em vez de na criação das partições.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE oid = to_regclass('raw_data.orders') AND relkind <> 'p'
+    ) THEN
+        RAISE EXCEPTION 'raw_data.orders existe sem particionamento (criada antes das partições mensais).'
+            USING HINT = 'Recrie a tabela com DROP TABLE raw_data.orders CASCADE e recarregue todo o histórico (kedro run --pipeline data_processing --params order_lookback_days=36500).';
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS raw_data.orders (
-    order_id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL,
     user_id INTEGER NOT NULL,
     status TEXT NOT NULL CHECK (status IN ('Processing', 'Shipped', 'Complete', 'Returned', 'Cancelled')),
     created_at TIMESTAMP WITH TIME ZONE NOT NULL,
@@ -12,8 +27,11 @@ CREATE TABLE IF NOT EXISTS raw_data.orders (
     CONSTRAINT check_delivered_after_shipped CHECK (delivered_at >= shipped_at),
     CONSTRAINT check_returned_after_delivered CHECK (returned_at >= delivered_at),
 
+    -- A chave primária de uma tabela particionada precisa conter a coluna de partição
+    PRIMARY KEY (order_id, created_at),
+
     CONSTRAINT fk_orders_users FOREIGN KEY (user_id) REFERENCES raw_data.users (id)
-);
+) PARTITION BY RANGE (created_at);
 
 COMMENT ON TABLE raw_data.orders IS 'Cabeçalho de pedidos dos usuários. Acompanha o status e as datas do ciclo de vida da entrega (funil logístico).';
 COMMENT ON COLUMN raw_data.orders.status IS 'Status atual do pedido. Valores permitidos: Processing, Shipped, Complete, Returned, Cancelled.';
@@ -0,0 +1,128 @@
+import glob
+import logging
+from pathlib import Path
+from typing import Any, ClassVar
+
+import ibis.expr.types as ir
+import pyarrow.parquet as pq
+from kedro.io import DatasetError
+from kedro_datasets.ibis import FileDataset
+
+logger = logging.getLogger(__name__)
+
+_GLOB_CHARS = ("*", "?", "[")
+
+
+class IbisMultiFileDataset(FileDataset):
+    """
+    Extensão do Ibis FileDataset para ler vários arquivos (glob ou lista) em uma única tabela.
+
+    Os caminhos são resolvidos antes da leitura e entregues de uma só vez ao leitor
+    multi-arquivo do DuckDB, que distribui os arquivos entre as threads disponíveis.
+    Por padrão os schemas dos shards são unificados por nome de coluna e cada linha
+    recebe a coluna `filename` (linhagem). As contagens de linhas por arquivo da última
+    carga ficam em `file_counts`, salvas no relatório da execução pelo
+    FileCountsReportHook.
+
+    Com `exclusive_patterns`, os caminhos são alternativas (ex: arquivo único ou
+    shards): se mais de um encontra arquivos, a carga falha em vez de ler as mesmas
+    linhas duas vezes.
+    """
+
+    DEFAULT_LOAD_ARGS: ClassVar[dict[str, Any]] = {
+        "union_by_name": True,
+        "filename": True,
+    }
+
+    def __init__(
+        self,
+        filepath: str | list[str],
+        *args,
+        exclusive_patterns: bool = False,
+        **kwargs,
+    ) -> None:
+        self._patterns = self._ensure_list(filepath)
+        if not self._patterns:
+            raise DatasetError("É necessário informar ao menos um caminho ou glob.")
+        self._exclusive_patterns = exclusive_patterns
+        self.file_counts: dict[str, int | None] = {}
+
+        super().__init__(self._patterns[0], *args, **kwargs)
+
+    def _ensure_list(self, value: str | list[str] | None) -> list[str]:
+        """Helper para garantir que o input seja sempre uma lista."""
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [value]
+        return list(value)
+
+    def _resolve_paths(self) -> list[str]:
+        """Expande os globs e remove duplicatas, preservando a ordem declarada."""
+        paths: dict[str, None] = {}
+        matched = []
+
+        for pattern in self._patterns:
+            if any(char in pattern for char in _GLOB_CHARS):
+                matches = sorted(glob.glob(pattern, recursive=True))
+            else:
+                matches = [pattern] if Path(pattern).exists() else []
+
+            if not matches:
+                logger.debug(f"Nenhum arquivo encontrado para: {pattern}")
+            else:
+                matched.append(pattern)
+
+            paths.update(dict.fromkeys(matches))
+
+        if self._exclusive_patterns and len(matched) > 1:
+            raise DatasetError(
+                f"Arquivos de {self._table_name} encontrados em mais de um caminho "
+                f"{matched}: mantenha apenas um (as linhas seriam lidas em duplicidade)."
+            )
+        return list(paths)
+
+    def _log_file_counts(self, paths: list[str]) -> dict[str, int | None]:
+        """
+        Registra no log a quantidade de linhas de cada arquivo.
+
+        As contagens vêm do rodapé dos arquivos parquet (sem ler os dados); nos demais
+        formatos, apenas o número de arquivos.
+
+        Returns:
+            dict[str, int | None]: Linhas por arquivo (None fora do parquet).
+        """
+        if self._file_format != "parquet":
+            logger.info(f"Tabela {self._table_name}: {len(paths)} arquivos.")
+            return dict.fromkeys(paths)
+
+        counts = {path: pq.read_metadata(path).num_rows for path in paths}
+        logger.info(
+            f"Tabela {self._table_name}: {sum(counts.values())} linhas em "
+            f"{len(counts)} arquivos."
+        )
+        for path, rows in counts.items():
+            logger.info(f"  {path}: {rows} linhas")
+        return counts
+
+    def load(self) -> ir.Table:
+        paths = self._resolve_paths()
+        if not paths:
+            raise DatasetError(
+                f"Nenhum arquivo encontrado para {self._table_name}: {self._patterns}"
+            )
+
+        reader = getattr(self.connection, f"read_{self._file_format}")
+        self.file_counts = self._log_file_counts(paths)
+        return reader(paths, table_name=self._table_name, **self._load_args)
+
+    def save(self, data: ir.Table) -> None:
+        raise DatasetError(
+            f"{type(self).__name__} é somente leitura: dados brutos são imutáveis."
+        )
+
+    def _describe(self) -> dict[str, Any]:
+        return {**super()._describe(), "filepath": self._patterns}
+
+    def _exists(self) -> bool:
+        return bool(self._resolve_paths())
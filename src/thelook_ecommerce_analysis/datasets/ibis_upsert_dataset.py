@@ -1,20 +1,45 @@
 import logging
 import uuid
-from typing import Any
+from collections import Counter
+from datetime import UTC, datetime
+from typing import Any, Protocol
 
 import ibis.expr.types as ir
+import pyarrow as pa
+import pyarrow.compute as pc
 from kedro_datasets.ibis import TableDataset
-from pgpq import ArrowToPostgresBinaryEncoder
 from sqlalchemy import (
     URL,
+    Connection,
     Engine,
     create_engine,
     text,
 )
+from sqlalchemy.exc import SQLAlchemyError
+
+from thelook_ecommerce_analysis.utils.pg_copy import copy_arrow_binary
 
 logger = logging.getLogger(__name__)
 
 
+def _month_start(value: datetime) -> datetime:
+    """Primeiro instante (UTC) do mês de `value`."""
+    value = value.astimezone(UTC) if value.tzinfo else value.replace(tzinfo=UTC)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    """Soma meses a um início de mês."""
+    year, month = divmod(value.month - 1 + months, 12)
+    return value.replace(year=value.year + year, month=month + 1)
+
+
+class _ConfigGetter(Protocol):
+    """Lê um argumento de save_args (a configuração da tabela no global_config tem prioridade)."""
+
+    def __call__(self, key: str, default: Any = None) -> Any: ...
+
+
 class IbisUpsertDataset(TableDataset):
     """Extensão do Ibis TableDataset para suportar UPSERT via pgpq."""
 
@@ -37,6 +62,18 @@ class IbisUpsertDataset(TableDataset):
             return [value]
         return value
 
+    def _select_columns(self, arrow_table: pa.Table, columns: list[str]) -> pa.Table:
+        """Mantém apenas as colunas configuradas, na ordem da tabela de destino."""
+        if not columns:
+            return arrow_table
+
+        missing = set(columns) - set(arrow_table.column_names)
+        if missing:
+            raise ValueError(
+                f"Colunas configuradas ausentes no input {self._table_name}: {missing}"
+            )
+        return arrow_table.select(columns)
+
     def _get_sqlalchemy_engine(self) -> Engine:
         if hasattr(self.connection, "engine"):
             return self.connection.engine
@@ -55,11 +92,8 @@ class IbisUpsertDataset(TableDataset):
             )
         )
 
-    def save(self, data: ir.Table) -> None:
-        if not self._is_upsert:
-            return super().save(data)
-
-        # 1. Configuração (Factory Pattern)
+    def _config_getter(self) -> _ConfigGetter:
+        """Retorna um getter que prioriza a configuração da tabela no global_config."""
         global_config = self._save_args.get("global_config")
         specific_config = {}
 
@@ -77,37 +111,20 @@ class IbisUpsertDataset(TableDataset):
                 return specific_config[key]
             return self._save_args.get(key, default)
 
-        # 2. Materialização (Zero-Copy)
-        arrow_table = data.to_pyarrow()
-        if arrow_table.num_rows == 0:
-            logger.info(f"Tabela {self._table_name}: Vazia.")
-            return
-
-        # 3. Filtragem de Colunas (Evita erro de INSERT mismatch)
-        target_columns = self._ensure_list(get_arg("columns"))
-
-        if target_columns:
-            missing = set(target_columns) - set(arrow_table.column_names)
-            if missing:
-                raise ValueError(
-                    f"Colunas configuradas ausentes no input {self._table_name}: {missing}"
-                )
-            arrow_table = arrow_table.select(target_columns)
-
-        # 4. Garantia de Schema (DDL)
-        engine = self._get_sqlalchemy_engine()
-
-        # 5. Preparação dos Metadados SQL
-        cols = arrow_table.column_names
-        cols_sql = [f'"{c}"' for c in cols]
-
-        index_elements = self._ensure_list(get_arg("index_elements", ["id"]))
-        exclude_from_update = self._ensure_list(get_arg("exclude_from_update", []))
+        return get_arg
 
+    def _on_conflict_sql(
+        self, cols: list[str], index_elements: list[str], exclude_from_update: list[str]
+    ) -> str:
+        """Monta a cláusula ON CONFLICT que só atualiza linhas com diferença real."""
         update_cols = [
             c for c in cols if c not in index_elements and c not in exclude_from_update
         ]
 
+        if not update_cols:
+            # Se não tem colunas para atualizar, apenas ignora conflitos
+            return "DO NOTHING"
+
         # Monta o SET: "coluna" = EXCLUDED."coluna"
         set_clause_parts = [f'"{c}" = EXCLUDED."{c}"' for c in update_cols]
 
@@ -118,60 +135,396 @@ class IbisUpsertDataset(TableDataset):
             for c in update_cols
         ]
 
-        idx_sql = ", ".join([f'"{i}"' for i in index_elements])
-
-        if not update_cols:
-            # Se não tem colunas para atualizar, apenas ignora conflitos
-            on_conflict = "DO NOTHING"
-        else:
-            # Upsert inteligente: Só atualiza SE houver diferença
-            on_conflict = f"""
+        # Upsert inteligente: Só atualiza SE houver diferença
+        return f"""
                 DO UPDATE SET {", ".join(set_clause_parts)}
                 WHERE {" OR ".join(where_clause_parts)}
             """
 
-        schema = self._connection_config.get("schema") or "public"
+    def _ensure_partitions(
+        self,
+        conn: Connection,
+        schema: str,
+        arrow_table: pa.Table,
+        partitioning: dict[str, Any],
+    ) -> list[tuple[str, str]]:
+        """
+        Cria as partições mensais do lote (e as próximas `premake_months`) que ainda não existem.
+
+        Returns:
+            list[tuple[str, str]]: Partições cobertas pelo lote e o filtro de intervalo
+            de cada uma, usados para o merge direto na partição.
+        """
+        column = partitioning.get("column", "created_at")
+        # As funções de pyarrow.compute são geradas em tempo de execução (sem stubs)
+        bounds = pc.min_max(arrow_table[column])  # ty: ignore[unresolved-attribute]
+        first = _month_start(bounds["min"].as_py())
+        last = _month_start(bounds["max"].as_py())
+
+        # Partições futuras são criadas antecipadamente, a partir do mês corrente
+        horizon = _add_months(
+            max(last, _month_start(datetime.now(UTC))),
+            int(partitioning.get("premake_months", 2)),
+        )
 
-        temp_table = f"tmp_{self._table_name}_{uuid.uuid4().hex[:8]}"
+        existing = set(
+            conn.execute(
+                text("""
+                    SELECT c.relname FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = CAST(:parent AS regclass)
+                """),
+                {"parent": f"{schema}.{self._table_name}"},
+            )
+            .scalars()
+            .all()
+        )
 
-        # 6. Execução Transacional (Upsert)
+        targets = []
+        month = first
+        while month <= horizon:
+            name = f"{self._table_name}_p{month:%Y_%m}"
+            lower, upper = month.isoformat(), _add_months(month, 1).isoformat()
+
+            # Só cria o que falta: CREATE ... PARTITION OF bloqueia a tabela pai
+            if name not in existing:
+                logger.info(f"Criando partição {schema}.{name} [{lower}, {upper}).")
+                conn.execute(
+                    text(f"""
+                        CREATE TABLE IF NOT EXISTS {schema}."{name}"
+                        PARTITION OF {schema}."{self._table_name}"
+                        FOR VALUES FROM ('{lower}') TO ('{upper}')
+                    """)
+                )
+
+            if month <= last:
+                targets.append(
+                    (
+                        name,
+                        f"WHERE \"{column}\" >= '{lower}' AND \"{column}\" < '{upper}'",
+                    )
+                )
+            month = _add_months(month, 1)
+
+        return targets
+
+    def _analyze_partitions(
+        self, engine: Engine, schema: str, targets: list[tuple[str, str]]
+    ) -> None:
+        """Atualiza as estatísticas apenas das partições tocadas pela carga."""
         with engine.begin() as conn:
-            # A. Cria Temp Table
+            for name, _ in targets:
+                conn.execute(text(f'ANALYZE {schema}."{name}"'))
+
+        logger.info(f"ANALYZE executado em {len(targets)} partições.")
+
+    def _with_change_log(
+        self, upsert_sql: str, schema: str, row_id: str, has_created_at: bool
+    ) -> str:
+        """
+        Envolve o UPSERT em uma CTE que grava as linhas afetadas em `change_log`.
+
+        O RETURNING do `ON CONFLICT ... WHERE IS DISTINCT FROM` só devolve linhas
+        inseridas ou efetivamente atualizadas, permitindo que as tabelas derivadas
+        reprocessem apenas o que mudou. O comando devolve a quantidade de linhas
+        alteradas por dia de `created_at` (dia nulo para tabelas sem a coluna).
+        """
+        created_sql = '"created_at"' if has_created_at else "NULL::timestamptz"
+
+        return f"""
+            WITH upserted AS (
+                {upsert_sql}
+                RETURNING "{row_id}" AS row_id, {created_sql} AS created_at
+            ),
+            logged AS (
+                INSERT INTO {schema}.change_log (table_name, row_id, created_at)
+                SELECT '{self._table_name}', row_id, created_at FROM upserted
+                RETURNING created_at
+            )
+            SELECT CAST(created_at AS DATE) AS day, COUNT(*) AS rows
+            FROM logged
+            GROUP BY 1
+        """  # noqa: S608
+
+    def _log_changed_days(self, changed_days: Counter) -> None:
+        """Registra os dias de created_at inseridos ou alterados pelo UPSERT."""
+        days = sorted(day for day in changed_days if day is not None)
+        if not days:
+            return
+
+        logger.info(
+            f"{self._table_name}: {sum(changed_days.values())} linhas alteradas em "
+            f"{len(days)} dias ({days[0]} a {days[-1]})."
+        )
+        logger.debug(
+            f"{self._table_name}: linhas alteradas por dia: "
+            f"{ {str(day): changed_days[day] for day in days} }"
+        )
+
+    def _copy_binary(
+        self, conn: Connection, target: str, arrow_table: pa.Table
+    ) -> None:
+        """Injeta a tabela Arrow em `target` via COPY binário (pgpq)."""
+        copy_arrow_binary(conn, target, arrow_table)
+
+    def _copy_new_time_range(
+        self,
+        conn: Connection,
+        schema: str,
+        arrow_table: pa.Table,
+        time_column: str,
+        change_key: str | None,
+    ) -> pa.Table:
+        """
+        Carrega via COPY direto na hypertable as linhas posteriores ao último `time_column`.
+
+        Linhas mais novas que o máximo já gravado não podem conflitar com a chave
+        (que inclui o tempo), então dispensam a tabela temporária e o merge. Como o
+        lote está ordenado por tempo, a divisão é um `slice` (zero-copy).
+
+        Args:
+            change_key (str | None): Coluna registrada no change_log (None desativa o CDC).
+
+        Returns:
+            pa.Table: Linhas de intervalos já carregados, que seguem para o UPSERT.
+        """
+        target = f'{schema}."{self._table_name}"'
+        watermark = conn.execute(
+            text(f'SELECT max("{time_column}") FROM {target}')  # noqa: S608
+        ).scalar()
+
+        split_at = 0
+        if watermark is not None:
+            column = arrow_table[time_column]
+            split_at = pc.sum(  # ty: ignore[unresolved-attribute]
+                pc.less_equal(  # ty: ignore[unresolved-attribute]
+                    column, pa.scalar(watermark, type=column.type)
+                )
+            ).as_py()
+
+        new_rows = arrow_table.slice(split_at or 0)
+        if new_rows.num_rows == 0:
+            return arrow_table
+
+        self._copy_binary(conn, target, new_rows)
+
+        if change_key:
+            where_sql = f'WHERE "{time_column}" > :watermark' if watermark else ""
             conn.execute(
                 text(f"""
-                CREATE TEMP TABLE {temp_table}
-                (LIKE {schema}."{self._table_name}" INCLUDING DEFAULTS)
-                ON COMMIT DROP
-            """)
+                    INSERT INTO {schema}.change_log (table_name, row_id, created_at)
+                    SELECT '{self._table_name}', "{change_key}", "{time_column}"
+                    FROM {target} {where_sql}
+                """),  # noqa: S608
+                {"watermark": watermark},
             )
 
-            # B. Encoder Arrow -> Binary
-            encoder = ArrowToPostgresBinaryEncoder(arrow_table.schema)
+        logger.info(
+            f"COPY direto em {self._table_name}: {new_rows.num_rows} linhas após {watermark}."
+        )
+        return arrow_table.slice(0, split_at or 0)
+
+    def _skip_compressed_range(
+        self, conn: Connection, schema: str, arrow_table: pa.Table, time_column: str
+    ) -> pa.Table:
+        """
+        Descarta do merge as linhas que caem em chunks já comprimidos.
+
+        O `INSERT ... ON CONFLICT` em um chunk comprimido descomprime os segmentos
+        tocados, desfazendo a compressão a cada carga do histórico completo. Os
+        eventos desses intervalos são imutáveis e já estão gravados, então apenas o
+        intervalo ainda não comprimido segue para o merge. Como o lote está ordenado
+        por tempo, a divisão é um `slice` (zero-copy).
+
+        Returns:
+            pa.Table: Linhas a partir do fim do último chunk comprimido.
+        """
+        boundary = conn.execute(
+            text("""
+                SELECT max(range_end) FROM timescaledb_information.chunks
+                WHERE hypertable_schema = :schema
+                    AND hypertable_name = :table
+                    AND is_compressed
+            """),
+            {"schema": schema, "table": self._table_name},
+        ).scalar()
+        if boundary is None:
+            return arrow_table
+
+        column = arrow_table[time_column]
+        split_at = pc.sum(  # ty: ignore[unresolved-attribute]
+            pc.less(  # ty: ignore[unresolved-attribute]
+                column, pa.scalar(boundary, type=column.type)
+            )
+        ).as_py()
 
-            # C. Injeção Binária
-            raw_conn = conn.connection.driver_connection
-            if raw_conn is None:
-                raise ValueError("Falha na conexão nativa psycopg.")
+        if split_at:
+            logger.info(
+                f"{self._table_name}: {split_at} linhas anteriores a {boundary} "
+                "ignoradas (chunks comprimidos)."
+            )
+        return arrow_table.slice(split_at or 0)
+
+    def _maintain_hypertable(
+        self, engine: Engine, schema: str, hypertable: dict[str, Any]
+    ) -> None:
+        """Comprime (e opcionalmente descarta) os chunks antigos após a carga."""
+        relation = f"{schema}.{self._table_name}"
+        compress_after = hypertable.get("compress_after")
+        drop_after = hypertable.get("drop_after")
+
+        try:
+            with engine.begin() as conn:
+                if drop_after:
+                    dropped = conn.execute(
+                        text(
+                            "SELECT count(*) FROM drop_chunks("
+                            "CAST(:relation AS regclass), older_than => CAST(:age AS INTERVAL))"
+                        ),
+                        {"relation": relation, "age": drop_after},
+                    ).scalar()
+                    logger.info(f"{relation}: {dropped} chunks removidos (retenção).")
+
+                if compress_after:
+                    compressed = conn.execute(
+                        text(
+                            "SELECT count(compress_chunk(c, if_not_compressed => TRUE)) "
+                            "FROM show_chunks(CAST(:relation AS regclass), "
+                            "older_than => CAST(:age AS INTERVAL)) c"
+                        ),
+                        {"relation": relation, "age": compress_after},
+                    ).scalar()
+                    logger.info(
+                        f"{relation}: {compressed} chunks anteriores a {compress_after} comprimidos."
+                    )
+        except SQLAlchemyError as e:
+            # A carga já foi confirmada. A manutenção é refeita na próxima execução
+            logger.warning(f"Falha na manutenção da hypertable {relation}: {e}")
 
-            with raw_conn.cursor() as cursor:
-                copy_sql = f"COPY {temp_table} ({', '.join(cols_sql)}) FROM STDIN WITH (FORMAT BINARY)"
+    def save(self, data: ir.Table) -> None:
+        if not self._is_upsert:
+            return super().save(data)
 
-                with cursor.copy(copy_sql) as copy:
-                    copy.write(encoder.write_header())
-                    for batch in arrow_table.to_batches():
-                        copy.write(encoder.write_batch(batch))
-                    copy.write(encoder.finish())
+        # 1. Configuração (Factory Pattern)
+        get_arg = self._config_getter()
 
-            # D. Merge Final
-            upsert_sql = f"""
-                INSERT INTO {schema}."{self._table_name}" ({", ".join(cols_sql)})
-                SELECT {", ".join(cols_sql)} FROM {temp_table}
-                ON CONFLICT ({idx_sql})
-                {on_conflict}
-            """  # noqa: S608
+        # 2. Materialização (Zero-Copy)
+        arrow_table = data.to_pyarrow()
+        if arrow_table.num_rows == 0:
+            logger.info(f"Tabela {self._table_name}: Vazia.")
+            return
 
-            result = conn.execute(text(upsert_sql))
+        # 3. Filtragem de Colunas (Evita erro de INSERT mismatch)
+        arrow_table = self._select_columns(
+            arrow_table, self._ensure_list(get_arg("columns"))
+        )
 
-            logger.info(
-                f"UPSERT concluído em {self._table_name}: {result.rowcount} de {arrow_table.num_rows} linhas inseridas."
+        # 4. Garantia de Schema (DDL)
+        engine = self._get_sqlalchemy_engine()
+
+        # 5. Preparação dos Metadados SQL
+        cols = arrow_table.column_names
+        cols_sql = ", ".join(f'"{c}"' for c in cols)
+
+        index_elements = self._ensure_list(get_arg("index_elements", ["id"]))
+        idx_sql = ", ".join([f'"{i}"' for i in index_elements])
+        on_conflict = self._on_conflict_sql(
+            cols,
+            index_elements,
+            self._ensure_list(get_arg("exclude_from_update", [])),
+        )
+
+        schema = self._connection_config.get("schema") or "public"
+
+        temp_table = f"tmp_{self._table_name}_{uuid.uuid4().hex[:8]}"
+
+        # Tabelas particionadas por intervalo mensal (PARTITION BY RANGE)
+        partitioning = get_arg("partitioning")
+        targets = [(self._table_name, "")]
+
+        # Hypertables (TimescaleDB): lote ordenado pelo tempo ocupa o menor número de chunks
+        hypertable = get_arg("hypertable")
+        if hypertable:
+            arrow_table = arrow_table.sort_by(
+                hypertable.get("time_column", "created_at")
             )
+
+        # 6. Execução Transacional (Upsert)
+        with engine.begin() as conn:
+            if hypertable:
+                arrow_table = self._copy_new_time_range(
+                    conn,
+                    schema,
+                    arrow_table,
+                    hypertable.get("time_column", "created_at"),
+                    index_elements[0] if get_arg("track_changes", False) else None,
+                )
+
+                # Intervalos já comprimidos não voltam ao merge
+                if arrow_table.num_rows and hypertable.get("compress_after"):
+                    arrow_table = self._skip_compressed_range(
+                        conn,
+                        schema,
+                        arrow_table,
+                        hypertable.get("time_column", "created_at"),
+                    )
+
+            # Sem linhas de intervalos já carregados, o merge é dispensado
+            if not hypertable or arrow_table.num_rows:
+                # A. Cria Temp Table
+                conn.execute(
+                    text(f"""
+                    CREATE TEMP TABLE {temp_table}
+                    (LIKE {schema}."{self._table_name}" INCLUDING DEFAULTS)
+                    ON COMMIT DROP
+                """)
+                )
+
+                # B. Injeção Binária
+                self._copy_binary(conn, temp_table, arrow_table)
+
+                # C. Merge Final (direto em cada partição do lote, se particionada)
+                if partitioning:
+                    targets = self._ensure_partitions(
+                        conn, schema, arrow_table, partitioning
+                    )
+
+                rowcount = 0
+                track_changes = get_arg("track_changes", False)
+                changed_days: Counter = Counter()
+                for target, range_sql in targets:
+                    upsert_sql = f"""
+                        INSERT INTO {schema}."{target}" AS "{self._table_name}" ({cols_sql})
+                        SELECT {cols_sql} FROM {temp_table} {range_sql}
+                        ON CONFLICT ({idx_sql})
+                        {on_conflict}
+                    """  # noqa: S608
+
+                    # D. Change Data Capture: registra as chaves inseridas ou alteradas
+                    upsert_sql = (
+                        self._with_change_log(
+                            upsert_sql, schema, index_elements[0], "created_at" in cols
+                        )
+                        if track_changes
+                        else upsert_sql
+                    )
+
+                    result = conn.execute(text(upsert_sql))
+                    if track_changes:
+                        # O CDC devolve as linhas alteradas agrupadas por dia
+                        changed_days.update({day: count for day, count in result.all()})
+                    else:
+                        rowcount += result.rowcount
+
+                rowcount += sum(changed_days.values())
+                self._log_changed_days(changed_days)
+
+                logger.info(
+                    f"UPSERT concluído em {self._table_name}: {rowcount} de {arrow_table.num_rows} linhas inseridas."
+                )
+
+        if partitioning:
+            self._analyze_partitions(engine, schema, targets)
+
+        if hypertable:
+            self._maintain_hypertable(engine, schema, hypertable)
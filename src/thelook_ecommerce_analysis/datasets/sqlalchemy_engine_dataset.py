@@ -0,0 +1,50 @@
+import logging
+from typing import Any, ClassVar
+
+from kedro.io import AbstractDataset, DatasetError
+from sqlalchemy import Engine, create_engine
+
+logger = logging.getLogger(__name__)
+
+
+class SQLAlchemyEngineDataset(AbstractDataset[None, Engine]):
+    """
+    Disponibiliza uma Engine SQLAlchemy (com pool de conexões) para nós que executam SQL no banco.
+
+    Usado pelos refreshes incrementais de tabelas derivadas, que rodam inteiramente
+    dentro do PostgreSQL. A Engine é compartilhada entre todos os datasets com a
+    mesma string de conexão, reaproveitando o pool durante a execução do Kedro.
+    """
+
+    DEFAULT_ENGINE_ARGS: ClassVar[dict[str, Any]] = {"pool_pre_ping": True}
+
+    _engines: ClassVar[dict[str, Engine]] = {}
+
+    def __init__(
+        self,
+        credentials: dict[str, Any],
+        engine_args: dict[str, Any] | None = None,
+        metadata: dict[str, Any] | None = None,
+    ) -> None:
+        if not credentials or "con" not in credentials:
+            raise DatasetError(
+                "Credenciais inválidas: é necessário informar a string de conexão 'con'."
+            )
+
+        self._con = credentials["con"]
+        self._engine_args = {**self.DEFAULT_ENGINE_ARGS, **(engine_args or {})}
+        self.metadata = metadata
+
+    def load(self) -> Engine:
+        if self._con not in self._engines:
+            logger.info("Criando Engine SQLAlchemy compartilhada.")
+            self._engines[self._con] = create_engine(self._con, **self._engine_args)
+
+        return self._engines[self._con]
+
+    def save(self, data: None) -> None:
+        raise DatasetError(f"{type(self).__name__} é somente leitura.")
+
+    def _describe(self) -> dict[str, Any]:
+        # Não expõe a string de conexão (contém a senha)
+        return {"engine_args": self._engine_args}
@@ -11,6 +11,10 @@ from kedro.pipeline import Pipeline
 from kedro.pipeline.node import Node
 from sqlalchemy import Engine, create_engine, text
 
+from thelook_ecommerce_analysis.datasets.ibis_multi_file_dataset import (
+    IbisMultiFileDataset,
+)
+
 
 class ResourceMonitoringHook:
     """
@@ -182,3 +186,41 @@ class CreateIndexesHook:
             self.logger.info("Criando índices finais...")
             engine = self._get_engine(run_params)
             self._execute_sql_files(engine, params["indexes"])
+
+
+class FileCountsReportHook:
+    """Salva no relatório da execução as linhas por arquivo dos dados brutos multi-arquivo."""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._catalog: DataCatalog | None = None
+
+    @hook_impl
+    def before_pipeline_run(
+        self, run_params: dict[str, Any], pipeline: Pipeline, catalog: DataCatalog
+    ):
+        """Guarda o catálogo da execução para salvar os relatórios."""
+        self._catalog = catalog
+
+    @hook_impl
+    def after_dataset_loaded(self, dataset_name: str, data: Any, node: Node):
+        """Grava as contagens da carga em `reporting_<dataset>_files` (data/08_reporting)."""
+        if self._catalog is None:
+            return
+
+        dataset = self._catalog.get(dataset_name)
+        if not isinstance(dataset, IbisMultiFileDataset) or not dataset.file_counts:
+            return
+
+        counts = dataset.file_counts
+        known = [rows for rows in counts.values() if rows is not None]
+        report = {
+            "dataset": dataset_name,
+            "files": len(counts),
+            "rows": sum(known) if len(known) == len(counts) else None,
+            "file_rows": counts,
+        }
+        self._catalog.save(f"reporting_{dataset_name}_files", report)
+        self.logger.info(
+            f"Contagem por arquivo de {dataset_name} salva no relatório da execução."
+        )
@@ -9,7 +9,9 @@ from kedro.framework.project import find_pipelines
 if TYPE_CHECKING:
     from kedro.pipeline import Pipeline
 
+from .pipelines.data_embedding.pipeline import create_pipeline as data_embedding
 from .pipelines.data_processing.pipeline import create_pipeline as data_processing
+from .pipelines.metrics.pipeline import create_pipeline as metrics
 
 
 def register_pipelines() -> dict[str, Pipeline]:
@@ -20,5 +22,5 @@ def register_pipelines() -> dict[str, Pipeline]:
     """
     pipelines = find_pipelines(raise_errors=True)
 
-    pipelines["__default__"] = data_processing()
+    pipelines["__default__"] = data_processing() + metrics() + data_embedding()
     return pipelines
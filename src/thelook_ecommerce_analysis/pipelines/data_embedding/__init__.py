@@ -0,0 +1,9 @@
+"""
+Pipeline 'data_embedding': gera os embeddings de produtos e usuários no schema embeddings.
+"""
+
+from .pipeline import create_pipeline
+
+__all__ = ["create_pipeline"]
+
+__version__ = "0.1"
@@ -0,0 +1,299 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import psutil
+
+from .model_server import encode_remote
+
+logger = logging.getLogger(__name__)
+
+
+# Backends de inferência do modelo (parameters: embedding.backend)
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+@dataclass(frozen=True)
+class EncoderConfig:
+    """Modelo de embeddings e backend de inferência (chave do cache de modelos)."""
+
+    model_name: str
+    device: str = "cpu"
+    backend: str = "torch"
+    # Perfil da quantização dinâmica int8 do backend onnx-int8 (ex: avx2, avx512_vnni, arm64)
+    quantization: str = "avx2"
+    # Diretório dos modelos exportados (ONNX quantizado) quando o repositório não os fornece
+    export_dir: str = "data/06_models/embeddings"
+    # Servidor de embeddings (model_server) com o modelo carregado; None: só local
+    server_url: str | None = None
+    server_timeout_s: float = 30.0
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifica os vetores gerados (entra no content_hash): trocar o backend regenera."""
+        if self.backend == "torch":
+            return self.model_name
+        if self.backend == "onnx-int8":
+            return f"{self.model_name}@{self.backend}-{self.quantization}"
+        return f"{self.model_name}@{self.backend}"
+
+    @classmethod
+    def from_params(cls, params: dict[str, Any]) -> "EncoderConfig":
+        server = params.get("server") or {}
+        config = cls(
+            model_name=params["embedding_model"],
+            device=params.get("device", "cpu"),
+            backend=params.get("backend", "torch"),
+            quantization=params.get("onnx_quantization", "avx2"),
+            export_dir=params.get("export_dir", cls.export_dir),
+            server_url=server.get("url") or os.environ.get("EMBEDDING_SERVER_URL"),
+            server_timeout_s=server.get("timeout_s", cls.server_timeout_s),
+        )
+        if config.backend not in BACKENDS:
+            raise ValueError(
+                f"Backend de embeddings inválido: {config.backend} (opções: {BACKENDS})."
+            )
+        return config
+
+
+def _quantized_onnx_model(config: EncoderConfig) -> Any:
+    """
+    Carrega o modelo ONNX com quantização dinâmica int8.
+
+    Usa o arquivo do repositório do modelo quando existe (ex: all-MiniLM-L6-v2 publica
+    onnx/model_qint8_avx2.onnx); caso contrário exporta e quantiza uma única vez em
+    `export_dir`.
+    """
+    from sentence_transformers import (  # noqa: PLC0415  # ty: ignore[unresolved-import]
+        SentenceTransformer,
+        export_dynamic_quantized_onnx_model,
+    )
+
+    file_name = f"onnx/model_qint8_{config.quantization}.onnx"
+    model_kwargs = {"file_name": file_name, "provider": "CPUExecutionProvider"}
+    try:
+        return SentenceTransformer(
+            config.model_name,
+            device=config.device,
+            backend="onnx",
+            model_kwargs=model_kwargs,
+        )
+    except (OSError, ValueError):
+        logger.info(f"{config.model_name}: {file_name} não publicado, exportando.")
+
+    local = Path(config.export_dir) / config.model_name.replace("/", "__")
+    if not (local / file_name).exists():
+        model = SentenceTransformer(
+            config.model_name, device=config.device, backend="onnx"
+        )
+        model.save(str(local))
+        export_dynamic_quantized_onnx_model(model, config.quantization, str(local))
+
+    return SentenceTransformer(
+        str(local), device=config.device, backend="onnx", model_kwargs=model_kwargs
+    )
+
+
+@lru_cache(maxsize=4)
+def load_model(config: EncoderConfig) -> Any:
+    """
+    Carrega o modelo de embeddings uma única vez por processo.
+
+    O import é tardio: sentence-transformers (e torch) fazem parte do grupo de
+    dependências `heavy` e só são necessários quando há textos a codificar. Os backends
+    ONNX exigem o extra `sentence-transformers[onnx]` (optimum e onnxruntime).
+    """
+    from sentence_transformers import (  # noqa: PLC0415  # ty: ignore[unresolved-import]
+        SentenceTransformer,
+    )
+
+    if config.backend == "onnx-int8":
+        return _quantized_onnx_model(config)
+
+    return SentenceTransformer(
+        config.model_name, device=config.device, backend=config.backend
+    )
+
+
+def length_buckets(texts: list[str], batch_size: int) -> list[np.ndarray]:
+    """
+    Agrupa os índices dos textos em lotes de tamanho parecido.
+
+    Os textos são ordenados pelo comprimento (do maior para o menor) e fatiados em
+    lotes de `batch_size`: cada lote é preenchido (padding) até o seu maior texto, então
+    lotes homogêneos desperdiçam menos tokens. Os lotes mais longos saem primeiro, o que
+    equilibra a carga entre os processos.
+
+    Returns:
+        list[np.ndarray]: Índices (posição em `texts`) de cada lote.
+    """
+    lengths = np.fromiter((len(t) for t in texts), np.int64, len(texts))
+    order = np.argsort(-lengths, kind="stable")
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def resolve_workers(workers: int, n_buckets: int) -> int:
+    """Número de processos: `workers` <= 0 usa um por núcleo, limitado ao número de lotes."""
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_buckets))
+
+
+def _init_worker(config: EncoderConfig, threads: int) -> None:
+    """Carrega o modelo no processo (cache de `load_model`) e divide os núcleos do pool."""
+    import torch  # noqa: PLC0415  # ty: ignore[unresolved-import]
+
+    torch.set_num_threads(threads)
+    load_model(config)
+
+
+def _encode_batch(model: Any, texts: list[str]) -> np.ndarray:
+    vectors = model.encode(
+        texts,
+        batch_size=len(texts),
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return np.asarray(vectors, np.float32)
+
+
+def _encode_in_worker(config: EncoderConfig, texts: list[str]) -> np.ndarray:
+    return _encode_batch(load_model(config), texts)
+
+
+def encode_texts(
+    texts: list[str], config: EncoderConfig, batch_size: int = 256, workers: int = 1
+) -> np.ndarray:
+    """
+    Codifica os textos em vetores normalizados (similaridade de cosseno = produto interno).
+
+    Os textos são agrupados em lotes por comprimento (`length_buckets`). Com mais de um
+    processo, os lotes são distribuídos a um pool em que cada processo carrega o modelo
+    uma única vez; os vetores voltam para a posição original de cada texto.
+
+    Com `config.server_url` e um único processo (cargas incrementais, consultas do app),
+    os textos são codificados no servidor de embeddings, que mantém o modelo carregado;
+    se ele estiver indisponível (ou servir outro modelo), a codificação é local.
+
+    Args:
+        texts (list[str]): Textos a codificar.
+        config (EncoderConfig): Modelo, dispositivo e backend de inferência.
+        batch_size (int): Textos por lote.
+        workers (int): Processos do pool (<= 0: um por núcleo; 1: no próprio processo).
+
+    Returns:
+        np.ndarray: Matriz (len(texts), dimensão) em float32, na ordem dos textos
+        (sem textos: (0, dimensão)).
+    """
+    buckets = length_buckets(texts, batch_size)
+    batches = [[texts[i] for i in bucket] for bucket in buckets]
+    workers = resolve_workers(workers, len(buckets))
+
+    if config.server_url and workers == 1:
+        vectors = encode_remote(
+            texts, config.server_url, config.fingerprint, config.server_timeout_s
+        )
+        if vectors is not None:
+            return vectors
+    # O modelo local não depende do servidor (mesma chave no cache de `load_model`)
+    config = replace(config, server_url=None)
+
+    if not texts:
+        # Mesmo vazia, a matriz tem a dimensão do modelo (ex: para PcaProjection.transform)
+        dimensions = load_model(config).get_sentence_embedding_dimension()
+        return np.empty((0, dimensions), np.float32)
+
+    if workers == 1:
+        model = load_model(config)
+        results = [_encode_batch(model, batch) for batch in batches]
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        logger.info(
+            f"Codificando {len(texts)} textos em {len(buckets)} lotes com "
+            f"{workers} processos ({threads} threads cada)."
+        )
+        # spawn: o torch não é seguro após fork de um processo com threads ativas
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(config, threads),
+        ) as pool:
+            results = list(pool.map(partial(_encode_in_worker, config), batches))
+
+    vectors = np.empty((len(texts), results[0].shape[1]), np.float32)
+    for bucket, result in zip(buckets, results, strict=True):
+        vectors[bucket] = result
+    return vectors
+
+
+def _timed_encode(
+    texts: list[str], config: EncoderConfig, batch_size: int
+) -> tuple[np.ndarray, float, float]:
+    """Codifica no próprio processo; retorna os vetores, a duração e o acréscimo de RSS (MB)."""
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    start = time.perf_counter()
+    vectors = encode_texts(texts, config, batch_size)
+    duration = time.perf_counter() - start
+    rss_mb = (process.memory_info().rss - rss_before) / 1024 / 1024
+    return vectors, duration, rss_mb
+
+
+def parity_check(
+    reference: np.ndarray, candidate: np.ndarray
+) -> dict[str, float | None]:
+    """
+    Similaridade de cosseno, texto a texto, entre vetores normalizados de dois backends.
+
+    Sem textos não há o que comparar: as similaridades são None.
+    """
+    if not len(reference):
+        return {"min_cosine": None, "mean_cosine": None}
+    cosine = np.einsum("ij,ij->i", reference, candidate)
+    return {
+        "min_cosine": round(float(cosine.min()), 6),
+        "mean_cosine": round(float(cosine.mean()), 6),
+    }
+
+
+def benchmark_backend(
+    texts: list[str], config: EncoderConfig, batch_size: int = 256
+) -> dict[str, Any]:
+    """
+    Compara o backend configurado com a referência em PyTorch (float32) em uma amostra.
+
+    Os dois backends codificam os mesmos textos no próprio processo (sem pool). A
+    memória é o acréscimo de RSS durante a carga do modelo e a codificação: a referência
+    é medida primeiro, então o valor do segundo backend não inclui a carga do torch.
+
+    Returns:
+        dict[str, Any]: Tempos, speedup, acréscimo de RSS de cada backend e a paridade
+        (similaridade de cosseno mínima e média).
+    """
+    config = replace(config, server_url=None)
+    reference, torch_s, torch_rss = _timed_encode(
+        texts, replace(config, backend="torch"), batch_size
+    )
+    candidate, backend_s, backend_rss = _timed_encode(texts, config, batch_size)
+
+    report = {
+        "texts": len(texts),
+        "backend": config.backend,
+        "torch_s": round(torch_s, 4),
+        "backend_s": round(backend_s, 4),
+        "speedup": round(torch_s / backend_s, 2) if backend_s else None,
+        "torch_rss_mb": round(torch_rss, 1),
+        "backend_rss_mb": round(backend_rss, 1),
+        **parity_check(reference, candidate),
+    }
+    logger.info(f"Benchmark de embeddings (torch x {config.backend}): {report}")
+    return report
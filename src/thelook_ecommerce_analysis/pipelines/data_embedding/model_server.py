@@ -0,0 +1,340 @@
+"""
+Servidor local de embeddings: mantém o modelo carregado em um processo de longa duração.
+
+O pipeline e o app enviam os textos por HTTP em vez de carregar o modelo a cada
+execução. Requisições concorrentes são agrupadas por alguns milissegundos e codificadas
+em uma única chamada ao modelo. Sem servidor (ou com o servidor indisponível), a
+codificação volta a ser local (`encoder.encode_texts`).
+
+Execução: `python -m thelook_ecommerce_analysis.pipelines.data_embedding.model_server`
+(configuração em parameters: embedding e embedding.server).
+"""
+
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.request
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, cast
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Textos por requisição do cliente (cargas grandes são enviadas em partes)
+CLIENT_CHUNK_TEXTS = 1024
+
+# Após uma falha, o cliente usa a codificação local por este intervalo
+RETRY_AFTER_S = 30.0
+
+# Espera máxima do servidor pelos vetores de uma requisição (o lote pode estar na fila)
+ENCODE_TIMEOUT_S = 30.0
+
+_unavailable_until: dict[str, float] = {}
+
+
+@dataclass
+class _Request:
+    texts: list[str]
+    future: Future = field(default_factory=Future)
+
+
+class BatchCoalescer:
+    """
+    Agrupa requisições concorrentes em lotes para o modelo.
+
+    Uma thread consome a fila: a primeira requisição abre uma janela de `max_wait_ms`
+    (ou até `max_batch` textos) em que as seguintes entram no mesmo lote. Os vetores do
+    lote são devolvidos a cada requisição na ordem dos seus textos.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[list[str]], np.ndarray],
+        max_wait_ms: float = 5.0,
+        max_batch: int = 256,
+    ) -> None:
+        self._encode = encode
+        self._max_wait_s = max_wait_ms / 1000
+        self._max_batch = max_batch
+        self._queue: queue.Queue[_Request | None] = queue.Queue()
+        # Protege o encerramento: nenhuma requisição entra na fila depois do sentinela
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"requests": 0, "batches": 0, "texts": 0}
+        self._thread = threading.Thread(
+            target=self._run, name="embedding-coalescer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> Future:
+        request = _Request(texts)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchCoalescer encerrado.")
+            self._queue.put(request)
+        return request.future
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first: _Request) -> tuple[list[_Request], bool]:
+        """Requisições do lote aberto por `first`; indica se o encerramento foi pedido."""
+        pending = [first]
+        size = len(first.texts)
+        deadline = time.monotonic() + self._max_wait_s
+        while size < self._max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                return pending, True
+            pending.append(request)
+            size += len(request.texts)
+        return pending, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending, stop = self._collect(first)
+            texts = [text for request in pending for text in request.texts]
+            try:
+                vectors = self._encode(texts)
+            except Exception as error:  # noqa: BLE001
+                for request in pending:
+                    request.future.set_exception(error)
+                continue
+
+            self.stats["requests"] += len(pending)
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(texts)
+            offset = 0
+            for request in pending:
+                request.future.set_result(vectors[offset : offset + len(request.texts)])
+                offset += len(request.texts)
+
+
+class EmbeddingServer(ThreadingHTTPServer):
+    """Servidor HTTP (uma thread por conexão) com o modelo de um `EncoderConfig`."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple[str, int], fingerprint: str, coalescer: BatchCoalescer
+    ) -> None:
+        super().__init__(address, _Handler)
+        self.fingerprint = fingerprint
+        self.coalescer = coalescer
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.coalescer.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    @property
+    def embedding_server(self) -> EmbeddingServer:
+        return cast("EmbeddingServer", self.server)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug(format % args)
+
+    def _reply(self, status: int, body: bytes, headers: dict[str, str]) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply_json(self, status: int, payload: dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self._reply(status, body, {"Content-Type": "application/json"})
+
+    def _read_request(self) -> dict[str, Any]:
+        """Corpo JSON de /encode: {"model": str, "texts": list[str]}."""
+        length = int(self.headers.get("Content-Length") or 0)
+        # JSONDecodeError deriva de ValueError
+        request = json.loads(self.rfile.read(length))
+        if not isinstance(request, dict):
+            raise ValueError("O corpo deve ser um objeto JSON.")
+        texts = request.get("texts")
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise ValueError("'texts' deve ser uma lista de strings.")
+        return request
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._reply_json(404, {"error": "not found"})
+            return
+        server = self.embedding_server
+        self._reply_json(200, {"model": server.fingerprint, **server.coalescer.stats})
+
+    def do_POST(self) -> None:
+        if self.path != "/encode":
+            self._reply_json(404, {"error": "not found"})
+            return
+        server = self.embedding_server
+        try:
+            request = self._read_request()
+        except ValueError as error:
+            self._reply_json(400, {"error": str(error)})
+            return
+        # Vetores de outro modelo/backend não podem entrar no content_hash da carga
+        if request.get("model") != server.fingerprint:
+            self._reply_json(409, {"model": server.fingerprint})
+            return
+
+        try:
+            future = server.coalescer.submit(request["texts"])
+            vectors = np.ascontiguousarray(future.result(ENCODE_TIMEOUT_S), "<f4")
+        except Exception as error:  # noqa: BLE001
+            # Falha do modelo, tempo esgotado ou servidor encerrando: o cliente usa o local
+            logger.warning(
+                f"Falha ao codificar {len(request['texts'])} textos: {error}"
+            )
+            self._reply_json(500, {"error": str(error) or type(error).__name__})
+            return
+        rows, dim = vectors.shape
+        self._reply(
+            200,
+            vectors.tobytes(),
+            {
+                "Content-Type": "application/octet-stream",
+                "X-Rows": str(rows),
+                "X-Dimensions": str(dim),
+            },
+        )
+
+
+def create_server(
+    config: Any,
+    address: tuple[str, int],
+    max_wait_ms: float = 5.0,
+    max_batch: int = 256,
+    encode: Callable[[list[str]], np.ndarray] | None = None,
+) -> EmbeddingServer:
+    """
+    Cria o servidor (sem iniciá-lo) com o modelo de `config` carregado uma única vez.
+
+    Args:
+        config (EncoderConfig): Modelo, dispositivo e backend.
+        address (tuple[str, int]): Host e porta (porta 0: escolhida pelo sistema).
+        max_wait_ms (float): Janela de agrupamento das requisições.
+        max_batch (int): Textos por lote do modelo.
+        encode (Callable | None): Função de codificação (padrão: o modelo de `config`).
+    """
+    from .encoder import encode_texts, load_model  # noqa: PLC0415
+
+    if encode is None:
+        # O próprio servidor codifica localmente (sem recursão para o servidor)
+        local = replace(config, server_url=None)
+        load_model(local)
+
+        def encode(texts: list[str]) -> np.ndarray:
+            return encode_texts(texts, local, batch_size=max_batch, workers=1)
+
+    coalescer = BatchCoalescer(encode, max_wait_ms, max_batch)
+    return EmbeddingServer(address, config.fingerprint, coalescer)
+
+
+def encode_remote(
+    texts: list[str], url: str, fingerprint: str, timeout_s: float = 30.0
+) -> np.ndarray | None:
+    """
+    Codifica os textos no servidor de embeddings.
+
+    Returns:
+        np.ndarray | None: Matriz (len(texts), dimensão) em float32, ou None se o
+        servidor estiver indisponível ou servir outro modelo (a chamada usa então a
+        codificação local). Após uma falha, o servidor é ignorado por `RETRY_AFTER_S`.
+    """
+    if time.monotonic() < _unavailable_until.get(url, 0.0):
+        return None
+
+    parts = []
+    try:
+        # Sem textos, uma requisição vazia informa a dimensão do modelo do servidor
+        for start in range(0, max(len(texts), 1), CLIENT_CHUNK_TEXTS):
+            chunk = texts[start : start + CLIENT_CHUNK_TEXTS]
+            request = urllib.request.Request(  # noqa: S310
+                f"{url.rstrip('/')}/encode",
+                data=json.dumps({"model": fingerprint, "texts": chunk}).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=timeout_s) as response:  # noqa: S310
+                rows = int(response.headers["X-Rows"])
+                dim = int(response.headers["X-Dimensions"])
+                parts.append(np.frombuffer(response.read(), "<f4").reshape(rows, dim))
+    except (OSError, ValueError, KeyError) as error:
+        # URLError e HTTPError (ex: 409, outro modelo) derivam de OSError
+        _unavailable_until[url] = time.monotonic() + RETRY_AFTER_S
+        logger.warning(
+            f"Servidor de embeddings indisponível ({url}): {error}. "
+            "Usando a codificação local."
+        )
+        return None
+
+    return np.concatenate(parts).astype(np.float32, copy=False)
+
+
+def main() -> None:
+    """Inicia o servidor com a configuração de embeddings do projeto (conf/)."""
+    from kedro.config import OmegaConfigLoader  # noqa: PLC0415
+
+    from .encoder import EncoderConfig  # noqa: PLC0415
+
+    parser = argparse.ArgumentParser(description="Servidor local de embeddings.")
+    parser.add_argument("--env", default="local", help="Ambiente do Kedro (conf/<env>)")
+    parser.add_argument("--host", help="Endereço (padrão: embedding.server.host)")
+    parser.add_argument(
+        "--port", type=int, help="Porta (padrão: embedding.server.port)"
+    )
+    args = parser.parse_args()
+
+    params = OmegaConfigLoader(conf_source="conf", env=args.env)["parameters"]
+    embedding = params["embedding"]
+    server_params = embedding.get("server") or {}
+    config = EncoderConfig.from_params(embedding)
+
+    server = create_server(
+        config,
+        (
+            args.host or server_params.get("host", "127.0.0.1"),
+            args.port or int(server_params.get("port", 8765)),
+        ),
+        server_params.get("max_wait_ms", 5.0),
+        server_params.get("max_batch", 256),
+    )
+    host, port = server.server_address[:2]
+    logger.info(
+        f"Servidor de embeddings ({config.fingerprint}) em http://{host}:{port}"
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,565 @@
+import logging
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+from sqlalchemy import Connection, Engine, text
+
+from thelook_ecommerce_analysis.utils.change_log import split_statements
+from thelook_ecommerce_analysis.utils.pg_copy import copy_arrow_binary, copy_vectors_out
+from thelook_ecommerce_analysis.utils.schema_catalog import (
+    approx_tokens,
+    fetch_catalog,
+    render_table,
+)
+from thelook_ecommerce_analysis.utils.vector_index import (
+    benchmark_ef_search,
+    benchmark_storage,
+    build_hnsw_index,
+    drop_hnsw_index,
+    should_defer_index,
+    sql_identifier,
+)
+from thelook_ecommerce_analysis.utils.vector_snapshot import write_snapshot
+
+from .encoder import (
+    EncoderConfig,
+    benchmark_backend,
+    encode_texts,
+    resolve_workers,
+)
+from .storage import (
+    PcaProjection,
+    StorageConfig,
+    ensure_column,
+    pca_path,
+    storage_fingerprint,
+    storage_variants,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_table(rows: list[tuple[int, str, str]], vectors: np.ndarray) -> pa.Table:
+    """Monta a tabela Arrow do lote: a matriz de vetores vira uma FixedSizeList (sem cópia)."""
+    source_id, chunk_text, content_hash = zip(*rows, strict=True)
+    # float32 -> vector; float16 -> halfvec
+    if vectors.dtype != np.float16:
+        vectors = vectors.astype(np.float32, copy=False)
+    vectors = np.ascontiguousarray(vectors)
+
+    return pa.table(
+        {
+            "source_id": pa.array(source_id, pa.int64()),
+            "chunk_text": pa.array(chunk_text, pa.string()),
+            "content_hash": pa.array(content_hash, pa.string()),
+            "embedding": pa.FixedSizeListArray.from_arrays(
+                pa.array(vectors.ravel()), vectors.shape[1]
+            ),
+        }
+    )
+
+
+def _stage_embeddings(conn: Connection, table: pa.Table, column_type: str) -> None:
+    """Grava o lote na tabela temporária embedding_stage via COPY binário (pgvector)."""
+    conn.execute(
+        text(f"""
+            CREATE TEMP TABLE embedding_stage (
+                source_id BIGINT PRIMARY KEY,
+                chunk_text TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                embedding {column_type}
+            ) ON COMMIT DROP
+        """)
+    )
+    copy_arrow_binary(conn, "embedding_stage", table)
+
+
+def _check_backend(
+    engine: Engine,
+    table: str,
+    config: EncoderConfig,
+    params: dict[str, Any],
+    texts: list[str],
+) -> dict[str, Any]:
+    """
+    Compara o backend configurado com o PyTorch antes de gravar qualquer vetor.
+
+    A amostra são os textos já armazenados na tabela (completados pelos textos
+    alterados). Paridade abaixo de `parity_min_cosine` interrompe o pipeline. A
+    codificação da amostra roda fora de qualquer transação.
+    """
+    sample_size = params["benchmark_sample"]
+    with engine.begin() as conn:
+        stored = (
+            conn.execute(
+                text(f"SELECT chunk_text FROM {table} ORDER BY id LIMIT :n"),  # noqa: S608
+                {"n": sample_size},
+            )
+            .scalars()
+            .all()
+        )
+    sample = list(dict.fromkeys([*stored, *texts]))[:sample_size]
+    if not sample:
+        # Tabela vazia e nenhum texto alterado: sem amostra para o benchmark
+        logger.info(f"{table}: sem textos para o benchmark de {config.backend}.")
+        return {"texts": 0, "backend": config.backend}
+
+    report = benchmark_backend(sample, config, params["batch_size"])
+    if report["min_cosine"] < params["parity_min_cosine"]:
+        raise ValueError(
+            f"Backend {config.backend} sem paridade com o PyTorch: cosseno mínimo "
+            f"{report['min_cosine']} < {params['parity_min_cosine']}."
+        )
+    return report
+
+
+def _load_projection(conn: Connection, path: Path) -> PcaProjection | None:
+    """
+    PCA já ajustada: o banco é a cópia durável, o arquivo é o que o app lê.
+
+    Um arquivo sem cópia no banco (cargas anteriores) é gravado no banco; uma cópia sem
+    arquivo (volume recriado) restaura o arquivo. Sem nenhum dos dois, retorna None.
+    """
+    payload = conn.execute(
+        text("SELECT payload FROM embeddings.storage_projections WHERE name = :name"),
+        {"name": path.name},
+    ).scalar()
+    if payload is not None:
+        projection = PcaProjection.from_bytes(bytes(payload))
+        if not path.exists():
+            projection.save(path)
+            logger.info(f"PCA {path.name} restaurada do banco em {path}.")
+        return projection
+    if path.exists():
+        projection = PcaProjection.load(path)
+        _store_projection(conn, path, projection)
+        return projection
+    return None
+
+
+def _store_projection(conn: Connection, path: Path, projection: PcaProjection) -> None:
+    conn.execute(
+        text("""
+            INSERT INTO embeddings.storage_projections (name, payload)
+            VALUES (:name, :payload)
+            ON CONFLICT (name) DO UPDATE SET payload = EXCLUDED.payload
+        """),
+        {"name": path.name, "payload": projection.to_bytes()},
+    )
+
+
+def _fit_projection(
+    engine: Engine,
+    chunks_sql: str,
+    path: Path,
+    config: EncoderConfig,
+    params: dict[str, Any],
+) -> PcaProjection:
+    """
+    Carrega a PCA da tabela ou a ajusta sobre uma amostra sistemática dos textos.
+
+    Os textos vêm da própria consulta de chunks com uma chave que nenhum hash
+    armazenado usa (todos os registros). A projeção é salva no arquivo e no banco
+    (embeddings.storage_projections) e reutilizada nas cargas seguintes, mesmo em um
+    container novo; apagar as duas cópias gera uma nova PCA e regenera todos os vetores.
+    A amostra é codificada entre a transação de leitura e a de gravação.
+    """
+    with engine.begin() as conn:
+        projection = _load_projection(conn, path)
+        if projection is not None:
+            return projection
+
+        texts = list(
+            dict.fromkeys(
+                row[1] for row in conn.execute(text(chunks_sql), {"model": "pca-fit"})
+            )
+        )
+
+    storage = StorageConfig.from_params(params)
+    step = max(1, len(texts) // storage.pca_fit_sample)
+    sample = texts[::step][: storage.pca_fit_sample]
+    if len(sample) <= storage.dimensions:
+        raise ValueError(
+            f"Amostra insuficiente para a PCA: {len(sample)} textos para "
+            f"{storage.dimensions} dimensões."
+        )
+
+    vectors = encode_texts(
+        sample, config, params["batch_size"], params.get("workers", 1)
+    )
+    projection = PcaProjection.fit(vectors, storage.dimensions)
+    projection.save(path)
+    with engine.begin() as conn:
+        _store_projection(conn, path, projection)
+    logger.info(
+        f"PCA ajustada com {len(sample)} textos: {storage.model_dimensions} -> "
+        f"{storage.dimensions} dimensões ({projection.explained_variance:.1%} da "
+        f"variância). Salva em {path}."
+    )
+    return projection
+
+
+def _run_storage_benchmark(
+    engine: Engine,
+    target: dict[str, Any],
+    config: EncoderConfig,
+    projection: PcaProjection | None,
+    params: dict[str, Any],
+) -> dict[str, Any]:
+    """Compara vector, halfvec e a PCA sobre textos da tabela (transação descartada)."""
+    benchmark = params["storage"]["benchmark"]
+    with engine.connect() as conn:
+        texts = (
+            conn.execute(
+                text(
+                    f"SELECT chunk_text FROM {target['table']} ORDER BY id LIMIT :n"  # noqa: S608
+                ),
+                {"n": int(benchmark["rows"])},
+            )
+            .scalars()
+            .all()
+        )
+        if not texts:
+            return {"rows": 0}
+
+        reference = encode_texts(
+            list(texts), config, params["batch_size"], params.get("workers", 1)
+        )
+        report = benchmark_storage(
+            conn,
+            storage_variants(reference, projection),
+            reference,
+            params["hnsw"],
+            benchmark,
+        )
+        conn.rollback()
+    return report
+
+
+def _merge_embeddings(
+    conn: Connection,
+    target: dict[str, Any],
+    merge_query: str,
+    hnsw: dict[str, Any],
+    changed_rows: int,
+) -> dict[str, Any]:
+    """Executa o merge, adiando o índice HNSW em cargas grandes."""
+    index = target["index"]
+    deferred = should_defer_index(
+        conn, target["table"], changed_rows, hnsw["bulk_load_fraction"]
+    )
+    if deferred:
+        drop_hnsw_index(conn, target["table"], index)
+
+    for statement in split_statements(merge_query):
+        conn.execute(text(statement))
+
+    if deferred:
+        # Estatísticas atualizadas para o planejador (e para a próxima decisão de adiamento)
+        conn.execute(text(f"ANALYZE {target['table']}"))
+
+    # Sem o adiamento, IF NOT EXISTS só cria o índice se ele ainda não existir
+    build_s = build_hnsw_index(conn, target["table"], index, hnsw)
+    return {
+        "index": index["name"],
+        "deferred": deferred,
+        "build_duration_s": round(build_s, 3),
+    }
+
+
+def _sync_metadata(conn: Connection, sync_query: str) -> int:
+    """Executa o script de sincronização dos metadados fora do texto; retorna as linhas."""
+    statements = split_statements(Path(sync_query).read_text(encoding="utf-8"))
+    return sum(conn.execute(text(statement)).rowcount for statement in statements)
+
+
+def _encode_unique_texts(
+    texts: list[str],
+    config: EncoderConfig,
+    storage: StorageConfig,
+    projection: PcaProjection | None,
+    params: dict[str, Any],
+) -> tuple[np.ndarray, int]:
+    """Codifica os textos (projetados pela PCA, se houver) no tipo do armazenamento."""
+    workers = resolve_workers(
+        params.get("workers", 1), -(-len(texts) // params["batch_size"])
+    )
+    vectors = encode_texts(texts, config, params["batch_size"], workers)
+    if projection is not None:
+        vectors = projection.transform(vectors)
+    return vectors.astype(storage.dtype, copy=False), workers
+
+
+def embed_changed_chunks(
+    engine: Engine,
+    target: dict[str, Any],
+    params: dict[str, Any],
+    **upstream: Any,
+) -> dict[str, Any]:
+    """
+    Gera os embeddings apenas dos textos novos ou alterados de uma tabela do schema embeddings.
+
+    A consulta de chunks monta o texto de cada registro e o hash (modelo + texto) e o
+    compara, no próprio banco, com o hash armazenado: só os registros divergentes
+    chegam ao Python. Textos idênticos são codificados uma única vez. Os vetores são
+    gravados em uma tabela temporária (COPY binário no formato do pgvector) e o script
+    de merge faz o UPSERT na tabela final.
+
+    A leitura e a gravação usam transações separadas: a codificação (CPU) roda entre
+    elas, sem manter locks nem um snapshot aberto no banco.
+
+    Em cargas grandes (tabela vazia ou lote acima de `hnsw.bulk_load_fraction`), o
+    índice HNSW é removido antes do merge e reconstruído uma única vez ao final, na
+    mesma transação; lotes pequenos são inseridos no índice existente.
+
+    O armazenamento (`storage`) pode usar halfvec (float16) e/ou uma PCA ajustada para
+    reduzir a dimensão; a coluna e o índice são ajustados ao formato configurado.
+
+    Metadados que não fazem parte do texto (ex: gasto médio) não alteram o hash: o
+    script `sync_query` (opcional) os atualiza em toda execução, com ou sem textos
+    alterados.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        target (dict[str, Any]): Scripts de chunks e de merge e o índice HNSW
+            (parameters: embedding_targets).
+        params (dict[str, Any]): Modelo, backend, batch_size, device, workers e a
+            configuração do HNSW (parameters: embedding).
+        **upstream: Saídas das etapas de origem. Garantem que o nó execute após a carga.
+
+    Returns:
+        dict[str, Any]: Registros alterados, textos codificados, duração e vazão (textos/s)
+        com o batch_size e os processos usados, para calibrar a configuração.
+    """
+    start = time.perf_counter()
+    config = EncoderConfig.from_params(params)
+    storage = StorageConfig.from_params(params)
+    target = {**target, "index": storage.index(target["index"])}
+    chunks_sql = split_statements(
+        Path(target["chunks_query"]).read_text(encoding="utf-8")
+    )[0]
+    merge_query = Path(target["merge_query"]).read_text(encoding="utf-8")
+
+    # 1. Leitura: registros alterados, em uma transação encerrada antes da codificação
+    projection = None
+    if storage.pca_dimensions:
+        projection = _fit_projection(
+            engine,
+            chunks_sql,
+            pca_path(storage, target["table"], config.fingerprint),
+            config,
+            params,
+        )
+
+    with engine.begin() as conn:
+        column_changed = ensure_column(conn, target["table"], target["index"], storage)
+        rows = [
+            tuple(row)
+            for row in conn.execute(
+                text(chunks_sql),
+                {"model": storage_fingerprint(config.fingerprint, projection)},
+            ).all()
+        ]
+
+    # Textos repetidos (ex: mesmo resumo de perfil) são codificados uma vez
+    unique_texts = list(dict.fromkeys(chunk_text for _, chunk_text, _ in rows))
+
+    benchmark = None
+    if params.get("benchmark_sample") and config.backend != "torch":
+        benchmark = _check_backend(
+            engine, target["table"], config, params, unique_texts
+        )
+
+    # 2. Codificação (CPU) fora de qualquer transação: nenhum lock ou snapshot é mantido
+    encoded, encode_s, workers = 0, 0.0, 0
+    vectors = None
+    if rows:
+        encode_start = time.perf_counter()
+        vectors, workers = _encode_unique_texts(
+            unique_texts, config, storage, projection, params
+        )
+        encode_s = time.perf_counter() - encode_start
+        encoded = len(unique_texts)
+
+    # 3. Gravação: staging, merge e metadados em uma nova transação. O hash gravado é o
+    # do texto codificado: um texto alterado entre as transações diverge e volta na
+    # próxima carga.
+    index_report: dict[str, Any] = {}
+    with engine.begin() as conn:
+        if vectors is not None:
+            position = {chunk_text: i for i, chunk_text in enumerate(unique_texts)}
+            _stage_embeddings(
+                conn,
+                embedding_table(rows, vectors[[position[r[1]] for r in rows]]),
+                storage.type,
+            )
+            index_report = _merge_embeddings(
+                conn, target, merge_query, params["hnsw"], len(rows)
+            )
+        else:
+            # Sem textos alterados, IF NOT EXISTS só refaz um índice ausente: coluna
+            # convertida (vector <-> halfvec) nesta carga ou em uma carga interrompida
+            # depois da leitura
+            build_s = build_hnsw_index(
+                conn, target["table"], target["index"], params["hnsw"]
+            )
+            if column_changed:
+                index_report = {
+                    "index": target["index"]["name"],
+                    "deferred": True,
+                    "build_duration_s": round(build_s, 3),
+                }
+
+        synced = 0
+        if target.get("sync_query"):
+            synced = _sync_metadata(conn, target["sync_query"])
+
+    duration = time.perf_counter() - start
+    rate = encoded / encode_s if encode_s else 0.0
+    logger.info(
+        f"{target['table']}: {len(rows)} registros alterados, {encoded} textos "
+        f"codificados ({rate:.1f} textos/s) em {duration:.2f}s."
+    )
+
+    report = {
+        "table": target["table"],
+        "backend": config.backend,
+        "storage": storage.column_type,
+        "column_changed": column_changed,
+        "changed_rows": len(rows),
+        "synced_rows": synced,
+        "encoded_texts": encoded,
+        "encode_duration_s": round(encode_s, 3),
+        "texts_per_s": round(rate, 1),
+        "batch_size": params["batch_size"],
+        "workers": workers,
+        "duration_s": round(duration, 3),
+    }
+    if index_report:
+        report["hnsw"] = index_report
+    if benchmark is not None:
+        report["benchmark"] = benchmark
+    if params["hnsw"].get("benchmark", {}).get("queries"):
+        with engine.begin() as conn:
+            report["hnsw_benchmark"] = benchmark_ef_search(
+                conn, target["table"], target["index"], params["hnsw"]["benchmark"]
+            )
+    if params.get("storage", {}).get("benchmark", {}).get("rows"):
+        report["storage_benchmark"] = _run_storage_benchmark(
+            engine, target, config, projection, params
+        )
+
+    return report
+
+
+def export_vector_snapshot(
+    engine: Engine,
+    target: dict[str, Any],
+    params: dict[str, Any],
+    **upstream: Any,
+) -> dict[str, Any]:
+    """
+    Exporta os vetores de uma tabela como snapshot .npy para o índice em memória do app.
+
+    Ids e vetores são lidos via COPY binário (sem conversão para texto) em ordem de id.
+    A versão é derivada do conteúdo e o carimbo é gravado ao final: o app recarrega o
+    índice só quando os vetores mudam.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        target (dict[str, Any]): Tabela, coluna indexada e a chave do snapshot
+            (parameters: embedding_targets).
+        params (dict[str, Any]): Armazenamento e diretório dos snapshots
+            (parameters: embedding).
+        **upstream: Relatório da carga dos embeddings. Garante que o nó execute depois dela.
+
+    Returns:
+        dict[str, Any]: Carimbo da versão (arquivos, linhas, dimensão) e se foi gravada.
+    """
+    start = time.perf_counter()
+    config = EncoderConfig.from_params(params)
+    storage = StorageConfig.from_params(params)
+    table = sql_identifier(target["table"])
+    key = sql_identifier(target["snapshot_key"])
+    column = sql_identifier(target["index"]["column"])
+
+    with engine.connect() as conn:
+        ids, vectors = copy_vectors_out(
+            conn,
+            f"SELECT {key}::bigint, {column} FROM {table} "  # noqa: S608
+            f"WHERE {column} IS NOT NULL ORDER BY {key}",
+            storage.type,
+        )
+
+    stamp = write_snapshot(
+        Path(params["snapshot_dir"]),
+        table.rpartition(".")[2],
+        ids,
+        vectors,
+        {"table": table, "model": config.fingerprint, "storage": storage.column_type},
+    )
+    return {**stamp, "duration_s": round(time.perf_counter() - start, 3)}
+
+
+def build_schema_context(
+    engine: Engine,
+    params: dict[str, Any],
+    embedding: dict[str, Any],
+    **upstream: Any,
+) -> dict[str, Any]:
+    """
+    Extrai o catálogo comentado (COMMENT ON) e grava o contexto de schema do Text-to-SQL.
+
+    Cada tabela vira um texto compacto (colunas, tipos e comentários) com o seu
+    embedding, gravados como snapshot versionado: o app seleciona as tabelas relevantes
+    para cada pergunta sem consultar o catálogo do banco. A versão muda só quando o
+    catálogo (ou o modelo) muda.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        params (dict[str, Any]): Schemas, tabelas ignoradas e tabelas por prompt
+            (parameters: schema_context).
+        embedding (dict[str, Any]): Modelo e diretório dos snapshots (parameters: embedding).
+        **upstream: Relatórios das cargas. Garantem que o nó execute depois das tabelas
+            derivadas e de embeddings existirem.
+
+    Returns:
+        dict[str, Any]: Carimbo da versão, tabelas, colunas e tokens estimados do
+        catálogo completo e do maior prompt (as `k` maiores tabelas).
+    """
+    start = time.perf_counter()
+    config = EncoderConfig.from_params(embedding)
+    with engine.connect() as conn:
+        catalog = fetch_catalog(conn, params["schemas"], params.get("exclude"))
+    if not catalog:
+        raise ValueError(f"Nenhuma tabela encontrada nos schemas {params['schemas']}.")
+
+    texts = [render_table(table) for table in catalog]
+    vectors = encode_texts(texts, config, batch_size=len(texts))
+    tables = [
+        {"name": table["name"], "kind": table["kind"], "text": content}
+        for table, content in zip(catalog, texts, strict=True)
+    ]
+    stamp = write_snapshot(
+        Path(embedding["snapshot_dir"]),
+        "schema_context",
+        np.arange(len(tables)),
+        vectors,
+        {"model": config.fingerprint, "tables": tables},
+    )
+
+    tokens = sorted((approx_tokens(content) for content in texts), reverse=True)
+    report = {
+        "version": stamp["version"],
+        "written": stamp["written"],
+        "tables": len(tables),
+        "columns": sum(len(table["columns"]) for table in catalog),
+        "catalog_tokens": sum(tokens),
+        "max_prompt_tokens": sum(tokens[: params["k"]]),
+        "duration_s": round(time.perf_counter() - start, 3),
+    }
+    logger.info(f"Contexto de schema: {report}")
+    return report
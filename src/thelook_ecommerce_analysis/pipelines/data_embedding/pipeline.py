@@ -0,0 +1,67 @@
+from kedro.pipeline import Node, Pipeline
+
+from .nodes import build_schema_context, embed_changed_chunks, export_vector_snapshot
+
+# Tabela de destino -> datasets que precisam estar carregados antes da geração. O perfil
+# de usuários usa o gasto médio de metrics.customer_stats (refresh do pipeline metrics)
+EMBEDDING_INPUTS: dict[str, dict[str, str]] = {
+    "products_embeddings": {"products": "primary_products"},
+    "fct_vector_geo_search": {
+        "users": "primary_users",
+        "derived_refresh": "reporting_derived_refresh",
+    },
+}
+
+# Tabelas exportadas como snapshot .npy para o índice vetorial em memória do app
+SNAPSHOT_TARGETS = ("products_embeddings",)
+
+
+def create_pipeline(**kwargs) -> Pipeline:
+    return Pipeline(
+        [
+            Node(
+                func=embed_changed_chunks,
+                inputs={
+                    "engine": "postgres_engine",
+                    "target": f"params:embedding_targets.{name}",
+                    "params": "params:embedding",
+                    **upstream,
+                },
+                outputs=f"reporting_{name}",
+                name=f"embed_{name}_node",
+                tags=["embeddings"],
+            )
+            for name, upstream in EMBEDDING_INPUTS.items()
+        ]
+        + [
+            Node(
+                func=export_vector_snapshot,
+                inputs={
+                    "engine": "postgres_engine",
+                    "target": f"params:embedding_targets.{name}",
+                    "params": "params:embedding",
+                    "embeddings": f"reporting_{name}",
+                },
+                outputs=f"reporting_{name}_snapshot",
+                name=f"export_{name}_snapshot_node",
+                tags=["embeddings"],
+            )
+            for name in SNAPSHOT_TARGETS
+        ]
+        + [
+            Node(
+                func=build_schema_context,
+                inputs={
+                    "engine": "postgres_engine",
+                    "params": "params:schema_context",
+                    "embedding": "params:embedding",
+                    **{name: f"reporting_{name}" for name in EMBEDDING_INPUTS},
+                },
+                outputs="reporting_schema_context",
+                name="build_schema_context_node",
+                tags=["embeddings"],
+            )
+        ],
+        namespace="data_embedding",
+        prefix_datasets_with_namespace=False,
+    )
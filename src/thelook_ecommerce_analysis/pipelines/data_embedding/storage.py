@@ -0,0 +1,214 @@
+import builtins
+import hashlib
+import io
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from sqlalchemy import Connection, text
+
+from thelook_ecommerce_analysis.utils.vector_index import (
+    drop_hnsw_index,
+    sql_identifier,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tipos de armazenamento do pgvector: float32 (vector) ou float16 (halfvec)
+STORAGE_TYPES = ("vector", "halfvec")
+
+_COLUMN_TYPE = re.compile(r"^(vector|halfvec)\((\d+)\)$")
+
+
+@dataclass(frozen=True)
+class StorageConfig:
+    """Formato dos embeddings gravados: tipo do pgvector e redução opcional por PCA."""
+
+    type: str = "vector"
+    # Dimensão de saída do modelo (a da coluna sem redução)
+    model_dimensions: int = 384
+    # Dimensão após a PCA. None: sem redução
+    pca_dimensions: int | None = None
+    # Textos usados no ajuste da PCA (amostra sistemática da tabela)
+    pca_fit_sample: int = 20000
+    pca_dir: str = "data/06_models/embeddings"
+
+    @classmethod
+    def from_params(cls, params: dict[str, Any]) -> "StorageConfig":
+        storage = params.get("storage") or {}
+        config = cls(
+            type=storage.get("type", "vector"),
+            model_dimensions=params.get("dimensions", cls.model_dimensions),
+            pca_dimensions=storage.get("pca_dimensions"),
+            pca_fit_sample=storage.get("pca_fit_sample", cls.pca_fit_sample),
+            pca_dir=storage.get("pca_dir", cls.pca_dir),
+        )
+        if config.type not in STORAGE_TYPES:
+            raise ValueError(
+                f"Armazenamento inválido: {config.type} (opções: {STORAGE_TYPES})."
+            )
+        if config.pca_dimensions and config.pca_dimensions >= config.model_dimensions:
+            raise ValueError(
+                f"pca_dimensions ({config.pca_dimensions}) deve ser menor que a "
+                f"dimensão do modelo ({config.model_dimensions})."
+            )
+        return config
+
+    @property
+    def dimensions(self) -> int:
+        return self.pca_dimensions or self.model_dimensions
+
+    @property
+    def column_type(self) -> str:
+        return f"{self.type}({self.dimensions})"
+
+    @property
+    def dtype(self) -> builtins.type[np.floating]:
+        """Tipo NumPy dos vetores enviados no COPY (FixedSizeList de float32/float16)."""
+        return np.float16 if self.type == "halfvec" else np.float32
+
+    def index(self, index: dict[str, str]) -> dict[str, str]:
+        """Índice com a classe de operadores do tipo armazenado (ex: halfvec_cosine_ops)."""
+        _, _, metric = index["opclass"].partition("_")
+        return {**index, "opclass": f"{self.type}_{metric}"}
+
+
+@dataclass(frozen=True)
+class PcaProjection:
+    """Redução de dimensão ajustada sobre os embeddings (média e componentes principais)."""
+
+    mean: np.ndarray
+    components: np.ndarray
+    explained_variance: float
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dimensions: int) -> "PcaProjection":
+        """Ajusta a PCA por SVD dos vetores centralizados."""
+        vectors = np.asarray(vectors, np.float64)
+        mean = vectors.mean(axis=0)
+        _, singular, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        variance = singular**2
+        return cls(
+            mean=mean.astype(np.float32),
+            components=vt[:dimensions].astype(np.float32),
+            explained_variance=float(variance[:dimensions].sum() / variance.sum()),
+        )
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Projeta e renormaliza (a busca por cosseno continua válida no espaço reduzido)."""
+        reduced = (np.asarray(vectors, np.float32) - self.mean) @ self.components.T
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.where(norms == 0, 1, norms)
+
+    @property
+    def digest(self) -> str:
+        """Identifica a projeção: uma PCA reajustada regenera todos os vetores."""
+        return hashlib.sha1(self.components.tobytes()).hexdigest()[:12]  # noqa: S324
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            mean=self.mean,
+            components=self.components,
+            explained_variance=self.explained_variance,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "PcaProjection":
+        with np.load(io.BytesIO(payload)) as data:
+            return cls(
+                mean=data["mean"],
+                components=data["components"],
+                explained_variance=float(data["explained_variance"]),
+            )
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: Path) -> "PcaProjection":
+        return cls.from_bytes(path.read_bytes())
+
+
+def storage_variants(
+    reference: np.ndarray, projection: PcaProjection | None
+) -> dict[str, tuple[str, np.ndarray]]:
+    """Formatos comparados no benchmark: vector e halfvec, completos e com a PCA."""
+    variants = {
+        "vector": ("vector", reference.astype(np.float32)),
+        "halfvec": ("halfvec", reference.astype(np.float16)),
+    }
+    if projection is not None:
+        reduced = projection.transform(reference)
+        dim = reduced.shape[1]
+        variants[f"vector_pca{dim}"] = ("vector", reduced.astype(np.float32))
+        variants[f"halfvec_pca{dim}"] = ("halfvec", reduced.astype(np.float16))
+    return variants
+
+
+def pca_path(storage: StorageConfig, table: str, encoder_fingerprint: str) -> Path:
+    """Arquivo da PCA de uma tabela, por modelo/backend e dimensão."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", f"{table}_{encoder_fingerprint}").strip("_")
+    return Path(storage.pca_dir) / f"{slug}_pca{storage.pca_dimensions}.npz"
+
+
+def storage_fingerprint(
+    encoder_fingerprint: str, projection: PcaProjection | None
+) -> str:
+    """Chave do content_hash: modelo/backend e, com redução, a dimensão e a projeção."""
+    if projection is None:
+        return encoder_fingerprint
+    return f"{encoder_fingerprint}|pca{len(projection.components)}-{projection.digest}"
+
+
+def ensure_column(
+    conn: Connection, table: str, index: dict[str, str], storage: StorageConfig
+) -> bool:
+    """
+    Ajusta o tipo da coluna de embeddings ao armazenamento configurado.
+
+    Com a mesma dimensão (vector <-> halfvec), os vetores são convertidos pelo cast do
+    pgvector. Com outra dimensão (PCA ligada, desligada ou alterada), a coluna é
+    esvaziada junto com o content_hash, e a tabela inteira é codificada novamente. O
+    índice HNSW é removido e reconstruído ao final da carga.
+
+    Returns:
+        bool: Se a coluna foi alterada.
+    """
+    column = sql_identifier(index["column"])
+    current = conn.execute(
+        text("""
+            SELECT format_type(a.atttypid, a.atttypmod)
+            FROM pg_attribute a
+            WHERE a.attrelid = to_regclass(:table) AND a.attname = :column
+        """),
+        {"table": table, "column": column},
+    ).scalar()
+
+    if current == storage.column_type:
+        return False
+
+    match = _COLUMN_TYPE.match(current or "")
+    same_dimensions = bool(match) and int(match.group(2)) == storage.dimensions
+    logger.info(
+        f"{table}: coluna {column} {current} -> {storage.column_type}"
+        f"{'' if same_dimensions else ' (vetores serão regenerados)'}."
+    )
+
+    drop_hnsw_index(conn, table, index)
+    using = f"{column}::{storage.column_type}" if same_dimensions else "NULL"
+    conn.execute(
+        text(
+            f"ALTER TABLE {table} ALTER COLUMN {column} "
+            f"TYPE {storage.column_type} USING {using}"
+        )
+    )
+    if not same_dimensions:
+        conn.execute(text(f"UPDATE {table} SET content_hash = NULL"))  # noqa: S608
+    return True
@@ -4,8 +4,10 @@ from datetime import datetime as datetime_  # Evitar problema com o Linter
 from typing import Any
 
 import ibis
+from sqlalchemy import Engine
 
 from thelook_ecommerce_analysis.pipelines.data_processing.transform_tables import (
+    EVENTS_DERIVED_COLUMNS,
     transform_distribution_centers,
     transform_events,
     transform_inventory_items,
@@ -14,6 +16,7 @@ from thelook_ecommerce_analysis.pipelines.data_processing.transform_tables impor
     transform_products,
     transform_users,
 )
+from thelook_ecommerce_analysis.utils.change_log import run_incremental_refresh
 
 logger = logging.getLogger(__name__)
 
@@ -365,24 +368,47 @@ def extract_events(
     events: ibis.Table, schema_rules: dict[str, Any], columns: list[str]
 ) -> ibis.Table:
     """
-    Extração e limpeza dos dados brutos.
+    Extração, enriquecimento e limpeza dos dados brutos.
 
     Args:
         events (Table): Dados brutos a serem transformados.
         schema_rules (dict[str, Any]): Regras do schema para validação.
-        columns (str): Colunas que serão utilizadas.
+        columns (str): Colunas da tabela de destino. As colunas derivadas
+            (ex: extracted_page_type) são criadas pelo pipeline.
 
     Returns:
         Table: Dados prontos para ingestão no banco de dados.
     """
 
-    # 1. Seleção de colunas
-    df = events.select(columns)
+    # 1. Seleção de colunas (apenas as existentes no arquivo bruto)
+    raw_columns = [c for c in columns if c not in EVENTS_DERIVED_COLUMNS]
+    df = events.select(raw_columns)
 
-    # 2. Tratamento
-    df = transform_events(df)
+    # 2. Tratamento e enriquecimento (parsing do URI e campos de sessão)
+    df = transform_events(df).select(columns)
 
     # 3. Validação do Schema
     df = _validate_ibis_table(df, schema_rules)
 
     return df
+
+
+def refresh_sessions(
+    events: ibis.Table, engine: Engine, query_path: str
+) -> dict[str, Any]:
+    """
+    Atualiza incrementalmente a tabela fato metrics.sessions.
+
+    Apenas as sessões com eventos inseridos ou alterados na janela pendente do
+    raw_data.change_log são re-agregadas. Na primeira execução (sem watermark)
+    a tabela é reconstruída a partir de todos os eventos.
+
+    Args:
+        events (Table): Tabela events já carregada. Garante que o nó execute após a ingestão.
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        query_path (str): Script SQL de refresh incremental.
+
+    Returns:
+        dict[str, Any]: Relatório do refresh (modo, janela, linhas e duração).
+    """
+    return run_incremental_refresh(engine, "sessions", query_path)
@@ -10,9 +10,11 @@ from .nodes import (
     extract_orders,
     extract_products,
     extract_users,
+    refresh_sessions,
 )
 from .schema_rules import (
     distribution_centers_schema,
+    events_schema,
     inventory_items_schema,
     order_items_schema,
     orders_schema,
@@ -110,7 +112,7 @@ def create_pipeline(**kwargs) -> Pipeline:
                 tags=["raw", "order_items"],
             ),
             Node(
-                func=create_node_func(extract_events, schema_rules=users_schema),
+                func=create_node_func(extract_events, schema_rules=events_schema),
                 inputs={
                     "events": "raw_events",
                     "columns": "params:tables.events.columns",
@@ -119,6 +121,17 @@ def create_pipeline(**kwargs) -> Pipeline:
                 name="process_events_table_node",
                 tags=["raw", "events"],
             ),
+            Node(
+                func=refresh_sessions,
+                inputs={
+                    "events": "primary_events",
+                    "engine": "postgres_engine",
+                    "query_path": "params:refresh_queries.sessions",
+                },
+                outputs="reporting_sessions",
+                name="refresh_sessions_table_node",
+                tags=["metrics", "sessions"],
+            ),
         ],
         namespace="data_processing",
         prefix_datasets_with_namespace=False,
@@ -169,6 +169,16 @@ events_schema = {
         "seq_invalid": lambda t: (
             t["sequence_number"].notnull() & (t["sequence_number"] < 1)
         ),
+        # Colunas derivadas do URI
+        "page_type_missing": lambda t: t["extracted_page_type"].isnull(),
+        "product_id_missing": lambda t: (
+            (t["extracted_page_type"] == "product") & t["extracted_product_id"].isnull()
+        ),
+        # Colunas de sessão
+        "session_bounds_invalid": lambda t: (
+            t["session_first_event_at"] > t["session_last_event_at"]
+        ),
+        "session_count_invalid": lambda t: t["session_event_count"] < 1,
     },
     "agg": {
         # Valida a unicidade da PK Composta (id, created_at)
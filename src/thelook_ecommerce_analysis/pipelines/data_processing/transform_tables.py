@@ -147,14 +147,35 @@ def transform_order_items(oi: ir.Table) -> ir.Table:
     )
 
 
+# Colunas de events derivadas no pipeline (não existem no arquivo bruto)
+EVENTS_DERIVED_COLUMNS = (
+    "visitor_type",
+    "extracted_product_id",
+    "extracted_page_type",
+    "session_first_event_at",
+    "session_last_event_at",
+    "session_event_count",
+)
+
+
 def transform_events(events: ir.Table) -> ir.Table:
-    """Aplica transformações e enriquece dados para simplificar queries do RAG."""
-    return events.mutate(
+    """
+    Aplica transformações e enriquece dados para simplificar queries do RAG.
+
+    O `uri` é interpretado com regex vetorizada dentro da engine (DuckDB):
+        - `/product/123` -> extracted_page_type='product', extracted_product_id=123
+        - `/department/men/category/...` -> extracted_page_type='department'
+    As colunas de sessão são calculadas com funções de janela por `session_id` e cobrem
+    apenas os eventos do lote: o refresh de `metrics.sessions` as recalcula a partir de
+    todos os eventos gravados (sessões que atravessam lotes). Eventos sem `session_id`
+    não pertencem a uma sessão: ficam com as colunas de sessão nulas e o `session_id`
+    'Unknown' (preenchido após a janela).
+    """
+    events = events.mutate(
         id=events.id.cast("int32"),
         user_id=events.user_id.cast("int32"),
         sequence_number=events.sequence_number.cast("int32"),
         created_at=events.created_at.cast("timestamp"),
-        session_id=events.session_id.fill_null("Unknown"),
         city=events.city.fill_null("Unknown"),
         state=events.state.fill_null("Unknown"),
         browser=events.browser.fill_null("Unknown"),
@@ -162,6 +183,31 @@ def transform_events(events: ir.Table) -> ir.Table:
         event_type=events.event_type.fill_null("Unknown"),
         # Materializa status do visitante para evitar lógicas de NULL no RAG
         visitor_type=events.user_id.isnull().ifelse("Guest", "Registered"),
-        extracted_product_id=events.extracted_product_id.cast("int32"),
-        extracted_page_type=events.extracted_page_type.fill_null("Unknown"),
     )
+
+    # 1. Parsing do URI (primeiro segmento do path e ID do produto)
+    uri = events.uri.lower()
+    events = events.mutate(
+        extracted_page_type=(
+            uri.re_extract(r"^/([^/?#]+)", 1).nullif("").fill_null("Unknown")
+        ),
+        extracted_product_id=(
+            uri.re_extract(r"^/product/(\d+)", 1).nullif("").cast("int32")
+        ),
+    )
+
+    # 2. Campos de sessão (apenas eventos com session_id)
+    session = ibis.window(group_by=events.session_id)
+    has_session = events.session_id.notnull()
+    events = events.mutate(
+        session_first_event_at=has_session.ifelse(
+            events.created_at.min().over(session), ibis.null()
+        ),
+        session_last_event_at=has_session.ifelse(
+            events.created_at.max().over(session), ibis.null()
+        ),
+        session_event_count=has_session.ifelse(
+            events.count().over(session), ibis.null()
+        ).cast("int32"),
+    )
+    return events.mutate(session_id=events.session_id.fill_null("Unknown"))
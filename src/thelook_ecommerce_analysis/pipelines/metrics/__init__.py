@@ -0,0 +1,9 @@
+"""
+Pipeline 'metrics': materializa as consultas de sql/metrics como tabelas do schema metrics.
+"""
+
+from .pipeline import create_pipeline
+
+__all__ = ["create_pipeline"]
+
+__version__ = "0.1"
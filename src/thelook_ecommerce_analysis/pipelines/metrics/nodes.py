@@ -0,0 +1,484 @@
+import logging
+import time
+from typing import Any
+
+import ibis
+import numpy as np
+import pyarrow as pa
+from sqlalchemy import Connection, Engine, text
+
+from thelook_ecommerce_analysis.utils.change_log import (
+    ChangeWindow,
+    RefreshSpec,
+    changed_tables,
+    commit_window,
+    open_window,
+)
+from thelook_ecommerce_analysis.utils.geo import (
+    Points,
+    cell_centers,
+    distance_rank_table,
+    grid_cells,
+    parent_cells,
+)
+from thelook_ecommerce_analysis.utils.pg_copy import copy_arrow_binary
+from thelook_ecommerce_analysis.utils.refresh_scheduler import run_scheduled_refresh
+
+logger = logging.getLogger(__name__)
+
+# Consumidor do change_log (e tabela de destino) da atribuição de CDs
+NEAREST_DC_CONSUMER = "user_dc_rank"
+
+_USERS_IN_WINDOW = """
+    SELECT c.row_id FROM raw_data.change_log c
+    WHERE c.table_name = 'users' AND c.seq > :from_seq AND c.seq <= :to_seq
+"""
+
+
+def refresh_derived_objects(
+    engine: Engine,
+    specs: dict[str, dict[str, Any]],
+    params: dict[str, Any],
+    scheduler: dict[str, Any],
+    **upstream: Any,
+) -> dict[str, Any]:
+    """
+    Materializa os objetos derivados dos schemas metrics e embeddings.
+
+    O modo de cada objeto é escolhido a partir das tabelas de origem alteradas na
+    janela pendente do raw_data.change_log: sem alterações o objeto é ignorado (skip);
+    com alterações apenas em fontes tratadas pelo script incremental, só as chaves
+    afetadas são recalculadas; caso contrário, a tabela é reconstruída (full). Objetos
+    independentes são atualizados em paralelo, respeitando as dependências entre eles.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        specs (dict[str, dict[str, Any]]): Scripts e fontes de cada objeto (parameters: derived_refresh).
+        params (dict[str, Any]): Parâmetros de negócio repassados aos scripts (ex: returns_cost).
+        scheduler (dict[str, Any]): Configuração do agendador (ex: max_workers).
+        **upstream: Saídas das etapas de origem. Garantem que o nó execute após a ingestão.
+
+    Returns:
+        dict[str, Any]: Relatório de cada objeto (modo, fontes alteradas, linhas e duração).
+    """
+    return run_scheduled_refresh(
+        engine,
+        {name: RefreshSpec(consumer=name, **spec) for name, spec in specs.items()},
+        params,
+        **scheduler,
+    )
+
+
+def report_refresh_timings(refresh: dict[str, Any]) -> dict[str, Any]:
+    """
+    Consolida os relatórios de refresh dos objetos derivados.
+
+    Returns:
+        dict[str, Any]: Modo, linhas e duração por objeto, além da soma das durações e da
+        duração total do agendamento (menor que a soma quando há paralelismo).
+    """
+    summary = {
+        name: {k: report[k] for k in ("mode", "rows", "duration_s")}
+        for name, report in refresh["objects"].items()
+    }
+
+    for name, item in sorted(summary.items(), key=lambda i: -i[1]["duration_s"]):
+        logger.info(
+            f"{name:<30} | {item['mode']:<11} | {item['rows']:>9} linhas | {item['duration_s']:>7.2f}s"
+        )
+
+    return {
+        "objects": summary,
+        "total_duration_s": round(sum(i["duration_s"] for i in summary.values()), 3),
+        "wall_duration_s": refresh["wall_duration_s"],
+    }
+
+
+def _open_users_window(
+    conn: Connection, consumer: str, sources: list[str]
+) -> tuple[ChangeWindow, str, dict[str, Any]]:
+    """
+    Abre a janela do change_log de um nó Python que processa usuários.
+
+    Alterações apenas em users são tratadas de forma incremental (usuários da janela);
+    alterações nas demais fontes, ou a falta de watermark, recalculam todos.
+
+    Returns:
+        tuple: Janela, modo (full, incremental ou skip) e parâmetros das consultas.
+    """
+    window = open_window(conn, consumer)
+    changed = [] if window.is_empty else changed_tables(conn, window, sources)
+
+    full = window.full_refresh or bool(set(changed) - {"users"})
+    mode = "full" if full else "incremental" if changed else "skip"
+    return window, mode, {**window.params(), "full_refresh": full}
+
+
+def _load_points(conn: Connection, query: str, params: dict[str, Any]) -> Points:
+    """Lê (id, latitude, longitude) como arrays NumPy."""
+    rows = conn.execute(text(query), params).all()
+    if not rows:
+        return Points(np.empty(0, np.int64), np.empty(0), np.empty(0))
+
+    ids, lat, lon = zip(*rows, strict=True)
+    return Points(
+        np.asarray(ids, np.int64),
+        np.asarray(lat, np.float64),
+        np.asarray(lon, np.float64),
+    )
+
+
+def _load_centers(conn: Connection) -> Points:
+    return _load_points(
+        conn,
+        "SELECT id, latitude, longitude FROM raw_data.distribution_centers ORDER BY id",
+        {},
+    )
+
+
+def benchmark_nearest_dc(engine: Engine, sample_size: int) -> dict[str, Any]:
+    """
+    Compara o cálculo vetorizado (haversine em NumPy) com o PostGIS (ST_Distance por linha).
+
+    Ambos calculam a distância e o ranking de todos os CDs para a mesma amostra de
+    usuários. O PostGIS usa o esferoide (geography), então as distâncias diferem em até
+    ~0,5% da haversine; o relatório mostra a diferença máxima e a concordância do CD
+    mais próximo.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        sample_size (int): Quantidade de usuários da amostra.
+
+    Returns:
+        dict[str, Any]: Tempos de cada abordagem, speedup e comparação dos resultados.
+    """
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        users = _load_points(
+            conn,
+            """
+            SELECT id, latitude, longitude FROM raw_data.users
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+            ORDER BY id LIMIT :sample_size
+            """,
+            {"sample_size": sample_size},
+        )
+        vectorized = distance_rank_table(users, _load_centers(conn))
+        numpy_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        postgis = conn.execute(
+            text("""
+                SELECT
+                    u.id AS user_id,
+                    dc.id AS dc_id,
+                    ST_Distance(u.user_geom, dc.distribution_center_geom) / 1000 AS distance_km,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY u.id
+                        ORDER BY ST_Distance(u.user_geom, dc.distribution_center_geom), dc.id
+                    ) AS dc_rank
+                FROM (
+                    SELECT id, user_geom FROM raw_data.users
+                    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                    ORDER BY id LIMIT :sample_size
+                ) u
+                CROSS JOIN raw_data.distribution_centers dc
+            """),
+            {"sample_size": sample_size},
+        ).all()
+        postgis_s = time.perf_counter() - start
+
+    expected = {(int(r[0]), int(r[1])): (float(r[2]), int(r[3])) for r in postgis}
+    nearest_match = diff_km = 0.0
+    for user_id, dc_id, distance, rank in zip(
+        *(vectorized[c].to_pylist() for c in vectorized.column_names), strict=True
+    ):
+        ref_distance, ref_rank = expected[(user_id, dc_id)]
+        diff_km = max(diff_km, abs(distance - ref_distance))
+        nearest_match += rank == 1 and ref_rank == 1
+
+    report = {
+        "users": len(users.ids),
+        "numpy_s": round(numpy_s, 4),
+        "postgis_s": round(postgis_s, 4),
+        "speedup": round(postgis_s / numpy_s, 2) if numpy_s else None,
+        "nearest_match_pct": round(100 * nearest_match / max(len(users.ids), 1), 2),
+        "max_distance_diff_km": round(diff_km, 3),
+    }
+    logger.info(f"Benchmark CD mais próximo (NumPy x PostGIS): {report}")
+    return report
+
+
+def assign_nearest_distribution_centers(
+    engine: Engine,
+    params: dict[str, Any],
+    users: ibis.Table,
+    distribution_centers: ibis.Table,
+) -> dict[str, Any]:
+    """
+    Materializa a distância e o ranking de todos os CDs para cada usuário (embeddings.user_dc_rank).
+
+    A matriz usuário x CD é calculada em uma única passada vetorizada (haversine em
+    NumPy) e gravada via COPY binário. Apenas os usuários inseridos ou alterados na
+    janela pendente do raw_data.change_log são recalculados; alterações em
+    distribution_centers (ou a primeira execução) recalculam todos.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        params (dict[str, Any]): Configuração (parameters: nearest_dc). `benchmark_sample`
+            maior que zero executa o benchmark contra o PostGIS após o refresh.
+        users (Table): Tabela users já carregada. Garante que o nó execute após a ingestão.
+        distribution_centers (Table): Tabela distribution_centers já carregada.
+
+    Returns:
+        dict[str, Any]: Relatório do refresh (modo, usuários, linhas e duração).
+    """
+    start = time.perf_counter()
+    n_users = rows = 0
+
+    with engine.begin() as conn:
+        window, mode, bind = _open_users_window(
+            conn, NEAREST_DC_CONSUMER, ["users", "distribution_centers"]
+        )
+
+        if mode != "skip":
+            user_points = _load_points(
+                conn,
+                f"""
+                SELECT id, latitude, longitude FROM raw_data.users
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                    AND (:full_refresh OR id IN ({_USERS_IN_WINDOW}))
+                """,  # noqa: S608
+                bind,
+            )
+            table = distance_rank_table(user_points, _load_centers(conn))
+
+            conn.execute(
+                text(f"""
+                    DELETE FROM embeddings.{NEAREST_DC_CONSUMER}
+                    WHERE :full_refresh OR user_id IN ({_USERS_IN_WINDOW})
+                """),  # noqa: S608
+                bind,
+            )
+            copy_arrow_binary(conn, f"embeddings.{NEAREST_DC_CONSUMER}", table)
+            n_users, rows = len(user_points.ids), table.num_rows
+
+            commit_window(conn, window)
+
+    duration = time.perf_counter() - start
+    logger.info(
+        f"{NEAREST_DC_CONSUMER}: refresh {mode} de {n_users} usuários "
+        f"({rows} pares usuário x CD) em {duration:.2f}s."
+    )
+
+    report = {
+        "consumer": NEAREST_DC_CONSUMER,
+        "mode": mode,
+        "users": n_users,
+        "rows": rows,
+        "duration_s": round(duration, 3),
+    }
+    if params.get("benchmark_sample"):
+        report["benchmark"] = benchmark_nearest_dc(engine, params["benchmark_sample"])
+
+    return report
+
+
+def _user_grid_state(
+    conn: Connection, query: str, params: dict[str, Any], finest: int
+) -> pa.Table:
+    """Lê (user_id, latitude, longitude, age) e calcula a célula na resolução mais fina."""
+    rows = conn.execute(text(query), params).all()
+    user_id, lat, lon, age = zip(*rows, strict=True) if rows else ([], [], [], [])
+
+    return pa.table(
+        {
+            "user_id": pa.array(user_id, pa.int32()),
+            "cell_id": pa.array(
+                grid_cells(np.asarray(lat), np.asarray(lon), finest), pa.int64()
+            ),
+            "age": pa.array(age, pa.int16()),
+        }
+    )
+
+
+def hotspot_deltas(
+    new_state: pa.Table, old_state: pa.Table, resolutions: list[int]
+) -> pa.Table:
+    """
+    Calcula as variações de densidade e idade por célula em todas as resoluções.
+
+    Cada usuário soma +1 na sua célula atual e -1 na célula anterior (estado gravado),
+    em cada resolução. As células das resoluções mais grossas são derivadas da mais fina.
+
+    Returns:
+        pa.Table: Variações por (resolution, cell_id), com o centro de cada célula.
+    """
+    finest = max(resolutions)
+    parts = []
+    for state, sign in ((new_state, 1), (old_state, -1)):
+        cells = state["cell_id"].to_numpy()
+        age = state["age"].fill_null(0).to_numpy().astype(np.int64)
+        has_age = state["age"].is_valid().to_numpy(zero_copy_only=False)
+        for resolution in resolutions:
+            parts.append(
+                pa.table(
+                    {
+                        "resolution": pa.array(
+                            np.full(len(cells), resolution), pa.int16()
+                        ),
+                        "cell_id": parent_cells(cells, finest, resolution),
+                        "density": np.full(len(cells), sign, np.int64),
+                        "age_sum": sign * age,
+                        "age_count": sign * has_age.astype(np.int64),
+                    }
+                )
+            )
+
+    delta = (
+        pa.concat_tables(parts)
+        .group_by(["resolution", "cell_id"])
+        .aggregate([("density", "sum"), ("age_sum", "sum"), ("age_count", "sum")])
+        .rename_columns(["resolution", "cell_id", "density", "age_sum", "age_count"])
+    )
+    # Usuários que continuam na mesma célula (e idade) não geram variação
+    changed = np.zeros(delta.num_rows, bool)
+    for column in ("density", "age_sum", "age_count"):
+        changed |= delta[column].to_numpy() != 0
+    delta = delta.filter(pa.array(changed))
+
+    center_lat = np.empty(delta.num_rows)
+    center_lon = np.empty(delta.num_rows)
+    res = delta["resolution"].to_numpy()
+    cells = delta["cell_id"].to_numpy()
+    for resolution in resolutions:
+        mask = res == resolution
+        center_lat[mask], center_lon[mask] = cell_centers(cells[mask], resolution)
+
+    return delta.append_column("center_lat", pa.array(center_lat)).append_column(
+        "center_lon", pa.array(center_lon)
+    )
+
+
+def refresh_hotspot_grid(
+    engine: Engine, params: dict[str, Any], users: ibis.Table
+) -> dict[str, Any]:
+    """
+    Mantém o mapa de calor de usuários (embeddings.map_hotspots_grid) em várias resoluções.
+
+    As células de uma grade hierárquica (quadtree sobre lat/lon) são calculadas em
+    NumPy. Em vez de reagrupar a tabela users, o nó aplica variações: cada usuário
+    inserido ou alterado na janela do change_log é retirado da célula anterior
+    (embeddings.user_grid_cells) e somado à célula atual, em todas as resoluções.
+    Alterar as resoluções configuradas muda o consumidor e reconstrói a grade.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        params (dict[str, Any]): Configuração (parameters: hotspots).
+        users (Table): Tabela users já carregada. Garante que o nó execute após a ingestão.
+
+    Returns:
+        dict[str, Any]: Relatório do refresh (modo, usuários, células alteradas e duração).
+    """
+    start = time.perf_counter()
+    resolutions = sorted(params["resolutions"])
+    consumer = f"map_hotspots_grid@{','.join(map(str, resolutions))}"
+    n_users = cells = 0
+
+    with engine.begin() as conn:
+        window, mode, bind = _open_users_window(conn, consumer, ["users"])
+
+        if mode != "skip":
+            new_state = _user_grid_state(
+                conn,
+                f"""
+                SELECT id, latitude, longitude, age FROM raw_data.users
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                    AND (:full_refresh OR id IN ({_USERS_IN_WINDOW}))
+                """,  # noqa: S608
+                bind,
+                max(resolutions),
+            )
+            if mode == "full":
+                # Reconstrução: a grade é refeita a partir do estado vazio
+                conn.execute(text("DELETE FROM embeddings.user_grid_cells"))
+                conn.execute(text("DELETE FROM embeddings.map_hotspots_grid"))
+                old_rows = []
+            else:
+                # Retira o estado anterior dos usuários da janela (célula e idade antigas)
+                old_rows = conn.execute(
+                    text(f"""
+                        DELETE FROM embeddings.user_grid_cells
+                        WHERE user_id IN ({_USERS_IN_WINDOW})
+                        RETURNING user_id, cell_id, age
+                    """),  # noqa: S608
+                    bind,
+                ).all()
+            old_state = pa.table(
+                {
+                    "user_id": pa.array([r[0] for r in old_rows], pa.int32()),
+                    "cell_id": pa.array([r[1] for r in old_rows], pa.int64()),
+                    "age": pa.array([r[2] for r in old_rows], pa.int16()),
+                }
+            )
+
+            delta = hotspot_deltas(new_state, old_state, resolutions)
+            copy_arrow_binary(conn, "embeddings.user_grid_cells", new_state)
+            _apply_hotspot_deltas(conn, delta)
+            n_users, cells = new_state.num_rows, delta.num_rows
+
+            commit_window(conn, window)
+
+    duration = time.perf_counter() - start
+    logger.info(
+        f"{consumer}: refresh {mode} de {n_users} usuários "
+        f"({cells} células alteradas) em {duration:.2f}s."
+    )
+
+    return {
+        "consumer": consumer,
+        "mode": mode,
+        "users": n_users,
+        "rows": cells,
+        "duration_s": round(duration, 3),
+    }
+
+
+def _apply_hotspot_deltas(conn: Connection, delta: pa.Table) -> None:
+    """Soma as variações às células (UPSERT) e remove as células que ficaram vazias."""
+    conn.execute(
+        text("""
+            CREATE TEMP TABLE hotspot_delta (
+                resolution SMALLINT,
+                cell_id BIGINT,
+                density BIGINT,
+                age_sum BIGINT,
+                age_count BIGINT,
+                center_lat DOUBLE PRECISION,
+                center_lon DOUBLE PRECISION
+            ) ON COMMIT DROP
+        """)
+    )
+    copy_arrow_binary(conn, "hotspot_delta", delta)
+
+    conn.execute(
+        text("""
+            INSERT INTO embeddings.map_hotspots_grid AS g (
+                resolution, cell_id, center_lat, center_lon, density, age_sum, age_count
+            )
+            SELECT resolution, cell_id, center_lat, center_lon, density, age_sum, age_count
+            FROM hotspot_delta
+            ON CONFLICT (resolution, cell_id) DO UPDATE
+            SET
+                density = g.density + EXCLUDED.density,
+                age_sum = g.age_sum + EXCLUDED.age_sum,
+                age_count = g.age_count + EXCLUDED.age_count
+        """)
+    )
+    conn.execute(
+        text("""
+            DELETE FROM embeddings.map_hotspots_grid g
+            USING hotspot_delta d
+            WHERE g.resolution = d.resolution AND g.cell_id = d.cell_id AND g.density <= 0
+        """)
+    )
@@ -0,0 +1,73 @@
+from kedro.pipeline import Node, Pipeline
+
+from .nodes import (
+    assign_nearest_distribution_centers,
+    refresh_derived_objects,
+    refresh_hotspot_grid,
+    report_refresh_timings,
+)
+
+# Datasets das etapas de origem dos objetos derivados. Definem a ordem de execução em
+# relação à ingestão (as alterações efetivas são lidas do raw_data.change_log e as
+# dependências entre os objetos são resolvidas pelo agendador).
+UPSTREAM_INPUTS: dict[str, str] = {
+    "users": "primary_users",
+    "distribution_centers": "primary_distribution_centers",
+    "products": "primary_products",
+    "inventory_items": "primary_inventory_items",
+    "orders": "primary_orders",
+    "order_items": "primary_order_items",
+    "sessions": "reporting_sessions",
+}
+
+
+def create_pipeline(**kwargs) -> Pipeline:
+    return Pipeline(
+        [
+            Node(
+                func=refresh_derived_objects,
+                inputs={
+                    "engine": "postgres_engine",
+                    "specs": "params:derived_refresh",
+                    "params": "params:metrics",
+                    "scheduler": "params:refresh_scheduler",
+                    **UPSTREAM_INPUTS,
+                },
+                outputs="reporting_derived_refresh",
+                name="refresh_derived_objects_node",
+                tags=["metrics", "embeddings"],
+            ),
+            Node(
+                func=assign_nearest_distribution_centers,
+                inputs={
+                    "engine": "postgres_engine",
+                    "params": "params:nearest_dc",
+                    "users": "primary_users",
+                    "distribution_centers": "primary_distribution_centers",
+                },
+                outputs="reporting_user_dc_rank",
+                name="assign_nearest_dc_node",
+                tags=["embeddings", "logistics"],
+            ),
+            Node(
+                func=refresh_hotspot_grid,
+                inputs={
+                    "engine": "postgres_engine",
+                    "params": "params:hotspots",
+                    "users": "primary_users",
+                },
+                outputs="reporting_map_hotspots_grid",
+                name="refresh_hotspot_grid_node",
+                tags=["embeddings", "hotspots"],
+            ),
+            Node(
+                func=report_refresh_timings,
+                inputs="reporting_derived_refresh",
+                outputs="reporting_metrics_refresh",
+                name="report_refresh_timings_node",
+                tags=["metrics"],
+            ),
+        ],
+        namespace="metrics",
+        prefix_datasets_with_namespace=False,
+    )
@@ -0,0 +1,9 @@
+"""
+Pipeline 'retrieval': benchmarks da busca sobre as tabelas do schema embeddings.
+"""
+
+from .pipeline import create_pipeline
+
+__all__ = ["create_pipeline"]
+
+__version__ = "0.1"
@@ -0,0 +1,44 @@
+from typing import Any
+
+from sqlalchemy import Engine
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import StorageConfig
+from thelook_ecommerce_analysis.retrieval.geo_search import (
+    GeoSearchConfig,
+    benchmark_geo_search,
+)
+
+
+def benchmark_hybrid_search(
+    engine: Engine,
+    params: dict[str, Any],
+    target: dict[str, Any],
+    embedding: dict[str, Any],
+    **upstream: Any,
+) -> dict[str, Any]:
+    """
+    Mede a busca híbrida (raio + gasto + vetor) de fct_vector_geo_search por seletividade.
+
+    Compara o prefiltro com distância exata, o HNSW com pós-filtro e a escolha
+    automática do plano. Desativado com `benchmark.queries` = 0.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do PostgreSQL.
+        params (dict[str, Any]): Limites do plano e o benchmark
+            (parameters: retrieval.geo_search).
+        target (dict[str, Any]): Tabela e índice HNSW (embedding_targets).
+        embedding (dict[str, Any]): Armazenamento dos vetores (parameters: embedding).
+        **upstream: Relatório da carga dos embeddings. Garante que o nó execute depois dela.
+
+    Returns:
+        dict[str, Any]: Recall@k e latências p50/p95 por nível de seletividade e plano.
+    """
+    benchmark = params.get("benchmark", {})
+    if not benchmark.get("queries"):
+        return {"queries": 0}
+
+    config = GeoSearchConfig.from_params(
+        params, target, StorageConfig.from_params(embedding)
+    )
+    with engine.begin() as conn:
+        return benchmark_geo_search(conn, config, benchmark)
@@ -0,0 +1,25 @@
+from kedro.pipeline import Node, Pipeline
+
+from .nodes import benchmark_hybrid_search
+
+
+def create_pipeline(**kwargs) -> Pipeline:
+    return Pipeline(
+        [
+            Node(
+                func=benchmark_hybrid_search,
+                inputs={
+                    "engine": "postgres_engine",
+                    "params": "params:retrieval.geo_search",
+                    "target": "params:embedding_targets.fct_vector_geo_search",
+                    "embedding": "params:embedding",
+                    "embeddings": "reporting_fct_vector_geo_search",
+                },
+                outputs="reporting_geo_search_benchmark",
+                name="benchmark_geo_search_node",
+                tags=["benchmark"],
+            )
+        ],
+        namespace="retrieval",
+        prefix_datasets_with_namespace=False,
+    )
@@ -0,0 +1,24 @@
+"""
+Busca sobre as tabelas do schema embeddings (consultas da aplicação).
+"""
+
+from .geo_search import GeoQuery, GeoSearchConfig, hybrid_geo_search, search_users
+from .product_search import ProductSearch, ProductSearchConfig, reciprocal_rank_fusion
+from .query_encoder import QueryEncoder
+from .schema_context import SchemaContext, SchemaContextCache
+from .vector_cache import VectorIndex, VectorIndexCache
+
+__all__ = [
+    "GeoQuery",
+    "GeoSearchConfig",
+    "ProductSearch",
+    "ProductSearchConfig",
+    "QueryEncoder",
+    "SchemaContext",
+    "SchemaContextCache",
+    "VectorIndex",
+    "VectorIndexCache",
+    "hybrid_geo_search",
+    "reciprocal_rank_fusion",
+    "search_users",
+]
@@ -0,0 +1,397 @@
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from sqlalchemy import Connection, Engine, text
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import StorageConfig
+from thelook_ecommerce_analysis.utils.vector_index import (
+    distance_operator,
+    sql_identifier,
+    vector_literal,
+)
+
+from .query_encoder import QueryEncoder
+
+logger = logging.getLogger(__name__)
+
+# Planos de execução: prefiltro (índices GIST/B-tree) + distância exata, ou HNSW + pós-filtro
+PLANS = ("prefilter", "hnsw")
+
+_RESULT_COLUMNS = "user_id, city, country, avg_spend, chunk_text"
+
+_ORIGIN = "ST_SetSRID(ST_MakePoint(:lon, :lat), 4326)::geography"
+
+
+@dataclass(frozen=True)
+class GeoQuery:
+    """Filtros da busca: raio (km) em torno de um ponto e faixa de gasto médio."""
+
+    k: int = 10
+    lat: float | None = None
+    lon: float | None = None
+    radius_km: float | None = None
+    min_spend: float | None = None
+    max_spend: float | None = None
+
+    def __post_init__(self) -> None:
+        if self.k <= 0:
+            raise ValueError(f"k deve ser positivo: {self.k}.")
+        point = (self.lat, self.lon)
+        if self.radius_km is not None and None in point:
+            raise ValueError("O filtro por raio exige lat e lon.")
+        if (self.lat is None) != (self.lon is None):
+            raise ValueError("Informe lat e lon juntos.")
+
+    @property
+    def has_point(self) -> bool:
+        return self.lat is not None
+
+    @property
+    def has_filters(self) -> bool:
+        return any(
+            value is not None
+            for value in (self.radius_km, self.min_spend, self.max_spend)
+        )
+
+    def where(self) -> tuple[str, dict[str, Any]]:
+        """Cláusula WHERE (com binds) dos filtros; 'TRUE' sem filtros."""
+        clauses, binds = [], {}
+        if self.radius_km is not None:
+            # ST_DWithin em geography usa o índice GIST (idx_vsearch_geom)
+            clauses.append(f"ST_DWithin(user_geom, {_ORIGIN}, :radius_m)")
+            binds["radius_m"] = self.radius_km * 1000
+        if self.min_spend is not None:
+            clauses.append("avg_spend >= :min_spend")
+            binds["min_spend"] = self.min_spend
+        if self.max_spend is not None:
+            clauses.append("avg_spend <= :max_spend")
+            binds["max_spend"] = self.max_spend
+        if self.has_point:
+            binds.update(lat=self.lat, lon=self.lon)
+        return " AND ".join(clauses) or "TRUE", binds
+
+
+@dataclass(frozen=True)
+class GeoSearchConfig:
+    """Tabela consultada e limites da escolha do plano (parameters: retrieval.geo_search)."""
+
+    table: str = "embeddings.fct_vector_geo_search"
+    column: str = "embedding"
+    column_type: str = "vector"
+    operator: str = "<=>"
+    # Filtros com até N linhas estimadas usam o prefiltro com distância exata
+    prefilter_max_rows: int = 20000
+    # Candidatos do HNSW = k / seletividade * oversample (margem para o pós-filtro)
+    oversample: float = 2.0
+    ef_search: int = 40
+    # Teto de candidatos do HNSW (o pgvector limita hnsw.ef_search a 1000)
+    max_candidates: int = 1000
+
+    @classmethod
+    def from_params(
+        cls, params: dict[str, Any], target: dict[str, Any], storage: StorageConfig
+    ) -> "GeoSearchConfig":
+        """
+        Args:
+            params (dict[str, Any]): Limites do plano (parameters: retrieval.geo_search).
+            target (dict[str, Any]): Tabela e índice HNSW (embedding_targets).
+            storage (StorageConfig): Tipo armazenado (vector ou halfvec).
+        """
+        index = storage.index(target["index"])
+        return cls(
+            table=sql_identifier(target["table"]),
+            column=sql_identifier(index["column"]),
+            column_type=storage.type,
+            operator=distance_operator(index["opclass"]),
+            prefilter_max_rows=params.get("prefilter_max_rows", cls.prefilter_max_rows),
+            oversample=params.get("oversample", cls.oversample),
+            ef_search=params.get("ef_search", cls.ef_search),
+            max_candidates=params.get("max_candidates", cls.max_candidates),
+        )
+
+
+def _ms(seconds: float) -> float:
+    return round(1000 * seconds, 3)
+
+
+def estimate_rows(
+    conn: Connection, query: GeoQuery, config: GeoSearchConfig
+) -> tuple[float, float]:
+    """
+    Estima as linhas que passam nos filtros pelo planejador (EXPLAIN, sem executar).
+
+    As estatísticas do PostGIS e do B-tree de avg_spend dão a seletividade de cada
+    filtro sem varrer a tabela.
+
+    Returns:
+        tuple[float, float]: Linhas estimadas e total de linhas da tabela (reltuples).
+    """
+    total = conn.execute(
+        text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": config.table},
+    ).scalar()
+    total = max(float(total or 0), 0.0)
+    if not query.has_filters:
+        return total, total
+
+    where, binds = query.where()
+    plan = conn.execute(
+        text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {config.table} WHERE {where}"),  # noqa: S608
+        binds,
+    ).scalar()
+    if plan is None:
+        # Sem plano não há estimativa: a tabela inteira (HNSW + pós-filtro)
+        return total, total
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0]["Plan"]["Plan Rows"]), total
+
+
+def choose_plan(estimated: float, total: float, config: GeoSearchConfig) -> str:
+    """Prefiltro quando os filtros deixam poucas linhas; HNSW + pós-filtro caso contrário."""
+    if total > 0 and estimated <= config.prefilter_max_rows:
+        return "prefilter"
+    return "hnsw"
+
+
+def hnsw_candidates(k: int, selectivity: float, config: GeoSearchConfig) -> int:
+    """Vizinhos pedidos ao HNSW para que, após o pós-filtro, restem k resultados."""
+    wanted = math.ceil(k / max(selectivity, 1e-9) * config.oversample)
+    return int(min(config.max_candidates, max(k, wanted)))
+
+
+def _search_sql(
+    plan: str, query: GeoQuery, config: GeoSearchConfig
+) -> tuple[str, dict[str, Any]]:
+    where, binds = query.where()
+    distance = f"{config.column} {config.operator} CAST(:q AS {config.column_type})"
+    distance_km = (
+        f"ST_Distance(user_geom, {_ORIGIN}) / 1000"
+        if query.has_point
+        else "NULL::float8"
+    )
+
+    if plan == "prefilter":
+        # MATERIALIZED: os candidatos vêm dos índices dos filtros e a distância é exata
+        sql = f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT {_RESULT_COLUMNS}, user_geom, {config.column}
+                FROM {config.table}
+                WHERE {where} AND {config.column} IS NOT NULL
+            )
+            SELECT {_RESULT_COLUMNS}, {distance_km} AS distance_km,
+                {distance} AS distance
+            FROM candidates
+            ORDER BY distance
+            LIMIT :k
+        """  # noqa: S608
+    else:
+        # O ORDER BY ... LIMIT interno usa o índice HNSW; os filtros valem depois
+        sql = f"""
+            WITH nearest AS MATERIALIZED (
+                SELECT {_RESULT_COLUMNS}, user_geom, {distance} AS distance
+                FROM {config.table}
+                ORDER BY distance
+                LIMIT :candidates
+            )
+            SELECT {_RESULT_COLUMNS}, {distance_km} AS distance_km, distance
+            FROM nearest
+            WHERE {where}
+            ORDER BY distance
+            LIMIT :k
+        """  # noqa: S608
+    return sql, binds
+
+
+def _run_plan(
+    conn: Connection,
+    plan: str,
+    query: GeoQuery,
+    config: GeoSearchConfig,
+    search_binds: dict[str, Any],
+) -> list[dict[str, Any]]:
+    """Executa um plano; `search_binds` traz o vetor (q) e os candidatos do HNSW."""
+    sql, binds = _search_sql(plan, query, config)
+    if plan == "hnsw":
+        # hnsw.ef_search limita os vizinhos devolvidos pelo índice
+        conn.execute(
+            text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+            {"ef": str(max(config.ef_search, search_binds["candidates"]))},
+        )
+    rows = conn.execute(text(sql), {**binds, **search_binds, "k": query.k})
+    return [dict(row._mapping) for row in rows]
+
+
+def search_users(
+    conn: Connection,
+    vector: np.ndarray | str,
+    query: GeoQuery,
+    config: GeoSearchConfig,
+    plan: str | None = None,
+) -> dict[str, Any]:
+    """
+    Busca os k usuários mais similares ao vetor que passam nos filtros de raio e gasto.
+
+    O plano é escolhido pela seletividade estimada dos filtros: com poucas linhas, os
+    índices GIST (raio) e B-tree (gasto) selecionam os candidatos e a distância vetorial
+    é calculada exatamente sobre eles; com filtros pouco seletivos, o HNSW devolve
+    k / seletividade * oversample vizinhos e os filtros são aplicados depois. Se o
+    pós-filtro deixar menos de k resultados, a busca é refeita com o prefiltro.
+
+    Args:
+        conn (Connection): Conexão SQLAlchemy dentro de uma transação (os SETs do HNSW
+            valem só nela).
+        vector (np.ndarray | str): Vetor da consulta (ou literal do pgvector).
+        query (GeoQuery): k e filtros.
+        config (GeoSearchConfig): Tabela e limites da escolha do plano.
+        plan (str | None): Força um plano ('prefilter' ou 'hnsw'); None escolhe.
+
+    Returns:
+        dict[str, Any]: Plano executado, linhas estimadas, seletividade, resultados
+        (ordenados pela distância) e tempos (ms) da estimativa e da busca.
+    """
+    if plan is not None and plan not in PLANS:
+        raise ValueError(f"Plano inválido: {plan} (opções: {PLANS}).")
+
+    start = time.perf_counter()
+    estimated, total = estimate_rows(conn, query, config)
+    selectivity = min(estimated / total, 1.0) if total else 1.0
+    estimate_s = time.perf_counter() - start
+
+    chosen = plan or choose_plan(estimated, total, config)
+    candidates = hnsw_candidates(query.k, selectivity, config)
+    search_binds = {
+        "q": vector if isinstance(vector, str) else vector_literal(vector),
+        "candidates": candidates,
+    }
+    search_start = time.perf_counter()
+    results = _run_plan(conn, chosen, query, config, search_binds)
+    fallback = chosen == "hnsw" and plan is None and len(results) < query.k
+    if fallback:
+        results = _run_plan(conn, "prefilter", query, config, search_binds)
+    search_s = time.perf_counter() - search_start
+
+    return {
+        "plan": chosen,
+        "fallback": fallback,
+        "estimated_rows": round(estimated),
+        "selectivity": round(selectivity, 6),
+        "candidates": candidates if chosen == "hnsw" else None,
+        "results": results,
+        "timings_ms": {
+            "estimate": _ms(estimate_s),
+            "search": _ms(search_s),
+            "total": _ms(time.perf_counter() - start),
+        },
+    }
+
+
+def hybrid_geo_search(
+    engine: Engine,
+    encoder: QueryEncoder,
+    query_text: str,
+    query: GeoQuery,
+    config: GeoSearchConfig,
+) -> dict[str, Any]:
+    """
+    Busca híbrida a partir de texto: codifica a consulta e executa `search_users`.
+
+    Returns:
+        dict[str, Any]: Saída de `search_users`, com o tempo de codificação e o total
+        em `timings_ms`.
+    """
+    start = time.perf_counter()
+    vector = encoder.encode([query_text])[0]
+    encode_s = time.perf_counter() - start
+
+    with engine.begin() as conn:
+        response = search_users(conn, vector, query, config)
+
+    response["timings_ms"] = {
+        "encode": _ms(encode_s),
+        **response["timings_ms"],
+        "total": _ms(time.perf_counter() - start),
+    }
+    return response
+
+
+def _spend_threshold(conn: Connection, config: GeoSearchConfig, fraction: float) -> Any:
+    """Gasto mínimo que deixa `fraction` das linhas (percentil de avg_spend)."""
+    return conn.execute(
+        text(f"""
+            SELECT percentile_cont(:p) WITHIN GROUP (ORDER BY avg_spend)
+            FROM {config.table}
+        """),  # noqa: S608
+        {"p": max(0.0, 1.0 - fraction)},
+    ).scalar()
+
+
+def benchmark_geo_search(
+    conn: Connection, config: GeoSearchConfig, benchmark: dict[str, Any]
+) -> dict[str, Any]:
+    """
+    Mede a latência dos dois planos e da escolha automática por nível de seletividade.
+
+    Cada nível é um filtro de gasto mínimo que deixa a fração indicada das linhas
+    (percentil de avg_spend). As consultas são vetores da própria tabela. O prefiltro é
+    exato e serve de referência do recall@k do HNSW + pós-filtro.
+
+    Args:
+        conn (Connection): Conexão SQLAlchemy (transação própria do benchmark).
+        config (GeoSearchConfig): Tabela e limites da escolha do plano.
+        benchmark (dict[str, Any]): queries (quantidade), k e a lista selectivity.
+
+    Returns:
+        dict[str, Any]: Por nível: seletividade estimada, plano escolhido e, por plano
+        ('prefilter', 'hnsw', 'auto'), recall@k e latências p50/p95 (ms).
+    """
+    k = int(benchmark["k"])
+    queries = (
+        conn.execute(
+            text(f"""
+                SELECT CAST({config.column} AS TEXT) FROM {config.table}
+                WHERE {config.column} IS NOT NULL
+                ORDER BY random() LIMIT :n
+            """),  # noqa: S608
+            {"n": int(benchmark["queries"])},
+        )
+        .scalars()
+        .all()
+    )
+    if not queries:
+        return {"queries": 0}
+
+    levels = []
+    for fraction in benchmark["selectivity"]:
+        query = GeoQuery(k=k, min_spend=_spend_threshold(conn, config, fraction))
+        level: dict[str, Any] = {"selectivity": fraction}
+        exact = []
+        for plan in ("prefilter", "hnsw", None):
+            responses = [search_users(conn, q, query, config, plan) for q in queries]
+            ids = [[r["user_id"] for r in resp["results"]] for resp in responses]
+            if plan == "prefilter":
+                exact = ids
+            recall = [
+                len(set(a) & set(e)) / max(len(e), 1)
+                for a, e in zip(ids, exact, strict=True)
+            ]
+            latency = [resp["timings_ms"]["total"] for resp in responses]
+            level[plan or "auto"] = {
+                "recall_at_k": round(float(np.mean(recall)), 4),
+                "p50_ms": round(float(np.percentile(latency, 50)), 3),
+                "p95_ms": round(float(np.percentile(latency, 95)), 3),
+            }
+            if plan is None:
+                level["estimated_selectivity"] = responses[0]["selectivity"]
+                level["chosen_plan"] = responses[0]["plan"]
+                level["fallbacks"] = sum(resp["fallback"] for resp in responses)
+        levels.append(level)
+
+    report = {"queries": len(queries), "k": k, "levels": levels}
+    logger.info(f"Benchmark da busca híbrida ({config.table}): {report}")
+    return report
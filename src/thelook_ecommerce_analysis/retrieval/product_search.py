@@ -0,0 +1,295 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any, Self
+
+from sqlalchemy import Engine, text
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import StorageConfig
+from thelook_ecommerce_analysis.utils.vector_index import (
+    distance_operator,
+    sql_identifier,
+    vector_literal,
+)
+
+from .query_encoder import QueryEncoder
+
+logger = logging.getLogger(__name__)
+
+_PRODUCT_COLUMNS = (
+    "p.id AS product_id, p.name, p.brand, p.category, p.department, p.retail_price"
+)
+
+
+@dataclass(frozen=True)
+class ProductSearchConfig:
+    """Tabelas, candidatos e cache da busca de produtos (parameters: retrieval.product_search)."""
+
+    table: str = "embeddings.products_embeddings"
+    column: str = "embedding"
+    column_type: str = "vector"
+    operator: str = "<=>"
+    # Candidatos de cada busca (trigramas e HNSW) antes da fusão
+    candidates: int = 50
+    # Constante da fusão por posição: 1 / (rrf_k + posição)
+    rrf_k: int = 60
+    # pg_trgm.similarity_threshold / word_similarity_threshold dos candidatos por trigramas
+    trigram_threshold: float = 0.3
+    ef_search: int = 40
+    cache_size: int = 1024
+    cache_ttl_s: float = 300.0
+
+    @classmethod
+    def from_params(
+        cls, params: dict[str, Any], target: dict[str, Any], storage: StorageConfig
+    ) -> "ProductSearchConfig":
+        """
+        Args:
+            params (dict[str, Any]): Candidatos, fusão e cache
+                (parameters: retrieval.product_search).
+            target (dict[str, Any]): Tabela e índice HNSW (embedding_targets).
+            storage (StorageConfig): Tipo armazenado (vector ou halfvec).
+        """
+        index = storage.index(target["index"])
+        return cls(
+            table=sql_identifier(target["table"]),
+            column=sql_identifier(index["column"]),
+            column_type=storage.type,
+            operator=distance_operator(index["opclass"]),
+            candidates=params.get("candidates", cls.candidates),
+            rrf_k=params.get("rrf_k", cls.rrf_k),
+            trigram_threshold=params.get("trigram_threshold", cls.trigram_threshold),
+            ef_search=params.get("ef_search", cls.ef_search),
+            cache_size=params.get("cache_size", cls.cache_size),
+            cache_ttl_s=params.get("cache_ttl_s", cls.cache_ttl_s),
+        )
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[Any]], rrf_k: int = 60
+) -> list[tuple[Any, float]]:
+    """
+    Combina rankings pela posição de cada item: soma de 1 / (rrf_k + posição).
+
+    A fusão usa só a posição, então escalas diferentes (similaridade de trigramas e
+    distância de cosseno) não precisam ser calibradas entre si.
+
+    Returns:
+        list[tuple[Any, float]]: Itens e pontuação, da maior para a menor (empates
+        mantêm a ordem de aparição).
+    """
+    scores: dict[Any, float] = {}
+    for ranking in rankings:
+        for position, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (rrf_k + position)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+class ResultCache:
+    """Cache LRU com expiração (TTL), seguro entre threads."""
+
+    def __init__(self, max_size: int, ttl_s: float) -> None:
+        self._max_size = max_size
+        self._ttl_s = ttl_s
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self._ttl_s:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ProductSearch:
+    """
+    Busca híbrida de produtos: trigramas (nome, marca, categoria) + similaridade vetorial.
+
+    A busca por trigramas (índices GIN gin_trgm_ops de raw_data.products) começa em uma
+    thread enquanto o texto é codificado; a busca HNSW em products_embeddings roda em
+    seguida na outra conexão. Os dois rankings são combinados por reciprocal rank
+    fusion e a resposta fica em cache por consulta.
+    """
+
+    def __init__(
+        self, engine: Engine, encoder: QueryEncoder, config: ProductSearchConfig
+    ) -> None:
+        self.engine = engine
+        self.encoder = encoder
+        self.config = config
+        self.cache = ResultCache(config.cache_size, config.cache_ttl_s)
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search")
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def _timed(self, func: Any, *args: Any) -> tuple[list[dict[str, Any]], float]:
+        start = time.perf_counter()
+        rows = func(*args)
+        return rows, time.perf_counter() - start
+
+    def _trigram_candidates(self, query_text: str) -> list[dict[str, Any]]:
+        """
+        Produtos com nome, marca ou categoria parecidos com a consulta.
+
+        O nome usa word_similarity (a consulta como trecho de um nome mais longo); marca
+        e categoria usam similarity. Os três operadores usam os índices GIN.
+        """
+        with self.engine.begin() as conn:
+            for setting in (
+                "pg_trgm.similarity_threshold",
+                "pg_trgm.word_similarity_threshold",
+            ):
+                conn.execute(
+                    text("SELECT set_config(:name, :value, true)"),
+                    {"name": setting, "value": str(self.config.trigram_threshold)},
+                )
+            rows = conn.execute(
+                text(f"""
+                    SELECT {_PRODUCT_COLUMNS},
+                        GREATEST(
+                            word_similarity(:q, p.name),
+                            similarity(p.brand, :q),
+                            similarity(p.category, :q)
+                        ) AS score
+                    FROM raw_data.products p
+                    WHERE :q <% p.name OR p.brand % :q OR p.category % :q
+                    ORDER BY score DESC, p.id
+                    LIMIT :n
+                """),  # noqa: S608
+                {"q": query_text, "n": self.config.candidates},
+            )
+            return [dict(row._mapping) for row in rows]
+
+    def _vector_candidates(self, literal: str) -> list[dict[str, Any]]:
+        """Vizinhos mais próximos do vetor da consulta pelo índice HNSW."""
+        config = self.config
+        with self.engine.begin() as conn:
+            # hnsw.ef_search limita os vizinhos devolvidos pelo índice
+            conn.execute(
+                text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+                {"ef": str(max(config.ef_search, config.candidates))},
+            )
+            rows = conn.execute(
+                text(f"""
+                    WITH nearest AS MATERIALIZED (
+                        SELECT source_id,
+                            {config.column} {config.operator}
+                                CAST(:q AS {config.column_type}) AS distance
+                        FROM {config.table}
+                        ORDER BY distance
+                        LIMIT :n
+                    )
+                    SELECT {_PRODUCT_COLUMNS}, n.distance AS score
+                    FROM nearest n
+                    JOIN raw_data.products p ON p.id = n.source_id
+                    ORDER BY n.distance, p.id
+                """),  # noqa: S608
+                {"q": literal, "n": config.candidates},
+            )
+            return [dict(row._mapping) for row in rows]
+
+    def search(self, query_text: str, k: int = 10) -> dict[str, Any]:
+        """
+        Busca os k produtos mais relevantes para o texto.
+
+        Args:
+            query_text (str): Texto livre (ex: 'calça jeans masculina levis').
+            k (int): Produtos retornados.
+
+        Returns:
+            dict[str, Any]: Produtos (com a pontuação da fusão e a posição em cada
+            busca), se veio do cache e os tempos (ms) de cada etapa: codificação,
+            trigramas, vetorial, fusão e total.
+        """
+        start = time.perf_counter()
+        query_text = " ".join(query_text.split())
+        key = (query_text.lower(), k)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return {
+                **cached,
+                "cached": True,
+                "timings_ms": {"total": round(1000 * (time.perf_counter() - start), 3)},
+            }
+
+        trigram = self._pool.submit(self._timed, self._trigram_candidates, query_text)
+        encode_start = time.perf_counter()
+        vector = self.encoder.encode([query_text])[0]
+        encode_s = time.perf_counter() - encode_start
+        semantic = self._pool.submit(
+            self._timed, self._vector_candidates, vector_literal(vector)
+        )
+        trigram_rows, trigram_s = trigram.result()
+        vector_rows, vector_s = semantic.result()
+
+        fusion_start = time.perf_counter()
+        products = {row["product_id"]: row for row in [*vector_rows, *trigram_rows]}
+        trigram_rank = {row["product_id"]: i for i, row in enumerate(trigram_rows, 1)}
+        vector_rank = {row["product_id"]: i for i, row in enumerate(vector_rows, 1)}
+        fused = reciprocal_rank_fusion(
+            [list(trigram_rank), list(vector_rank)], self.config.rrf_k
+        )[:k]
+        results = [
+            {
+                **{c: v for c, v in products[pid].items() if c != "score"},
+                "score": round(score, 6),
+                "trigram_rank": trigram_rank.get(pid),
+                "vector_rank": vector_rank.get(pid),
+            }
+            for pid, score in fused
+        ]
+        fusion_s = time.perf_counter() - fusion_start
+
+        response = {
+            "query": query_text,
+            "results": results,
+            "cached": False,
+            "timings_ms": {
+                "encode": round(1000 * encode_s, 3),
+                "trigram": round(1000 * trigram_s, 3),
+                "vector": round(1000 * vector_s, 3),
+                "fusion": round(1000 * fusion_s, 3),
+                "total": round(1000 * (time.perf_counter() - start), 3),
+            },
+        }
+        self.cache.put(key, {"query": query_text, "results": results})
+        logger.debug(f"Busca de produtos '{query_text}': {response['timings_ms']}")
+        return response
@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.encoder import (
+    EncoderConfig,
+    encode_texts,
+)
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import (
+    PcaProjection,
+    StorageConfig,
+    pca_path,
+)
+
+
+@dataclass(frozen=True)
+class QueryEncoder:
+    """
+    Codifica textos de consulta no mesmo espaço dos vetores gravados em uma tabela.
+
+    Usa o modelo e o backend do pipeline data_embedding e, com a PCA ligada, a mesma
+    projeção salva pela carga da tabela.
+    """
+
+    config: EncoderConfig
+    storage: StorageConfig
+    projection: PcaProjection | None = None
+
+    @classmethod
+    def from_params(cls, params: dict[str, Any], table: str) -> "QueryEncoder":
+        """
+        Args:
+            params (dict[str, Any]): Configuração dos embeddings (parameters: embedding).
+            table (str): Tabela consultada (ex: 'embeddings.fct_vector_geo_search').
+        """
+        config = EncoderConfig.from_params(params)
+        storage = StorageConfig.from_params(params)
+        projection = None
+        if storage.pca_dimensions:
+            path = pca_path(storage, table, config.fingerprint)
+            if not path.exists():
+                raise FileNotFoundError(
+                    f"PCA de {table} não encontrada em {path}: execute o pipeline "
+                    "data_embedding antes da busca."
+                )
+            projection = PcaProjection.load(path)
+        return cls(config=config, storage=storage, projection=projection)
+
+    @property
+    def column_type(self) -> str:
+        """Tipo pgvector do CAST da consulta (vector ou halfvec)."""
+        return self.storage.type
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Vetores normalizados (e reduzidos pela PCA, se houver) no próprio processo."""
+        vectors = encode_texts(texts, self.config, batch_size=max(len(texts), 1))
+        if self.projection is not None:
+            vectors = self.projection.transform(vectors)
+        return vectors.astype(np.float32, copy=False)
@@ -0,0 +1,106 @@
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.encoder import (
+    EncoderConfig,
+    encode_texts,
+)
+from thelook_ecommerce_analysis.utils.vector_snapshot import read_stamp
+
+from .vector_cache import SnapshotCache, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Nome do snapshot gravado pelo nó build_schema_context_node
+SCHEMA_CONTEXT = "schema_context"
+
+
+@dataclass(frozen=True)
+class SchemaContext:
+    """
+    Catálogo comentado das tabelas (texto compacto + embedding por tabela) para o prompt.
+
+    Montar o contexto de uma pergunta é uma busca em memória: as tabelas mais similares
+    à pergunta, sem consultas ao catálogo do banco.
+    """
+
+    index: VectorIndex
+    tables: list[dict[str, Any]]
+    model: str
+
+    @classmethod
+    def load(
+        cls, directory: Path, name: str = SCHEMA_CONTEXT, mmap: bool = False
+    ) -> "SchemaContext":
+        """Carrega a versão do carimbo gravado pelo pipeline data_embedding."""
+        index = VectorIndex.load(directory, name, mmap)
+        stamp = read_stamp(directory, name)
+        if stamp is None or stamp["version"] != index.version:
+            # Nova versão gravada entre as duas leituras: carrega a versão do carimbo
+            return cls.load(directory, name, mmap)
+        return cls(index=index, tables=stamp["tables"], model=stamp["model"])
+
+    @property
+    def version(self) -> str:
+        return self.index.version
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def relevant(
+        self, query: np.ndarray, k: int, min_score: float = 0.0
+    ) -> list[dict[str, Any]]:
+        """
+        As até k tabelas mais similares à pergunta (a mais similar é sempre incluída).
+
+        Returns:
+            list[dict[str, Any]]: Nome, tipo, texto do prompt e similaridade.
+        """
+        ids, scores = self.index.top_k(query, k)
+        return [
+            {**self.tables[int(i)], "score": round(float(score), 4)}
+            for position, (i, score) in enumerate(zip(ids, scores, strict=True))
+            if position == 0 or score >= min_score
+        ]
+
+    def prompt(
+        self,
+        question: str,
+        config: EncoderConfig,
+        k: int = 4,
+        min_score: float = 0.0,
+    ) -> str:
+        """
+        Contexto de schema do prompt de Text-to-SQL para uma pergunta.
+
+        Args:
+            question (str): Pergunta em linguagem natural.
+            config (EncoderConfig): Modelo dos embeddings (o mesmo da geração do catálogo).
+            k (int): Tabelas incluídas.
+            min_score (float): Similaridade mínima de cosseno.
+
+        Returns:
+            str: Texto compacto (colunas, tipos e comentários) das tabelas relevantes.
+        """
+        if config.fingerprint != self.model:
+            raise ValueError(
+                f"Contexto de schema gerado com {self.model}, consulta com "
+                f"{config.fingerprint}: execute o pipeline data_embedding."
+            )
+        vector = encode_texts([question], config, batch_size=1)[0]
+        tables = self.relevant(vector, k, min_score)
+        logger.debug(
+            f"Contexto de schema para '{question}': {[t['name'] for t in tables]}"
+        )
+        return "\n\n".join(table["text"] for table in tables)
+
+
+class SchemaContextCache(SnapshotCache[SchemaContext]):
+    """Mantém o `SchemaContext` carregado no app e o recarrega quando o carimbo muda."""
+
+    def __init__(self, directory: Path, name: str = SCHEMA_CONTEXT) -> None:
+        super().__init__(directory, name, SchemaContext.load, mmap=False)
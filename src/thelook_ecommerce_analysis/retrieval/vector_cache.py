@@ -0,0 +1,154 @@
+import logging
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Generic, Protocol, TypeVar
+
+import numpy as np
+
+from thelook_ecommerce_analysis.utils.vector_snapshot import (
+    load_snapshot,
+    read_stamp,
+    stamp_path,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class VectorIndex:
+    """
+    Índice vetorial somente leitura em memória: busca exata por produto interno (BLAS).
+
+    Os vetores são normalizados, então o produto interno é a similaridade de cosseno. A
+    matriz é float32 contígua (ou mapeada do .npy), e os ids estão em ordem crescente.
+    """
+
+    ids: np.ndarray
+    vectors: np.ndarray
+    version: str
+
+    @classmethod
+    def load(cls, directory: Path, name: str, mmap: bool = True) -> "VectorIndex":
+        """Carrega a versão indicada pelo carimbo do snapshot exportado pelo pipeline."""
+        stamp = read_stamp(directory, name)
+        if stamp is None:
+            raise FileNotFoundError(
+                f"Snapshot {name} não encontrado em {directory}: execute o pipeline "
+                "data_embedding."
+            )
+        ids, vectors = load_snapshot(directory, stamp, mmap)
+        return cls(ids=ids, vectors=vectors, version=stamp["version"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vector(self, item_id: int) -> np.ndarray:
+        """Vetor armazenado de um id (busca binária nos ids ordenados)."""
+        position = int(np.searchsorted(self.ids, item_id))
+        if position >= len(self.ids) or self.ids[position] != item_id:
+            raise KeyError(item_id)
+        return np.asarray(self.vectors[position])
+
+    def top_k(
+        self, query: np.ndarray, k: int, exclude: Any = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Os k vetores mais similares à consulta.
+
+        Args:
+            query (np.ndarray): Vetor normalizado (mesma dimensão e espaço do snapshot).
+            k (int): Resultados.
+            exclude (Any): Id ignorado (ex: o próprio produto em `similar`).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Ids e similaridades, da maior para a menor.
+        """
+        # Produto matriz-vetor (sgemv) sobre a matriz inteira
+        scores = self.vectors @ np.asarray(query, np.float32)
+        if exclude is not None:
+            scores[self.ids == exclude] = -np.inf
+        k = min(k, len(scores) - (exclude is not None))
+        if k <= 0:
+            return np.empty(0, self.ids.dtype), np.empty(0, np.float32)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.ids[top], scores[top]
+
+    def similar(self, item_id: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Os k itens mais similares a um item do snapshot (sem codificar texto)."""
+        return self.top_k(self.vector(item_id), k, exclude=item_id)
+
+
+class Versioned(Protocol):
+    """Objeto carregado de um snapshot: a versão vem do carimbo."""
+
+    @property
+    def version(self) -> str: ...
+
+    def __len__(self) -> int: ...
+
+
+T = TypeVar("T", bound=Versioned)
+
+
+class SnapshotCache(Generic[T]):  # noqa: UP046
+    """
+    Mantém carregado no processo da aplicação o objeto de um snapshot versionado.
+
+    A cada `get`, o carimbo de versão do snapshot é conferido (stat do arquivo; o JSON
+    só é lido quando o arquivo muda) e o objeto é recarregado quando o pipeline exporta
+    uma nova versão. Seguro entre threads (sessões do Streamlit).
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        name: str,
+        loader: Callable[[Path, str, bool], T],
+        mmap: bool = True,
+    ) -> None:
+        self.directory = Path(directory)
+        self.name = name
+        self.mmap = mmap
+        self._loader = loader
+        self._value: T | None = None
+        self._stamp_mtime: int | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """Objeto da versão atual (recarregado se o carimbo mudou)."""
+        path = stamp_path(self.directory, self.name)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        with self._lock:
+            if self._value is not None and mtime == self._stamp_mtime:
+                return self._value
+
+            stamp = read_stamp(self.directory, self.name)
+            if stamp is None:
+                if self._value is None:
+                    # Pipeline ainda não executado: FileNotFoundError com a orientação
+                    return self._loader(self.directory, self.name, self.mmap)
+                # Carimbo removido: mantém a última versão carregada
+                return self._value
+            if self._value is None or stamp["version"] != self._value.version:
+                self._value = self._loader(self.directory, self.name, self.mmap)
+                logger.info(
+                    f"Snapshot {self.name} carregado: versão {self._value.version}, "
+                    f"{len(self._value)} itens."
+                )
+            self._stamp_mtime = mtime
+            return self._value
+
+
+class VectorIndexCache(SnapshotCache[VectorIndex]):
+    """Mantém um `VectorIndex` carregado no processo da aplicação."""
+
+    def __init__(self, directory: Path, name: str, mmap: bool = True) -> None:
+        super().__init__(directory, name, VectorIndex.load, mmap)
@@ -1,11 +1,15 @@
 from dotenv import load_dotenv
 from kedro.config import OmegaConfigLoader
 
-from thelook_ecommerce_analysis.hooks import CreateIndexesHook, ResourceMonitoringHook
+from thelook_ecommerce_analysis.hooks import (
+    CreateIndexesHook,
+    FileCountsReportHook,
+    ResourceMonitoringHook,
+)
 
 load_dotenv()
 
-HOOKS = (ResourceMonitoringHook(), CreateIndexesHook())
+HOOKS = (ResourceMonitoringHook(), CreateIndexesHook(), FileCountsReportHook())
 
 CONFIG_LOADER_CLASS = OmegaConfigLoader
 
@@ -0,0 +1,252 @@
+import logging
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Connection, Engine, text
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChangeWindow:
+    """Intervalo (from_seq, to_seq] do raw_data.change_log ainda não processado por um consumidor."""
+
+    consumer: str
+    from_seq: int
+    to_seq: int
+    # Consumidor sem watermark: precisa reconstruir a tabela derivada inteira
+    full_refresh: bool = False
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.full_refresh and self.to_seq <= self.from_seq
+
+    def params(self) -> dict[str, Any]:
+        """Parâmetros nomeados usados pelos scripts SQL de refresh."""
+        return {
+            "from_seq": self.from_seq,
+            "to_seq": self.to_seq,
+            "full_refresh": self.full_refresh,
+        }
+
+
+def open_window(
+    conn: Connection, consumer: str, schema: str = "raw_data"
+) -> ChangeWindow:
+    """Lê o watermark do consumidor e o último seq registrado no change_log."""
+    last_seq = conn.execute(
+        text(f"SELECT last_seq FROM {schema}.refresh_state WHERE consumer = :consumer"),  # noqa: S608
+        {"consumer": consumer},
+    ).scalar()
+    max_seq = conn.execute(
+        text(f"SELECT COALESCE(MAX(seq), 0) FROM {schema}.change_log")  # noqa: S608
+    ).scalar()
+
+    return ChangeWindow(
+        consumer,
+        from_seq=int(last_seq or 0),
+        to_seq=int(max_seq or 0),
+        full_refresh=last_seq is None,
+    )
+
+
+def commit_window(
+    conn: Connection, window: ChangeWindow, schema: str = "raw_data"
+) -> None:
+    """Avança o watermark do consumidor até o fim da janela processada."""
+    conn.execute(
+        text(f"""
+            INSERT INTO {schema}.refresh_state (consumer, last_seq, refreshed_at)
+            VALUES (:consumer, :to_seq, now())
+            ON CONFLICT (consumer) DO UPDATE
+            SET last_seq = EXCLUDED.last_seq, refreshed_at = EXCLUDED.refreshed_at
+        """),  # noqa: S608
+        {"consumer": window.consumer, "to_seq": window.to_seq},
+    )
+
+
+def prune_change_log(conn: Connection, schema: str = "raw_data") -> int:
+    """
+    Remove os registros do change_log já processados por todos os consumidores.
+
+    Apenas os seqs abaixo do menor watermark do refresh_state são removidos (sem
+    consumidores registrados, nada é removido). Consumidores novos começam por uma
+    reconstrução completa, então não dependem dos registros removidos.
+    """
+    result = conn.execute(
+        text(f"""
+            DELETE FROM {schema}.change_log
+            WHERE seq < (SELECT min(last_seq) FROM {schema}.refresh_state)
+        """)  # noqa: S608
+    )
+    return max(result.rowcount, 0)
+
+
+@dataclass(frozen=True)
+class RefreshSpec:
+    """Definição do refresh de uma tabela derivada a partir do change_log."""
+
+    consumer: str
+    # Script de reconstrução completa
+    full_query: str
+    # Script incremental (janela do change_log). Sem ele, toda alteração gera refresh completo
+    incremental_query: str | None = None
+    # Tabelas de raw_data observadas. None: qualquer alteração no change_log
+    sources: list[str] | None = None
+    # Fontes tratadas pelo script incremental (padrão: todas as sources). Alterações
+    # em outras fontes (ex: custo em products) exigem reconstrução completa
+    incremental_sources: list[str] | None = None
+
+
+def changed_tables(
+    conn: Connection, window: ChangeWindow, sources: list[str], schema: str = "raw_data"
+) -> list[str]:
+    """Retorna as fontes com registros no change_log dentro da janela."""
+    # Uma busca por fonte no índice (table_name, seq), sem varrer a janela inteira
+    return list(
+        conn.execute(
+            text(f"""
+                SELECT s FROM unnest(CAST(:sources AS TEXT[])) AS s
+                WHERE EXISTS (
+                    SELECT 1 FROM {schema}.change_log c
+                    WHERE c.table_name = s AND c.seq > :from_seq AND c.seq <= :to_seq
+                )
+            """),  # noqa: S608
+            {"sources": list(sources), **window.params()},
+        )
+        .scalars()
+        .all()
+    )
+
+
+def choose_mode(spec: RefreshSpec, window: ChangeWindow, changed: list[str]) -> str:
+    """Decide entre reconstrução completa (full), incremental ou skip."""
+    if window.full_refresh:
+        return "full"
+
+    if window.is_empty or (spec.sources is not None and not changed):
+        return "skip"
+
+    if spec.incremental_query is None:
+        return "full"
+
+    handled = (
+        spec.incremental_sources
+        if spec.incremental_sources is not None
+        else spec.sources
+    )
+    if handled is not None and not set(changed) <= set(handled):
+        return "full"
+
+    return "incremental"
+
+
+def split_statements(sql: str) -> list[str]:
+    """Separa um script SQL em comandos (terminados por ';' no fim da linha)."""
+    statements = []
+    for chunk in re.split(r";[ \t]*(?:\n|$)", sql):
+        # Remove linhas de comentário: parâmetros citados nelas não devem virar binds
+        lines = [
+            line
+            for line in chunk.splitlines()
+            if line.strip() and not line.strip().startswith("--")
+        ]
+        if lines:
+            statements.append("\n".join(lines))
+    return statements
+
+
+def run_refresh(
+    engine: Engine, spec: RefreshSpec, params: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    """
+    Atualiza uma tabela derivada escolhendo o modo a partir das fontes alteradas.
+
+    Os scripts podem conter vários comandos e usar os parâmetros `:from_seq`,
+    `:to_seq`, `:full_refresh` e os informados em `params`. O refresh e o avanço do
+    watermark ocorrem na mesma transação: em caso de falha, a janela é reprocessada
+    na próxima execução.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do banco de destino.
+        spec (RefreshSpec): Scripts e fontes observadas da tabela derivada.
+        params (dict[str, Any] | None): Parâmetros adicionais dos scripts.
+
+    Returns:
+        dict[str, Any]: Relatório com o modo, a janela, as fontes alteradas, as linhas
+        afetadas e a duração.
+    """
+    start = time.perf_counter()
+
+    with engine.begin() as conn:
+        window = open_window(conn, spec.consumer)
+
+        changed = []
+        if spec.sources is not None and not window.is_empty:
+            changed = changed_tables(conn, window, spec.sources)
+
+        mode = choose_mode(spec, window, changed)
+
+        rows = 0
+        if mode != "skip":
+            query_path = spec.full_query if mode == "full" else spec.incremental_query
+            query = Path(str(query_path)).read_text(encoding="utf-8")
+            bind = {
+                **window.params(),
+                "full_refresh": mode == "full",
+                **(params or {}),
+            }
+
+            for statement in split_statements(query):
+                rows += max(conn.execute(text(statement), bind).rowcount, 0)
+
+            commit_window(conn, window)
+
+    # Após o commit do watermark: em transação própria, sem prolongar a do refresh
+    pruned = 0
+    if mode != "skip":
+        with engine.begin() as conn:
+            pruned = prune_change_log(conn)
+
+    duration = time.perf_counter() - start
+    logger.info(
+        f"{spec.consumer}: refresh {mode} (seq {window.from_seq} -> {window.to_seq}, "
+        f"fontes alteradas: {changed or '-'}) afetou {rows} linhas em {duration:.2f}s "
+        f"({pruned} registros do change_log removidos)."
+    )
+
+    return {
+        "consumer": spec.consumer,
+        "mode": mode,
+        "from_seq": window.from_seq,
+        "to_seq": window.to_seq,
+        "changed_sources": changed,
+        "rows": rows,
+        "pruned_change_log": pruned,
+        "duration_s": round(duration, 3),
+    }
+
+
+def run_incremental_refresh(
+    engine: Engine, consumer: str, query_path: str
+) -> dict[str, Any]:
+    """
+    Executa um script SQL de refresh incremental sobre a janela pendente do change_log.
+
+    O mesmo script é usado na reconstrução completa (parâmetro `:full_refresh`).
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do banco de destino.
+        consumer (str): Nome da tabela derivada (chave do watermark).
+        query_path (str): Caminho do script SQL de refresh.
+
+    Returns:
+        dict[str, Any]: Relatório com a janela processada, linhas afetadas e duração.
+    """
+    return run_refresh(
+        engine,
+        RefreshSpec(consumer, full_query=query_path, incremental_query=query_path),
+    )
@@ -0,0 +1,149 @@
+from typing import NamedTuple
+
+import numpy as np
+import pyarrow as pa
+
+# Raio médio da Terra (IUGG). Não é o da esfera do PostGIS (use_spheroid=false usa
+# ~6370.986 km), e o ST_Distance de geography usa por padrão o esferoide WGS84: as
+# distâncias do PostGIS diferem da haversine em até ~0,5% (ver benchmark_nearest_dc)
+EARTH_RADIUS_KM = 6371.0088
+
+
+class Points(NamedTuple):
+    """Conjunto de pontos identificados (coordenadas em graus)."""
+
+    ids: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+
+
+def haversine_matrix(
+    lat_a: np.ndarray, lon_a: np.ndarray, lat_b: np.ndarray, lon_b: np.ndarray
+) -> np.ndarray:
+    """
+    Calcula a distância (km) de cada ponto A para cada ponto B em uma única passada vetorizada.
+
+    Args:
+        lat_a, lon_a (np.ndarray): Coordenadas (graus) dos N pontos de origem.
+        lat_b, lon_b (np.ndarray): Coordenadas (graus) dos M pontos de destino.
+
+    Returns:
+        np.ndarray: Matriz (N, M) de distâncias pela fórmula de haversine.
+    """
+    lat_a = np.radians(np.asarray(lat_a, dtype=np.float64))[:, None]
+    lon_a = np.radians(np.asarray(lon_a, dtype=np.float64))[:, None]
+    lat_b = np.radians(np.asarray(lat_b, dtype=np.float64))[None, :]
+    lon_b = np.radians(np.asarray(lon_b, dtype=np.float64))[None, :]
+
+    h = (
+        np.sin((lat_b - lat_a) / 2) ** 2
+        + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def rank_by_row(distances: np.ndarray) -> np.ndarray:
+    """Posição de cada coluna na sua linha, em ordem crescente (1 = mais próximo)."""
+    order = np.argsort(distances, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(
+        ranks, order, np.arange(1, distances.shape[1] + 1)[None, :], axis=1
+    )
+    return ranks
+
+
+def distance_rank_table(users: Points, centers: Points) -> pa.Table:
+    """
+    Monta a matriz de distâncias usuário x CD em formato longo: uma linha por par.
+
+    Returns:
+        pa.Table: Colunas user_id, dc_id, distance_km e dc_rank (1 = CD mais próximo).
+    """
+    distances = haversine_matrix(users.lat, users.lon, centers.lat, centers.lon)
+    ranks = rank_by_row(distances)
+    n_users, n_centers = distances.shape
+
+    return pa.table(
+        {
+            "user_id": pa.array(np.repeat(users.ids, n_centers), pa.int32()),
+            "dc_id": pa.array(np.tile(centers.ids, n_users), pa.int32()),
+            "distance_km": pa.array(distances.ravel().round(3), pa.float64()),
+            "dc_rank": pa.array(ranks.ravel(), pa.int16()),
+        }
+    )
+
+
+# Grade hierárquica (quadtree) sobre lat/lon: na resolução r há 2^r x 2^r células e o id
+# intercala os bits de x (longitude) e y (latitude) (ordem Z/Morton). O pai de uma célula
+# na resolução r - k é `cell >> 2k`, então a resolução mais fina determina todas as outras.
+MAX_GRID_RESOLUTION = 24
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Intercala zeros entre os bits (x -> x0x0x0...), para até 32 bits."""
+    v = values.astype(np.uint64)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def _compact_bits(values: np.ndarray) -> np.ndarray:
+    """Inverso de `_spread_bits`: recupera os bits das posições pares."""
+    v = values.astype(np.uint64) & np.uint64(0x5555555555555555)
+    for shift, mask in (
+        (1, 0x3333333333333333),
+        (2, 0x0F0F0F0F0F0F0F0F),
+        (4, 0x00FF00FF00FF00FF),
+        (8, 0x0000FFFF0000FFFF),
+        (16, 0x00000000FFFFFFFF),
+    ):
+        v = (v | (v >> np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def grid_cells(lat: np.ndarray, lon: np.ndarray, resolution: int) -> np.ndarray:
+    """
+    Calcula o id da célula da grade hierárquica de cada ponto, de forma vetorizada.
+
+    Args:
+        lat, lon (np.ndarray): Coordenadas em graus.
+        resolution (int): Resolução da grade (2^resolution células por eixo).
+
+    Returns:
+        np.ndarray: Ids das células (int64), únicos dentro da resolução.
+    """
+    if not 0 <= resolution <= MAX_GRID_RESOLUTION:
+        raise ValueError(
+            f"Resolução inválida: {resolution} (0 a {MAX_GRID_RESOLUTION})."
+        )
+
+    n = 1 << resolution
+    x = np.clip(
+        ((np.asarray(lon, np.float64) + 180) / 360 * n).astype(np.int64), 0, n - 1
+    )
+    y = np.clip(
+        ((np.asarray(lat, np.float64) + 90) / 180 * n).astype(np.int64), 0, n - 1
+    )
+    return (_spread_bits(x) | (_spread_bits(y) << np.uint64(1))).astype(np.int64)
+
+
+def parent_cells(
+    cells: np.ndarray, resolution: int, parent_resolution: int
+) -> np.ndarray:
+    """Id das células ancestrais na resolução mais grossa `parent_resolution`."""
+    return np.asarray(cells, np.int64) >> (2 * (resolution - parent_resolution))
+
+
+def cell_centers(cells: np.ndarray, resolution: int) -> tuple[np.ndarray, np.ndarray]:
+    """Coordenadas (lat, lon) do centro de cada célula."""
+    cells = np.asarray(cells, np.int64).astype(np.uint64)
+    n = 1 << resolution
+    x = _compact_bits(cells).astype(np.float64)
+    y = _compact_bits(cells >> np.uint64(1)).astype(np.float64)
+    return (y + 0.5) / n * 180 - 90, (x + 0.5) / n * 360 - 180
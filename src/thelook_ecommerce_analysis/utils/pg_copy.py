@@ -0,0 +1,273 @@
+import struct
+from collections.abc import Iterator
+from typing import cast
+
+import numpy as np
+import numpy.typing as npt
+import pyarrow as pa
+from pgpq import ArrowToPostgresBinaryEncoder
+from sqlalchemy import Connection
+
+# Cabeçalho (assinatura, flags e extensão vazia) e terminador do COPY ... FORMAT BINARY
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+# Tipos Arrow de largura fixa -> representação binária (big-endian) do PostgreSQL
+_FIXED_WIDTH = {
+    pa.bool_(): np.dtype("u1"),
+    pa.int16(): np.dtype(">i2"),
+    pa.int32(): np.dtype(">i4"),
+    pa.int64(): np.dtype(">i8"),
+    pa.float32(): np.dtype(">f4"),
+    pa.float64(): np.dtype(">f8"),
+}
+
+# Vetores (FixedSizeList) -> elemento dos tipos vector (float32) e halfvec (float16) do pgvector
+_VECTOR_ITEMS = {pa.float32(): np.dtype(">f4"), pa.float16(): np.dtype(">f2")}
+
+# Linhas por lote do encoder NumPy (limita a memória dos índices de cada lote)
+VECTOR_COPY_BATCH_ROWS = 2048
+
+
+def is_vector_type(data_type: pa.DataType) -> bool:
+    """FixedSizeList de float32/float16: gravado como vector/halfvec do pgvector."""
+    return pa.types.is_fixed_size_list(data_type) and (
+        data_type.value_type in _VECTOR_ITEMS
+    )
+
+
+def _field_payload(
+    column: pa.Array,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+    """
+    Bytes de cada campo de uma coluna.
+
+    Returns:
+        tuple: Dados (matriz (n, largura) para tipos fixos ou buffer contínuo), tamanho do
+        campo por linha (-1 para nulo) e o início de cada campo no buffer (None se matriz).
+    """
+    n = len(column)
+    valid = (
+        np.ones(n, bool)
+        if column.null_count == 0
+        else np.asarray(column.is_valid().to_numpy(zero_copy_only=False))
+    )
+    data_type = column.type
+
+    if data_type in _FIXED_WIDTH:
+        dtype = _FIXED_WIDTH[data_type]
+        values = column.fill_null(False if data_type == pa.bool_() else 0)
+        matrix = values.to_numpy(zero_copy_only=False).astype(dtype).view(np.uint8)
+        sizes = np.where(valid, dtype.itemsize, -1)
+        return matrix.reshape(n, dtype.itemsize), sizes, None
+
+    if is_vector_type(data_type):
+        dim = data_type.list_size
+        item = _VECTOR_ITEMS[data_type.value_type]
+        # Valores da fatia (inclui os slots nulos): sem conversão para listas Python
+        values = column.values.slice(column.offset * dim, n * dim)
+        record = cast(
+            "npt.NDArray[np.void]",
+            np.empty(
+                n, np.dtype([("dim", ">i2"), ("unused", ">i2"), ("v", item, (dim,))])
+            ),
+        )
+        record["dim"] = dim
+        record["unused"] = 0
+        record["v"] = values.to_numpy(zero_copy_only=False).reshape(n, dim)
+        sizes = np.where(valid, record.dtype.itemsize, -1)
+        return record.view(np.uint8).reshape(n, record.dtype.itemsize), sizes, None
+
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type):
+        offset_type = np.int64 if pa.types.is_large_string(data_type) else np.int32
+        _, offsets_buffer, data_buffer = column.buffers()
+        offsets = np.frombuffer(offsets_buffer, offset_type)[
+            column.offset : column.offset + n + 1
+        ].astype(np.int64)
+        data = (
+            np.frombuffer(data_buffer, np.uint8)
+            if data_buffer is not None
+            else np.empty(0, np.uint8)
+        )
+        sizes = np.where(valid, np.diff(offsets), -1)
+        return data, sizes, offsets[:-1]
+
+    raise TypeError(
+        f"Tipo Arrow sem encoder binário: {data_type} (suportados: inteiros, float, "
+        "bool, string e FixedSizeList de float32/float16)."
+    )
+
+
+def _ranges(starts: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """Concatena os intervalos [start, start + size) sem laço Python."""
+    total = int(sizes.sum())
+    if total == 0:
+        return np.empty(0, np.int64)
+    ends = np.cumsum(sizes)
+    within = np.arange(total) - np.repeat(ends - sizes, sizes)
+    return np.repeat(starts, sizes) + within
+
+
+def encode_copy_rows(batch: pa.RecordBatch) -> bytes:
+    """
+    Codifica as linhas de um lote no formato binário do COPY (sem cabeçalho/terminador).
+
+    Cada linha é `int16 (colunas)` seguido de `int32 (tamanho)` + bytes por campo. Os
+    bytes de cada coluna são montados em NumPy e posicionados por índices vetorizados:
+    a matriz de embeddings nunca é convertida em listas Python.
+    """
+    n = batch.num_rows
+    payloads = [_field_payload(column) for column in batch.columns]
+
+    # Bytes de cada campo: 4 do tamanho + dados (nulos não têm dados)
+    field_bytes = np.stack([4 + np.maximum(sizes, 0) for _, sizes, _ in payloads])
+    row_sizes = 2 + field_bytes.sum(axis=0)
+    row_starts = np.concatenate(([0], np.cumsum(row_sizes)[:-1]))
+    out = np.empty(int(row_sizes.sum()), np.uint8)
+
+    count = np.frombuffer(struct.pack(">h", batch.num_columns), np.uint8)
+    out[row_starts[:, None] + np.arange(2)] = count
+
+    field_starts = row_starts + 2
+    for (data, sizes, starts), width in zip(payloads, field_bytes, strict=True):
+        length = sizes.astype(">i4").view(np.uint8).reshape(n, 4)
+        out[field_starts[:, None] + np.arange(4)] = length
+
+        valid = sizes >= 0
+        if starts is None:
+            # Largura fixa: um bloco por linha
+            block = data.shape[1]
+            out[(field_starts[valid] + 4)[:, None] + np.arange(block)] = data[valid]
+        else:
+            out[_ranges(field_starts[valid] + 4, sizes[valid])] = data[
+                _ranges(starts[valid], sizes[valid])
+            ]
+        field_starts = field_starts + width
+
+    return out.tobytes()
+
+
+def iter_copy_binary(
+    arrow_table: pa.Table, batch_rows: int = VECTOR_COPY_BATCH_ROWS
+) -> Iterator[bytes]:
+    """Gera o fluxo completo do COPY binário (cabeçalho, lotes de linhas e terminador)."""
+    yield COPY_HEADER
+    for batch in arrow_table.to_batches(max_chunksize=batch_rows):
+        if batch.num_rows:
+            yield encode_copy_rows(batch)
+    yield COPY_TRAILER
+
+
+def copy_arrow_binary(conn: Connection, target: str, arrow_table: pa.Table) -> None:
+    """
+    Injeta uma tabela Arrow em `target` via COPY binário.
+
+    Tabelas sem vetores usam o pgpq. Colunas FixedSizeList de float32/float16 são
+    gravadas no formato binário dos tipos vector/halfvec do pgvector pelo encoder NumPy
+    (`encode_copy_rows`), que o pgpq não suporta.
+
+    Args:
+        conn (Connection): Conexão SQLAlchemy (driver psycopg) dentro da transação.
+        target (str): Tabela de destino (ex: 'embeddings.user_dc_rank').
+        arrow_table (pa.Table): Dados com as colunas de destino.
+    """
+    raw_conn = conn.connection.driver_connection
+    if raw_conn is None:
+        raise ValueError("Falha na conexão nativa psycopg.")
+
+    cols_sql = ", ".join(f'"{c}"' for c in arrow_table.column_names)
+
+    with raw_conn.cursor() as cursor:
+        copy_sql = f"COPY {target} ({cols_sql}) FROM STDIN WITH (FORMAT BINARY)"
+
+        with cursor.copy(copy_sql) as copy:
+            if any(is_vector_type(field.type) for field in arrow_table.schema):
+                for chunk in iter_copy_binary(arrow_table):
+                    copy.write(chunk)
+                return
+
+            # Encoder Arrow -> Binary
+            encoder = ArrowToPostgresBinaryEncoder(arrow_table.schema)
+            copy.write(encoder.write_header())
+            for batch in arrow_table.to_batches():
+                copy.write(encoder.write_batch(batch))
+            copy.write(encoder.finish())
+
+
+def decode_vector_rows(
+    payload: bytes, column_type: str
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decodifica o COPY ... TO STDOUT (FORMAT BINARY) de um `SELECT id::bigint, vetor`.
+
+    Sem nulos, todas as linhas têm o mesmo tamanho: o corpo é lido de uma vez como um
+    array estruturado, sem laço por linha.
+
+    Args:
+        payload (bytes): Fluxo completo (cabeçalho, linhas e terminador).
+        column_type (str): Tipo da coluna de vetores ('vector' ou 'halfvec').
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Ids (int64) e a matriz (n, dimensão) em float32.
+    """
+    item = np.dtype(">f2") if column_type == "halfvec" else np.dtype(">f4")
+    if not payload.startswith(COPY_HEADER[:11]) or not payload.endswith(COPY_TRAILER):
+        raise ValueError("Fluxo de COPY binário incompleto ou sem a assinatura.")
+    (extension,) = struct.unpack(">i", payload[15:19])
+    body = payload[19 + extension : -len(COPY_TRAILER)]
+    if not body:
+        return np.empty(0, np.int64), np.empty((0, 0), np.float32)
+
+    # Posição da dimensão do primeiro vetor: colunas (2) + id (4 + 8) + tamanho (4)
+    (dim,) = struct.unpack(">h", body[18:20])
+    record = np.dtype(
+        [
+            ("columns", ">i2"),
+            ("id_size", ">i4"),
+            ("id", ">i8"),
+            ("vector_size", ">i4"),
+            ("dim", ">i2"),
+            ("unused", ">i2"),
+            ("v", item, (dim,)),
+        ]
+    )
+    if len(body) % record.itemsize:
+        raise ValueError(
+            "Linhas de tamanho variável no COPY: use `id::bigint` e filtre vetores nulos."
+        )
+    rows = cast("npt.NDArray[np.void]", np.frombuffer(body, record))
+    expected = {
+        "columns": 2,
+        "id_size": 8,
+        "vector_size": 4 + dim * item.itemsize,
+        "dim": dim,
+    }
+    if any(np.any(rows[name] != value) for name, value in expected.items()):
+        raise ValueError(
+            "Layout inesperado no COPY binário (esperado: id bigint, vetor)."
+        )
+    return rows["id"].astype(np.int64), rows["v"].astype(np.float32)
+
+
+def copy_vectors_out(
+    conn: Connection, query: str, column_type: str
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lê ids e vetores de uma consulta via COPY binário (sem converter vetores em texto).
+
+    Args:
+        conn (Connection): Conexão SQLAlchemy (driver psycopg).
+        query (str): SELECT com duas colunas: id::bigint e o vetor (sem nulos).
+        column_type (str): Tipo da coluna de vetores ('vector' ou 'halfvec').
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Ids (int64) e a matriz (n, dimensão) em float32.
+    """
+    raw_conn = conn.connection.driver_connection
+    if raw_conn is None:
+        raise ValueError("Falha na conexão nativa psycopg.")
+
+    with raw_conn.cursor() as cursor:
+        with cursor.copy(f"COPY ({query}) TO STDOUT WITH (FORMAT BINARY)") as copy:
+            payload = b"".join(bytes(chunk) for chunk in copy)
+    return decode_vector_rows(payload, column_type)
@@ -0,0 +1,139 @@
+import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import replace
+from graphlib import TopologicalSorter
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Engine
+
+from thelook_ecommerce_analysis.utils.change_log import RefreshSpec, run_refresh
+
+logger = logging.getLogger(__name__)
+
+# Referências qualificadas (schema.tabela) nos scripts de refresh
+TABLE_REFERENCE = re.compile(r"\b(raw_data|metrics|embeddings)\.(\w+)", re.IGNORECASE)
+
+# Tabelas técnicas do CDC: lidas por todos os scripts, não são fontes
+TECHNICAL_TABLES = frozenset({"change_log", "refresh_state"})
+
+
+def parse_references(sql: str) -> set[tuple[str, str]]:
+    """Extrai as tabelas (schema, tabela) referenciadas por um script SQL, ignorando comentários."""
+    body = re.sub(r"--[^\n]*", "", sql)
+    return {
+        (schema.lower(), table.lower())
+        for schema, table in TABLE_REFERENCE.findall(body)
+        if table.lower() not in TECHNICAL_TABLES
+    }
+
+
+def _script_references(spec: RefreshSpec) -> set[tuple[str, str]]:
+    references = set()
+    for query in {spec.full_query, spec.incremental_query} - {None}:
+        references |= parse_references(Path(str(query)).read_text(encoding="utf-8"))
+    return references
+
+
+def build_dag(specs: dict[str, RefreshSpec]) -> dict[str, set[str]]:
+    """
+    Monta o grafo de dependências entre os objetos derivados.
+
+    Um objeto depende de outro quando os seus scripts leem a tabela do outro objeto.
+
+    Returns:
+        dict[str, set[str]]: Objetos dos quais cada objeto depende.
+    """
+    return {
+        name: {table for _, table in _script_references(spec)} & specs.keys() - {name}
+        for name, spec in specs.items()
+    }
+
+
+def resolve_sources(
+    specs: dict[str, RefreshSpec], dag: dict[str, set[str]]
+) -> dict[str, RefreshSpec]:
+    """
+    Completa as fontes de cada objeto.
+
+    As fontes declaradas têm prioridade; sem declaração, são as tabelas de raw_data
+    lidas pelos scripts. Cada objeto herda as fontes dos objetos dos quais depende,
+    então uma alteração em raw_data dispara o refresh de toda a cadeia abaixo dela.
+    """
+    resolved: dict[str, RefreshSpec] = {}
+
+    for name in TopologicalSorter(dag).static_order():
+        spec = specs[name]
+        own = spec.sources
+        if own is None:
+            own = sorted(
+                table
+                for schema, table in _script_references(spec)
+                if schema == "raw_data"
+            )
+        # `sources` é opcional no RefreshSpec; as dependências já resolvidas têm uma lista
+        inherited = [
+            src for dep in sorted(dag[name]) for src in resolved[dep].sources or []
+        ]
+        resolved[name] = replace(spec, sources=list(dict.fromkeys([*own, *inherited])))
+
+    return resolved
+
+
+def run_scheduled_refresh(
+    engine: Engine,
+    specs: dict[str, RefreshSpec],
+    params: dict[str, Any] | None = None,
+    max_workers: int = 4,
+) -> dict[str, Any]:
+    """
+    Atualiza os objetos derivados respeitando as dependências entre eles.
+
+    Cada objeto é liberado assim que os objetos dos quais depende terminam. Objetos
+    independentes rodam em paralelo, cada um com a sua conexão do pool da Engine e a
+    sua transação; objetos sem fontes alteradas são ignorados (skip) por `run_refresh`.
+
+    Args:
+        engine (Engine): Engine SQLAlchemy do banco de destino.
+        specs (dict[str, RefreshSpec]): Objetos derivados por nome.
+        params (dict[str, Any] | None): Parâmetros adicionais dos scripts.
+        max_workers (int): Refreshes simultâneos. Não deve exceder o pool da Engine.
+
+    Returns:
+        dict[str, Any]: Relatório de cada objeto e a duração total (wall clock).
+    """
+    start = time.perf_counter()
+    dag = build_dag(specs)
+    resolved = resolve_sources(specs, dag)
+
+    sorter = TopologicalSorter(dag)
+    sorter.prepare()
+    reports: dict[str, dict[str, Any]] = {}
+
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="refresh") as pool:
+        running: dict[Future, str] = {}
+        try:
+            while sorter.is_active():
+                for name in sorter.get_ready():
+                    future = pool.submit(run_refresh, engine, resolved[name], params)
+                    running[future] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    reports[name] = future.result()
+                    sorter.done(name)
+        except BaseException:
+            # Refreshes em andamento terminam (cada um na sua transação); os demais não iniciam
+            pool.shutdown(cancel_futures=True)
+            raise
+
+    duration = time.perf_counter() - start
+    logger.info(
+        f"Refresh de {len(reports)} objetos derivados em {duration:.2f}s "
+        f"({max_workers} em paralelo)."
+    )
+
+    return {"objects": reports, "wall_duration_s": round(duration, 3)}
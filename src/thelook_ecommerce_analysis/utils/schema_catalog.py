@@ -0,0 +1,101 @@
+import re
+from typing import Any
+
+from sqlalchemy import Connection, text
+
+# Tabelas, views e views materializadas com as colunas e os COMMENT ON de cada uma.
+# pg_catalog direto: information_schema não expõe os comentários e é bem mais lento
+CATALOG_SQL = """
+    SELECT
+        n.nspname || '.' || c.relname AS name,
+        CASE c.relkind
+            WHEN 'v' THEN 'VIEW'
+            WHEN 'm' THEN 'MATERIALIZED VIEW'
+            ELSE 'TABLE'
+        END AS kind,
+        obj_description(c.oid, 'pg_class') AS comment,
+        a.attname AS column_name,
+        format_type(a.atttypid, a.atttypmod) AS column_type,
+        col_description(c.oid, a.attnum) AS column_comment
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a
+        ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = ANY(:schemas)
+        AND c.relkind IN ('r', 'p', 'v', 'm')
+        AND NOT c.relispartition
+    ORDER BY name, a.attnum
+"""
+
+# Nomes curtos dos tipos (menos tokens no prompt, mesmo significado para o SQL)
+_TYPE_ALIASES = (
+    (re.compile(r"^timestamp with time zone"), "timestamptz"),
+    (re.compile(r"^timestamp without time zone"), "timestamp"),
+    (re.compile(r"^character varying"), "varchar"),
+    (re.compile(r"^double precision"), "float8"),
+    (re.compile(r"^geography\((\w+),4326\)"), r"geography(\1)"),
+)
+
+
+def short_type(column_type: str) -> str:
+    for pattern, alias in _TYPE_ALIASES:
+        column_type = pattern.sub(alias, column_type)
+    return column_type
+
+
+def fetch_catalog(
+    conn: Connection, schemas: list[str], exclude: list[str] | None = None
+) -> list[dict[str, Any]]:
+    """
+    Lê o catálogo dos schemas: tabelas, colunas, tipos e comentários (COMMENT ON).
+
+    Args:
+        conn (Connection): Conexão com o PostgreSQL.
+        schemas (list[str]): Schemas incluídos (ex: raw_data, metrics, embeddings).
+        exclude (list[str] | None): Tabelas ignoradas (schema.tabela).
+
+    Returns:
+        list[dict[str, Any]]: Uma entrada por tabela (nome, tipo, comentário e colunas),
+        em ordem alfabética.
+    """
+    excluded = set(exclude or [])
+    tables: dict[str, dict[str, Any]] = {}
+    for row in conn.execute(text(CATALOG_SQL), {"schemas": list(schemas)}):
+        if row.name in excluded:
+            continue
+        table = tables.setdefault(
+            row.name,
+            {"name": row.name, "kind": row.kind, "comment": row.comment, "columns": []},
+        )
+        table["columns"].append(
+            {
+                "name": row.column_name,
+                "type": short_type(row.column_type),
+                "comment": row.column_comment,
+            }
+        )
+    return list(tables.values())
+
+
+def render_table(table: dict[str, Any]) -> str:
+    """
+    Texto compacto de uma tabela para o prompt (e para o seu embedding).
+
+    Uma linha por coluna (nome e tipo) e os comentários após `--`, sem as cláusulas de
+    DDL (constraints, defaults, índices) que o modelo não usa para escrever a consulta.
+    """
+    header = f"{table['kind']} {table['name']}"
+    if table["comment"]:
+        header += f" -- {table['comment']}"
+    lines = [header]
+    for column in table["columns"]:
+        line = f"  {column['name']} {column['type']}"
+        if column["comment"]:
+            line += f" -- {column['comment']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def approx_tokens(content: str) -> int:
+    """Estimativa de tokens (~4 caracteres por token) para comparar os prompts."""
+    return (len(content) + 3) // 4
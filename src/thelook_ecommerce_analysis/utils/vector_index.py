@@ -0,0 +1,328 @@
+import logging
+import re
+import time
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+from sqlalchemy import Connection, text
+
+from thelook_ecommerce_analysis.utils.pg_copy import copy_arrow_binary
+
+logger = logging.getLogger(__name__)
+
+# Operador de distância de cada classe de operadores do pgvector (vector e halfvec)
+DISTANCE_OPERATORS = {
+    "cosine_ops": "<=>",
+    "l2_ops": "<->",
+    "ip_ops": "<#>",
+}
+
+# Identificadores interpolados no DDL (índice, tabela, coluna e opclass). O índice é
+# criado no schema da tabela, então o seu nome não é qualificado
+_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_]*(\.[a-z_][a-z0-9_]*)?$")
+
+
+def sql_identifier(name: str) -> str:
+    """Valida um identificador (opcionalmente schema.nome) antes da interpolação no SQL."""
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Identificador SQL inválido: {name!r}.")
+    return name
+
+
+def distance_operator(opclass: str) -> str:
+    """Operador de distância (ORDER BY) correspondente à classe de operadores do índice."""
+    for suffix, operator in DISTANCE_OPERATORS.items():
+        if opclass.endswith(suffix):
+            return operator
+    raise ValueError(f"Classe de operadores sem operador conhecido: {opclass}.")
+
+
+def column_type(index: dict[str, str]) -> str:
+    """Tipo pgvector da coluna indexada, derivado da classe de operadores."""
+    return "halfvec" if index["opclass"].startswith("halfvec") else "vector"
+
+
+def should_defer_index(
+    conn: Connection, table: str, changed_rows: int, bulk_load_fraction: float
+) -> bool:
+    """
+    Decide se o índice HNSW deve ser removido durante a carga e reconstruído depois.
+
+    Inserir em um índice HNSW custa uma busca no grafo por linha; em cargas grandes é
+    mais barato construir o índice uma vez ao final. Tabelas vazias (ou nunca
+    analisadas) e lotes acima de `bulk_load_fraction` das linhas adiam o índice.
+    """
+    if changed_rows == 0:
+        return False
+
+    estimated_rows = conn.execute(
+        text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table},
+    ).scalar()
+    if estimated_rows is None or estimated_rows <= 0:
+        return True
+    return changed_rows >= bulk_load_fraction * estimated_rows
+
+
+def drop_hnsw_index(conn: Connection, table: str, index: dict[str, str]) -> None:
+    """Remove o índice antes da carga (a remoção só vale após o COMMIT da transação)."""
+    schema = sql_identifier(table).rpartition(".")[0] or "public"
+    conn.execute(text(f"DROP INDEX IF EXISTS {schema}.{sql_identifier(index['name'])}"))
+
+
+def build_hnsw_index(
+    conn: Connection, table: str, index: dict[str, str], hnsw: dict[str, Any]
+) -> float:
+    """
+    Cria o índice HNSW, se não existir, com os parâmetros de construção configurados.
+
+    A construção usa `maintenance_work_mem` (o grafo cabendo na memória evita a fase
+    lenta em disco) e `max_parallel_maintenance_workers`, ambos apenas na transação.
+
+    Args:
+        conn (Connection): Conexão SQLAlchemy dentro da transação da carga.
+        table (str): Tabela indexada (ex: 'embeddings.products_embeddings').
+        index (dict[str, str]): Nome (sem schema), coluna e classe de operadores.
+        hnsw (dict[str, Any]): m, ef_construction, maintenance_workers e maintenance_work_mem.
+
+    Returns:
+        float: Duração do comando (próxima de zero quando o índice já existia).
+    """
+    start = time.perf_counter()
+    conn.execute(
+        text("SELECT set_config('maintenance_work_mem', :mem, true)"),
+        {"mem": str(hnsw["maintenance_work_mem"])},
+    )
+    conn.execute(
+        text("SELECT set_config('max_parallel_maintenance_workers', :workers, true)"),
+        {"workers": str(int(hnsw["maintenance_workers"]))},
+    )
+    conn.execute(
+        text(f"""
+            CREATE INDEX IF NOT EXISTS {sql_identifier(index["name"])}
+            ON {sql_identifier(table)}
+            USING hnsw ({sql_identifier(index["column"])} {sql_identifier(index["opclass"])})
+            WITH (m = {int(hnsw["m"])}, ef_construction = {int(hnsw["ef_construction"])})
+        """)
+    )
+    return time.perf_counter() - start
+
+
+def _knn_ids(
+    conn: Connection, query_sql: str, vector: str, k: int
+) -> tuple[list[int], float]:
+    start = time.perf_counter()
+    ids = conn.execute(text(query_sql), {"q": vector, "k": k}).scalars().all()
+    return list(ids), time.perf_counter() - start
+
+
+def benchmark_ef_search(
+    conn: Connection,
+    table: str,
+    index: dict[str, str],
+    benchmark: dict[str, Any],
+) -> dict[str, Any]:
+    """
+    Mede recall@k e latência da busca HNSW para cada valor de `hnsw.ef_search`.
+
+    As consultas são vetores da própria tabela. A referência é a busca exata (varredura
+    sequencial com o índice desativado); para cada ef_search, recall@k é a fração dos k
+    vizinhos exatos devolvidos pela busca aproximada. Os SETs valem só na transação.
+
+    Args:
+        conn (Connection): Conexão SQLAlchemy (transação própria do benchmark).
+        table (str): Tabela com o índice HNSW.
+        index (dict[str, str]): Coluna e classe de operadores do índice.
+        benchmark (dict[str, Any]): queries (quantidade), k e a lista ef_search.
+
+    Returns:
+        dict[str, Any]: Latência da busca exata e, por ef_search, recall@k médio e as
+        latências p50/p95 (ms).
+    """
+    column = sql_identifier(index["column"])
+    operator = distance_operator(index["opclass"])
+    k = int(benchmark["k"])
+    query_sql = f"""
+        SELECT id FROM {sql_identifier(table)}
+        ORDER BY {column} {operator} CAST(:q AS {column_type(index)})
+        LIMIT :k
+    """  # noqa: S608
+
+    queries = (
+        conn.execute(
+            text(f"""
+                SELECT CAST({column} AS TEXT) FROM {sql_identifier(table)}
+                WHERE {column} IS NOT NULL
+                ORDER BY random() LIMIT :n
+            """),  # noqa: S608
+            {"n": int(benchmark["queries"])},
+        )
+        .scalars()
+        .all()
+    )
+    if not queries:
+        return {"queries": 0}
+
+    conn.execute(text("SELECT set_config('enable_indexscan', 'off', true)"))
+    exact, exact_latency = zip(
+        *(_knn_ids(conn, query_sql, q, k) for q in queries), strict=True
+    )
+    conn.execute(text("SELECT set_config('enable_indexscan', 'on', true)"))
+
+    sweep = []
+    for ef_search in benchmark["ef_search"]:
+        conn.execute(
+            text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+            {"ef": str(int(ef_search))},
+        )
+        approx, latency = zip(
+            *(_knn_ids(conn, query_sql, q, k) for q in queries), strict=True
+        )
+        recall = [
+            len(set(a) & set(e)) / max(len(e), 1)
+            for a, e in zip(approx, exact, strict=True)
+        ]
+        latency_ms = 1000 * np.asarray(latency)
+        sweep.append(
+            {
+                "ef_search": int(ef_search),
+                "recall_at_k": round(float(np.mean(recall)), 4),
+                "p50_ms": round(float(np.percentile(latency_ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(latency_ms, 95)), 3),
+            }
+        )
+
+    exact_ms = 1000 * np.asarray(exact_latency)
+    report = {
+        "queries": len(queries),
+        "k": k,
+        "exact_p50_ms": round(float(np.percentile(exact_ms, 50)), 3),
+        "exact_p95_ms": round(float(np.percentile(exact_ms, 95)), 3),
+        "ef_search": sweep,
+    }
+    logger.info(f"Benchmark HNSW ({table}): {report}")
+    return report
+
+
+def vector_literal(vector: np.ndarray) -> str:
+    """Representação textual aceita pelos tipos vector/halfvec ('[x1,x2,...]')."""
+    return "[" + ",".join(f"{float(v):.7g}" for v in vector) + "]"
+
+
+def exact_top_k(reference: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Índices dos k vizinhos exatos (cosseno sobre vetores normalizados) de cada consulta."""
+    similarity = np.asarray(queries, np.float32) @ np.asarray(reference, np.float32).T
+    top = np.argpartition(-similarity, min(k, similarity.shape[1]) - 1, axis=1)[:, :k]
+    order = np.take_along_axis(similarity, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _benchmark_variant(
+    conn: Connection,
+    name: str,
+    column_type: str,
+    vectors: np.ndarray,
+    hnsw: dict[str, Any],
+) -> tuple[float, int, int]:
+    """Carrega os vetores em uma tabela temporária e constrói o HNSW; mede tempo e tamanhos."""
+    table = sql_identifier(f"storage_benchmark_{name}")
+    dim = vectors.shape[1]
+    conn.execute(
+        text(f"""
+            CREATE TEMP TABLE {table} (id INTEGER, embedding {column_type}({dim}))
+            ON COMMIT DROP
+        """)
+    )
+    copy_arrow_binary(
+        conn,
+        table,
+        pa.table(
+            {
+                "id": pa.array(np.arange(len(vectors), dtype=np.int32)),
+                "embedding": pa.FixedSizeListArray.from_arrays(
+                    pa.array(np.ascontiguousarray(vectors).ravel()), dim
+                ),
+            }
+        ),
+    )
+    index = {
+        "name": f"{table}_hnsw",
+        "column": "embedding",
+        "opclass": f"{column_type}_cosine_ops",
+    }
+    build_s = build_hnsw_index(conn, table, index, hnsw)
+    index_bytes, table_bytes = conn.execute(
+        text(
+            "SELECT pg_relation_size(to_regclass(:index)), "
+            "pg_table_size(to_regclass(:table))"
+        ),
+        {"index": index["name"], "table": table},
+    ).one()
+    return build_s, int(index_bytes), int(table_bytes)
+
+
+def benchmark_storage(
+    conn: Connection,
+    variants: dict[str, tuple[str, np.ndarray]],
+    reference: np.ndarray,
+    hnsw: dict[str, Any],
+    benchmark: dict[str, Any],
+) -> dict[str, Any]:
+    """
+    Compara formatos de armazenamento dos embeddings (tipo e dimensão).
+
+    Cada variante é carregada em uma tabela temporária com o seu índice HNSW. O recall@k
+    é medido contra a busca exata nos vetores completos (float32, sem redução): as
+    consultas são as primeiras linhas da amostra, já no formato de cada variante. A
+    conexão deve estar em uma transação descartada ao final (rollback).
+
+    Args:
+        conn (Connection): Conexão SQLAlchemy (transação descartável).
+        variants (dict[str, tuple[str, np.ndarray]]): Nome -> (tipo pgvector, vetores).
+        reference (np.ndarray): Vetores completos e normalizados (mesmas linhas).
+        hnsw (dict[str, Any]): Parâmetros de construção do índice.
+        benchmark (dict[str, Any]): queries (quantidade), k e ef_search.
+
+    Returns:
+        dict[str, Any]: Por variante: tamanho do índice e da tabela (MB), duração da
+        construção do índice, recall@k e latência p50 (ms).
+    """
+    k = int(benchmark["k"])
+    n_queries = min(int(benchmark["queries"]), len(reference))
+    expected = exact_top_k(reference, reference[:n_queries], k)
+    conn.execute(
+        text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+        {"ef": str(int(benchmark.get("ef_search", 40)))},
+    )
+
+    report: dict[str, Any] = {"rows": len(reference), "queries": n_queries, "k": k}
+    for name, (column_type, vectors) in variants.items():
+        build_s, index_bytes, table_bytes = _benchmark_variant(
+            conn, name, column_type, vectors, hnsw
+        )
+        query_sql = f"""
+            SELECT id FROM storage_benchmark_{name}
+            ORDER BY embedding <=> CAST(:q AS {column_type})
+            LIMIT :k
+        """  # noqa: S608
+        results = [
+            _knn_ids(conn, query_sql, vector_literal(vectors[i]), k)
+            for i in range(n_queries)
+        ]
+        recall = [
+            len(set(ids) & set(expected[i].tolist())) / k
+            for i, (ids, _) in enumerate(results)
+        ]
+        report[name] = {
+            "index_mb": round(index_bytes / 1024 / 1024, 2),
+            "table_mb": round(table_bytes / 1024 / 1024, 2),
+            "build_s": round(build_s, 3),
+            "recall_at_k": round(float(np.mean(recall)), 4) if recall else None,
+            "p50_ms": round(float(np.percentile([1000 * t for _, t in results], 50)), 3)
+            if results
+            else None,
+        }
+
+    logger.info(f"Benchmark de armazenamento dos embeddings: {report}")
+    return report
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def stamp_path(directory: Path, name: str) -> Path:
+    """Carimbo de versão do snapshot: gravado por último, aponta para os arquivos atuais."""
+    return Path(directory) / f"{name}.version.json"
+
+
+def snapshot_version(ids: np.ndarray, vectors: np.ndarray) -> str:
+    """Versão derivada do conteúdo: uma carga sem alterações mantém a versão."""
+    digest = hashlib.sha1(ids.tobytes())  # noqa: S324
+    digest.update(vectors.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def read_stamp(directory: Path, name: str) -> dict[str, Any] | None:
+    path = stamp_path(directory, name)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _atomic_write(path: Path, write: Any) -> None:
+    """Grava em um arquivo temporário e o renomeia (leitores nunca veem arquivos parciais)."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with tmp.open("wb") as file:
+        write(file)
+    os.replace(tmp, path)
+
+
+def write_snapshot(
+    directory: Path,
+    name: str,
+    ids: np.ndarray,
+    vectors: np.ndarray,
+    metadata: dict[str, Any],
+) -> dict[str, Any]:
+    """
+    Exporta ids e vetores em arquivos .npy versionados e atualiza o carimbo de versão.
+
+    Os arquivos de cada versão têm nomes próprios e o carimbo é gravado por último
+    (renomeação atômica): quem lê o carimbo sempre encontra os dois arquivos completos,
+    e um leitor com a versão anterior mapeada em memória não é afetado. São mantidas a
+    versão atual e a anterior.
+
+    Args:
+        directory (Path): Diretório dos snapshots.
+        name (str): Nome do snapshot (ex: 'products_embeddings').
+        ids (np.ndarray): Ids em ordem crescente.
+        vectors (np.ndarray): Matriz (n, dimensão) na ordem dos ids.
+        metadata (dict[str, Any]): Informações gravadas no carimbo (modelo, tipo).
+
+    Returns:
+        dict[str, Any]: Carimbo da versão atual e se os arquivos foram gravados.
+    """
+    directory = Path(directory)
+    ids = np.ascontiguousarray(ids, np.int64)
+    vectors = np.ascontiguousarray(vectors, np.float32)
+    version = snapshot_version(ids, vectors)
+
+    current = read_stamp(directory, name)
+    if current is not None and current["version"] == version:
+        return {**current, "written": False}
+
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = {
+        "name": name,
+        "version": version,
+        "vectors": f"{name}-{version}.npy",
+        "ids": f"{name}-{version}.ids.npy",
+        "rows": int(vectors.shape[0]),
+        "dimensions": int(vectors.shape[1]),
+        "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        **metadata,
+    }
+    _atomic_write(directory / stamp["vectors"], lambda f: np.save(f, vectors))
+    _atomic_write(directory / stamp["ids"], lambda f: np.save(f, ids))
+    _atomic_write(
+        stamp_path(directory, name),
+        lambda f: f.write(json.dumps(stamp, indent=2).encode("utf-8")),
+    )
+
+    keep = {stamp["vectors"], stamp["ids"]}
+    if current is not None:
+        keep |= {current["vectors"], current["ids"]}
+    for old in directory.glob(f"{name}-*.npy"):
+        if old.name not in keep:
+            old.unlink(missing_ok=True)
+
+    logger.info(
+        f"Snapshot {name} {version}: {stamp['rows']} vetores x "
+        f"{stamp['dimensions']} dimensões em {directory}."
+    )
+    return {**stamp, "written": True}
+
+
+def load_snapshot(
+    directory: Path, stamp: dict[str, Any], mmap: bool = True
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Abre os arquivos de uma versão do snapshot.
+
+    Args:
+        directory (Path): Diretório dos snapshots.
+        stamp (dict[str, Any]): Carimbo da versão (`read_stamp`).
+        mmap (bool): Mapeia a matriz em memória (somente leitura) em vez de copiá-la.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Ids e a matriz float32 contígua.
+    """
+    directory = Path(directory)
+    ids = np.load(directory / stamp["ids"])
+    vectors = np.load(directory / stamp["vectors"], mmap_mode="r" if mmap else None)
+    return ids, vectors
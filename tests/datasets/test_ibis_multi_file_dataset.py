@@ -0,0 +1,133 @@
+import logging
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from kedro.io import DatasetError
+
+from thelook_ecommerce_analysis.datasets.ibis_multi_file_dataset import (
+    IbisMultiFileDataset,
+)
+
+
+class TestIbisMultiFileDataset:
+    """Suíte de testes para a classe IbisMultiFileDataset."""
+
+    @pytest.fixture
+    def shards_dir(self, tmp_path: Path) -> Path:
+        """Cria shards parquet com schemas divergentes, simulando o exportador."""
+        shard_dir = tmp_path / "events"
+        shard_dir.mkdir()
+
+        pq.write_table(
+            pa.table({"id": [1, 2], "uri": ["/home", "/cart"]}),
+            shard_dir / "events_0001.parquet",
+        )
+        # Shard com coluna extra: deve ser unificado por nome
+        pq.write_table(
+            pa.table({"id": [3], "uri": ["/purchase"], "browser": ["Chrome"]}),
+            shard_dir / "events_0002.parquet",
+        )
+        return shard_dir
+
+    def _make_dataset(
+        self, filepath: str | list[str], **kwargs: Any
+    ) -> IbisMultiFileDataset:
+        return IbisMultiFileDataset(
+            filepath=filepath,
+            file_format="parquet",
+            table_name="events",
+            connection={"backend": "duckdb"},
+            **kwargs,
+        )
+
+    def test_load_glob_unifies_schema(self, shards_dir: Path) -> None:
+        """Verifica se o glob lê todos os shards e unifica os schemas por nome."""
+        ds = self._make_dataset(str(shards_dir / "*.parquet"))
+
+        table = ds.load()
+        df = table.to_pandas()
+
+        assert len(df) == 3, "Deveria ler as linhas de todos os shards."
+        assert "browser" in table.columns, "Coluna extra deveria ser unificada."
+        assert df["browser"].isna().sum() == 2, (
+            "Linhas sem a coluna deveriam vir nulas."
+        )
+
+    def test_load_adds_filename_lineage(self, shards_dir: Path) -> None:
+        """Cada linha recebe o arquivo de origem (`filename`), desativável em load_args."""
+        pattern = str(shards_dir / "*.parquet")
+        ds = self._make_dataset(pattern)
+
+        df = ds.load().to_pandas()
+
+        assert df.loc[df["id"] == 3, "filename"].iloc[0].endswith("events_0002.parquet")
+        disabled = self._make_dataset(pattern, load_args={"filename": False})
+        assert "filename" not in disabled.load().columns
+
+    def test_load_file_list_ignores_missing_and_duplicates(
+        self, shards_dir: Path, tmp_path: Path
+    ) -> None:
+        """Lista de caminhos: arquivos inexistentes são ignorados e duplicatas removidas."""
+        ds = self._make_dataset(
+            [
+                str(tmp_path / "events.parquet"),  # Não existe
+                str(shards_dir / "events_0001.parquet"),
+                str(shards_dir / "*.parquet"),  # Inclui novamente o shard 0001
+            ]
+        )
+
+        assert ds._resolve_paths() == [
+            str(shards_dir / "events_0001.parquet"),
+            str(shards_dir / "events_0002.parquet"),
+        ]
+        assert ds.load().count().to_pyarrow().as_py() == 3
+
+    def test_exclusive_patterns_reject_double_match(
+        self, shards_dir: Path, tmp_path: Path
+    ) -> None:
+        """Arquivo único e shards da mesma tabela não podem ser lidos juntos."""
+        pq.write_table(pa.table({"id": [1]}), tmp_path / "events.parquet")
+        patterns = [str(tmp_path / "events.parquet"), str(shards_dir / "*.parquet")]
+
+        assert self._make_dataset(patterns[1:], exclusive_patterns=True)._exists()
+        with pytest.raises(DatasetError, match="mais de um caminho"):
+            self._make_dataset(patterns, exclusive_patterns=True).load()
+
+    def test_load_logs_per_file_counts(
+        self, shards_dir: Path, caplog: pytest.LogCaptureFixture
+    ) -> None:
+        """As contagens por arquivo devem aparecer no log da execução."""
+        ds = self._make_dataset(str(shards_dir / "*.parquet"))
+
+        with caplog.at_level(logging.INFO):
+            ds.load()
+
+        assert "3 linhas em 2 arquivos" in caplog.text
+        assert "events_0001.parquet: 2 linhas" in caplog.text
+        assert ds.file_counts == {
+            str(shards_dir / "events_0001.parquet"): 2,
+            str(shards_dir / "events_0002.parquet"): 1,
+        }
+
+    def test_load_without_matches_raises(self, tmp_path: Path) -> None:
+        """Sem nenhum arquivo encontrado deve levantar DatasetError."""
+        ds = self._make_dataset(str(tmp_path / "nada" / "*.parquet"))
+
+        assert ds._exists() is False
+        with pytest.raises(DatasetError, match="Nenhum arquivo encontrado"):
+            ds.load()
+
+    def test_init_requires_filepath(self) -> None:
+        """Uma lista vazia de caminhos não é uma configuração válida."""
+        with pytest.raises(DatasetError, match="ao menos um caminho"):
+            self._make_dataset([])
+
+    def test_save_is_read_only(self, shards_dir: Path) -> None:
+        """Dados brutos são imutáveis: save deve falhar."""
+        ds = self._make_dataset(str(shards_dir / "*.parquet"))
+
+        with pytest.raises(DatasetError, match="somente leitura"):
+            ds.save(ds.load())
@@ -1,10 +1,13 @@
 import re
+from datetime import UTC, date, datetime
 from typing import Any
 from unittest.mock import MagicMock, PropertyMock
 
+import pyarrow as pa
 import pytest
 from kedro.io import DatasetError
 from pytest_mock import MockerFixture
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.testing.engines import mock_engine
 
 from thelook_ecommerce_analysis.datasets.ibis_upsert_dataset import IbisUpsertDataset
@@ -185,7 +188,7 @@ class TestIbisUpsertDataset:
 
         # Precisamos mockar o ArrowToPostgresBinaryEncoder da biblioteca pgpq
         mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
 
         with pytest.raises(Exception, match="Falha na conexão nativa psycopg."):
@@ -204,7 +207,7 @@ class TestIbisUpsertDataset:
         mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
 
         mock_encoder_class = mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
         mock_encoder = mock_encoder_class.return_value
         mock_encoder.write_header.return_value = b"header"  # Converte para bytes
@@ -254,7 +257,7 @@ class TestIbisUpsertDataset:
 
         # 4. Mock do Encoder para evitar erros de importação/inicialização
         mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
 
         # 5. Execução
@@ -295,7 +298,7 @@ class TestIbisUpsertDataset:
         mock_conn = mock_engine.begin.return_value.__enter__.return_value
         mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
         mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
 
         dataset.save(mock_ibis_table)
@@ -321,7 +324,7 @@ class TestIbisUpsertDataset:
         mock_copy = mock_cursor.copy.return_value.__enter__.return_value
 
         mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
 
         dataset.save(mock_ibis_table)
@@ -333,6 +336,39 @@ class TestIbisUpsertDataset:
         assert "COPY tmp_my_table" in copy_sql
         assert "FORMAT BINARY" in copy_sql
 
+    def test_save_upsert_vector_column(
+        self, dataset: IbisUpsertDataset, mocker: MockerFixture
+    ):
+        """Embeddings (FixedSizeList) seguem o COPY binário do pgvector e o UPSERT por source_id."""
+        dataset._save_args["index_elements"] = ["source_id"]
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
+        mock_cursor = mock_conn.connection.driver_connection.cursor.return_value.__enter__.return_value
+        mock_copy = mock_cursor.copy.return_value.__enter__.return_value
+        mock_encoder = mocker.patch(
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
+        )
+        arrow_table = pa.table(
+            {
+                "source_id": pa.array([1, 2], pa.int64()),
+                "embedding": pa.FixedSizeListArray.from_arrays(
+                    pa.array([1.0, 0.0, 0.0, 1.0], pa.float32()), 2
+                ),
+            }
+        )
+        ibis_table = MagicMock()
+        ibis_table.to_pyarrow.return_value = arrow_table
+
+        dataset.save(ibis_table)
+
+        mock_encoder.assert_not_called()
+        written = b"".join(c[0][0] for c in mock_copy.write.call_args_list)
+        assert written.startswith(b"PGCOPY\n\xff\r\n\x00")
+        last_sql = str(mock_conn.execute.call_args_list[-1][0][0])
+        assert 'ON CONFLICT ("source_id")' in last_sql
+        assert '"embedding" IS DISTINCT FROM EXCLUDED."embedding"' in last_sql
+
     def test_save_upsert_transaction_rollback_on_error(
         self,
         dataset: IbisUpsertDataset,
@@ -374,7 +410,7 @@ class TestIbisUpsertDataset:
         mock_conn = mock_engine.begin.return_value.__enter__.return_value
         mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
         mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
 
         dataset.save(mock_ibis_table)
@@ -400,7 +436,7 @@ class TestIbisUpsertDataset:
         mock_engine = MagicMock()
         mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
         mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
 
         # Spy no método select da tabela arrow (que é o mock_arrow_table dentro do mock_ibis_table)
@@ -423,7 +459,7 @@ class TestIbisUpsertDataset:
         mock_conn = mock_engine.begin.return_value.__enter__.return_value
         mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
         mocker.patch(
-            "thelook_ecommerce_analysis.datasets.ibis_upsert_dataset.ArrowToPostgresBinaryEncoder"
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
         )
 
         dataset.save(mock_ibis_table)
@@ -440,3 +476,324 @@ class TestIbisUpsertDataset:
 
         # Verifica se o UPSERT final (último SQL) usa a MESMA tabela temporária
         assert f"FROM {temp_table_name}" in executed_sqls[-1]
+
+    def test_save_upsert_track_changes(
+        self,
+        dataset: IbisUpsertDataset,
+        mock_ibis_table: MagicMock,
+        mocker: MockerFixture,
+    ):
+        """Com track_changes o UPSERT deve gravar as chaves afetadas no change_log."""
+        dataset._is_upsert = True
+        dataset._save_args = {"index_elements": ["id"], "track_changes": True}
+
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
+        )
+
+        dataset.save(mock_ibis_table)
+
+        last_sql = str(mock_conn.execute.call_args_list[-1][0][0])
+
+        assert "WITH upserted AS" in last_sql
+        assert "CAST(created_at AS DATE) AS day" in last_sql
+        assert 'RETURNING "id" AS row_id' in last_sql
+        # A tabela mockada não possui created_at
+        assert "NULL::timestamptz AS created_at" in last_sql
+        assert "INSERT INTO public.change_log" in last_sql
+        assert "'my_table'" in last_sql
+
+    def test_with_change_log_uses_created_at(self, dataset: IbisUpsertDataset):
+        """Tabelas com created_at (ex: events) registram o timestamp da linha."""
+        sql = dataset._with_change_log("INSERT ...", "raw_data", "id", True)
+
+        assert 'RETURNING "id" AS row_id, "created_at" AS created_at' in sql
+        assert "INSERT INTO raw_data.change_log" in sql
+
+    def test_save_upsert_without_track_changes(
+        self,
+        dataset: IbisUpsertDataset,
+        mock_ibis_table: MagicMock,
+        mocker: MockerFixture,
+    ):
+        """Por padrão o UPSERT não grava no change_log."""
+        dataset._is_upsert = True
+
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
+        )
+
+        dataset.save(mock_ibis_table)
+
+        assert "change_log" not in str(mock_conn.execute.call_args_list[-1][0][0])
+
+    # 4. Testes da carga em Hypertable (TimescaleDB)
+    @pytest.fixture
+    def events_arrow(self) -> pa.Table:
+        """Lote de eventos fora de ordem temporal."""
+        return pa.table(
+            {
+                "id": [3, 1, 2],
+                "created_at": pa.array(
+                    [
+                        datetime(2024, 3, 1, tzinfo=UTC),
+                        datetime(2024, 1, 1, tzinfo=UTC),
+                        datetime(2024, 2, 1, tzinfo=UTC),
+                    ],
+                    type=pa.timestamp("us", tz="UTC"),
+                ),
+            }
+        )
+
+    @pytest.fixture
+    def hypertable_dataset(
+        self, dataset: IbisUpsertDataset, mocker: MockerFixture
+    ) -> IbisUpsertDataset:
+        dataset._is_upsert = True
+        dataset._save_args = {
+            "index_elements": ["id", "created_at"],
+            "track_changes": True,
+            "hypertable": {"time_column": "created_at", "compress_after": "3 months"},
+        }
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
+        )
+        return dataset
+
+    def test_hypertable_new_range_uses_plain_copy(
+        self,
+        hypertable_dataset: IbisUpsertDataset,
+        events_arrow: pa.Table,
+        mocker: MockerFixture,
+    ) -> None:
+        """Linhas após o último created_at vão direto para a hypertable, ordenadas."""
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        # Último created_at gravado e nenhum chunk comprimido
+        mock_conn.execute.return_value.scalar.side_effect = [
+            datetime(2024, 1, 15, tzinfo=UTC),
+            None,
+            None,
+        ]
+        mocker.patch.object(
+            hypertable_dataset, "_get_sqlalchemy_engine", return_value=mock_engine
+        )
+        mock_copy = mocker.patch.object(hypertable_dataset, "_copy_binary")
+
+        hypertable_dataset.save(MagicMock(to_pyarrow=lambda: events_arrow))
+
+        # 1º COPY: direto na hypertable, apenas fevereiro e março, em ordem
+        target, direct_rows = mock_copy.call_args_list[0][0][1:]
+        assert target == 'public."my_table"'
+        assert direct_rows["id"].to_pylist() == [2, 3]
+
+        # 2º COPY: tabela temporária com o intervalo já carregado (merge)
+        temp_target, merge_rows = mock_copy.call_args_list[1][0][1:]
+        assert temp_target.startswith("tmp_my_table")
+        assert merge_rows["id"].to_pylist() == [1]
+
+        executed = [str(c[0][0]) for c in mock_conn.execute.call_args_list]
+        assert any('WHERE "created_at" > :watermark' in sql for sql in executed)
+        assert any("ON CONFLICT" in sql for sql in executed)
+
+    @pytest.mark.parametrize(
+        ("boundary", "merged_ids"),
+        [
+            (datetime(2024, 2, 1, tzinfo=UTC), [2]),
+            (datetime(2024, 3, 1, tzinfo=UTC), None),
+        ],
+    )
+    def test_hypertable_merge_skips_compressed_chunks(
+        self,
+        hypertable_dataset: IbisUpsertDataset,
+        events_arrow: pa.Table,
+        mocker: MockerFixture,
+        boundary: datetime,
+        merged_ids: list[int] | None,
+    ) -> None:
+        """Linhas de chunks já comprimidos não passam pelo ON CONFLICT."""
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mock_conn.execute.return_value.scalar.side_effect = [
+            datetime(2024, 2, 15, tzinfo=UTC),
+            boundary,
+            None,
+        ]
+        mocker.patch.object(
+            hypertable_dataset, "_get_sqlalchemy_engine", return_value=mock_engine
+        )
+        mock_copy = mocker.patch.object(hypertable_dataset, "_copy_binary")
+
+        hypertable_dataset.save(MagicMock(to_pyarrow=lambda: events_arrow))
+
+        executed = " ".join(str(c[0][0]) for c in mock_conn.execute.call_args_list)
+        assert "timescaledb_information.chunks" in executed
+
+        if merged_ids is None:
+            mock_copy.assert_called_once()
+            assert "ON CONFLICT" not in executed
+        else:
+            assert mock_copy.call_args_list[1][0][2]["id"].to_pylist() == merged_ids
+            assert "ON CONFLICT" in executed
+
+    def test_hypertable_skips_merge_when_all_rows_are_new(
+        self,
+        hypertable_dataset: IbisUpsertDataset,
+        events_arrow: pa.Table,
+        mocker: MockerFixture,
+    ) -> None:
+        """Hypertable vazia: todo o lote é carregado via COPY, sem tabela temporária."""
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mock_conn.execute.return_value.scalar.return_value = None
+        mocker.patch.object(
+            hypertable_dataset, "_get_sqlalchemy_engine", return_value=mock_engine
+        )
+        mock_copy = mocker.patch.object(hypertable_dataset, "_copy_binary")
+
+        hypertable_dataset.save(MagicMock(to_pyarrow=lambda: events_arrow))
+
+        mock_copy.assert_called_once()
+        assert mock_copy.call_args[0][2]["id"].to_pylist() == [1, 2, 3]
+
+        executed = " ".join(str(c[0][0]) for c in mock_conn.execute.call_args_list)
+        assert "CREATE TEMP TABLE" not in executed
+        assert "ON CONFLICT" not in executed
+
+    def test_hypertable_compresses_old_chunks(
+        self,
+        hypertable_dataset: IbisUpsertDataset,
+        events_arrow: pa.Table,
+        mocker: MockerFixture,
+    ) -> None:
+        """Após a carga, chunks mais antigos que compress_after são comprimidos."""
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mock_conn.execute.return_value.scalar.return_value = None
+        mocker.patch.object(
+            hypertable_dataset, "_get_sqlalchemy_engine", return_value=mock_engine
+        )
+        mocker.patch.object(hypertable_dataset, "_copy_binary")
+
+        hypertable_dataset.save(MagicMock(to_pyarrow=lambda: events_arrow))
+
+        sql, params = mock_conn.execute.call_args[0]
+        assert "compress_chunk" in str(sql)
+        assert "drop_chunks" not in " ".join(
+            str(c[0][0]) for c in mock_conn.execute.call_args_list
+        )
+        assert params == {"relation": "public.my_table", "age": "3 months"}
+
+    def test_hypertable_maintenance_failure_is_logged(
+        self, hypertable_dataset: IbisUpsertDataset
+    ) -> None:
+        """Falha na compressão não desfaz a carga já confirmada."""
+        mock_engine = MagicMock()
+        mock_engine.begin.return_value.__enter__.return_value.execute.side_effect = (
+            SQLAlchemyError("compressão indisponível")
+        )
+
+        hypertable_dataset._maintain_hypertable(
+            mock_engine, "raw_data", {"compress_after": "3 months"}
+        )
+
+    # 5. Testes de Tabelas Particionadas
+    def test_partitioned_merge_targets_batch_months(
+        self,
+        dataset: IbisUpsertDataset,
+        events_arrow: pa.Table,
+        mocker: MockerFixture,
+    ) -> None:
+        """O merge é feito direto em cada partição mensal coberta pelo lote."""
+        dataset._is_upsert = True
+        dataset._save_args = {
+            "index_elements": ["id", "created_at"],
+            "partitioning": {"column": "created_at", "premake_months": 0},
+        }
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.pg_copy.ArrowToPostgresBinaryEncoder"
+        )
+        mocker.patch.object(dataset, "_copy_binary")
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
+
+        # Apenas janeiro já existe
+        mock_conn.execute.return_value.scalars.return_value.all.return_value = [
+            "my_table_p2024_01"
+        ]
+
+        dataset.save(MagicMock(to_pyarrow=lambda: events_arrow))
+
+        executed = [str(c[0][0]) for c in mock_conn.execute.call_args_list]
+        created = [sql for sql in executed if "PARTITION OF" in sql]
+        merges = [sql for sql in executed if "ON CONFLICT" in sql]
+        analyzed = [sql for sql in executed if sql.startswith("ANALYZE")]
+
+        assert not any("my_table_p2024_01" in sql for sql in created)
+        assert any(
+            'public."my_table_p2024_02"' in sql
+            and "FROM ('2024-02-01T00:00:00+00:00') TO ('2024-03-01T00:00:00+00:00')"
+            in sql
+            for sql in created
+        )
+        assert [m.split('"')[1] for m in merges] == [
+            "my_table_p2024_01",
+            "my_table_p2024_02",
+            "my_table_p2024_03",
+        ]
+        assert 'AS "my_table"' in merges[0]
+        assert "\"created_at\" >= '2024-01-01T00:00:00+00:00'" in merges[0]
+        assert analyzed == [
+            'ANALYZE public."my_table_p2024_01"',
+            'ANALYZE public."my_table_p2024_02"',
+            'ANALYZE public."my_table_p2024_03"',
+        ]
+
+    def test_partitions_are_premade(
+        self, dataset: IbisUpsertDataset, events_arrow: pa.Table
+    ) -> None:
+        """Partições futuras são criadas a partir do mês corrente."""
+        conn = MagicMock()
+        conn.execute.return_value.scalars.return_value.all.return_value = []
+
+        targets = dataset._ensure_partitions(
+            conn, "raw_data", events_arrow, {"premake_months": 2}
+        )
+
+        current = datetime.now(UTC)
+        created = " ".join(str(c[0][0]) for c in conn.execute.call_args_list)
+
+        assert len(targets) == 3
+        assert f"my_table_p{current:%Y_%m}" in created
+        assert 'PARTITION OF raw_data."my_table"' in created
+
+    def test_track_changes_reports_changed_days(
+        self,
+        dataset: IbisUpsertDataset,
+        events_arrow: pa.Table,
+        mocker: MockerFixture,
+        caplog: pytest.LogCaptureFixture,
+    ) -> None:
+        """O UPSERT com CDC informa quantas linhas mudaram em quais dias de created_at."""
+        dataset._is_upsert = True
+        dataset._save_args = {"index_elements": ["id"], "track_changes": True}
+        mocker.patch.object(dataset, "_copy_binary")
+        mock_engine = MagicMock()
+        mock_conn = mock_engine.begin.return_value.__enter__.return_value
+        mock_conn.execute.return_value.all.return_value = [
+            (date(2024, 2, 1), 3),
+            (date(2024, 1, 1), 2),
+        ]
+        mocker.patch.object(dataset, "_get_sqlalchemy_engine", return_value=mock_engine)
+
+        with caplog.at_level("INFO"):
+            dataset.save(MagicMock(to_pyarrow=lambda: events_arrow))
+
+        assert "5 linhas alteradas em 2 dias (2024-01-01 a 2024-02-01)" in caplog.text
@@ -8,7 +8,14 @@ from kedro.pipeline.node import Node
 from pytest_mock import MockerFixture
 from sqlalchemy import Engine
 
-from thelook_ecommerce_analysis.hooks import CreateIndexesHook, ResourceMonitoringHook
+from thelook_ecommerce_analysis.datasets.ibis_multi_file_dataset import (
+    IbisMultiFileDataset,
+)
+from thelook_ecommerce_analysis.hooks import (
+    CreateIndexesHook,
+    FileCountsReportHook,
+    ResourceMonitoringHook,
+)
 
 # Importe suas classes aqui
 # from seu_projeto.hooks import ResourceMonitoringHook, CreateIndexesHook
@@ -157,3 +164,50 @@ class TestCreateIndexesHook:
 
         # Test after_pipeline
         hook.after_pipeline_run({}, MagicMock(), catalog)
+
+
+class TestFileCountsReportHook:
+    @pytest.fixture
+    def hook(self) -> FileCountsReportHook:
+        return FileCountsReportHook()
+
+    def _catalog(self, dataset: object) -> MagicMock:
+        catalog = MagicMock(spec=DataCatalog)
+        catalog.get.return_value = dataset
+        return catalog
+
+    def test_saves_file_counts_report(self, hook: FileCountsReportHook):
+        dataset = MagicMock(spec=IbisMultiFileDataset)
+        dataset.file_counts = {"a.parquet": 2, "b.parquet": 1}
+        catalog = self._catalog(dataset)
+
+        hook.before_pipeline_run({}, MagicMock(), catalog)
+        hook.after_dataset_loaded("raw_events", MagicMock(), MagicMock())
+
+        catalog.save.assert_called_once_with(
+            "reporting_raw_events_files",
+            {
+                "dataset": "raw_events",
+                "files": 2,
+                "rows": 3,
+                "file_rows": {"a.parquet": 2, "b.parquet": 1},
+            },
+        )
+
+    def test_rows_unknown_outside_parquet(self, hook: FileCountsReportHook):
+        dataset = MagicMock(spec=IbisMultiFileDataset)
+        dataset.file_counts = {"a.csv": None}
+        catalog = self._catalog(dataset)
+
+        hook.before_pipeline_run({}, MagicMock(), catalog)
+        hook.after_dataset_loaded("raw_events", MagicMock(), MagicMock())
+
+        assert catalog.save.call_args[0][1]["rows"] is None
+
+    def test_ignores_other_datasets(self, hook: FileCountsReportHook):
+        catalog = self._catalog(MagicMock())
+
+        hook.before_pipeline_run({}, MagicMock(), catalog)
+        hook.after_dataset_loaded("primary_events", MagicMock(), MagicMock())
+
+        catalog.save.assert_not_called()
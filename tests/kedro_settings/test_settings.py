@@ -4,7 +4,11 @@ from kedro.config import OmegaConfigLoader
 from pytest_mock import MockerFixture
 
 from thelook_ecommerce_analysis import settings
-from thelook_ecommerce_analysis.hooks import CreateIndexesHook, ResourceMonitoringHook
+from thelook_ecommerce_analysis.hooks import (
+    CreateIndexesHook,
+    FileCountsReportHook,
+    ResourceMonitoringHook,
+)
 
 
 class TestSettings:
@@ -25,14 +29,16 @@ class TestSettings:
         hooks = settings.HOOKS
 
         assert isinstance(hooks, tuple), "HOOKS deve ser uma tupla imutável"
-        assert len(hooks) == 2, "Esperado exatamente 2 hooks registrados"
+        assert len(hooks) == 3, "Esperado exatamente 3 hooks registrados"
 
         # Validar as instâncias
         has_monitoring = any(isinstance(hook, ResourceMonitoringHook) for hook in hooks)
         has_indexes = any(isinstance(hook, CreateIndexesHook) for hook in hooks)
+        has_file_counts = any(isinstance(hook, FileCountsReportHook) for hook in hooks)
 
         assert has_monitoring, "ResourceMonitoringHook não foi registrado"
         assert has_indexes, "CreateIndexesHook não foi registrado"
+        assert has_file_counts, "FileCountsReportHook não foi registrado"
 
     def test_config_loader_setup(self) -> None:
         """Testa a injeção do OmegaConfigLoader e a sobreposição de padrões."""
@@ -0,0 +1,154 @@
+from collections.abc import Callable, Iterable
+from typing import Any, Self
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.encoder import (
+    EncoderConfig,
+    benchmark_backend,
+    encode_texts,
+    length_buckets,
+    parity_check,
+    resolve_workers,
+)
+
+ENCODER = "thelook_ecommerce_analysis.pipelines.data_embedding.encoder"
+
+CONFIG = EncoderConfig("m")
+
+
+class _InlinePool:
+    """Substitui o ProcessPoolExecutor executando os lotes no próprio processo."""
+
+    def __init__(self, workers: int, **kwargs: Any) -> None:
+        self.workers = workers
+        self.kwargs = kwargs
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+    def map(self, func: Callable, items: Iterable) -> Iterable:
+        return map(func, items)
+
+
+class TestEncoder:
+    """Suíte de testes para a codificação em lotes por comprimento."""
+
+    @pytest.fixture
+    def model(self, mocker: MockerFixture) -> MagicMock:
+        """Modelo falso: o vetor de cada texto é (comprimento, 1)."""
+        model = MagicMock()
+        model.encode.side_effect = lambda texts, **kwargs: np.array(
+            [[len(t), 1.0] for t in texts]
+        )
+        mocker.patch(f"{ENCODER}.load_model", return_value=model)
+        return model
+
+    def test_length_buckets(self) -> None:
+        """Lotes homogêneos, do texto mais longo ao mais curto."""
+        texts = ["a", "aaaa", "aa", "aaaaa", "aaa"]
+
+        buckets = length_buckets(texts, batch_size=2)
+
+        assert [b.tolist() for b in buckets] == [[3, 1], [4, 2], [0]]
+
+    @pytest.mark.parametrize(
+        ("workers", "n_buckets", "expected"),
+        [(1, 10, 1), (4, 2, 2), (8, 10, 8), (0, 1, 1)],
+    )
+    def test_resolve_workers(self, workers: int, n_buckets: int, expected: int) -> None:
+        assert resolve_workers(workers, n_buckets) == expected
+
+    def test_preserves_order(self, model: MagicMock) -> None:
+        """Os vetores voltam para a posição original de cada texto."""
+        texts = ["bb", "a", "dddd", "ccc"]
+
+        vectors = encode_texts(texts, CONFIG, batch_size=2)
+
+        assert vectors.dtype == np.float32
+        assert vectors[:, 0].tolist() == [2, 1, 4, 3]
+        assert [c.args[0] for c in model.encode.call_args_list] == [
+            ["dddd", "ccc"],
+            ["bb", "a"],
+        ]
+
+    def test_process_pool(self, model: MagicMock, mocker: MockerFixture) -> None:
+        """Com vários processos, cada processo recebe o modelo e os lotes via initializer."""
+        pools: list[_InlinePool] = []
+
+        def make_pool(workers: int, **kwargs: Any) -> _InlinePool:
+            pools.append(_InlinePool(workers, **kwargs))
+            return pools[-1]
+
+        mocker.patch(f"{ENCODER}.ProcessPoolExecutor", side_effect=make_pool)
+        texts = ["bb", "a", "dddd", "ccc", "eeeee"]
+
+        vectors = encode_texts(texts, CONFIG, batch_size=2, workers=2)
+
+        assert vectors[:, 0].tolist() == [2, 1, 4, 3, 5]
+        assert pools[0].workers == 2
+        assert pools[0].kwargs["initargs"][0] == CONFIG
+
+    def test_empty(self, model: MagicMock) -> None:
+        """Sem textos, a matriz vazia mantém a dimensão do modelo."""
+        model.get_sentence_embedding_dimension.return_value = 2
+
+        assert encode_texts([], CONFIG).shape == (0, 2)
+        model.encode.assert_not_called()
+
+
+class TestBackends:
+    """Suíte de testes para a configuração e o benchmark dos backends de inferência."""
+
+    def test_from_params(self) -> None:
+        config = EncoderConfig.from_params(
+            {
+                "embedding_model": "m",
+                "backend": "onnx-int8",
+                "onnx_quantization": "arm64",
+            }
+        )
+
+        assert config == EncoderConfig("m", backend="onnx-int8", quantization="arm64")
+        assert config.fingerprint == "m@onnx-int8-arm64"
+        assert EncoderConfig("m").fingerprint == "m"
+
+    def test_invalid_backend(self) -> None:
+        with pytest.raises(ValueError, match="Backend"):
+            EncoderConfig.from_params({"embedding_model": "m", "backend": "tensorrt"})
+
+    def test_parity_check(self) -> None:
+        reference = np.array([[1.0, 0.0], [0.0, 1.0]])
+        candidate = np.array([[1.0, 0.0], [0.6, 0.8]])
+
+        assert parity_check(reference, candidate) == {
+            "min_cosine": 0.8,
+            "mean_cosine": 0.9,
+        }
+        empty = np.empty((0, 2))
+        assert parity_check(empty, empty) == {"min_cosine": None, "mean_cosine": None}
+
+    def test_benchmark_compares_with_torch(self, mocker: MockerFixture) -> None:
+        """A referência é sempre o mesmo modelo no backend torch."""
+        models = {
+            "torch": np.array([[1.0, 0.0]], np.float32),
+            "onnx": np.array([[0.6, 0.8]], np.float32),
+        }
+        mock_encode = mocker.patch(
+            f"{ENCODER}.encode_texts",
+            side_effect=lambda texts, config, batch_size: models[config.backend],
+        )
+
+        report = benchmark_backend(["a"], EncoderConfig("m", backend="onnx"), 8)
+
+        backends = [c.args[1].backend for c in mock_encode.call_args_list]
+        assert backends == ["torch", "onnx"]
+        assert report["backend"] == "onnx"
+        assert report["min_cosine"] == pytest.approx(0.6)
+        assert {"torch_s", "backend_s", "speedup", "backend_rss_mb"} <= set(report)
@@ -0,0 +1,225 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from collections.abc import Iterator
+from dataclasses import replace
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.pipelines.data_embedding import model_server
+from thelook_ecommerce_analysis.pipelines.data_embedding.encoder import (
+    EncoderConfig,
+    encode_texts,
+)
+from thelook_ecommerce_analysis.pipelines.data_embedding.model_server import (
+    BatchCoalescer,
+    EmbeddingServer,
+    create_server,
+    encode_remote,
+)
+
+ENCODER = "thelook_ecommerce_analysis.pipelines.data_embedding.encoder"
+
+CONFIG = EncoderConfig("m")
+
+
+def _fake_encode(texts: list[str]) -> np.ndarray:
+    """O vetor de cada texto é (comprimento, 1)."""
+    return np.array([[len(t), 1.0] for t in texts], np.float32).reshape(-1, 2)
+
+
+@pytest.fixture(autouse=True)
+def reset_backoff() -> Iterator[None]:
+    model_server._unavailable_until.clear()
+    yield
+    model_server._unavailable_until.clear()
+
+
+@pytest.fixture
+def server() -> Iterator[EmbeddingServer]:
+    server = create_server(CONFIG, ("127.0.0.1", 0), encode=_fake_encode)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server: EmbeddingServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+class TestBatchCoalescer:
+    """Suíte de testes para o agrupamento de requisições concorrentes."""
+
+    def test_coalesces_concurrent_requests(self) -> None:
+        encode = MagicMock(side_effect=_fake_encode)
+        coalescer = BatchCoalescer(encode, max_wait_ms=200, max_batch=100)
+
+        futures = [coalescer.submit(["a" * i, "b"]) for i in range(1, 4)]
+        results = [future.result(timeout=5) for future in futures]
+        coalescer.close()
+
+        encode.assert_called_once()
+        assert [r[:, 0].tolist() for r in results] == [[1, 1], [2, 1], [3, 1]]
+        assert coalescer.stats == {"requests": 3, "batches": 1, "texts": 6}
+
+    def test_max_batch_closes_window(self) -> None:
+        encode = MagicMock(side_effect=_fake_encode)
+        coalescer = BatchCoalescer(encode, max_wait_ms=10_000, max_batch=2)
+
+        result = coalescer.submit(["aa", "b"]).result(timeout=5)
+        coalescer.close()
+
+        assert result.shape == (2, 2)
+
+    def test_propagates_errors(self) -> None:
+        coalescer = BatchCoalescer(
+            MagicMock(side_effect=RuntimeError("oom")), max_wait_ms=1
+        )
+
+        with pytest.raises(RuntimeError, match="oom"):
+            coalescer.submit(["a"]).result(timeout=5)
+        coalescer.close()
+
+    def test_rejects_after_close(self) -> None:
+        """Requisições após o encerramento falham em vez de esperar para sempre."""
+        coalescer = BatchCoalescer(MagicMock(side_effect=_fake_encode))
+        coalescer.close()
+
+        with pytest.raises(RuntimeError, match="encerrado"):
+            coalescer.submit(["a"])
+        coalescer.close()
+
+
+class TestServer:
+    """Suíte de testes para o servidor HTTP e o cliente."""
+
+    def test_encode_remote(self, server: EmbeddingServer) -> None:
+        vectors = encode_remote(["bb", "a", "dddd"], _url(server), CONFIG.fingerprint)
+
+        assert vectors is not None
+        assert vectors.dtype == np.float32
+        assert vectors[:, 0].tolist() == [2, 1, 4]
+
+    def test_chunks_large_requests(
+        self, server: EmbeddingServer, mocker: MockerFixture
+    ) -> None:
+        mocker.patch.object(model_server, "CLIENT_CHUNK_TEXTS", 2)
+
+        vectors = encode_remote(["a", "bb", "ccc"], _url(server), CONFIG.fingerprint)
+
+        assert vectors is not None
+        assert vectors[:, 0].tolist() == [1, 2, 3]
+
+    def test_empty_keeps_dimensions(self, server: EmbeddingServer) -> None:
+        vectors = encode_remote([], _url(server), CONFIG.fingerprint)
+
+        assert vectors is not None
+        assert vectors.shape == (0, 2)
+
+    def test_health(self, server: EmbeddingServer) -> None:
+        encode_remote(["a"], _url(server), CONFIG.fingerprint)
+
+        with urllib.request.urlopen(f"{_url(server)}/health") as response:  # noqa: S310
+            health = json.loads(response.read())
+
+        assert health["model"] == "m"
+        assert health["texts"] == 1
+
+    def test_other_model_falls_back(self, server: EmbeddingServer) -> None:
+        """Vetores de outro modelo/backend não são aceitos (409): o cliente usa o local."""
+        assert encode_remote(["a"], _url(server), "m@onnx") is None
+
+    def test_encode_error_returns_500(self) -> None:
+        """Uma falha do modelo vira um 500 em JSON: o cliente usa a codificação local."""
+        server = create_server(
+            CONFIG, ("127.0.0.1", 0), encode=MagicMock(side_effect=RuntimeError("oom"))
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        request = urllib.request.Request(  # noqa: S310
+            f"{_url(server)}/encode",
+            data=json.dumps({"model": "m", "texts": ["a"]}).encode("utf-8"),
+            method="POST",
+        )
+        try:
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(request)  # noqa: S310
+            assert error.value.code == 500
+            assert json.loads(error.value.read()) == {"error": "oom"}
+            assert encode_remote(["a"], _url(server), CONFIG.fingerprint) is None
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @pytest.mark.parametrize(
+        "body",
+        [b"{not json", b"[]", b'{"model": "m"}', b'{"model": "m", "texts": [1]}'],
+    )
+    def test_invalid_request_returns_400(
+        self, server: EmbeddingServer, body: bytes
+    ) -> None:
+        request = urllib.request.Request(  # noqa: S310
+            f"{_url(server)}/encode", data=body, method="POST"
+        )
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)  # noqa: S310
+
+        assert error.value.code == 400
+        assert "error" in json.loads(error.value.read())
+
+    def test_unavailable_backs_off(self, mocker: MockerFixture) -> None:
+        urlopen = mocker.patch.object(
+            model_server.urllib.request, "urlopen", side_effect=ConnectionRefusedError
+        )
+
+        assert encode_remote(["a"], "http://localhost:1", "m") is None
+        assert encode_remote(["a"], "http://localhost:1", "m") is None
+        urlopen.assert_called_once()
+
+
+class TestEncodeTextsWithServer:
+    """Suíte de testes para o uso do servidor em `encode_texts`."""
+
+    @pytest.fixture
+    def model(self, mocker: MockerFixture) -> MagicMock:
+        model = MagicMock()
+        model.encode.side_effect = lambda texts, **kwargs: _fake_encode(texts)
+        mocker.patch(f"{ENCODER}.load_model", return_value=model)
+        return model
+
+    def test_uses_server(self, server: EmbeddingServer, model: MagicMock) -> None:
+        config = replace(CONFIG, server_url=_url(server))
+
+        vectors = encode_texts(["bb", "a"], config)
+
+        assert vectors[:, 0].tolist() == [2, 1]
+        model.encode.assert_not_called()
+
+    def test_falls_back_to_local(self, model: MagicMock) -> None:
+        config = replace(CONFIG, server_url="http://127.0.0.1:1")
+
+        vectors = encode_texts(["bb", "a"], config)
+
+        assert vectors[:, 0].tolist() == [2, 1]
+        model.encode.assert_called_once()
+
+    def test_from_params(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("EMBEDDING_SERVER_URL", "http://embedding-server:8765")
+        assert EncoderConfig.from_params({"embedding_model": "m"}).server_url == (
+            "http://embedding-server:8765"
+        )
+
+        config = EncoderConfig.from_params(
+            {"embedding_model": "m", "server": {"url": "http://x:1", "timeout_s": 5}}
+        )
+        assert (config.server_url, config.server_timeout_s) == ("http://x:1", 5)
+        # O servidor não altera os vetores: o fingerprint (content_hash) é o mesmo
+        assert config.fingerprint == CONFIG.fingerprint
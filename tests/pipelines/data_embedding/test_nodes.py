@@ -0,0 +1,451 @@
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import numpy as np
+import pyarrow as pa
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.encoder import EncoderConfig
+from thelook_ecommerce_analysis.pipelines.data_embedding.nodes import (
+    _fit_projection,
+    build_schema_context,
+    embed_changed_chunks,
+    export_vector_snapshot,
+)
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import PcaProjection
+
+NODES = "thelook_ecommerce_analysis.pipelines.data_embedding.nodes"
+
+HNSW = {
+    "m": 16,
+    "ef_construction": 64,
+    "maintenance_workers": 2,
+    "maintenance_work_mem": "64MB",
+    "bulk_load_fraction": 0.1,
+}
+
+PARAMS = {
+    "embedding_model": "all-MiniLM-L6-v2",
+    "batch_size": 32,
+    "device": "cpu",
+    "hnsw": HNSW,
+}
+
+
+class TestEmbedChangedChunks:
+    """Suíte de testes para a geração incremental de embeddings."""
+
+    @pytest.fixture
+    def target(self, tmp_path: Path) -> dict[str, Any]:
+        chunks = tmp_path / "chunks.sql"
+        chunks.write_text(
+            "-- Parâmetros: :model\n"
+            "SELECT id, txt, md5(:model || txt) FROM raw_data.products;\n"
+        )
+        merge = tmp_path / "merge.sql"
+        merge.write_text(
+            "INSERT INTO embeddings.x SELECT * FROM embedding_stage;\n\n"
+            "UPDATE embeddings.x SET y = 1;\n"
+        )
+        return {
+            "table": "embeddings.x",
+            "chunks_query": str(chunks),
+            "merge_query": str(merge),
+            "index": {
+                "name": "idx_x",
+                "column": "embedding",
+                "opclass": "vector_cosine_ops",
+            },
+        }
+
+    @pytest.fixture(autouse=True)
+    def mock_ensure_column(self, mocker: MockerFixture) -> MagicMock:
+        """A coluna de embeddings já está no formato configurado."""
+        return mocker.patch(f"{NODES}.ensure_column", return_value=False)
+
+    def _conn(self, engine: MagicMock) -> MagicMock:
+        return engine.begin.return_value.__enter__.return_value
+
+    def test_no_changes_skips_encoding(
+        self, target: dict[str, Any], mocker: MockerFixture
+    ) -> None:
+        """Sem hashes divergentes o modelo não é carregado e nada é gravado."""
+        mock_encode = mocker.patch(f"{NODES}.encode_texts")
+        engine = MagicMock()
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = []
+
+        report = embed_changed_chunks(engine, target, PARAMS)
+
+        mock_encode.assert_not_called()
+        sql, params = conn.execute.call_args_list[0][0]
+        assert "md5(:model || txt)" in str(sql)
+        assert params == {"model": "all-MiniLM-L6-v2"}
+        # Nada a gravar: apenas o índice ausente seria recriado (IF NOT EXISTS)
+        executed = " ".join(str(c[0][0]) for c in conn.execute.call_args_list[1:])
+        assert "CREATE INDEX IF NOT EXISTS" in executed
+        assert "embedding_stage" not in executed
+        assert report["changed_rows"] == 0
+        assert report["encoded_texts"] == 0
+
+    def test_syncs_metadata_without_changes(
+        self, target: dict[str, Any], tmp_path: Path, mocker: MockerFixture
+    ) -> None:
+        """O gasto médio é sincronizado mesmo sem textos alterados."""
+        sync = tmp_path / "sync.sql"
+        sync.write_text("UPDATE embeddings.x SET avg_spend = 1;\n")
+        mock_encode = mocker.patch(f"{NODES}.encode_texts")
+        engine = MagicMock()
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = []
+        conn.execute.return_value.rowcount = 7
+
+        report = embed_changed_chunks(
+            engine, {**target, "sync_query": str(sync)}, PARAMS
+        )
+
+        mock_encode.assert_not_called()
+        executed = [str(c[0][0]) for c in conn.execute.call_args_list]
+        assert executed[-1] == "UPDATE embeddings.x SET avg_spend = 1"
+        assert report["synced_rows"] == 7
+
+    def test_encodes_unique_texts_and_merges(
+        self, target: dict[str, Any], mocker: MockerFixture
+    ) -> None:
+        """Textos repetidos são codificados uma vez e cada registro recebe o seu vetor."""
+        mock_encode = mocker.patch(
+            f"{NODES}.encode_texts",
+            return_value=np.array([[1.0, 0.0], [0.0, 1.0]], np.float32),
+        )
+        mock_copy = mocker.patch(f"{NODES}.copy_arrow_binary")
+        engine = MagicMock()
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = [
+            (1, "a", "h1"),
+            (2, "b", "h2"),
+            (3, "a", "h1"),
+        ]
+        conn.execute.return_value.scalar.return_value = 0
+
+        report = embed_changed_chunks(engine, target, PARAMS)
+
+        mock_encode.assert_called_once_with(
+            ["a", "b"], EncoderConfig("all-MiniLM-L6-v2"), 32, 1
+        )
+
+        target_table, staged = mock_copy.call_args[0][1:]
+        assert target_table == "embedding_stage"
+        assert staged.column("source_id").to_pylist() == [1, 2, 3]
+        assert staged.schema.field("embedding").type == pa.list_(pa.float32(), 2)
+        assert staged.column("embedding").to_pylist() == [[1, 0], [0, 1], [1, 0]]
+
+        executed = [str(c[0][0]) for c in conn.execute.call_args_list]
+        merge = executed.index("INSERT INTO embeddings.x SELECT * FROM embedding_stage")
+        assert executed[merge + 1] == "UPDATE embeddings.x SET y = 1"
+        assert report["changed_rows"] == 3
+        assert report["encoded_texts"] == 2
+
+    def test_encodes_outside_transactions(
+        self, target: dict[str, Any], mocker: MockerFixture
+    ) -> None:
+        """A leitura é confirmada antes da codificação; a gravação usa nova transação."""
+        engine = MagicMock()
+        transaction = engine.begin.return_value
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = [(1, "a", "h1")]
+        conn.execute.return_value.scalar.return_value = 0
+        open_transactions = []
+
+        def encode(texts: list[str], *args: Any) -> np.ndarray:
+            open_transactions.append(
+                transaction.__enter__.call_count - transaction.__exit__.call_count
+            )
+            return np.ones((len(texts), 2), np.float32)
+
+        mocker.patch(f"{NODES}.encode_texts", side_effect=encode)
+        mock_copy = mocker.patch(f"{NODES}.copy_arrow_binary")
+
+        embed_changed_chunks(engine, target, PARAMS)
+
+        assert open_transactions == [0]
+        assert engine.begin.call_count == 2
+        mock_copy.assert_called_once()
+
+    def test_backend_without_parity_fails_before_writing(
+        self, target: dict[str, Any], mocker: MockerFixture
+    ) -> None:
+        """Backend ONNX com paridade insuficiente interrompe o nó antes do merge."""
+        mock_benchmark = mocker.patch(
+            f"{NODES}.benchmark_backend", return_value={"min_cosine": 0.9}
+        )
+        mock_encode = mocker.patch(f"{NODES}.encode_texts")
+        engine = MagicMock()
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = [(1, "a", "h1")]
+        conn.execute.return_value.scalars.return_value.all.return_value = ["b", "a"]
+        params = {
+            **PARAMS,
+            "backend": "onnx-int8",
+            "benchmark_sample": 10,
+            "parity_min_cosine": 0.99,
+        }
+
+        with pytest.raises(ValueError, match="paridade"):
+            embed_changed_chunks(engine, target, params)
+
+        texts, config, batch_size = mock_benchmark.call_args[0]
+        assert texts == ["b", "a"]
+        assert config.backend == "onnx-int8"
+        mock_encode.assert_not_called()
+        # O hash identifica o backend: trocar de backend regenera os vetores
+        assert conn.execute.call_args_list[0][0][1] == {
+            "model": "all-MiniLM-L6-v2@onnx-int8-avx2"
+        }
+
+    def test_backend_benchmark_skipped_without_texts(
+        self, target: dict[str, Any], mocker: MockerFixture
+    ) -> None:
+        """Tabela vazia e nenhum texto alterado: o benchmark não tem amostra."""
+        mock_benchmark = mocker.patch(f"{NODES}.benchmark_backend")
+        engine = MagicMock()
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = []
+        conn.execute.return_value.scalars.return_value.all.return_value = []
+        params = {**PARAMS, "backend": "onnx", "benchmark_sample": 10}
+
+        report = embed_changed_chunks(engine, target, params)
+
+        mock_benchmark.assert_not_called()
+        assert report["benchmark"] == {"texts": 0, "backend": "onnx"}
+
+    @pytest.mark.parametrize(
+        ("reltuples", "deferred"), [(-1.0, True), (20.0, True), (1000.0, False)]
+    )
+    def test_bulk_load_defers_hnsw_index(
+        self,
+        target: dict[str, Any],
+        mocker: MockerFixture,
+        reltuples: float,
+        deferred: bool,
+    ) -> None:
+        """Cargas grandes removem o índice antes do merge e o reconstroem ao final."""
+        mocker.patch(
+            f"{NODES}.encode_texts",
+            return_value=np.array([[1.0, 0.0], [0.0, 1.0]], np.float32),
+        )
+        mocker.patch(f"{NODES}.copy_arrow_binary")
+        engine = MagicMock()
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = [(1, "a", "h1"), (2, "b", "h2")]
+        conn.execute.return_value.scalar.return_value = reltuples
+
+        report = embed_changed_chunks(engine, target, PARAMS)
+
+        executed = [" ".join(str(c[0][0]).split()) for c in conn.execute.call_args_list]
+        merge = executed.index("INSERT INTO embeddings.x SELECT * FROM embedding_stage")
+        create = next(i for i, sql in enumerate(executed) if "CREATE INDEX" in sql)
+        assert ("DROP INDEX IF EXISTS embeddings.idx_x" in executed[:merge]) is deferred
+        assert create > merge
+        assert "USING hnsw (embedding vector_cosine_ops)" in executed[create]
+        assert "WITH (m = 16, ef_construction = 64)" in executed[create]
+        assert report["hnsw"]["deferred"] is deferred
+
+    def test_halfvec_with_pca(
+        self, target: dict[str, Any], mocker: MockerFixture, tmp_path: Path
+    ) -> None:
+        """Com PCA, a projeção entra no hash e os vetores reduzidos vão como halfvec."""
+        projection = PcaProjection(
+            mean=np.zeros(3, np.float32),
+            components=np.eye(3, dtype=np.float32)[:2],
+            explained_variance=0.9,
+        )
+        mocker.patch(f"{NODES}._fit_projection", return_value=projection)
+        mocker.patch(
+            f"{NODES}.encode_texts",
+            return_value=np.array([[3.0, 4.0, 1.0]], np.float32),
+        )
+        mock_copy = mocker.patch(f"{NODES}.copy_arrow_binary")
+        engine = MagicMock()
+        conn = self._conn(engine)
+        conn.execute.return_value.all.return_value = [(1, "a", "h1")]
+        conn.execute.return_value.scalar.return_value = 100.0
+        params = {
+            **PARAMS,
+            "dimensions": 3,
+            "storage": {
+                "type": "halfvec",
+                "pca_dimensions": 2,
+                "pca_dir": str(tmp_path),
+            },
+        }
+
+        report = embed_changed_chunks(engine, target, params)
+
+        fingerprint = conn.execute.call_args_list[0][0][1]["model"]
+        assert fingerprint == f"all-MiniLM-L6-v2|pca2-{projection.digest}"
+        staged = mock_copy.call_args[0][2]
+        assert staged.schema.field("embedding").type == pa.list_(pa.float16(), 2)
+        assert np.allclose(
+            staged.column("embedding").to_pylist(), [[0.6, 0.8]], atol=1e-3
+        )
+        executed = [" ".join(str(c[0][0]).split()) for c in conn.execute.call_args_list]
+        assert any("embedding halfvec" in sql for sql in executed)
+        assert any("halfvec_cosine_ops" in sql for sql in executed)
+        assert report["storage"] == "halfvec(2)"
+
+
+class TestFitProjection:
+    """Suíte de testes para a persistência da PCA (arquivo + banco)."""
+
+    PROJECTION = PcaProjection(
+        mean=np.zeros(3, np.float32),
+        components=np.eye(3, dtype=np.float32)[:2],
+        explained_variance=0.9,
+    )
+
+    def _executed(self, conn: MagicMock) -> list[str]:
+        return [" ".join(str(c[0][0]).split()) for c in conn.execute.call_args_list]
+
+    def _engine(self) -> tuple[MagicMock, MagicMock]:
+        engine = MagicMock()
+        return engine, engine.begin.return_value.__enter__.return_value
+
+    def test_restores_file_from_database(self, tmp_path: Path) -> None:
+        """Volume recriado: a PCA vem do banco (sem reajuste) e o arquivo é restaurado."""
+        engine, conn = self._engine()
+        conn.execute.return_value.scalar.return_value = self.PROJECTION.to_bytes()
+        path = tmp_path / "x_pca2.npz"
+
+        projection = _fit_projection(
+            engine, "SELECT 1", path, EncoderConfig("m"), PARAMS
+        )
+
+        assert projection.digest == self.PROJECTION.digest
+        assert PcaProjection.load(path).digest == self.PROJECTION.digest
+        assert conn.execute.call_count == 1
+
+    def test_stores_existing_file(self, tmp_path: Path) -> None:
+        """Arquivo de cargas anteriores sem cópia no banco: é gravado no banco."""
+        engine, conn = self._engine()
+        conn.execute.return_value.scalar.return_value = None
+        path = tmp_path / "x_pca2.npz"
+        self.PROJECTION.save(path)
+
+        projection = _fit_projection(
+            engine, "SELECT 1", path, EncoderConfig("m"), PARAMS
+        )
+
+        assert projection.digest == self.PROJECTION.digest
+        insert = self._executed(conn)[-1]
+        assert "INSERT INTO embeddings.storage_projections" in insert
+        assert conn.execute.call_args[0][1]["name"] == "x_pca2.npz"
+
+    def test_fits_and_stores(self, tmp_path: Path, mocker: MockerFixture) -> None:
+        mocker.patch(
+            f"{NODES}.encode_texts", return_value=np.eye(4, 3, dtype=np.float32)
+        )
+        engine, conn = self._engine()
+        conn.execute.return_value.scalar.return_value = None
+        conn.execute.return_value.__iter__.return_value = iter(
+            [(i, f"t{i}") for i in range(4)]
+        )
+        path = tmp_path / "x_pca2.npz"
+        params = {**PARAMS, "dimensions": 3, "storage": {"pca_dimensions": 2}}
+
+        projection = _fit_projection(
+            engine, "SELECT 1", path, EncoderConfig("m"), params
+        )
+
+        assert path.exists()
+        assert projection.components.shape == (2, 3)
+        assert "INSERT INTO embeddings.storage_projections" in self._executed(conn)[-1]
+
+
+class TestExportVectorSnapshot:
+    """Suíte de testes para a exportação do snapshot .npy dos vetores."""
+
+    def test_exports_by_key(self, mocker: MockerFixture, tmp_path: Path) -> None:
+        ids = np.array([1, 2], np.int64)
+        vectors = np.array([[1.0, 0.0], [0.0, 1.0]], np.float32)
+        mock_copy = mocker.patch(
+            f"{NODES}.copy_vectors_out", return_value=(ids, vectors)
+        )
+        target = {
+            "table": "embeddings.products_embeddings",
+            "snapshot_key": "source_id",
+            "index": {"name": "idx", "column": "embedding", "opclass": "x"},
+        }
+        params = {
+            **PARAMS,
+            "storage": {"type": "halfvec"},
+            "snapshot_dir": str(tmp_path),
+        }
+
+        first = export_vector_snapshot(MagicMock(), target, params)
+        second = export_vector_snapshot(MagicMock(), target, params)
+
+        query, column_type = mock_copy.call_args[0][1:]
+        assert "SELECT source_id::bigint, embedding" in query
+        assert "ORDER BY source_id" in query
+        assert column_type == "halfvec"
+        assert first["written"]
+        assert first["storage"] == "halfvec(384)"
+        assert (tmp_path / "products_embeddings.version.json").exists()
+        # Mesmo conteúdo: mesma versão, sem regravar
+        assert not second["written"]
+        assert second["version"] == first["version"]
+
+
+class TestBuildSchemaContext:
+    """Suíte de testes para a extração do catálogo comentado."""
+
+    CATALOG = [
+        {
+            "name": "metrics.daily_sales",
+            "kind": "TABLE",
+            "comment": "Vendas por dia.",
+            "columns": [
+                {"name": "day", "type": "date", "comment": None},
+                {"name": "gmv", "type": "numeric", "comment": "Vendas brutas."},
+            ],
+        },
+        {
+            "name": "raw_data.users",
+            "kind": "TABLE",
+            "comment": None,
+            "columns": [{"name": "id", "type": "bigint", "comment": None}],
+        },
+    ]
+
+    def test_writes_versioned_snapshot(
+        self, mocker: MockerFixture, tmp_path: Path
+    ) -> None:
+        mock_fetch = mocker.patch(f"{NODES}.fetch_catalog", return_value=self.CATALOG)
+        mock_encode = mocker.patch(
+            f"{NODES}.encode_texts", return_value=np.eye(2, dtype=np.float32)
+        )
+        params = {"schemas": ["raw_data", "metrics"], "exclude": [], "k": 1}
+        embedding = {**PARAMS, "snapshot_dir": str(tmp_path)}
+
+        first = build_schema_context(MagicMock(), params, embedding)
+        second = build_schema_context(MagicMock(), params, embedding)
+
+        assert mock_fetch.call_args[0][1:] == (["raw_data", "metrics"], [])
+        texts = mock_encode.call_args[0][0]
+        assert texts[0].startswith("TABLE metrics.daily_sales -- Vendas por dia.")
+        assert "  gmv numeric -- Vendas brutas." in texts[0]
+        assert (first["tables"], first["columns"]) == (2, 3)
+        assert first["max_prompt_tokens"] < first["catalog_tokens"]
+        assert first["written"]
+        assert not second["written"]
+
+        stamp = (tmp_path / "schema_context.version.json").read_text()
+        assert "metrics.daily_sales" in stamp
+
+    def test_empty_catalog(self, mocker: MockerFixture) -> None:
+        mocker.patch(f"{NODES}.fetch_catalog", return_value=[])
+
+        with pytest.raises(ValueError, match="Nenhuma tabela"):
+            build_schema_context(MagicMock(), {"schemas": ["x"], "k": 1}, PARAMS)
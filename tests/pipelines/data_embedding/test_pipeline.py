@@ -0,0 +1,107 @@
+import re
+from pathlib import Path
+
+import pytest
+import yaml
+from kedro.pipeline import Pipeline
+
+from thelook_ecommerce_analysis.pipelines.data_embedding import create_pipeline
+from thelook_ecommerce_analysis.pipelines.data_embedding.pipeline import (
+    EMBEDDING_INPUTS,
+    SNAPSHOT_TARGETS,
+)
+from thelook_ecommerce_analysis.utils.change_log import split_statements
+
+
+class TestDataEmbeddingPipeline:
+    """Suíte de testes para a topologia do pipeline de embeddings."""
+
+    @pytest.fixture
+    def pipeline(self) -> Pipeline:
+        return create_pipeline()
+
+    @pytest.fixture
+    def targets(self) -> dict:
+        params = yaml.safe_load(Path("conf/base/parameters.yml").read_text())
+        return params["embedding_targets"]
+
+    def test_one_node_per_target(self, pipeline: Pipeline, targets: dict) -> None:
+        assert set(EMBEDDING_INPUTS) == set(targets)
+        assert {n.name for n in pipeline.nodes} == {
+            f"data_embedding.embed_{name}_node" for name in targets
+        } | {
+            f"data_embedding.export_{name}_snapshot_node" for name in SNAPSHOT_TARGETS
+        } | {"data_embedding.build_schema_context_node"}
+
+    def test_snapshot_after_embeddings(self, pipeline: Pipeline, targets: dict) -> None:
+        """O snapshot .npy é exportado depois da carga dos vetores da tabela."""
+        for name in SNAPSHOT_TARGETS:
+            node = next(
+                n
+                for n in pipeline.nodes
+                if n.name == f"data_embedding.export_{name}_snapshot_node"
+            )
+
+            assert f"reporting_{name}" in node.inputs
+            assert node.outputs == [f"reporting_{name}_snapshot"]
+            assert "snapshot_key" in targets[name]
+
+    def test_schema_context_after_loads(self, pipeline: Pipeline) -> None:
+        """O catálogo é extraído depois que as tabelas de embeddings são carregadas."""
+        node = next(
+            n
+            for n in pipeline.nodes
+            if n.name == "data_embedding.build_schema_context_node"
+        )
+
+        assert {f"reporting_{name}" for name in EMBEDDING_INPUTS} <= set(node.inputs)
+        assert "params:schema_context" in node.inputs
+        assert node.outputs == ["reporting_schema_context"]
+
+    def test_user_profiles_run_after_metrics(self, pipeline: Pipeline) -> None:
+        """O perfil de usuário usa o gasto médio calculado pelo pipeline metrics."""
+        node = next(
+            n
+            for n in pipeline.nodes
+            if n.name == "data_embedding.embed_fct_vector_geo_search_node"
+        )
+
+        assert "reporting_derived_refresh" in node.inputs
+        assert "primary_users" in node.inputs
+        assert node.outputs == ["reporting_fct_vector_geo_search"]
+
+    def test_scripts_compare_content_hash(self, targets: dict) -> None:
+        """A consulta de chunks filtra no banco os registros com hash divergente."""
+        for target in targets.values():
+            chunks = split_statements(Path(target["chunks_query"]).read_text())
+            merge = split_statements(Path(target["merge_query"]).read_text())
+
+            assert len(chunks) == 1
+            assert ":model" in chunks[0]
+            assert "content_hash IS DISTINCT FROM" in chunks[0]
+            assert "FROM embedding_stage" in merge[0]
+            assert "ON CONFLICT" in merge[0]
+
+    def test_spend_synced_outside_merge(self, targets: dict) -> None:
+        """O gasto médio não depende do merge (que só roda com textos alterados)."""
+        target = targets["fct_vector_geo_search"]
+        merge = Path(target["merge_query"]).read_text()
+        sync = split_statements(Path(target["sync_query"]).read_text())
+
+        assert "UPDATE embeddings" not in merge
+        assert len(sync) == 1
+        assert "SET avg_spend" in sync[0]
+
+    def test_schema_context_excludes_technical_tables(self) -> None:
+        """Tabelas comentadas como "Tabela técnica" não entram no contexto do prompt."""
+        params = yaml.safe_load(Path("conf/base/parameters.yml").read_text())
+        technical = {
+            match.group(1)
+            for path in Path("sql").rglob("*.sql")
+            for match in re.finditer(
+                r"COMMENT ON TABLE (\S+) IS 'Tabela técnica", path.read_text()
+            )
+        }
+
+        assert technical
+        assert technical <= set(params["schema_context"]["exclude"])
@@ -0,0 +1,145 @@
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import (
+    PcaProjection,
+    StorageConfig,
+    ensure_column,
+    storage_fingerprint,
+    storage_variants,
+)
+from thelook_ecommerce_analysis.utils.vector_index import exact_top_k
+
+INDEX = {"name": "idx_x", "column": "embedding", "opclass": "vector_cosine_ops"}
+
+
+def _normalized(rows: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestStorageConfig:
+    """Suíte de testes para o formato de armazenamento dos embeddings."""
+
+    def test_defaults(self) -> None:
+        storage = StorageConfig.from_params({"dimensions": 384})
+        assert storage.column_type == "vector(384)"
+        assert storage.dtype == np.float32
+        assert storage.index(INDEX) == INDEX
+
+    def test_halfvec_with_pca(self) -> None:
+        storage = StorageConfig.from_params(
+            {"dimensions": 384, "storage": {"type": "halfvec", "pca_dimensions": 128}}
+        )
+        assert storage.column_type == "halfvec(128)"
+        assert storage.dtype == np.float16
+        assert storage.index(INDEX)["opclass"] == "halfvec_cosine_ops"
+
+    @pytest.mark.parametrize(
+        "storage",
+        [{"type": "bit"}, {"pca_dimensions": 384}, {"pca_dimensions": 512}],
+    )
+    def test_invalid(self, storage: dict) -> None:
+        with pytest.raises(ValueError):
+            StorageConfig.from_params({"dimensions": 384, "storage": storage})
+
+
+class TestPcaProjection:
+    """Suíte de testes para a redução de dimensão por PCA."""
+
+    def test_fit_transform(self) -> None:
+        # Variância concentrada em 4 das 16 dimensões
+        rng = np.random.default_rng(1)
+        latent = rng.normal(size=(500, 4))
+        vectors = latent @ rng.normal(size=(4, 16)) + rng.normal(
+            scale=0.01, size=(500, 16)
+        )
+
+        projection = PcaProjection.fit(vectors, 4)
+        reduced = projection.transform(vectors)
+
+        assert reduced.shape == (500, 4)
+        assert projection.explained_variance > 0.99
+        np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1, rtol=1e-5)
+
+    def test_neighbours_preserved(self) -> None:
+        vectors = _normalized(300, 32)
+        projection = PcaProjection.fit(vectors, 31)
+        reduced = projection.transform(vectors)
+
+        exact = exact_top_k(vectors, vectors[:10], 1)
+        approx = exact_top_k(reduced, reduced[:10], 1)
+        np.testing.assert_array_equal(exact, approx)
+
+    def test_save_load(self, tmp_path: Path) -> None:
+        projection = PcaProjection.fit(_normalized(50, 8), 3)
+        path = tmp_path / "pca" / "x.npz"
+
+        projection.save(path)
+        loaded = PcaProjection.load(path)
+
+        np.testing.assert_array_equal(loaded.components, projection.components)
+        assert loaded.digest == projection.digest
+        restored = PcaProjection.from_bytes(projection.to_bytes())
+        assert restored.digest == projection.digest
+        assert restored.explained_variance == projection.explained_variance
+        assert loaded.explained_variance == pytest.approx(projection.explained_variance)
+
+    def test_fingerprint(self) -> None:
+        projection = PcaProjection.fit(_normalized(50, 8), 3)
+        other = PcaProjection.fit(_normalized(50, 8, seed=2), 3)
+
+        assert storage_fingerprint("m", None) == "m"
+        assert storage_fingerprint("m", projection) == f"m|pca3-{projection.digest}"
+        assert storage_fingerprint("m", projection) != storage_fingerprint("m", other)
+
+    def test_storage_variants(self) -> None:
+        reference = _normalized(20, 8)
+        projection = PcaProjection.fit(reference, 4)
+
+        variants = storage_variants(reference, projection)
+
+        assert list(variants) == ["vector", "halfvec", "vector_pca4", "halfvec_pca4"]
+        assert variants["halfvec"][1].dtype == np.float16
+        assert variants["vector_pca4"][1].shape == (20, 4)
+        assert list(storage_variants(reference, None)) == ["vector", "halfvec"]
+
+
+class TestEnsureColumn:
+    """Suíte de testes para a conversão da coluna de embeddings."""
+
+    def _executed(self, conn: MagicMock) -> list[str]:
+        return [" ".join(str(c[0][0]).split()) for c in conn.execute.call_args_list]
+
+    def test_unchanged(self) -> None:
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = "vector(384)"
+
+        assert not ensure_column(conn, "embeddings.t", INDEX, StorageConfig())
+        assert conn.execute.call_count == 1
+
+    def test_same_dimensions_casts(self) -> None:
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = "vector(384)"
+        storage = StorageConfig(type="halfvec")
+
+        assert ensure_column(conn, "embeddings.t", INDEX, storage)
+
+        executed = self._executed(conn)
+        assert any("DROP INDEX" in sql for sql in executed)
+        assert any("USING embedding::halfvec(384)" in sql for sql in executed)
+        assert not any("content_hash = NULL" in sql for sql in executed)
+
+    def test_new_dimensions_regenerates(self) -> None:
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = "vector(384)"
+        storage = StorageConfig(type="halfvec", pca_dimensions=128)
+
+        assert ensure_column(conn, "embeddings.t", INDEX, storage)
+
+        executed = self._executed(conn)
+        assert any("TYPE halfvec(128) USING NULL" in sql for sql in executed)
+        assert any("SET content_hash = NULL" in sql for sql in executed)
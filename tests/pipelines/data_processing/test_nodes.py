@@ -1,4 +1,5 @@
 import logging
+from pathlib import Path
 
 import ibis
 import pandas as pd
@@ -14,6 +15,7 @@ from thelook_ecommerce_analysis.pipelines.data_processing.nodes import (
     extract_orders,
     extract_products,
     extract_users,
+    refresh_sessions,
 )
 from thelook_ecommerce_analysis.pipelines.data_processing.schema_rules import (
     distribution_centers_schema,
@@ -24,6 +26,10 @@ from thelook_ecommerce_analysis.pipelines.data_processing.schema_rules import (
     products_schema,
     users_schema,
 )
+from thelook_ecommerce_analysis.pipelines.data_processing.transform_tables import (
+    EVENTS_DERIVED_COLUMNS,
+)
+from thelook_ecommerce_analysis.utils.change_log import split_statements
 
 
 class TestDataProcessingNodes:
@@ -584,8 +590,48 @@ class TestDataProcessingNodes:
             )
 
     def test_extract_events_happy_path(self) -> None:
-        """Testa a extração e validação do schema básico da tabela events."""
+        """Testa a extração, enriquecimento e validação da tabela events."""
+
+        df = pd.DataFrame(
+            {
+                "id": [1, 2],
+                "user_id": [10, 10],
+                "sequence_number": [1, 2],
+                "session_id": ["abc-123", "abc-123"],
+                "created_at": pd.to_datetime(["2023-01-01", "2023-01-02"], utc=True),
+                "city": ["São Paulo", "São Paulo"],
+                "state": ["SP", "SP"],
+                "browser": ["Chrome", "Chrome"],
+                "traffic_source": ["Organic", "Organic"],
+                "uri": ["/product/100", "/cart"],
+                "event_type": ["product", "cart"],
+            }
+        )
+        table = ibis.memtable(df)
+        cols = [
+            *df.columns,
+            "visitor_type",
+            "extracted_product_id",
+            "extracted_page_type",
+            "session_first_event_at",
+            "session_last_event_at",
+            "session_event_count",
+        ]
+
+        res = extract_events(table, schema_rules=events_schema, columns=cols)
+
+        assert res.count().to_pandas() == 2, (
+            "Deveria retornar um DataFrame com 2 registros"
+        )
+        assert res.columns == tuple(cols), (
+            "Deveria conter as colunas de destino, incluindo as derivadas"
+        )
+        result_df = res.to_pandas().sort_values("id")
+        assert result_df["extracted_product_id"].iloc[0] == 100
+        assert (result_df["session_event_count"] == 2).all()
 
+    def test_extract_events_invalid_event_type(self) -> None:
+        """Eventos fora do domínio permitido devem violar o events_schema."""
         df = pd.DataFrame(
             {
                 "id": [1],
@@ -593,23 +639,42 @@ class TestDataProcessingNodes:
                 "sequence_number": [1],
                 "session_id": ["abc-123"],
                 "created_at": pd.to_datetime(["2023-01-01"], utc=True),
-                "city": ["São Paulo"],
-                "state": ["SP"],
+                "uri": ["/home"],
+                "event_type": ["scroll"],
                 "browser": ["Chrome"],
                 "traffic_source": ["Organic"],
-                "event_type": ["product"],
-                "extracted_product_id": [100],
-                "extracted_page_type": ["product_page"],
+                "city": ["São Paulo"],
+                "state": ["SP"],
             }
         )
-        table = ibis.memtable(df)
-        cols = list(df.columns)
+        cols = [*df.columns, *EVENTS_DERIVED_COLUMNS]
 
-        res = extract_events(table, schema_rules=events_schema, columns=cols)
+        with pytest.raises(ValueError, match="event_type_invalid"):
+            extract_events(ibis.memtable(df), schema_rules=events_schema, columns=cols)
 
-        assert res.count().to_pandas() == 1, (
-            "Deveria retornar um DataFrame com 1 registro"
+    def test_refresh_sessions(self, mocker: MockerFixture) -> None:
+        """O refresh de sessões delega a janela incremental ao change_log."""
+        mock_refresh = mocker.patch(
+            "thelook_ecommerce_analysis.pipelines.data_processing.nodes.run_incremental_refresh",
+            return_value={"consumer": "sessions", "mode": "incremental"},
         )
-        assert "visitor_type" in res.columns, (
-            "Deveria conter a coluna materializada 'visitor_type'"
+        engine = mocker.MagicMock()
+
+        report = refresh_sessions(
+            mocker.MagicMock(), engine, "sql/metrics/refresh/sessions.sql"
         )
+
+        mock_refresh.assert_called_once_with(
+            engine, "sessions", "sql/metrics/refresh/sessions.sql"
+        )
+        assert report["mode"] == "incremental"
+
+    def test_refresh_sessions_updates_event_session_fields(self) -> None:
+        """Os campos de sessão dos eventos vêm do agregado sobre todos os eventos gravados."""
+        sql = Path("sql/metrics/refresh/sessions.sql").read_text()
+        statements = split_statements(sql)
+
+        assert "INSERT INTO metrics.sessions" in statements[1]
+        assert statements[-1].startswith("UPDATE raw_data.events")
+        assert "FROM metrics.sessions" in statements[-1]
+        assert "touched_sessions" in statements[-1]
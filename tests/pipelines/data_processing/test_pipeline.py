@@ -15,8 +15,8 @@ class TestDataProcessingPipeline:
     def test_pipeline_instance(self, pipeline: Pipeline) -> None:
         """Garante que o pipeline de data processing instância todos os nós corretamente."""
         assert isinstance(pipeline, Pipeline), "Deveria ser um Pipeline"
-        assert len(pipeline.nodes) == 7, (
-            "O pipeline deveria ter exatamente 7 nós de processamento"
+        assert len(pipeline.nodes) == 8, (
+            "O pipeline deveria ter exatamente 8 nós de processamento"
         )
 
     def test_pipeline_dependencies(self, pipeline: Pipeline) -> None:
@@ -51,3 +51,15 @@ class TestDataProcessingPipeline:
         assert "data_processing.process_inventory_items_table_node" in node_names, (
             "process_inventory_items_table_node deveria estar registrado como node"
         )
+
+    def test_sessions_refresh_runs_after_events(self, pipeline: Pipeline) -> None:
+        """O refresh de sessões deve depender da carga de events."""
+        sessions_node = next(
+            node
+            for node in pipeline.nodes
+            if node.name == "data_processing.refresh_sessions_table_node"
+        )
+
+        assert "primary_events" in sessions_node.inputs
+        assert "postgres_engine" in sessions_node.inputs
+        assert sessions_node.outputs == ["reporting_sessions"]
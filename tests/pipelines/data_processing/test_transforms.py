@@ -143,13 +143,12 @@ class TestTransformTables:
                 "state": [None, "State"],
                 "browser": [None, "Chrome"],
                 "traffic_source": [None, "Organic"],
+                "uri": ["/product/1", "/department/men/category/jeans"],
                 "event_type": [None, "product"],
-                "extracted_product_id": ["1", None],
-                "extracted_page_type": [None, "category"],
             }
         )
         table = transform_events(ibis.memtable(df))
-        res = table.to_pandas()
+        res = table.to_pandas().sort_values("id")
 
         assert res["visitor_type"].iloc[0] == "Registered", (
             "user_id preenchido deve ser Registered"
@@ -158,4 +157,93 @@ class TestTransformTables:
         assert res["session_id"].iloc[0] == "Unknown", (
             "Valores nulos de string devem virar 'Unknown'"
         )
+        assert res["session_event_count"].isna().iloc[0], (
+            "Eventos sem session_id não devem ter campos de sessão"
+        )
         assert res["id"].dtype == "int32", "O dtype de 'id' deveria ser 'int32'"
+
+    def test_transform_events_uri_parsing(self) -> None:
+        """Valida a extração vetorizada de page_type e product_id a partir do uri."""
+        df = pd.DataFrame(
+            {
+                "id": [1, 2, 3, 4, 5],
+                "user_id": [10, 10, 10, 10, 10],
+                "sequence_number": [1, 2, 3, 4, 5],
+                "created_at": pd.to_datetime(
+                    [
+                        "2023-01-01 10:00",
+                        "2023-01-01 10:01",
+                        "2023-01-01 10:05",
+                        "2023-01-01 10:07",
+                        "2023-01-02 08:00",
+                    ]
+                ),
+                "session_id": ["s1", "s1", "s1", "s1", "s2"],
+                "city": ["City"] * 5,
+                "state": ["State"] * 5,
+                "browser": ["Chrome"] * 5,
+                "traffic_source": ["Organic"] * 5,
+                "uri": [
+                    "/home",
+                    "/Product/123?ref=email",
+                    "/department/men/category/jeans/brand/levi",
+                    "/cart",
+                    None,
+                ],
+                "event_type": ["home", "product", "department", "cart", "home"],
+            }
+        )
+        res = transform_events(ibis.memtable(df)).to_pandas().sort_values("id")
+
+        assert res["extracted_page_type"].tolist() == [
+            "home",
+            "product",
+            "department",
+            "cart",
+            "Unknown",
+        ]
+        assert res["extracted_product_id"].iloc[1] == 123, (
+            "ID do produto deveria ser extraído do uri (case-insensitive)"
+        )
+        assert res["extracted_product_id"].isna().sum() == 4, (
+            "Páginas que não são de produto devem ter product_id nulo"
+        )
+
+    def test_transform_events_session_fields(self) -> None:
+        """Valida os campos de sessão calculados com funções de janela."""
+        df = pd.DataFrame(
+            {
+                "id": [1, 2, 3, 4, 5],
+                "user_id": [None, None, 7, 8, 9],
+                "sequence_number": [1, 2, 1, 1, 1],
+                "created_at": pd.to_datetime(
+                    [
+                        "2023-01-01 10:00",
+                        "2023-01-01 10:30",
+                        "2023-01-02 08:00",
+                        "2023-01-03 09:00",
+                        "2023-01-05 09:00",
+                    ]
+                ),
+                "session_id": ["s1", "s1", "s2", None, None],
+                "city": ["City"] * 5,
+                "state": ["State"] * 5,
+                "browser": ["Chrome"] * 5,
+                "traffic_source": ["Organic"] * 5,
+                "uri": ["/home", "/cart", "/home", "/home", "/cart"],
+                "event_type": ["home", "cart", "home", "home", "cart"],
+            }
+        )
+        res = transform_events(ibis.memtable(df)).to_pandas().set_index("id")
+
+        assert res.loc[1, "session_event_count"] == 2
+        assert res.loc[3, "session_event_count"] == 1
+        assert res.loc[1, "session_first_event_at"] == pd.Timestamp("2023-01-01 10:00")
+        assert res.loc[2, "session_last_event_at"] == pd.Timestamp("2023-01-01 10:30")
+        assert (
+            res.loc[3, "session_first_event_at"] == res.loc[3, "session_last_event_at"]
+        )
+        # Eventos sem session_id não formam uma sessão 'Unknown' entre si
+        assert res.loc[[4, 5], "session_id"].eq("Unknown").all()
+        assert res.loc[[4, 5], "session_event_count"].isna().all()
+        assert res.loc[[4, 5], "session_first_event_at"].isna().all()
@@ -0,0 +1,232 @@
+from unittest.mock import MagicMock
+
+import pyarrow as pa
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.pipelines.metrics.nodes import (
+    assign_nearest_distribution_centers,
+    benchmark_nearest_dc,
+    hotspot_deltas,
+    refresh_derived_objects,
+    refresh_hotspot_grid,
+    report_refresh_timings,
+)
+from thelook_ecommerce_analysis.utils.change_log import ChangeWindow, RefreshSpec
+
+NODES = "thelook_ecommerce_analysis.pipelines.metrics.nodes"
+
+
+class TestMetricsNodes:
+    """Suíte de testes para os nós do pipeline de métricas."""
+
+    def test_refresh_derived_objects_builds_specs(self, mocker: MockerFixture) -> None:
+        """A configuração de cada objeto vira um RefreshSpec com o nome como consumidor."""
+        mock_run = mocker.patch(
+            "thelook_ecommerce_analysis.pipelines.metrics.nodes.run_scheduled_refresh",
+            return_value={"objects": {}, "wall_duration_s": 0.0},
+        )
+        engine = mocker.MagicMock()
+        specs = {"daily_sales": {"sources": ["order_items"], "full_query": "full.sql"}}
+
+        report = refresh_derived_objects(
+            engine,
+            specs,
+            {"returns_cost": 0.1},
+            {"max_workers": 2},
+            order_items=mocker.MagicMock(),
+        )
+
+        mock_run.assert_called_once_with(
+            engine,
+            {
+                "daily_sales": RefreshSpec(
+                    "daily_sales", full_query="full.sql", sources=["order_items"]
+                )
+            },
+            {"returns_cost": 0.1},
+            max_workers=2,
+        )
+        assert report == {"objects": {}, "wall_duration_s": 0.0}
+
+    def test_report_refresh_timings(self) -> None:
+        """Consolida modo, linhas e duração de cada objeto."""
+        summary = report_refresh_timings(
+            {
+                "objects": {
+                    "daily_sales": {
+                        "mode": "full",
+                        "rows": 10,
+                        "duration_s": 1.5,
+                        "to_seq": 3,
+                    },
+                    "sales_funnel": {"mode": "skip", "rows": 0, "duration_s": 0.01},
+                },
+                "wall_duration_s": 1.5,
+            }
+        )
+
+        assert summary["objects"]["daily_sales"] == {
+            "mode": "full",
+            "rows": 10,
+            "duration_s": 1.5,
+        }
+        assert summary["total_duration_s"] == 1.51
+        assert summary["wall_duration_s"] == 1.5
+
+
+class TestAssignNearestDistributionCenters:
+    """Suíte de testes para a atribuição vetorizada de CDs aos usuários."""
+
+    @pytest.fixture
+    def engine(self) -> MagicMock:
+        engine = MagicMock()
+        conn = engine.begin.return_value.__enter__.return_value
+        conn.execute.return_value.all.side_effect = [
+            [(10, 0.0, 0.0), (20, 0.0, 2.0)],  # usuários
+            [(1, 0.0, 0.1), (2, 0.0, 1.9)],  # CDs
+        ]
+        return engine
+
+    def _patch_window(
+        self, mocker: MockerFixture, window: ChangeWindow, changed: list[str]
+    ) -> MagicMock:
+        mocker.patch(f"{NODES}.open_window", return_value=window)
+        mocker.patch(f"{NODES}.changed_tables", return_value=changed)
+        return mocker.patch(f"{NODES}.commit_window")
+
+    def test_skip_without_user_changes(
+        self, engine: MagicMock, mocker: MockerFixture
+    ) -> None:
+        mock_commit = self._patch_window(mocker, ChangeWindow("x", 5, 9), [])
+        mock_copy = mocker.patch(f"{NODES}.copy_arrow_binary")
+
+        report = assign_nearest_distribution_centers(
+            engine, {}, MagicMock(), MagicMock()
+        )
+
+        assert report["mode"] == "skip"
+        mock_copy.assert_not_called()
+        mock_commit.assert_not_called()
+
+    def test_incremental_copies_changed_users(
+        self, engine: MagicMock, mocker: MockerFixture
+    ) -> None:
+        """Usuários alterados: apaga as suas linhas e grava a matriz via COPY."""
+        window = ChangeWindow("x", 5, 9)
+        mock_commit = self._patch_window(mocker, window, ["users"])
+        mock_copy = mocker.patch(f"{NODES}.copy_arrow_binary")
+        conn = engine.begin.return_value.__enter__.return_value
+
+        report = assign_nearest_distribution_centers(
+            engine, {}, MagicMock(), MagicMock()
+        )
+
+        target, table = mock_copy.call_args[0][1:]
+        assert target == "embeddings.user_dc_rank"
+        assert table["dc_rank"].to_pylist() == [1, 2, 2, 1]
+        delete_sql, bind = conn.execute.call_args[0]
+        assert "DELETE FROM embeddings.user_dc_rank" in str(delete_sql)
+        assert bind["full_refresh"] is False
+        mock_commit.assert_called_once_with(conn, window)
+        assert report["mode"] == "incremental"
+        assert report["users"] == 2
+        assert report["rows"] == 4
+
+    def test_distribution_center_change_forces_full(
+        self, engine: MagicMock, mocker: MockerFixture
+    ) -> None:
+        self._patch_window(mocker, ChangeWindow("x", 5, 9), ["distribution_centers"])
+        mocker.patch(f"{NODES}.copy_arrow_binary")
+        mock_benchmark = mocker.patch(
+            f"{NODES}.benchmark_nearest_dc", return_value={"speedup": 10.0}
+        )
+
+        report = assign_nearest_distribution_centers(
+            engine, {"benchmark_sample": 100}, MagicMock(), MagicMock()
+        )
+
+        assert report["mode"] == "full"
+        mock_benchmark.assert_called_once_with(engine, 100)
+        assert report["benchmark"] == {"speedup": 10.0}
+
+    def test_benchmark_compares_with_postgis(self) -> None:
+        """O benchmark compara ranking e distâncias com o resultado do PostGIS."""
+        engine = MagicMock()
+        conn = engine.connect.return_value.__enter__.return_value
+        conn.execute.return_value.all.side_effect = [
+            [(10, 0.0, 0.0)],  # amostra de usuários
+            [(1, 0.0, 0.1), (2, 0.0, 1.9)],  # CDs
+            [(10, 1, 11.12, 1), (10, 2, 211.27, 2)],  # PostGIS
+        ]
+
+        report = benchmark_nearest_dc(engine, 1)
+
+        assert report["users"] == 1
+        assert report["nearest_match_pct"] == 100.0
+        assert report["max_distance_diff_km"] < 0.1
+        assert report["postgis_s"] >= 0
+
+
+class TestHotspotGrid:
+    """Suíte de testes para o mapa de calor mantido por variações."""
+
+    def _state(self, user_ids: list[int], cells: list[int], ages: list) -> pa.Table:
+        return pa.table(
+            {
+                "user_id": pa.array(user_ids, pa.int32()),
+                "cell_id": pa.array(cells, pa.int64()),
+                "age": pa.array(ages, pa.int16()),
+            }
+        )
+
+    def test_hotspot_deltas(self) -> None:
+        """O usuário que mudou de célula sai da anterior e entra na nova em cada resolução."""
+        new_state = self._state([1, 2], [0b0111, 0b0001], [30, None])
+        old_state = self._state([1], [0b0100], [30])
+
+        delta = hotspot_deltas(new_state, old_state, [1, 2])
+        rows = {
+            (r["resolution"], r["cell_id"]): (
+                r["density"],
+                r["age_sum"],
+                r["age_count"],
+            )
+            for r in delta.to_pylist()
+        }
+
+        # Resolução 2: usuário 1 sai da célula 4 e entra na 7; usuário 2 entra na 1
+        assert rows[(2, 4)] == (-1, -30, -1)
+        assert rows[(2, 7)] == (1, 30, 1)
+        assert rows[(2, 1)] == (1, 0, 0)
+        # Resolução 1: o usuário 1 continua na célula 1 (sem variação); usuário 2 na 0
+        assert (1, 1) not in rows
+        assert rows[(1, 0)] == (1, 0, 0)
+        assert {"center_lat", "center_lon"} <= set(delta.column_names)
+
+    def test_refresh_applies_deltas(self, mocker: MockerFixture) -> None:
+        """Incremental: retira o estado anterior, grava o novo e aplica as variações."""
+        window = ChangeWindow("x", 5, 9)
+        mocker.patch(f"{NODES}.open_window", return_value=window)
+        mocker.patch(f"{NODES}.changed_tables", return_value=["users"])
+        mock_commit = mocker.patch(f"{NODES}.commit_window")
+        mock_copy = mocker.patch(f"{NODES}.copy_arrow_binary")
+        engine = MagicMock()
+        conn = engine.begin.return_value.__enter__.return_value
+        conn.execute.return_value.all.side_effect = [
+            [(1, -23.55, -46.63, 30)],  # usuários da janela
+            [],  # estado anterior (usuário novo)
+        ]
+
+        report = refresh_hotspot_grid(engine, {"resolutions": [13, 5]}, MagicMock())
+
+        targets = [c[0][1] for c in mock_copy.call_args_list]
+        assert targets == ["embeddings.user_grid_cells", "hotspot_delta"]
+        executed = "\n".join(str(c[0][0]) for c in conn.execute.call_args_list)
+        assert "RETURNING user_id, cell_id, age" in executed
+        assert "ON CONFLICT (resolution, cell_id) DO UPDATE" in executed
+        mock_commit.assert_called_once_with(conn, window)
+        assert report["consumer"] == "map_hotspots_grid@5,13"
+        assert report["mode"] == "incremental"
+        assert report["users"] == 1
+        assert report["rows"] == 2  # uma célula por resolução
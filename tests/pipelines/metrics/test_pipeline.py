@@ -0,0 +1,153 @@
+from pathlib import Path
+
+import pytest
+import yaml
+from kedro.pipeline import Pipeline
+
+from thelook_ecommerce_analysis.pipelines.metrics import create_pipeline
+from thelook_ecommerce_analysis.pipelines.metrics.pipeline import UPSTREAM_INPUTS
+from thelook_ecommerce_analysis.utils.change_log import RefreshSpec, split_statements
+from thelook_ecommerce_analysis.utils.refresh_scheduler import (
+    build_dag,
+    resolve_sources,
+)
+
+
+class TestMetricsPipeline:
+    """Suíte de testes para a topologia do pipeline de métricas."""
+
+    @pytest.fixture
+    def pipeline(self) -> Pipeline:
+        return create_pipeline()
+
+    @pytest.fixture
+    def derived_refresh(self) -> dict:
+        """Configuração de refresh declarada em parameters.yml."""
+        params = yaml.safe_load(Path("conf/base/parameters.yml").read_text())
+        return params["derived_refresh"]
+
+    def test_pipeline_instance(self, pipeline: Pipeline) -> None:
+        """Refresh agendado, atribuição de CDs, mapa de calor e consolidador de tempos."""
+        assert len(pipeline.nodes) == 4
+
+    def test_refresh_runs_after_ingestion(self, pipeline: Pipeline) -> None:
+        """O refresh depende dos datasets primários e do refresh de sessions."""
+        node = next(
+            n
+            for n in pipeline.nodes
+            if n.name == "metrics.refresh_derived_objects_node"
+        )
+
+        assert set(UPSTREAM_INPUTS.values()) <= set(node.inputs)
+        assert "reporting_sessions" in node.inputs
+        assert "params:derived_refresh" in node.inputs
+        assert node.outputs == ["reporting_derived_refresh"]
+
+    def test_nearest_dc_runs_after_users(self, pipeline: Pipeline) -> None:
+        node = next(
+            n for n in pipeline.nodes if n.name == "metrics.assign_nearest_dc_node"
+        )
+
+        assert "primary_users" in node.inputs
+        assert "primary_distribution_centers" in node.inputs
+        assert node.outputs == ["reporting_user_dc_rank"]
+
+    def test_timings_report_collects_refresh(self, pipeline: Pipeline) -> None:
+        node = next(
+            n for n in pipeline.nodes if n.name == "metrics.report_refresh_timings_node"
+        )
+
+        assert node.inputs == ["reporting_derived_refresh"]
+        assert node.outputs == ["reporting_metrics_refresh"]
+
+    def test_every_object_is_configured(self, derived_refresh: dict) -> None:
+        """Todos os objetos possuem DDL e scripts SQL existentes."""
+        for name, spec in derived_refresh.items():
+            assert Path(spec["full_query"]).exists(), name
+            if "incremental_query" in spec:
+                assert Path(spec["incremental_query"]).exists(), name
+            assert (
+                Path(f"sql/metrics/{name}.sql").exists()
+                or Path(f"sql/embeddings/{name}.sql").exists()
+            ), name
+
+    def test_dag_resolves_sources(self, derived_refresh: dict) -> None:
+        """Fontes não declaradas são extraídas dos scripts de refresh."""
+        specs = {
+            name: RefreshSpec(consumer=name, **spec)
+            for name, spec in derived_refresh.items()
+        }
+        resolved = resolve_sources(specs, build_dag(specs))
+
+        assert set(resolved["fct_user_logistics"].sources or []) == {
+            "users",
+            "orders",
+            "order_items",
+            "products",
+            "distribution_centers",
+        }
+
+    def test_daily_sales_is_incremental_by_day(self, derived_refresh: dict) -> None:
+        """Alterações em order_items recalculam apenas os dias afetados."""
+        spec = derived_refresh["daily_sales"]
+        statements = split_statements(Path(spec["incremental_query"]).read_text())
+
+        assert spec["incremental_sources"] == ["order_items"]
+        assert "CREATE TEMP TABLE daily_sales_changed_days" in statements[0]
+        assert statements[1].startswith("DELETE FROM metrics.daily_sales")
+        assert ":returns_cost" in statements[2]
+
+    def test_cohort_retention_uses_compact_state(self, derived_refresh: dict) -> None:
+        """A matriz de retenção é derivada do estado por usuário, não de order_items."""
+        spec = derived_refresh["cohort_retention"]
+        statements = split_statements(Path(spec["incremental_query"]).read_text())
+        matrix = statements[-1]
+
+        assert "incremental_sources" not in spec  # order_items e users são incrementais
+        assert any("INSERT INTO metrics.user_cohorts" in s for s in statements)
+        assert "metrics.user_active_months" in matrix
+        assert "raw_data.order_items" not in matrix
+        assert ":cohort_limit" in matrix
+
+    def test_customer_rfm_ltv_scores_with_cutpoints(
+        self, derived_refresh: dict
+    ) -> None:
+        """Os scores usam pontos de corte persistidos, sem NTILE sobre todos os clientes."""
+        spec = derived_refresh["customer_rfm_ltv"]
+        sql = Path(spec["incremental_query"]).read_text()
+        statements = split_statements(sql)
+
+        assert "NTILE" not in sql
+        assert any("INSERT INTO metrics.customer_stats" in s for s in statements)
+        cutpoints = next(
+            s for s in statements if "INSERT INTO metrics.rfm_cutpoints" in s
+        )
+        # O filtro fica no SELECT, antes das ordenações de percentile_cont
+        guard = cutpoints.index(":rfm_cutpoints_max_age")
+        assert "NOT EXISTS" in cutpoints[:guard]
+        assert guard < cutpoints.index("GROUP BY")
+        assert "metrics.rfm_cutpoints" in statements[-1]
+        assert "raw_data.order_items" not in statements[-1]
+
+    def test_product_360_aging_is_date_independent(self, derived_refresh: dict) -> None:
+        """O refresh não depende da data corrente; o aging é calculado na view."""
+        spec = derived_refresh["product_360"]
+        sql = Path(spec["incremental_query"]).read_text()
+        ddl = Path("sql/metrics/product_360.sql").read_text()
+
+        assert "current_date" not in sql
+        assert "stock_created_day_sum" in sql
+        assert "VIEW metrics.product_360_current" in ddl
+        assert "product_360_touched" in split_statements(sql)[-1]
+
+    def test_fct_user_logistics_caches_distances(self, derived_refresh: dict) -> None:
+        """ST_Distance é calculado apenas ao preencher o cache por par (usuário, CD)."""
+        spec = derived_refresh["fct_user_logistics"]
+        statements = split_statements(Path(spec["incremental_query"]).read_text())
+
+        distance = [s for s in statements if "ST_Distance" in s]
+        assert len(distance) == 1
+        assert "INSERT INTO embeddings.user_dc_distance" in distance[0]
+        assert "ON CONFLICT (user_id, dc_id) DO NOTHING" in distance[0]
+        assert "embeddings.user_dc_distance" in statements[-1]
+        assert set(spec["incremental_sources"]) == {"order_items", "orders", "users"}
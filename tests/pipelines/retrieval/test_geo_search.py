@@ -0,0 +1,162 @@
+import json
+from typing import Any
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import StorageConfig
+from thelook_ecommerce_analysis.retrieval.geo_search import (
+    GeoQuery,
+    GeoSearchConfig,
+    choose_plan,
+    estimate_rows,
+    hnsw_candidates,
+    search_users,
+)
+
+TARGET = {
+    "table": "embeddings.fct_vector_geo_search",
+    "index": {
+        "name": "idx_vsearch_vector",
+        "column": "embedding",
+        "opclass": "vector_cosine_ops",
+    },
+}
+
+
+def _row(user_id: int, distance: float) -> MagicMock:
+    row = MagicMock()
+    row._mapping = {"user_id": user_id, "distance": distance}
+    return row
+
+
+def _sql(call: Any) -> str:
+    return " ".join(str(call[0][0]).split())
+
+
+class TestGeoSearch:
+    """Suíte de testes para a busca híbrida (raio + gasto + vetor)."""
+
+    @pytest.fixture
+    def config(self) -> GeoSearchConfig:
+        return GeoSearchConfig.from_params(
+            {"prefilter_max_rows": 100, "oversample": 2.0, "max_candidates": 500},
+            TARGET,
+            StorageConfig(),
+        )
+
+    def _conn(self, estimated: float, total: float, results: list) -> MagicMock:
+        """Conexão com reltuples, o plano do EXPLAIN e os resultados da busca."""
+        conn = MagicMock()
+        plan = json.dumps([{"Plan": {"Plan Rows": estimated}}])
+
+        def execute(statement: object, binds: dict | None = None) -> MagicMock:
+            sql = str(statement)
+            result = MagicMock()
+            if "reltuples" in sql:
+                result.scalar.return_value = total
+            elif "EXPLAIN" in sql:
+                result.scalar.return_value = plan
+            else:
+                result.__iter__.return_value = iter(results)
+            return result
+
+        conn.execute.side_effect = execute
+        return conn
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [{"k": 0}, {"radius_km": 5}, {"lat": 1.0}, {"lon": 1.0, "radius_km": 5}],
+    )
+    def test_invalid_query(self, kwargs: dict) -> None:
+        with pytest.raises(ValueError):
+            GeoQuery(**kwargs)
+
+    def test_where(self) -> None:
+        query = GeoQuery(lat=-23.5, lon=-46.6, radius_km=10, min_spend=50)
+
+        where, binds = query.where()
+
+        assert "ST_DWithin(user_geom" in where
+        assert "avg_spend >= :min_spend" in where
+        assert binds == {"radius_m": 10000, "min_spend": 50, "lat": -23.5, "lon": -46.6}
+        assert GeoQuery().where() == ("TRUE", {})
+
+    def test_config_follows_storage(self) -> None:
+        config = GeoSearchConfig.from_params({}, TARGET, StorageConfig(type="halfvec"))
+
+        assert config.column_type == "halfvec"
+        assert config.operator == "<=>"
+
+    def test_estimate_without_filters(self, config: GeoSearchConfig) -> None:
+        conn = self._conn(estimated=0, total=1000.0, results=[])
+
+        assert estimate_rows(conn, GeoQuery(), config) == (1000.0, 1000.0)
+        assert conn.execute.call_count == 1
+
+    def test_estimate_without_plan(self, config: GeoSearchConfig) -> None:
+        """Sem o plano do EXPLAIN, a estimativa é o total (busca pelo HNSW)."""
+        conn = MagicMock()
+        conn.execute.return_value.scalar.side_effect = [1000.0, None]
+
+        assert estimate_rows(conn, GeoQuery(min_spend=50), config) == (1000.0, 1000.0)
+
+    @pytest.mark.parametrize(
+        ("estimated", "total", "plan"),
+        [(50, 1000, "prefilter"), (100, 1000, "prefilter"), (101, 1000, "hnsw")],
+    )
+    def test_choose_plan(
+        self, config: GeoSearchConfig, estimated: float, total: float, plan: str
+    ) -> None:
+        assert choose_plan(estimated, total, config) == plan
+
+    def test_hnsw_candidates(self, config: GeoSearchConfig) -> None:
+        assert hnsw_candidates(10, 1.0, config) == 20
+        assert hnsw_candidates(10, 0.1, config) == 200
+        # Limitado por max_candidates
+        assert hnsw_candidates(10, 0.001, config) == 500
+
+    def test_selective_filter_uses_prefilter(self, config: GeoSearchConfig) -> None:
+        conn = self._conn(estimated=40, total=10000, results=[_row(7, 0.1)])
+        query = GeoQuery(k=1, lat=-23.5, lon=-46.6, radius_km=5)
+
+        response = search_users(conn, np.array([0.6, 0.8]), query, config)
+
+        assert response["plan"] == "prefilter"
+        assert response["results"] == [{"user_id": 7, "distance": 0.1}]
+        search_sql = _sql(conn.execute.call_args_list[-1])
+        assert "candidates AS MATERIALIZED" in search_sql
+        assert "ST_DWithin" in search_sql
+        assert conn.execute.call_args_list[-1][0][1]["q"] == "[0.6,0.8]"
+        assert set(response["timings_ms"]) == {"estimate", "search", "total"}
+
+    def test_broad_filter_uses_hnsw(self, config: GeoSearchConfig) -> None:
+        conn = self._conn(estimated=5000, total=10000, results=[_row(1, 0.2)])
+        query = GeoQuery(k=1, min_spend=10)
+
+        response = search_users(conn, "[1,0]", query, config)
+
+        assert response["plan"] == "hnsw"
+        assert response["selectivity"] == 0.5
+        assert response["candidates"] == 4
+        assert not response["fallback"]
+        executed = [_sql(c) for c in conn.execute.call_args_list]
+        assert any("hnsw.ef_search" in sql for sql in executed)
+        assert "nearest AS MATERIALIZED" in executed[-1]
+        assert conn.execute.call_args_list[-1][0][1]["candidates"] == 4
+
+    def test_short_postfilter_falls_back(self, config: GeoSearchConfig) -> None:
+        """Se o pós-filtro deixa menos de k resultados, a busca usa o prefiltro."""
+        conn = self._conn(estimated=5000, total=10000, results=[_row(1, 0.2)])
+        query = GeoQuery(k=3, min_spend=10)
+
+        response = search_users(conn, "[1,0]", query, config)
+
+        assert response["plan"] == "hnsw"
+        assert response["fallback"]
+        assert "candidates AS MATERIALIZED" in _sql(conn.execute.call_args_list[-1])
+
+    def test_invalid_plan(self, config: GeoSearchConfig) -> None:
+        with pytest.raises(ValueError):
+            search_users(MagicMock(), "[1,0]", GeoQuery(), config, plan="ivfflat")
@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.pipelines.retrieval.nodes import (
+    benchmark_hybrid_search,
+)
+
+NODES = "thelook_ecommerce_analysis.pipelines.retrieval.nodes"
+
+TARGET = {
+    "table": "embeddings.fct_vector_geo_search",
+    "index": {
+        "name": "idx_vsearch_vector",
+        "column": "embedding",
+        "opclass": "vector_cosine_ops",
+    },
+}
+
+
+class TestBenchmarkHybridSearch:
+    """Suíte de testes para o nó de benchmark da busca híbrida."""
+
+    def test_disabled(self, mocker: MockerFixture) -> None:
+        mock_benchmark = mocker.patch(f"{NODES}.benchmark_geo_search")
+        engine = MagicMock()
+
+        report = benchmark_hybrid_search(
+            engine, {"benchmark": {"queries": 0}}, TARGET, {}
+        )
+
+        assert report == {"queries": 0}
+        mock_benchmark.assert_not_called()
+        engine.begin.assert_not_called()
+
+    def test_runs_with_storage_type(self, mocker: MockerFixture) -> None:
+        mock_benchmark = mocker.patch(
+            f"{NODES}.benchmark_geo_search", return_value={"queries": 5}
+        )
+        benchmark = {"queries": 5, "k": 10, "selectivity": [0.1]}
+
+        report = benchmark_hybrid_search(
+            MagicMock(),
+            {"benchmark": benchmark},
+            TARGET,
+            {"storage": {"type": "halfvec"}},
+            embeddings={"table": TARGET["table"]},
+        )
+
+        assert report == {"queries": 5}
+        _, config, passed = mock_benchmark.call_args[0]
+        assert config.column_type == "halfvec"
+        assert passed == benchmark
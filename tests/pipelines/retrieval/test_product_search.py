@@ -0,0 +1,155 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.storage import StorageConfig
+from thelook_ecommerce_analysis.retrieval.product_search import (
+    ProductSearch,
+    ProductSearchConfig,
+    ResultCache,
+    reciprocal_rank_fusion,
+)
+
+MODULE = "thelook_ecommerce_analysis.retrieval.product_search"
+
+TARGET = {
+    "table": "embeddings.products_embeddings",
+    "index": {
+        "name": "idx_product_embedding",
+        "column": "embedding",
+        "opclass": "vector_cosine_ops",
+    },
+}
+
+
+def _product(product_id: int, score: float) -> dict:
+    return {"product_id": product_id, "name": f"p{product_id}", "score": score}
+
+
+class TestReciprocalRankFusion:
+    """Suíte de testes para a fusão de rankings."""
+
+    def test_items_in_both_rankings_win(self) -> None:
+        fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4, 1]], rrf_k=60)
+
+        assert [item for item, _ in fused] == [1, 3, 2, 4]
+        assert fused[0][1] == pytest.approx(1 / 61 + 1 / 63)
+
+    def test_empty(self) -> None:
+        assert reciprocal_rank_fusion([[], []]) == []
+
+
+class TestResultCache:
+    """Suíte de testes para o cache LRU com expiração."""
+
+    def test_lru_eviction(self) -> None:
+        cache = ResultCache(max_size=2, ttl_s=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert len(cache) == 2
+
+    def test_expiration(self, mocker: MockerFixture) -> None:
+        clock = mocker.patch(f"{MODULE}.time.monotonic", return_value=100.0)
+        cache = ResultCache(max_size=2, ttl_s=10)
+        cache.put("a", 1)
+
+        clock.return_value = 105.0
+        assert cache.get("a") == 1
+        clock.return_value = 111.0
+        assert cache.get("a") is None
+
+    def test_disabled(self) -> None:
+        cache = ResultCache(max_size=0, ttl_s=10)
+        cache.put("a", 1)
+        assert cache.get("a") is None
+
+
+class TestProductSearch:
+    """Suíte de testes para a busca híbrida de produtos."""
+
+    @pytest.fixture
+    def encoder(self) -> MagicMock:
+        encoder = MagicMock()
+        encoder.encode.return_value = np.array([[0.6, 0.8]], np.float32)
+        return encoder
+
+    @pytest.fixture
+    def config(self) -> ProductSearchConfig:
+        return ProductSearchConfig.from_params(
+            {"candidates": 20, "trigram_threshold": 0.2}, TARGET, StorageConfig()
+        )
+
+    def test_config_follows_storage(self) -> None:
+        config = ProductSearchConfig.from_params(
+            {}, TARGET, StorageConfig(type="halfvec")
+        )
+        assert config.column_type == "halfvec"
+        assert config.operator == "<=>"
+
+    def test_fuses_and_caches(
+        self, encoder: MagicMock, config: ProductSearchConfig, mocker: MockerFixture
+    ) -> None:
+        with ProductSearch(MagicMock(), encoder, config) as search:
+            trigram = mocker.patch.object(
+                search,
+                "_trigram_candidates",
+                return_value=[_product(1, 0.9), _product(2, 0.5)],
+            )
+            vector = mocker.patch.object(
+                search,
+                "_vector_candidates",
+                return_value=[_product(3, 0.1), _product(1, 0.2)],
+            )
+
+            response = search.search("  Calça   Jeans ", k=2)
+            again = search.search("calça jeans", k=2)
+
+        assert [r["product_id"] for r in response["results"]] == [1, 3]
+        assert response["results"][0]["trigram_rank"] == 1
+        assert response["results"][0]["vector_rank"] == 2
+        assert response["results"][1]["trigram_rank"] is None
+        assert set(response["timings_ms"]) == {
+            "encode",
+            "trigram",
+            "vector",
+            "fusion",
+            "total",
+        }
+        assert not response["cached"]
+        trigram.assert_called_once_with("Calça Jeans")
+        vector.assert_called_once_with("[0.6,0.8]")
+
+        assert again["cached"]
+        assert again["results"] == response["results"]
+        encoder.encode.assert_called_once()
+
+    def test_queries(self, encoder: MagicMock, config: ProductSearchConfig) -> None:
+        engine = MagicMock()
+        conn = engine.begin.return_value.__enter__.return_value
+        conn.execute.return_value.__iter__.return_value = iter([])
+
+        with ProductSearch(engine, encoder, config) as search:
+            search.search("nike", k=5)
+
+        calls = conn.execute.call_args_list
+        executed = [" ".join(str(c[0][0]).split()) for c in calls]
+        settings = {
+            c[0][1]["name"]: c[0][1]["value"] for c in calls if "name" in c[0][1]
+        }
+        assert settings == {
+            "pg_trgm.similarity_threshold": "0.2",
+            "pg_trgm.word_similarity_threshold": "0.2",
+        }
+        assert any(":q <% p.name" in sql for sql in executed)
+        assert any("hnsw.ef_search" in sql for sql in executed)
+        assert any(
+            "ORDER BY distance LIMIT :n" in sql and "CAST(:q AS vector)" in sql
+            for sql in executed
+        )
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.pipelines.data_embedding.encoder import EncoderConfig
+from thelook_ecommerce_analysis.retrieval.schema_context import (
+    SchemaContext,
+    SchemaContextCache,
+)
+from thelook_ecommerce_analysis.utils.vector_snapshot import write_snapshot
+
+MODULE = "thelook_ecommerce_analysis.retrieval.schema_context"
+
+TABLES = [
+    {
+        "name": "metrics.daily_sales",
+        "kind": "TABLE",
+        "text": "TABLE metrics.daily_sales",
+    },
+    {"name": "metrics.sessions", "kind": "TABLE", "text": "TABLE metrics.sessions"},
+    {"name": "raw_data.users", "kind": "TABLE", "text": "TABLE raw_data.users"},
+]
+
+VECTORS = np.array([[1.0, 0.0], [0.8, 0.6], [0.0, 1.0]], np.float32)
+
+
+def _write(directory: Path, vectors: np.ndarray = VECTORS) -> dict:
+    return write_snapshot(
+        directory,
+        "schema_context",
+        np.arange(len(TABLES)),
+        vectors,
+        {"model": "m", "tables": TABLES},
+    )
+
+
+class TestSchemaContext:
+    """Suíte de testes para a seleção das tabelas do prompt."""
+
+    @pytest.fixture
+    def context(self, tmp_path: Path) -> SchemaContext:
+        _write(tmp_path)
+        return SchemaContext.load(tmp_path)
+
+    def test_relevant(self, context: SchemaContext) -> None:
+        tables = context.relevant(np.array([1.0, 0.0], np.float32), k=3, min_score=0.5)
+
+        assert [t["name"] for t in tables] == [
+            "metrics.daily_sales",
+            "metrics.sessions",
+        ]
+        assert tables[0]["score"] == pytest.approx(1.0)
+
+    def test_most_similar_always_included(self, context: SchemaContext) -> None:
+        tables = context.relevant(np.array([0.0, -1.0], np.float32), k=2, min_score=0.9)
+
+        assert len(tables) == 1
+
+    def test_prompt(self, context: SchemaContext, mocker: MockerFixture) -> None:
+        encode = mocker.patch(
+            f"{MODULE}.encode_texts", return_value=np.array([[0.0, 1.0]], np.float32)
+        )
+
+        prompt = context.prompt("quantos usuários?", EncoderConfig("m"), k=2)
+
+        assert prompt == "TABLE raw_data.users\n\nTABLE metrics.sessions"
+        assert encode.call_args[0][0] == ["quantos usuários?"]
+
+    def test_prompt_other_model(self, context: SchemaContext) -> None:
+        with pytest.raises(ValueError, match="pipeline data_embedding"):
+            context.prompt("x", EncoderConfig("outro"))
+
+    def test_cache_reloads_new_version(self, tmp_path: Path) -> None:
+        first = _write(tmp_path)
+        cache = SchemaContextCache(tmp_path)
+
+        context = cache.get()
+        assert cache.get() is context
+        assert context.version == first["version"]
+        assert len(context) == len(TABLES)
+
+        second = _write(tmp_path, VECTORS[::-1].copy())
+        reloaded = cache.get()
+
+        assert reloaded.version == second["version"]
+        assert reloaded.version != first["version"]
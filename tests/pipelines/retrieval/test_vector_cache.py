@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from thelook_ecommerce_analysis.retrieval.vector_cache import (
+    VectorIndex,
+    VectorIndexCache,
+)
+from thelook_ecommerce_analysis.utils.vector_index import exact_top_k
+from thelook_ecommerce_analysis.utils.vector_snapshot import write_snapshot
+
+
+def _normalized(rows: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestVectorIndex:
+    """Suíte de testes para o índice vetorial em memória."""
+
+    @pytest.fixture
+    def index(self) -> VectorIndex:
+        return VectorIndex(
+            ids=np.arange(100, 300, 2), vectors=_normalized(100, 16), version="v1"
+        )
+
+    def test_top_k_matches_exact(self, index: VectorIndex) -> None:
+        query = _normalized(1, 16, seed=1)[0]
+
+        ids, scores = index.top_k(query, 5)
+
+        expected = exact_top_k(index.vectors, query[None, :], 5)[0]
+        np.testing.assert_array_equal(ids, index.ids[expected])
+        assert np.all(np.diff(scores) <= 0)
+
+    def test_similar_excludes_item(self, index: VectorIndex) -> None:
+        ids, scores = index.similar(102, 3)
+
+        assert 102 not in ids
+        assert len(ids) == 3
+        np.testing.assert_allclose(
+            scores[0], index.vectors[index.ids == ids[0]][0] @ index.vector(102)
+        )
+
+    def test_unknown_id(self, index: VectorIndex) -> None:
+        with pytest.raises(KeyError):
+            index.vector(101)
+
+    def test_k_larger_than_index(self) -> None:
+        index = VectorIndex(
+            ids=np.array([1, 2]), vectors=_normalized(2, 4), version="v"
+        )
+
+        ids, _ = index.similar(1, 10)
+
+        assert ids.tolist() == [2]
+
+
+class TestVectorIndexCache:
+    """Suíte de testes para a invalidação pelo carimbo de versão."""
+
+    def test_reloads_on_new_version(self, tmp_path: Path) -> None:
+        ids = np.arange(10)
+        write_snapshot(tmp_path, "products", ids, _normalized(10, 4), {})
+        cache = VectorIndexCache(tmp_path, "products")
+
+        first = cache.get()
+        assert cache.get() is first
+
+        stamp = write_snapshot(tmp_path, "products", ids, _normalized(10, 4, 1), {})
+        second = cache.get()
+
+        assert second is not first
+        assert second.version == stamp["version"]
+        assert isinstance(second.vectors, np.memmap)
+
+    def test_missing_snapshot(self, tmp_path: Path) -> None:
+        """App iniciado antes do pipeline: erro com a orientação, não TypeError."""
+        with pytest.raises(FileNotFoundError, match="pipeline data_embedding"):
+            VectorIndexCache(tmp_path, "products").get()
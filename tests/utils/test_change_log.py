@@ -0,0 +1,318 @@
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.utils.change_log import (
+    ChangeWindow,
+    RefreshSpec,
+    changed_tables,
+    choose_mode,
+    commit_window,
+    open_window,
+    prune_change_log,
+    run_incremental_refresh,
+    run_refresh,
+    split_statements,
+)
+
+
+class TestChangeWindow:
+    """Suíte de testes para a janela de alterações do change_log."""
+
+    def test_params(self) -> None:
+        """Os parâmetros nomeados devem refletir a janela."""
+        window = ChangeWindow("sessions", from_seq=10, to_seq=20)
+
+        assert window.params() == {
+            "from_seq": 10,
+            "to_seq": 20,
+            "full_refresh": False,
+        }
+
+    def test_is_empty(self) -> None:
+        """Janela sem novos seqs é vazia, exceto quando é reconstrução completa."""
+        assert ChangeWindow("x", from_seq=5, to_seq=5).is_empty is True
+        assert ChangeWindow("x", from_seq=5, to_seq=6).is_empty is False
+        assert (
+            ChangeWindow("x", from_seq=0, to_seq=0, full_refresh=True).is_empty is False
+        )
+
+
+class TestChangeLogHelpers:
+    """Suíte de testes para leitura e gravação do watermark."""
+
+    def test_open_window_without_watermark(self) -> None:
+        """Consumidor sem registro em refresh_state deve gerar reconstrução completa."""
+        conn = MagicMock()
+        conn.execute.return_value.scalar.side_effect = [None, 42]
+
+        window = open_window(conn, "sessions")
+
+        assert window == ChangeWindow(
+            "sessions", from_seq=0, to_seq=42, full_refresh=True
+        )
+
+    def test_open_window_with_watermark(self) -> None:
+        """Consumidor com watermark deve processar apenas a janela pendente."""
+        conn = MagicMock()
+        conn.execute.return_value.scalar.side_effect = [30, 42]
+
+        window = open_window(conn, "sessions")
+
+        assert window.from_seq == 30
+        assert window.to_seq == 42
+        assert window.full_refresh is False
+
+    def test_commit_window(self) -> None:
+        """O watermark deve ser gravado com UPSERT no refresh_state."""
+        conn = MagicMock()
+
+        commit_window(conn, ChangeWindow("sessions", from_seq=1, to_seq=9))
+
+        sql, params = conn.execute.call_args[0]
+        assert "raw_data.refresh_state" in str(sql)
+        assert "ON CONFLICT (consumer)" in str(sql)
+        assert params == {"consumer": "sessions", "to_seq": 9}
+
+    def test_prune_change_log(self) -> None:
+        """Só os registros abaixo do menor watermark são removidos."""
+        conn = MagicMock()
+        conn.execute.return_value.rowcount = 5
+
+        assert prune_change_log(conn) == 5
+        sql = " ".join(str(conn.execute.call_args[0][0]).split())
+        assert "DELETE FROM raw_data.change_log" in sql
+        assert "seq < (SELECT min(last_seq) FROM raw_data.refresh_state)" in sql
+
+
+class TestRunIncrementalRefresh:
+    """Suíte de testes para a execução de scripts de refresh incremental."""
+
+    @pytest.fixture
+    def query_path(self, tmp_path: Path) -> str:
+        path = tmp_path / "refresh.sql"
+        path.write_text("INSERT INTO metrics.x SELECT 1 WHERE :full_refresh")
+        return str(path)
+
+    @pytest.fixture
+    def mock_engine(self) -> MagicMock:
+        return MagicMock()
+
+    @pytest.fixture(autouse=True)
+    def mock_prune(self, mocker: MockerFixture) -> MagicMock:
+        return mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.prune_change_log",
+            return_value=2,
+        )
+
+    def _conn(self, engine: MagicMock) -> MagicMock:
+        return engine.begin.return_value.__enter__.return_value
+
+    def test_skip_when_no_changes(
+        self,
+        mock_engine: MagicMock,
+        query_path: str,
+        mocker: MockerFixture,
+        mock_prune: MagicMock,
+    ) -> None:
+        """Sem alterações pendentes o script não deve ser executado."""
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.open_window",
+            return_value=ChangeWindow("x", from_seq=7, to_seq=7),
+        )
+        mock_commit = mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.commit_window"
+        )
+
+        report = run_incremental_refresh(mock_engine, "x", query_path)
+
+        assert report["mode"] == "skip"
+        assert report["rows"] == 0
+        self._conn(mock_engine).execute.assert_not_called()
+        mock_commit.assert_not_called()
+        mock_prune.assert_not_called()
+
+    def test_incremental_refresh(
+        self,
+        mock_engine: MagicMock,
+        query_path: str,
+        mocker: MockerFixture,
+        mock_prune: MagicMock,
+    ) -> None:
+        """Executa o script com os parâmetros da janela e avança o watermark."""
+        window = ChangeWindow("x", from_seq=7, to_seq=12)
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.open_window",
+            return_value=window,
+        )
+        mock_commit = mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.commit_window"
+        )
+        conn = self._conn(mock_engine)
+        conn.execute.return_value.rowcount = 3
+
+        report = run_incremental_refresh(mock_engine, "x", query_path)
+
+        sql, params = conn.execute.call_args[0]
+        assert "INSERT INTO metrics.x" in str(sql)
+        assert params == window.params()
+        mock_commit.assert_called_once_with(conn, window)
+        # O change_log é podado após o commit do watermark
+        mock_prune.assert_called_once()
+        assert mock_engine.begin.call_count == 2
+        assert report["mode"] == "incremental"
+        assert report["rows"] == 3
+        assert report["pruned_change_log"] == 2
+        assert report["to_seq"] == 12
+
+    def test_full_refresh(
+        self, mock_engine: MagicMock, query_path: str, mocker: MockerFixture
+    ) -> None:
+        """Consumidor novo deve reportar reconstrução completa."""
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.open_window",
+            return_value=ChangeWindow("x", from_seq=0, to_seq=0, full_refresh=True),
+        )
+        mocker.patch("thelook_ecommerce_analysis.utils.change_log.commit_window")
+        self._conn(mock_engine).execute.return_value.rowcount = 10
+
+        report = run_incremental_refresh(mock_engine, "x", query_path)
+
+        sql, params = self._conn(mock_engine).execute.call_args[0]
+        assert params["full_refresh"] is True
+        assert report["mode"] == "full"
+        assert report["rows"] == 10
+
+
+class TestRunRefresh:
+    """Suíte de testes para a escolha do modo de refresh por fontes alteradas."""
+
+    @pytest.fixture
+    def spec(self, tmp_path: Path) -> RefreshSpec:
+        full = tmp_path / "full.sql"
+        full.write_text(
+            "-- Reconstrução completa. Parâmetros: :returns_cost\n"
+            "DELETE FROM metrics.x;\n\n"
+            "INSERT INTO metrics.x SELECT :returns_cost;\n"
+        )
+        incremental = tmp_path / "incremental.sql"
+        incremental.write_text("INSERT INTO metrics.x SELECT :from_seq")
+        return RefreshSpec(
+            "x",
+            full_query=str(full),
+            incremental_query=str(incremental),
+            sources=["order_items", "products"],
+            incremental_sources=["order_items"],
+        )
+
+    def test_split_statements(self, spec: RefreshSpec) -> None:
+        """Comandos são separados por ';' e linhas de comentário são descartadas."""
+        statements = split_statements(Path(spec.full_query).read_text())
+
+        assert statements == [
+            "DELETE FROM metrics.x",
+            "INSERT INTO metrics.x SELECT :returns_cost",
+        ]
+
+    @pytest.mark.parametrize(
+        ("window", "changed", "expected"),
+        [
+            (ChangeWindow("x", 0, 0, full_refresh=True), [], "full"),
+            (ChangeWindow("x", 5, 5), [], "skip"),
+            (ChangeWindow("x", 5, 9), [], "skip"),
+            (ChangeWindow("x", 5, 9), ["order_items"], "incremental"),
+            (ChangeWindow("x", 5, 9), ["order_items", "products"], "full"),
+        ],
+    )
+    def test_choose_mode(
+        self,
+        spec: RefreshSpec,
+        window: ChangeWindow,
+        changed: list[str],
+        expected: str,
+    ) -> None:
+        assert choose_mode(spec, window, changed) == expected
+
+    def test_choose_mode_without_incremental_query(self, spec: RefreshSpec) -> None:
+        """Sem script incremental, qualquer alteração nas fontes reconstrói a tabela."""
+        spec = RefreshSpec("x", full_query=spec.full_query, sources=["order_items"])
+
+        assert choose_mode(spec, ChangeWindow("x", 1, 2), ["order_items"]) == "full"
+
+    def test_changed_tables(self) -> None:
+        conn = MagicMock()
+        conn.execute.return_value.scalars.return_value.all.return_value = ["users"]
+
+        changed = changed_tables(conn, ChangeWindow("x", 1, 9), ["users", "orders"])
+
+        sql, params = conn.execute.call_args[0]
+        assert "unnest" in str(sql)
+        assert params == {
+            "sources": ["users", "orders"],
+            "from_seq": 1,
+            "to_seq": 9,
+            "full_refresh": False,
+        }
+        assert changed == ["users"]
+
+    def test_run_refresh_skips_unchanged_sources(
+        self, spec: RefreshSpec, mocker: MockerFixture
+    ) -> None:
+        """Alterações apenas em tabelas não observadas não disparam o refresh."""
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.open_window",
+            return_value=ChangeWindow("x", 5, 9),
+        )
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.changed_tables",
+            return_value=[],
+        )
+        mock_commit = mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.commit_window"
+        )
+
+        report = run_refresh(MagicMock(), spec)
+
+        assert report["mode"] == "skip"
+        mock_commit.assert_not_called()
+
+    def test_run_refresh_full_executes_all_statements(
+        self, spec: RefreshSpec, mocker: MockerFixture
+    ) -> None:
+        """Na reconstrução completa todos os comandos recebem os parâmetros extras."""
+        mocker.patch("thelook_ecommerce_analysis.utils.change_log.prune_change_log")
+        window = ChangeWindow("x", 5, 9)
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.open_window",
+            return_value=window,
+        )
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.changed_tables",
+            return_value=["products"],
+        )
+        mock_commit = mocker.patch(
+            "thelook_ecommerce_analysis.utils.change_log.commit_window"
+        )
+        engine = MagicMock()
+        conn = engine.begin.return_value.__enter__.return_value
+        conn.execute.return_value.rowcount = 4
+
+        report = run_refresh(engine, spec, {"returns_cost": 0.1})
+
+        executed = [str(c[0][0]) for c in conn.execute.call_args_list]
+        assert executed == [
+            "DELETE FROM metrics.x",
+            "INSERT INTO metrics.x SELECT :returns_cost",
+        ]
+        assert conn.execute.call_args[0][1] == {
+            "from_seq": 5,
+            "to_seq": 9,
+            "full_refresh": True,
+            "returns_cost": 0.1,
+        }
+        mock_commit.assert_called_once_with(conn, window)
+        assert report["mode"] == "full"
+        assert report["changed_sources"] == ["products"]
+        assert report["rows"] == 8
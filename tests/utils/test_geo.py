@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from thelook_ecommerce_analysis.utils.geo import (
+    Points,
+    cell_centers,
+    distance_rank_table,
+    grid_cells,
+    haversine_matrix,
+    parent_cells,
+    rank_by_row,
+)
+
+
+class TestGeo:
+    """Suíte de testes para as distâncias vetorizadas (haversine)."""
+
+    def test_haversine_known_distance(self) -> None:
+        """São Paulo -> Rio de Janeiro (~361 km) e distância nula para o mesmo ponto."""
+        distances = haversine_matrix(
+            np.array([-23.5505]),
+            np.array([-46.6333]),
+            np.array([-22.9068, -23.5505]),
+            np.array([-43.1729, -46.6333]),
+        )
+
+        assert distances.shape == (1, 2)
+        assert distances[0, 0] == pytest.approx(361, abs=2)
+        assert distances[0, 1] == pytest.approx(0)
+
+    def test_rank_by_row(self) -> None:
+        ranks = rank_by_row(np.array([[5.0, 1.0, 3.0], [0.0, 2.0, 1.0]]))
+
+        assert ranks.tolist() == [[3, 1, 2], [1, 3, 2]]
+
+    def test_distance_rank_table(self) -> None:
+        """Uma linha por par usuário x CD, com o ranking de proximidade."""
+        users = Points(np.array([10, 20]), np.array([0.0, 0.0]), np.array([0.0, 2.0]))
+        centers = Points(np.array([1, 2]), np.array([0.0, 0.0]), np.array([0.1, 1.9]))
+
+        table = distance_rank_table(users, centers)
+
+        assert table.column_names == ["user_id", "dc_id", "distance_km", "dc_rank"]
+        assert table["user_id"].to_pylist() == [10, 10, 20, 20]
+        assert table["dc_id"].to_pylist() == [1, 2, 1, 2]
+        assert table["dc_rank"].to_pylist() == [1, 2, 2, 1]
+
+
+class TestGrid:
+    """Suíte de testes para a grade hierárquica (quadtree) de células."""
+
+    @pytest.fixture
+    def points(self) -> tuple[np.ndarray, np.ndarray]:
+        return np.array([-23.55, 40.7, -90.0, 90.0]), np.array(
+            [-46.63, -74.0, -180.0, 180.0]
+        )
+
+    def test_parent_matches_coarser_resolution(
+        self, points: tuple[np.ndarray, np.ndarray]
+    ) -> None:
+        """A célula pai derivada da mais fina é a mesma calculada na resolução grossa."""
+        lat, lon = points
+        fine = grid_cells(lat, lon, 13)
+
+        for resolution in (0, 5, 10):
+            assert np.array_equal(
+                parent_cells(fine, 13, resolution), grid_cells(lat, lon, resolution)
+            )
+
+    def test_cells_are_bounded(self, points: tuple[np.ndarray, np.ndarray]) -> None:
+        """Os extremos (-90/-180 e 90/180) ficam na primeira e na última célula."""
+        lat, lon = points
+        cells = grid_cells(lat, lon, 4)
+
+        assert cells[2] == 0
+        assert cells[3] == (1 << 8) - 1
+
+    def test_cell_centers_contain_points(
+        self, points: tuple[np.ndarray, np.ndarray]
+    ) -> None:
+        lat, lon = points
+        center_lat, center_lon = cell_centers(grid_cells(lat, lon, 13), 13)
+
+        assert np.all(np.abs(center_lat - lat) <= 180 / (1 << 13))
+        assert np.all(np.abs(center_lon - lon) <= 360 / (1 << 13))
+
+    def test_invalid_resolution(self) -> None:
+        with pytest.raises(ValueError, match="Resolução inválida"):
+            grid_cells(np.array([0.0]), np.array([0.0]), 25)
@@ -0,0 +1,189 @@
+import struct
+from unittest.mock import MagicMock
+
+import numpy as np
+import pyarrow as pa
+import pytest
+from pgpq import ArrowToPostgresBinaryEncoder
+
+from thelook_ecommerce_analysis.utils.pg_copy import (
+    COPY_HEADER,
+    COPY_TRAILER,
+    copy_arrow_binary,
+    copy_vectors_out,
+    decode_vector_rows,
+    encode_copy_rows,
+    is_vector_type,
+    iter_copy_binary,
+)
+
+
+def _vectors(matrix: np.ndarray) -> pa.FixedSizeListArray:
+    return pa.FixedSizeListArray.from_arrays(pa.array(matrix.ravel()), matrix.shape[1])
+
+
+class TestVectorCopyEncoder:
+    """Suíte de testes para o encoder NumPy do COPY binário (pgvector)."""
+
+    def test_matches_pgpq_for_scalar_columns(self) -> None:
+        """Sem vetores, o fluxo é idêntico ao do pgpq (incluindo nulos e fatias)."""
+        table = pa.table(
+            {
+                "id": pa.array([1, None, 3, 4], pa.int64()),
+                "name": pa.array(["ab", None, "çx", ""], pa.string()),
+                "price": pa.array([1.5, 2.0, None, 0.0]),
+                "active": pa.array([True, False, None, True]),
+                "qt": pa.array([1, 2, 3, 4], pa.int32()),
+            }
+        ).slice(1, 3)
+
+        encoder = ArrowToPostgresBinaryEncoder(table.schema)
+        expected = (
+            encoder.write_header()
+            + b"".join(encoder.write_batch(b) for b in table.to_batches())
+            + encoder.finish()
+        )
+
+        assert b"".join(iter_copy_binary(table, batch_rows=2)) == expected
+
+    @pytest.mark.parametrize(
+        ("dtype", "item"), [(np.float32, ">f4"), (np.float16, ">f2")]
+    )
+    def test_vector_layout(self, dtype: type, item: str) -> None:
+        """vector/halfvec: int16 dimensão, int16 reservado e os valores em big-endian."""
+        matrix = np.array([[0.5, -1.0, 2.0]], dtype)
+        table = pa.table(
+            {"source_id": pa.array([7], pa.int64()), "embedding": _vectors(matrix)}
+        )
+
+        row = encode_copy_rows(table.to_batches()[0])
+
+        width = np.dtype(item).itemsize
+        assert struct.unpack(">h", row[:2]) == (2,)
+        assert struct.unpack(">iq", row[2:14]) == (8, 7)
+        assert struct.unpack(">ihh", row[14:22]) == (4 + 3 * width, 3, 0)
+        np.testing.assert_array_equal(np.frombuffer(row[22:], item), matrix[0])
+
+    def test_null_vector(self) -> None:
+        matrix = np.ones((2, 2), np.float32)
+        embedding = pa.FixedSizeListArray.from_arrays(
+            pa.array(matrix.ravel()), 2, mask=pa.array([False, True])
+        )
+        table = pa.table({"embedding": embedding})
+
+        row = encode_copy_rows(table.to_batches()[0])
+
+        assert len(row) == (2 + 4 + 12) + (2 + 4)
+        assert struct.unpack(">i", row[-4:]) == (-1,)
+
+    def test_stream_framing(self) -> None:
+        table = pa.table({"embedding": _vectors(np.zeros((5, 4), np.float32))})
+
+        chunks = list(iter_copy_binary(table, batch_rows=2))
+
+        assert chunks[0] == COPY_HEADER
+        assert chunks[-1] == COPY_TRAILER
+        assert len(chunks) == 5
+
+    def test_unsupported_type(self) -> None:
+        table = pa.table({"d": pa.array([1], pa.date32())})
+
+        with pytest.raises(TypeError, match="date32"):
+            encode_copy_rows(table.to_batches()[0])
+
+    def test_is_vector_type(self) -> None:
+        assert is_vector_type(pa.list_(pa.float32(), 384))
+        assert is_vector_type(pa.list_(pa.float16(), 384))
+        assert not is_vector_type(pa.list_(pa.float32()))
+        assert not is_vector_type(pa.list_(pa.int64(), 2))
+
+
+class TestCopyArrowBinary:
+    """Suíte de testes para a escolha do encoder do COPY."""
+
+    def _copy(self, conn: MagicMock) -> MagicMock:
+        cursor = conn.connection.driver_connection.cursor.return_value.__enter__
+        return cursor.return_value.copy.return_value.__enter__.return_value
+
+    def test_vector_table_uses_numpy_encoder(self) -> None:
+        conn = MagicMock()
+        table = pa.table(
+            {
+                "source_id": pa.array([1, 2], pa.int64()),
+                "embedding": _vectors(np.eye(2, dtype=np.float32)),
+            }
+        )
+
+        copy_arrow_binary(conn, "embedding_stage", table)
+
+        written = b"".join(c[0][0] for c in self._copy(conn).write.call_args_list)
+        assert written == b"".join(iter_copy_binary(table))
+        cursor = conn.connection.driver_connection.cursor.return_value.__enter__
+        copy_sql = cursor.return_value.copy.call_args[0][0]
+        assert copy_sql == (
+            'COPY embedding_stage ("source_id", "embedding") FROM STDIN '
+            "WITH (FORMAT BINARY)"
+        )
+
+    def test_raw_connection_required(self) -> None:
+        conn = MagicMock()
+        conn.connection.driver_connection = None
+
+        with pytest.raises(ValueError, match="psycopg"):
+            copy_arrow_binary(conn, "x", pa.table({"id": [1]}))
+
+
+class TestCopyVectorsOut:
+    """Suíte de testes para a leitura de vetores via COPY binário."""
+
+    def _stream(self, ids: list[int], matrix: np.ndarray) -> bytes:
+        table = pa.table({"id": pa.array(ids, pa.int64()), "v": _vectors(matrix)})
+        return b"".join(iter_copy_binary(table, batch_rows=2))
+
+    @pytest.mark.parametrize(
+        ("dtype", "column_type"), [(np.float32, "vector"), (np.float16, "halfvec")]
+    )
+    def test_roundtrip(self, dtype: type, column_type: str) -> None:
+        matrix = np.arange(15, dtype=dtype).reshape(5, 3) / 4
+
+        ids, vectors = decode_vector_rows(
+            self._stream([5, 6, 7, 8, 9], matrix), column_type
+        )
+
+        assert ids.tolist() == [5, 6, 7, 8, 9]
+        assert vectors.dtype == np.float32
+        np.testing.assert_array_equal(vectors, matrix.astype(np.float32))
+
+    def test_empty(self) -> None:
+        ids, vectors = decode_vector_rows(COPY_HEADER + COPY_TRAILER, "vector")
+        assert len(ids) == 0
+        assert vectors.shape == (0, 0)
+
+    def test_rejects_other_layouts(self) -> None:
+        table = pa.table(
+            {
+                "id": pa.array([1], pa.int32()),
+                "v": _vectors(np.ones((1, 2), np.float32)),
+            }
+        )
+        payload = b"".join(iter_copy_binary(table))
+
+        with pytest.raises(ValueError, match="COPY"):
+            decode_vector_rows(payload, "vector")
+        with pytest.raises(ValueError, match="COPY"):
+            decode_vector_rows(b"not a copy stream", "vector")
+
+    def test_reads_copy_to_stdout(self) -> None:
+        conn = MagicMock()
+        cursor = conn.connection.driver_connection.cursor.return_value.__enter__
+        copy = cursor.return_value.copy
+        payload = self._stream([1, 2], np.eye(2, dtype=np.float32))
+        copy.return_value.__enter__.return_value = iter([payload[:10], payload[10:]])
+
+        ids, vectors = copy_vectors_out(conn, "SELECT id, v FROM t", "vector")
+
+        assert copy.call_args[0][0] == (
+            "COPY (SELECT id, v FROM t) TO STDOUT WITH (FORMAT BINARY)"
+        )
+        assert ids.tolist() == [1, 2]
+        np.testing.assert_array_equal(vectors, np.eye(2))
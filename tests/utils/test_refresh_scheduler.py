@@ -0,0 +1,123 @@
+import threading
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from thelook_ecommerce_analysis.utils.change_log import RefreshSpec
+from thelook_ecommerce_analysis.utils.refresh_scheduler import (
+    build_dag,
+    parse_references,
+    resolve_sources,
+    run_scheduled_refresh,
+)
+
+
+@pytest.fixture
+def specs(tmp_path: Path) -> dict[str, RefreshSpec]:
+    """Três objetos: 'b' lê 'a'; 'c' é independente."""
+    scripts = {
+        "a": "DELETE FROM metrics.a;\nINSERT INTO metrics.a SELECT * FROM raw_data.users",
+        "b": "-- Lê raw_data.events apenas no comentário\n"
+        "INSERT INTO metrics.b SELECT * FROM metrics.a JOIN raw_data.orders o ON true",
+        "c": "INSERT INTO embeddings.c SELECT * FROM raw_data.products, raw_data.change_log",
+    }
+    result = {}
+    for name, sql in scripts.items():
+        path = tmp_path / f"{name}.sql"
+        path.write_text(sql)
+        result[name] = RefreshSpec(name, full_query=str(path))
+    return result
+
+
+class TestDag:
+    """Suíte de testes para a extração de fontes e o grafo de dependências."""
+
+    def test_parse_references(self) -> None:
+        """Tabelas técnicas do CDC e comentários são ignorados."""
+        sql = (
+            "SELECT * FROM raw_data.Users u -- JOIN raw_data.events\n"
+            "JOIN raw_data.change_log c ON true JOIN metrics.sessions s ON true"
+        )
+
+        assert parse_references(sql) == {("raw_data", "users"), ("metrics", "sessions")}
+
+    def test_build_dag(self, specs: dict[str, RefreshSpec]) -> None:
+        assert build_dag(specs) == {"a": set(), "b": {"a"}, "c": set()}
+
+    def test_resolve_sources_inherits_upstream(
+        self, specs: dict[str, RefreshSpec]
+    ) -> None:
+        """Um objeto herda as fontes dos objetos que lê."""
+        resolved = resolve_sources(specs, build_dag(specs))
+
+        assert resolved["a"].sources == ["users"]
+        assert resolved["b"].sources == ["orders", "users"]
+        assert resolved["c"].sources == ["products"]
+
+    def test_declared_sources_take_precedence(
+        self, specs: dict[str, RefreshSpec]
+    ) -> None:
+        specs["a"] = RefreshSpec("a", full_query=specs["a"].full_query, sources=["x"])
+
+        resolved = resolve_sources(specs, build_dag(specs))
+
+        assert resolved["a"].sources == ["x"]
+        assert resolved["b"].sources == ["orders", "x"]
+
+
+class TestRunScheduledRefresh:
+    """Suíte de testes para a execução concorrente respeitando dependências."""
+
+    def test_runs_dependencies_first_and_in_parallel(
+        self, specs: dict[str, RefreshSpec], mocker: MockerFixture
+    ) -> None:
+        """'a' e 'c' rodam juntos; 'b' só inicia após 'a' terminar."""
+        order: list[str] = []
+        both_started = threading.Barrier(2, timeout=5)
+
+        def fake_refresh(
+            engine: MagicMock, spec: RefreshSpec, params: Any
+        ) -> dict[str, Any]:
+            if spec.consumer in {"a", "c"}:
+                # Bloqueia até os dois objetos independentes estarem em execução
+                both_started.wait()
+            order.append(spec.consumer)
+            return {"consumer": spec.consumer, "mode": "full", "rows": 1}
+
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.refresh_scheduler.run_refresh",
+            side_effect=fake_refresh,
+        )
+
+        report = run_scheduled_refresh(MagicMock(), specs, max_workers=2)
+
+        assert order.index("b") > order.index("a")
+        assert set(report["objects"]) == {"a", "b", "c"}
+        assert report["wall_duration_s"] >= 0
+
+    def test_failure_stops_downstream(
+        self, specs: dict[str, RefreshSpec], mocker: MockerFixture
+    ) -> None:
+        """Falha em um objeto propaga o erro e não inicia os dependentes."""
+        started: list[str] = []
+
+        def fake_refresh(
+            engine: MagicMock, spec: RefreshSpec, params: Any
+        ) -> dict[str, Any]:
+            started.append(spec.consumer)
+            if spec.consumer == "a":
+                raise RuntimeError("falhou")
+            return {"consumer": spec.consumer}
+
+        mocker.patch(
+            "thelook_ecommerce_analysis.utils.refresh_scheduler.run_refresh",
+            side_effect=fake_refresh,
+        )
+
+        with pytest.raises(RuntimeError, match="falhou"):
+            run_scheduled_refresh(MagicMock(), specs, max_workers=1)
+
+        assert "b" not in started
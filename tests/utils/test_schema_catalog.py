@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from thelook_ecommerce_analysis.utils.schema_catalog import (
+    approx_tokens,
+    fetch_catalog,
+    render_table,
+    short_type,
+)
+
+
+def _row(name: str, column: str, column_type: str, **kwargs: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        name=name,
+        kind=kwargs.get("kind", "TABLE"),
+        comment=kwargs.get("comment"),
+        column_name=column,
+        column_type=column_type,
+        column_comment=kwargs.get("column_comment"),
+    )
+
+
+class TestSchemaCatalog:
+    """Suíte de testes para a extração do catálogo comentado."""
+
+    @pytest.mark.parametrize(
+        ("column_type", "expected"),
+        [
+            ("timestamp with time zone", "timestamptz"),
+            ("character varying(255)", "varchar(255)"),
+            ("double precision", "float8"),
+            ("geography(Point,4326)", "geography(Point)"),
+            ("vector(384)", "vector(384)"),
+        ],
+    )
+    def test_short_type(self, column_type: str, expected: str) -> None:
+        assert short_type(column_type) == expected
+
+    def test_groups_columns_by_table(self) -> None:
+        conn = MagicMock()
+        conn.execute.return_value = [
+            _row("metrics.sessions", "session_id", "text", comment="Sessões."),
+            _row("metrics.sessions", "duration_min", "double precision"),
+            _row("raw_data.change_log", "id", "bigint"),
+        ]
+
+        catalog = fetch_catalog(conn, ["metrics", "raw_data"], ["raw_data.change_log"])
+
+        assert conn.execute.call_args[0][1] == {"schemas": ["metrics", "raw_data"]}
+        assert [t["name"] for t in catalog] == ["metrics.sessions"]
+        assert catalog[0]["comment"] == "Sessões."
+        assert catalog[0]["columns"][1] == {
+            "name": "duration_min",
+            "type": "float8",
+            "comment": None,
+        }
+
+    def test_render_table(self) -> None:
+        table = {
+            "name": "metrics.product_360_current",
+            "kind": "VIEW",
+            "comment": "Visão de produtos.",
+            "columns": [
+                {"name": "product_id", "type": "bigint", "comment": None},
+                {"name": "avg_aging_days", "type": "numeric", "comment": "Dias."},
+            ],
+        }
+
+        assert render_table(table) == (
+            "VIEW metrics.product_360_current -- Visão de produtos.\n"
+            "  product_id bigint\n"
+            "  avg_aging_days numeric -- Dias."
+        )
+
+    def test_approx_tokens(self) -> None:
+        assert approx_tokens("") == 0
+        assert approx_tokens("abcde") == 2
@@ -0,0 +1,110 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from thelook_ecommerce_analysis.utils.vector_index import (
+    benchmark_ef_search,
+    build_hnsw_index,
+    distance_operator,
+    drop_hnsw_index,
+    should_defer_index,
+)
+
+INDEX = {"name": "idx_x", "column": "embedding", "opclass": "vector_cosine_ops"}
+
+
+class TestVectorIndex:
+    """Suíte de testes para a construção adiada do índice HNSW."""
+
+    @pytest.mark.parametrize(
+        ("opclass", "operator"),
+        [
+            ("vector_cosine_ops", "<=>"),
+            ("halfvec_cosine_ops", "<=>"),
+            ("vector_l2_ops", "<->"),
+            ("vector_ip_ops", "<#>"),
+        ],
+    )
+    def test_distance_operator(self, opclass: str, operator: str) -> None:
+        assert distance_operator(opclass) == operator
+
+    @pytest.mark.parametrize(
+        ("changed", "reltuples", "expected"),
+        [(0, None, False), (5, None, True), (5, -1.0, True), (5, 100.0, False)],
+    )
+    def test_should_defer_index(
+        self, changed: int, reltuples: float | None, expected: bool
+    ) -> None:
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = reltuples
+
+        assert should_defer_index(conn, "embeddings.x", changed, 0.1) is expected
+
+    def test_drop_uses_table_schema(self) -> None:
+        conn = MagicMock()
+
+        drop_hnsw_index(conn, "embeddings.x", INDEX)
+
+        assert str(conn.execute.call_args[0][0]) == (
+            "DROP INDEX IF EXISTS embeddings.idx_x"
+        )
+
+    def test_build_sets_maintenance_settings(self) -> None:
+        """A construção é configurada apenas na transação (set_config local)."""
+        conn = MagicMock()
+        hnsw = {
+            "m": 24,
+            "ef_construction": 128,
+            "maintenance_workers": 3,
+            "maintenance_work_mem": "256MB",
+        }
+
+        build_hnsw_index(conn, "embeddings.x", INDEX, hnsw)
+
+        calls = conn.execute.call_args_list
+        assert calls[0][0][1] == {"mem": "256MB"}
+        assert calls[1][0][1] == {"workers": "3"}
+        ddl = " ".join(str(calls[2][0][0]).split())
+        assert ddl == (
+            "CREATE INDEX IF NOT EXISTS idx_x ON embeddings.x "
+            "USING hnsw (embedding vector_cosine_ops) "
+            "WITH (m = 24, ef_construction = 128)"
+        )
+
+    def test_rejects_invalid_identifier(self) -> None:
+        with pytest.raises(ValueError, match="Identificador"):
+            drop_hnsw_index(MagicMock(), "embeddings.x", {"name": "x; DROP TABLE y"})
+
+    def test_benchmark_recall_against_exact_search(self) -> None:
+        """recall@k compara a busca aproximada com a exata (índice desativado)."""
+        conn = MagicMock()
+        settings: dict[str, str] = {}
+
+        def execute(statement: object, params: dict | None = None) -> MagicMock:
+            sql = str(statement)
+            result = MagicMock()
+            if "set_config" in sql:
+                name = sql.split("'")[1]
+                settings[name] = (params or {}).get("ef") or sql.split("'")[3]
+            elif "random()" in sql:
+                result.scalars.return_value.all.return_value = ["[1,0]", "[0,1]"]
+            elif settings.get("enable_indexscan") == "off":
+                result.scalars.return_value.all.return_value = [1, 2]
+            elif settings.get("hnsw.ef_search") == "10":
+                result.scalars.return_value.all.return_value = [1, 3]
+            else:
+                result.scalars.return_value.all.return_value = [2, 1]
+            return result
+
+        conn.execute.side_effect = execute
+
+        report = benchmark_ef_search(
+            conn, "embeddings.x", INDEX, {"queries": 2, "k": 2, "ef_search": [10, 40]}
+        )
+
+        assert report["queries"] == 2
+        assert [(r["ef_search"], r["recall_at_k"]) for r in report["ef_search"]] == [
+            (10, 0.5),
+            (40, 1.0),
+        ]
+        assert {"p50_ms", "p95_ms"} <= set(report["ef_search"][0])
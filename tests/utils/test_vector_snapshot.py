@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import numpy as np
+
+from thelook_ecommerce_analysis.utils.vector_snapshot import (
+    load_snapshot,
+    read_stamp,
+    write_snapshot,
+)
+
+
+def _vectors(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(5, 4)).astype(np.float32)
+
+
+class TestVectorSnapshot:
+    """Suíte de testes para os snapshots .npy versionados."""
+
+    def test_roundtrip_mmap(self, tmp_path: Path) -> None:
+        ids = np.arange(5)
+        vectors = _vectors(0)
+
+        stamp = write_snapshot(tmp_path, "x", ids, vectors, {"model": "m"})
+        current = read_stamp(tmp_path, "x")
+        assert current is not None
+        loaded_ids, loaded = load_snapshot(tmp_path, current)
+
+        assert stamp["rows"] == 5
+        assert stamp["dimensions"] == 4
+        assert stamp["model"] == "m"
+        assert isinstance(loaded, np.memmap)
+        assert loaded.dtype == np.float32
+        assert loaded.flags["C_CONTIGUOUS"]
+        np.testing.assert_array_equal(loaded, vectors)
+        np.testing.assert_array_equal(loaded_ids, ids)
+
+    def test_keeps_current_and_previous(self, tmp_path: Path) -> None:
+        ids = np.arange(5)
+        versions = [
+            write_snapshot(tmp_path, "x", ids, _vectors(seed), {})["version"]
+            for seed in range(3)
+        ]
+
+        assert len(set(versions)) == 3
+        current = read_stamp(tmp_path, "x")
+        assert current is not None
+        assert current["version"] == versions[2]
+        files = sorted(p.name for p in tmp_path.glob("x-*.npy"))
+        assert files == sorted(
+            f"x-{v}{suffix}" for v in versions[1:] for suffix in (".npy", ".ids.npy")
+        )
+        assert not list(tmp_path.glob(".*.tmp"))
+
+    def test_missing_stamp(self, tmp_path: Path) -> None:
+        assert read_stamp(tmp_path, "x") is None